@@ -0,0 +1,367 @@
+"""
+Read-through response cache.
+
+Entries are JSON-serialized and carry invalidation tags such as
+"doc:<uuid>", "qa:<uuid>" or the collection tags "documents"/"qa_entries".
+`sync_import` invalidates exactly the tags of the rows it touched.
+
+Backends:
+- LRUCache: in-process, TTL plus entry-count and byte-size bounded LRU.
+  Per process: with more than one worker (WEB_CONCURRENCY) the others
+  would never see an invalidation, so the cache is disabled instead.
+- RedisCache: shared across workers/nodes; takes any client exposing the
+  redis-py commands it uses, so tests can pass a local stand-in. Needs
+  Redis 7+ (EXPIRE NX/GT). It fails open: while Redis is unreachable, reads
+  are misses and writes and invalidations are logged and skipped.
+"""
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, Optional
+from app.core.settings import settings
+import datetime
+import hashlib
+import inspect
+import json
+import logging
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+DOCUMENTS_TAG = "documents"
+QA_TAG = "qa_entries"
+
+_MISSING = object()
+MISSING = _MISSING  # what backend get() returns on a miss
+
+
+def doc_tag(doc_id) -> str:
+    return f"doc:{doc_id}"
+
+
+def qa_tag(qa_id) -> str:
+    return f"qa:{qa_id}"
+
+
+def _dumps(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, default=str, separators=(",", ":")).encode("utf-8")
+
+
+class CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.errors = 0  # backend calls that failed and were skipped
+
+    def incr(self, name: str, amount: int = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def as_dict(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+        }
+
+
+class LRUCache:
+    """In-process LRU with per-entry TTL, bounded by entry count and payload bytes"""
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (payload, expires_at, tags)
+        self._tags: Dict[str, set] = {}
+        self._bytes = 0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats.incr("misses")
+                return _MISSING
+            payload, expires_at, _ = entry
+            if expires_at <= self.clock():
+                self._remove(key)
+                self.stats.incr("expirations")
+                self.stats.incr("misses")
+                return _MISSING
+            self._entries.move_to_end(key)
+        self.stats.incr("hits")
+        return json.loads(payload)
+
+    def set(self, key: str, value, ttl: int, tags: Iterable[str] = ()):
+        payload = _dumps(value)
+        if len(payload) > self.max_bytes:
+            return
+        tags = frozenset(tags)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (payload, self.clock() + ttl, tags)
+            self._bytes += len(payload)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.stats.incr("evictions")
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        removed = 0
+        with self._lock:
+            for tag in set(tags):
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+                    removed += 1
+        self.stats.incr("invalidations", removed)
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self._bytes = 0
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            **self.stats.as_dict(),
+        }
+
+    def _remove(self, key: str):
+        payload, _, tags = self._entries.pop(key)
+        self._bytes -= len(payload)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class RedisCache:
+    """Shared cache on a redis-py compatible client; eviction is left to Redis (maxmemory-policy)"""
+
+    def __init__(self, client, prefix: str = "core:cache:"):
+        self.client = client
+        self.prefix = prefix
+        self.stats = CacheStats()
+
+    def get(self, key: str):
+        try:
+            payload = self.client.get(self.prefix + key)
+        except Exception as e:
+            self._failed("read", e)
+            payload = None
+        if payload is None:
+            self.stats.incr("misses")
+            return _MISSING
+        self.stats.incr("hits")
+        return json.loads(payload)
+
+    def set(self, key: str, value, ttl: int, tags: Iterable[str] = ()):
+        pipe = self.client.pipeline()
+        pipe.set(self.prefix + key, _dumps(value), ex=ttl)
+        for tag in tags:
+            tag_key = self.prefix + "tag:" + tag
+            pipe.sadd(tag_key, key)
+            # the tag set lives as long as its longest-lived entry: NX gives a new set
+            # a TTL, GT only ever extends it (Redis 7+)
+            pipe.expire(tag_key, ttl, nx=True)
+            pipe.expire(tag_key, ttl, gt=True)
+        try:
+            pipe.execute()
+        except Exception as e:
+            self._failed("write", e)
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        removed = 0
+        for tag in set(tags):
+            tag_key = self.prefix + "tag:" + tag
+            try:
+                keys = self.client.smembers(tag_key)
+                if keys:
+                    removed += self.client.delete(*[self.prefix + (k.decode() if isinstance(k, bytes) else k) for k in keys])
+                self.client.delete(tag_key)
+            except Exception as e:
+                # entries left behind expire with their TTL
+                self._failed(f"invalidation of {tag}", e)
+        self.stats.incr("invalidations", removed)
+        return removed
+
+    def _failed(self, operation: str, error: Exception):
+        self.stats.incr("errors")
+        logger.warning(f"Redis cache {operation} failed: {error}")
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def info(self) -> Dict[str, Any]:
+        return {"backend": "redis", **self.stats.as_dict()}
+
+
+class NullCache:
+    """Backend used when caching is disabled"""
+
+    def __init__(self):
+        self.stats = CacheStats()
+
+    def get(self, key: str):
+        return _MISSING
+
+    def set(self, key: str, value, ttl: int, tags: Iterable[str] = ()):
+        pass
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        return 0
+
+    def clear(self):
+        pass
+
+    def info(self) -> Dict[str, Any]:
+        return {"backend": "none"}
+
+
+def create_cache():
+    backend = settings.CACHE_BACKEND
+    if backend == "none":
+        return NullCache()
+    if backend == "redis":
+        import redis  # optional dependency, only needed for the shared backend
+        return RedisCache(redis.Redis.from_url(settings.CACHE_REDIS_URL))
+    if settings.WEB_CONCURRENCY > 1:  # gunicorn.conf.py exports the actual worker count
+        # sync_import could only clear the importing worker's LRU; the other
+        # workers would serve stale entries until their TTL
+        logger.warning(
+            f"CACHE_BACKEND=memory is per process and WEB_CONCURRENCY={settings.WEB_CONCURRENCY}: "
+            "response caching is disabled, use CACHE_BACKEND=redis to share it"
+        )
+        return NullCache()
+    return LRUCache(max_entries=settings.CACHE_MAX_ENTRIES, max_bytes=settings.CACHE_MAX_BYTES)
+
+
+cache = create_cache()
+
+
+def set_cache(backend):
+    """Swap the process-wide cache backend (used by tests and startup code)"""
+    global cache
+    cache = backend
+
+
+def get_cache():
+    return cache
+
+
+def invalidate(tags: Iterable[str]) -> int:
+    tags = list(tags)
+    if not tags:
+        return 0
+    removed = cache.invalidate_tags(tags)
+    logger.debug(f"Cache invalidation: {len(tags)} tags, {removed} entries")
+    return removed
+
+
+_KEY_TYPES = (str, int, float, bool, type(None), uuid.UUID, datetime.date)
+
+
+def _key_part(value):
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = [_key_part(v) for v in value]
+        return sorted(items, key=str) if isinstance(value, (set, frozenset)) else items
+    if isinstance(value, _KEY_TYPES):
+        return value
+    return _MISSING
+
+
+def make_key(namespace: str, params: Dict[str, Any]) -> str:
+    """Build a cache key from the plain-valued call parameters (sessions etc. are skipped)"""
+    parts = {}
+    for name, value in sorted(params.items()):
+        part = _key_part(value)
+        if part is _MISSING or (isinstance(part, list) and _MISSING in part):
+            continue
+        parts[name] = part
+    digest = hashlib.sha1(_dumps(parts)).hexdigest()
+    return f"{namespace}:{digest}"
+
+
+def cached(namespace: str, ttl: int = None, tags: Callable[..., Iterable[str]] = None):
+    """
+    Cache a route handler's return value.
+
+    `tags` receives the call's keyword arguments and the result and returns
+    the invalidation tags for the entry. The wrapped signature is preserved so
+    FastAPI still resolves dependencies. `wrapper.refresh(...)` recomputes
+    and stores the entry regardless of what is cached, for warmup jobs.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        def lookup(args, kwargs):
+            params = signature.bind_partial(*args, **kwargs).arguments
+            return params, make_key(namespace, params)
+
+        def store(key, params, result):
+            entry_tags = list(tags(result=result, **params)) if tags else []
+            cache.set(key, result, ttl or settings.CACHE_DEFAULT_TTL, entry_tags)
+
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                params, key = lookup(args, kwargs)
+                hit = cache.get(key)
+                if hit is not _MISSING:
+                    return hit
+                result = await func(*args, **kwargs)
+                store(key, params, result)
+                return result
+
+            async def async_refresh(*args, **kwargs):
+                params, key = lookup(args, kwargs)
+                result = await func(*args, **kwargs)
+                store(key, params, result)
+                return result
+            async_wrapper.refresh = async_refresh
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            params, key = lookup(args, kwargs)
+            hit = cache.get(key)
+            if hit is not _MISSING:
+                return hit
+            result = func(*args, **kwargs)
+            store(key, params, result)
+            return result
+
+        def refresh(*args, **kwargs):
+            params, key = lookup(args, kwargs)
+            result = func(*args, **kwargs)
+            store(key, params, result)
+            return result
+        wrapper.refresh = refresh
+        return wrapper
+
+    return decorator
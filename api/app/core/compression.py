@@ -0,0 +1,237 @@
+"""
+HTTP body compression.
+
+RequestDecompressionMiddleware accepts `Content-Encoding: gzip` or `zstd`
+request bodies on selected path prefixes and inflates them chunk by chunk as
+they arrive, so the compressed body is never buffered, and stops as soon as
+the inflated size passes the cap, so a small compressed chunk cannot inflate
+past it in memory.
+
+ResponseCompressionMiddleware negotiates `Accept-Encoding` and compresses
+large responses with zstd or gzip, streaming when the response streams.
+"""
+from typing import Dict, Optional, Sequence, Tuple
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import zlib
+import zstandard
+
+SUPPORTED_ENCODINGS = ("zstd", "gzip")
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+# Compress in a worker thread above this size to keep the event loop free
+THREAD_MINIMUM_SIZE = 256 * 1024
+
+# A zstd block inflates to at most 128 KiB from as little as 4 bytes (an RLE block),
+# so zstd input is fed this much at a time: at most 16 MiB of output per call
+ZSTD_INPUT_SLICE = 512
+
+
+class _GzipDecoder:
+    def __init__(self):
+        self._obj = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def decompress(self, data: bytes, max_length: int) -> bytes:
+        # stops after max_length + 1 bytes, leaving the rest of the input unread
+        return self._obj.decompress(data, max_length + 1)
+
+    def finish(self) -> bytes:
+        tail = self._obj.flush()
+        if not self._obj.eof:
+            raise ValueError("truncated gzip stream")
+        return tail
+
+
+class _ZstdDecoder:
+    def __init__(self):
+        self._obj = zstandard.ZstdDecompressor().decompressobj()
+
+    def decompress(self, data: bytes, max_length: int) -> bytes:
+        # zstandard's decompressobj has no output limit, so the input is sliced instead
+        chunks, size = [], 0
+        view = memoryview(data)
+        for start in range(0, len(view), ZSTD_INPUT_SLICE):
+            chunk = self._obj.decompress(view[start:start + ZSTD_INPUT_SLICE])
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > max_length or self._obj.eof:
+                break
+        return b"".join(chunks)
+
+    def finish(self) -> bytes:
+        if not self._obj.eof:
+            raise ValueError("truncated zstd stream")
+        return b""
+
+
+_DECODERS = {"gzip": _GzipDecoder, "zstd": _ZstdDecoder}
+
+
+class RequestDecompressionMiddleware:
+    def __init__(self, app: ASGIApp, path_prefixes: Sequence[str] = ("/sync/",), max_body_bytes: int = 512 * 1024 * 1024):
+        self.app = app
+        self.path_prefixes = tuple(path_prefixes)
+        self.max_body_bytes = max_body_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        encoding = Headers(scope=scope).get("content-encoding", "identity").strip().lower()
+        if encoding == "identity":
+            await self.app(scope, receive, send)
+            return
+        if encoding not in _DECODERS:
+            response = PlainTextResponse(f"Unsupported Content-Encoding: {encoding}", status_code=415)
+            await response(scope, receive, send)
+            return
+
+        scope = dict(scope)
+        scope["headers"] = [
+            (name, value) for name, value in scope["headers"]
+            if name not in (b"content-encoding", b"content-length")
+        ]
+        await self.app(scope, self._inflating_receive(receive, _DECODERS[encoding]()), send)
+
+    def _inflating_receive(self, receive: Receive, decoder) -> Receive:
+        total = 0
+
+        async def inflating_receive() -> Message:
+            nonlocal total
+            message = await receive()
+            if message["type"] != "http.request":
+                return message
+            more_body = message.get("more_body", False)
+            remaining = self.max_body_bytes - total
+            try:
+                body = decoder.decompress(message.get("body", b""), remaining)
+                if not more_body and len(body) <= remaining:
+                    body += decoder.finish()
+            except (zlib.error, zstandard.ZstdError, ValueError) as e:
+                raise HTTPException(status_code=400, detail=f"Invalid compressed body: {e}")
+            total += len(body)
+            if total > self.max_body_bytes:
+                raise HTTPException(status_code=413, detail="Decompressed body too large")
+            return {"type": "http.request", "body": body, "more_body": more_body}
+
+        return inflating_receive
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Pick the best supported encoding from an Accept-Encoding header
+    A `*` weight applies only to codings the header does not name, so
+    "zstd;q=0, *" still refuses zstd (RFC 9110 section 12.5.3).
+    """
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+    best: Tuple[float, int, Optional[str]] = (0.0, 0, None)
+    for candidate in SUPPORTED_ENCODINGS:
+        q = weights.get(candidate, weights.get("*", 0.0))
+        # prefer zstd over gzip at equal q
+        rank = len(SUPPORTED_ENCODINGS) - SUPPORTED_ENCODINGS.index(candidate)
+        if q > 0 and (q, rank) > best[:2]:
+            best = (q, rank, candidate)
+    return best[2]
+
+
+class _Compressor:
+    def __init__(self, encoding: str, gzip_level: int, zstd_level: int):
+        if encoding == "zstd":
+            self._obj = zstandard.ZstdCompressor(level=zstd_level).compressobj()
+            self._sync_flush = lambda: self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        else:
+            self._obj = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self._sync_flush = lambda: self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        out = self._obj.compress(data)
+        return out + (self._obj.flush() if final else self._sync_flush())
+
+    async def compress_async(self, data: bytes, final: bool) -> bytes:
+        if len(data) >= THREAD_MINIMUM_SIZE:
+            return await run_in_threadpool(self.compress, data, final)
+        return self.compress(data, final)
+
+
+class ResponseCompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6, zstd_level: int = 3):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.zstd_level = zstd_level
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        async def compressing_send(message: Message) -> None:
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                passthrough = (
+                    "content-encoding" in headers
+                    or message["status"] in (204, 206, 304)
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                )
+                if passthrough:
+                    await send(message)
+                else:
+                    start = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start is not None:
+                # first body chunk decides whether to compress
+                headers = MutableHeaders(raw=start["headers"])
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding, self.gzip_level, self.zstd_level)
+                body = await compressor.compress_async(body, final=not more_body)
+                headers["Content-Encoding"] = encoding
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    headers["Content-Length"] = str(len(body))
+                await send(start)
+                start = None
+            else:
+                body = await compressor.compress_async(body, final=not more_body)
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, compressing_send)
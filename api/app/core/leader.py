@@ -0,0 +1,89 @@
+"""
+Leader election across worker processes and nodes.
+
+Every worker competes for a session-level Postgres advisory lock; the one
+that gets it holds its connection open and is the leader until the
+connection drops or the worker shuts down, at which point another worker
+picks the lock up on its next attempt. Databases without advisory locks
+(SQLite in tests and local runs) have a single process, which always leads.
+"""
+from typing import Optional
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def lock_key(name: str) -> int:
+    """Stable signed 64-bit advisory lock key for a lock name"""
+    return int.from_bytes(hashlib.sha1(name.encode("utf-8")).digest()[:8], "big", signed=True)
+
+
+class LeaderElection:
+    def __init__(self, engine: Engine, name: str):
+        self.engine = engine
+        self.name = name
+        self.key = lock_key(name)
+        self._conn: Optional[Connection] = None
+        self._lock = threading.Lock()
+
+    @property
+    def supported(self) -> bool:
+        return self.engine.dialect.name == "postgresql"
+
+    @property
+    def is_leader(self) -> bool:
+        return self._conn is not None or not self.supported
+
+    def try_acquire(self) -> bool:
+        """Become or stay leader; returns whether this process leads"""
+        if not self.supported:
+            return True
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._conn.execute(text("SELECT 1"))
+                    self._conn.commit()
+                    return True
+                except Exception as e:
+                    logger.warning(f"Lost leadership of {self.name}: {e}")
+                    self._discard()
+            conn = self.engine.connect()
+            try:
+                acquired = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": self.key}).scalar()
+                # the lock is session-level; end the transaction so the connection is not left idle in it
+                conn.commit()
+            except Exception:
+                conn.close()
+                raise
+            if not acquired:
+                conn.close()
+                return False
+            self._conn = conn
+            logger.info(f"Acquired leadership of {self.name}")
+            return True
+
+    def release(self):
+        with self._lock:
+            if self._conn is None:
+                return
+            try:
+                self._conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.key})
+                self._conn.commit()
+                self._conn.close()
+                self._conn = None
+            except Exception as e:
+                # dropping the session releases its advisory locks too
+                logger.warning(f"Advisory unlock of {self.name} failed: {e}")
+                self._discard()
+            logger.info(f"Released leadership of {self.name}")
+
+    def _discard(self):
+        try:
+            self._conn.invalidate()
+        except Exception:
+            pass
+        self._conn = None
@@ -8,7 +8,9 @@ class Settings(BaseSettings):
     ENV: str = "dev"
     
     # Database
-    SQLALCHEMY_DATABASE_URI: str
+    SQLALCHEMY_DATABASE_URI: str = ""  # required unless EDGE_BUNDLE_PATH is set
+    SQLALCHEMY_REPLICA_URIS: str = ""  # comma-separated read replicas, empty for none
+    REPLICA_HEALTH_SECONDS: int = 10
     
     # MinIO/S3
     S3_ENDPOINT: str = "http://minio:9000"
@@ -20,6 +22,92 @@ class Settings(BaseSettings):
     JWT_SECRET: str = "change_me_in_production"
     BRIDGE_TOKEN: str = "secure_bridge_token_change_me"
     
+    # Serving
+    WEB_CONCURRENCY: int = 1  # worker processes per node; 0 lets gunicorn.conf.py use one per core
+    DB_CONNECTION_BUDGET: int = 40  # connections all workers of a node may hold together
+    
+    # Leader-elected background jobs
+    LEADER_JOBS_ENABLED: bool = True
+    LEADER_POLL_SECONDS: int = 15
+    STATS_REFRESH_SECONDS: int = 60
+    RECONCILE_INTERVAL_SECONDS: int = 0  # 0 disables periodic storage reconciliation
+    RECONCILE_WORKERS: int = 4
+    PARTITION_VACUUM_SECONDS: int = 0  # 0 leaves legal_units partitions to autovacuum alone
+    
+    # Sync
+    SYNC_DECODER: str = "msgspec"  # msgspec | pydantic
+    SYNC_MAX_BODY_BYTES: int = 512 * 1024 * 1024  # after decompression
+    RECONCILE_MAX_PREFIXES: int = 4096  # per /sync/reconcile nodes or rows request
+    
+    # Compression
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_ZSTD_LEVEL: int = 3
+    
+    # Response cache
+    CACHE_BACKEND: str = "memory"  # memory | redis | none
+    CACHE_DEFAULT_TTL: int = 300
+    CACHE_MAX_ENTRIES: int = 10000
+    CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    CACHE_REDIS_URL: str = "redis://redis:6379/0"
+    
+    # Document catalog
+    CATALOG_ENABLED: bool = True
+    CATALOG_REFRESH_SECONDS: int = 30
+    CATALOG_REFRESH_OVERLAP_SECONDS: int = 300
+
+    # Type-ahead suggestions
+    SUGGEST_ENABLED: bool = True
+    SUGGEST_REFRESH_SECONDS: int = 30
+    SUGGEST_REFRESH_OVERLAP_SECONDS: int = 300
+    SUGGEST_RELOAD_SECONDS: int = 3600  # full reload, for popularity and the label index
+    SUGGEST_MAX_LIMIT: int = 20  # suggestions per kind per request
+
+    # Citations
+    CITE_MAX_BATCH: int = 500  # citations per POST /cite/batch
+    CITATION_GRAPH_REFRESH_SECONDS: int = 60  # how stale a worker's graph may get
+    GRAPH_MAX_HOPS: int = 3
+    GRAPH_MAX_UNITS: int = 500  # seeds and neighbours per graph request
+
+    # Retrieval
+    RETRIEVE_MAX_QUERIES: int = 32  # queries per POST /retrieve/batch
+    RETRIEVE_MAX_LIMIT: int = 50  # hits per query
+    RETRIEVAL_CACHE_ENABLED: bool = True  # entries live in the response cache backend
+    RETRIEVAL_CACHE_TTL: int = 600
+    RETRIEVAL_CACHE_SIMILARITY: float = 0.0  # cosine threshold for near-repeat queries, 0 for exact only
+    RETRIEVAL_CACHE_MAX_VECTORS: int = 10000  # cached query embeddings per process
+    RETRIEVAL_BACKEND: str = "postgres"  # postgres | bm25 (falls back to postgres until the index exists)
+    RERANKER: str = "none"  # none | linear | package.module:factory (see app.services.rerank)
+    RERANK_WEIGHTS_PATH: str = ""  # JSON weights for the linear reranker; built-in defaults when empty
+    RERANK_CANDIDATES: int = 200  # first-stage hits per query handed to the reranker
+
+    # BM25 index
+    BM25_INDEX_DIR: str = "/data/bm25"  # shared by the workers of a node; written by the leader
+    BM25_REFRESH_SECONDS: int = 30  # leader job; 0 disables index updates
+    BM25_REFRESH_OVERLAP_SECONDS: int = 300
+    BM25_MAX_SEGMENTS: int = 8  # more are merged, smallest first
+
+    # Embeddings
+    EMBEDDER: str = "none"  # none | hashing | package.module:factory
+    EMBEDDING_BATCH_SIZE: int = 64  # texts per embedder call
+    EMBEDDING_REFRESH_SECONDS: int = 60  # leader job; 0 disables it
+    EMBEDDING_REFRESH_OVERLAP_SECONDS: int = 300
+
+    # Related content (Q&A entries <-> legal units)
+    RELATED_REFRESH_SECONDS: int = 900  # leader job, needs an EMBEDDER; 0 disables it
+    RELATED_TOP_K: int = 10  # links kept per entry and per unit
+    RELATED_MIN_SCORE: float = 0.0  # cosine below which a link is not kept
+    RELATED_WORKERS: int = 2  # scoring processes; 0 for one per CPU
+    RELATED_BLOCK_SIZE: int = 1024  # units per scoring task
+
+    # Edge snapshot bundles
+    EDGE_BUNDLE_PATH: str = ""  # serve the read API from this SQLite bundle instead of the database
+    SNAPSHOT_OVERLAP_SECONDS: int = 300  # a delta re-reads this far before its base's watermark
+
+    # Context assembly
+    CONTEXT_MAX_HITS: int = 200  # hits per POST /context
+    CONTEXT_CHARS_PER_TOKEN: float = 3.0  # token estimate for Persian text
+    
     # CORS
     ALLOWED_ORIGINS: str = "http://localhost:5173,http://admin-frontend:5173"
     
@@ -28,6 +116,11 @@ class Settings(BaseSettings):
         """Convert comma-separated string to list"""
         return [origin.strip() for origin in self.ALLOWED_ORIGINS.split(",")]
     
+    @property
+    def replica_uris_list(self) -> List[str]:
+        """Convert comma-separated replica URIs to list"""
+        return [uri.strip() for uri in self.SQLALCHEMY_REPLICA_URIS.split(",") if uri.strip()]
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -1,14 +1,47 @@
+from typing import Tuple
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.settings import settings
+from app.db.bundle import bundle_engine
 
-engine = create_engine(
-    settings.SQLALCHEMY_DATABASE_URI,
-    pool_pre_ping=True,
-    echo=settings.ENV == "dev"
-)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def pool_sizing(budget: int, workers: int) -> Tuple[int, int]:
+    """
+    Split a node-wide connection budget into (pool_size, max_overflow) for
+    each worker process, so that all workers together never exceed it
+    """
+    per_worker = max(budget // max(workers, 1), 2)
+    pool_size = max(per_worker * 3 // 4, 1)
+    return pool_size, per_worker - pool_size
+
+
+engine_options = {}
+if settings.EDGE_BUNDLE_PATH:
+    # Edge read node: the snapshot bundle is the only database
+    engine = bundle_engine(settings.EDGE_BUNDLE_PATH, echo=settings.ENV == "dev")
+    SessionLocal = sessionmaker(
+        autocommit=False, autoflush=False, bind=engine, info={"bundle": settings.EDGE_BUNDLE_PATH}
+    )
+else:
+    if make_url(settings.SQLALCHEMY_DATABASE_URI).get_backend_name() == "postgresql":
+        pool_size, max_overflow = pool_sizing(settings.DB_CONNECTION_BUDGET, settings.WEB_CONCURRENCY)
+        engine_options = {"pool_size": pool_size, "max_overflow": max_overflow}
+
+    engine = create_engine(
+        settings.SQLALCHEMY_DATABASE_URI,
+        pool_pre_ping=True,
+        echo=settings.ENV == "dev",
+        **engine_options
+    )
+
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Read replicas share the primary's pool sizing; each is a separate server
+replica_engines = [
+    create_engine(uri, pool_pre_ping=True, echo=settings.ENV == "dev", **engine_options)
+    for uri in settings.replica_uris_list
+]
 
 Base = declarative_base()
@@ -0,0 +1,65 @@
+"""
+Snapshot bundles as the database of an edge read node.
+
+A bundle (app.services.snapshots) is one SQLite file holding the servable
+documents, legal units and Q&A entries under the same table and column
+names as the primary, so ORM reads run on it unchanged. With
+EDGE_BUNDLE_PATH set, app.db.base binds SessionLocal to the bundle, opened
+read-only. The few statements written for PostgreSQL check `is_bundle` and
+take their SQLite/FTS5 form instead.
+
+Connections are not pooled: a delta is applied to a copy that replaces the
+file, and every new session opens whatever file is current.
+"""
+from typing import Callable, Dict, Optional, Tuple
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool
+import os
+
+BUNDLE_FORMAT = 1
+
+
+def bundle_engine(path: str, echo: bool = False) -> Engine:
+    return create_engine(
+        f"sqlite:///file:{os.path.abspath(path)}?mode=ro&uri=true",
+        poolclass=NullPool,
+        echo=echo,
+        connect_args={"check_same_thread": False}
+    )
+
+
+def bundle_sessionmaker(path: str, echo: bool = False) -> sessionmaker:
+    return sessionmaker(autocommit=False, autoflush=False, bind=bundle_engine(path, echo), info={"bundle": path})
+
+
+def is_bundle(db: Session) -> bool:
+    """Whether this session reads a snapshot bundle rather than PostgreSQL"""
+    return db.info.get("bundle") is not None
+
+
+def bundle_info(db: Session) -> Dict[str, str]:
+    """The bundle's metadata: format, snapshot_id, watermark, created_at, ..."""
+    return dict(db.execute(text("SELECT key, value FROM bundle_meta")).all())
+
+
+class BundleWatcher:
+    """Calls `on_change` when the bundle file is replaced, e.g. by an applied delta"""
+
+    def __init__(self, path: str, on_change: Callable[[], None]):
+        self.path = path
+        self.on_change = on_change
+        self._stamp: Optional[Tuple[int, int]] = None
+
+    def check(self) -> bool:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        stamp = (stat.st_ino, stat.st_mtime_ns)
+        changed = self._stamp is not None and stamp != self._stamp
+        self._stamp = stamp
+        if changed:
+            self.on_change()
+        return changed
@@ -0,0 +1,21 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0002_file_s3_key_index'
+down_revision = '0001_initial_migration'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Byte-ordered index so storage reconciliation can stream file_s3 in the
+    # same order MinIO lists keys (and range-scan one shard at a time).
+    op.create_index(
+        'idx_official_file_s3',
+        'official_documents',
+        [sa.text('file_s3 COLLATE "C"')],
+        postgresql_where=sa.text('file_s3 IS NOT NULL')
+    )
+
+def downgrade():
+    op.drop_index('idx_official_file_s3', table_name='official_documents')
@@ -0,0 +1,14 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0003_document_text_normalized'
+down_revision = '0002_file_s3_key_index'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('official_documents', sa.Column('text_normalized', sa.Text()))
+
+def downgrade():
+    op.drop_column('official_documents', 'text_normalized')
@@ -0,0 +1,107 @@
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '0004_point_in_time_history'
+down_revision = '0003_document_text_normalized'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'document_versions',
+        sa.Column('id', sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column('document_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('title', sa.Text(), nullable=False),
+        sa.Column('doc_type', sa.String(50), nullable=False),
+        sa.Column('jurisdiction', sa.String(255)),
+        sa.Column('authority', sa.String(255)),
+        sa.Column('effective_date', sa.Date()),
+        sa.Column('amended_date', sa.Date()),
+        sa.Column('source_url', sa.Text()),
+        sa.Column('file_s3', sa.Text()),
+        sa.Column('status', sa.String(50)),
+        sa.Column('content_hash', sa.String(32), nullable=False),
+        sa.Column('valid_from', sa.Date(), nullable=False),
+        sa.Column('valid_to', sa.Date()),
+        sa.Column('recorded_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    )
+    # one open version per document; per-document as-of lookups; cross-document range scans
+    op.create_index('idx_docver_current', 'document_versions', ['document_id'], unique=True,
+                    postgresql_where=sa.text('valid_to IS NULL'))
+    op.create_index('idx_docver_doc_from', 'document_versions', ['document_id', 'valid_from'])
+    op.create_index('idx_docver_range', 'document_versions',
+                    [sa.text("daterange(valid_from, valid_to, '[)')")], postgresql_using='gist')
+
+    op.create_table(
+        'legal_unit_versions',
+        sa.Column('id', sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column('document_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('unit_key', sa.String(255), nullable=False),
+        sa.Column('content_hash', sa.String(32), nullable=False),
+        sa.Column('unit_type', sa.String(50), nullable=False),
+        sa.Column('num_label', sa.String(100)),
+        sa.Column('heading', sa.Text()),
+        sa.Column('text_plain', sa.Text()),
+        sa.Column('order_index', sa.Integer()),
+        sa.Column('valid_from', sa.Date(), nullable=False),
+        sa.Column('valid_to', sa.Date()),
+        sa.Column('recorded_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    )
+    op.create_index('idx_unitver_current', 'legal_unit_versions', ['document_id', 'unit_key'], unique=True,
+                    postgresql_where=sa.text('valid_to IS NULL'))
+    op.create_index('idx_unitver_doc_from', 'legal_unit_versions', ['document_id', 'valid_from'])
+    op.create_index('idx_unitver_range', 'legal_unit_versions',
+                    [sa.text("daterange(valid_from, valid_to, '[)')")], postgresql_using='gist')
+
+    # Seed history with the current state so as-of reads work for existing data.
+    # Hashes use the same md5 layout as app.services.versioning.content_hash.
+    op.execute("""
+        INSERT INTO document_versions (
+            document_id, title, doc_type, jurisdiction, authority, effective_date, amended_date,
+            source_url, file_s3, status, content_hash, valid_from
+        )
+        SELECT id, title, doc_type::text, jurisdiction, authority, effective_date, amended_date,
+               source_url, file_s3, status::text,
+               md5(concat_ws(chr(31),
+                   coalesce(title, ''), coalesce(doc_type::text, ''), coalesce(jurisdiction, ''),
+                   coalesce(authority, ''), coalesce(effective_date::text, ''), coalesce(amended_date::text, ''),
+                   coalesce(source_url, ''), coalesce(file_s3, ''), coalesce(status::text, ''))),
+               coalesce(amended_date, effective_date, created_at::date)
+        FROM official_documents
+    """)
+    op.execute("""
+        DO $$
+        BEGIN
+            IF to_regclass('legal_units') IS NOT NULL THEN
+                INSERT INTO legal_unit_versions (
+                    document_id, unit_key, content_hash, unit_type, num_label, heading, text_plain,
+                    order_index, valid_from
+                )
+                SELECT u.document_id,
+                       u.unit_type::text || '|' || coalesce(u.num_label, '') || '|' ||
+                           row_number() OVER (PARTITION BY u.document_id, u.unit_type, coalesce(u.num_label, '')
+                                              ORDER BY u.order_index NULLS LAST, u.id),
+                       md5(concat_ws(chr(31),
+                           coalesce(u.unit_type::text, ''), coalesce(u.num_label, ''),
+                           coalesce(u.heading, ''), coalesce(u.text_plain, ''))),
+                       u.unit_type::text, u.num_label, u.heading, u.text_plain, u.order_index,
+                       coalesce(d.amended_date, d.effective_date, d.created_at::date)
+                FROM legal_units u
+                JOIN official_documents d ON d.id = u.document_id;
+            END IF;
+        END
+        $$;
+    """)
+
+def downgrade():
+    op.drop_index('idx_unitver_range', table_name='legal_unit_versions')
+    op.drop_index('idx_unitver_doc_from', table_name='legal_unit_versions')
+    op.drop_index('idx_unitver_current', table_name='legal_unit_versions')
+    op.drop_table('legal_unit_versions')
+
+    op.drop_index('idx_docver_range', table_name='document_versions')
+    op.drop_index('idx_docver_doc_from', table_name='document_versions')
+    op.drop_index('idx_docver_current', table_name='document_versions')
+    op.drop_table('document_versions')
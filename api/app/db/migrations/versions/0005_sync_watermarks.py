@@ -0,0 +1,19 @@
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '0005_sync_watermarks'
+down_revision = '0004_point_in_time_history'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # The model predates the migrations; replica routing reads the watermark on every probe
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS sync_watermarks (
+            id SERIAL PRIMARY KEY,
+            last_imported_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+        )
+    """)
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS sync_watermarks")
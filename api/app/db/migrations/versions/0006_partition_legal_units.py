@@ -0,0 +1,89 @@
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '0006_partition_legal_units'
+down_revision = '0005_sync_watermarks'
+branch_labels = None
+depends_on = None
+
+# Must stay a power of two so partitions can later be split by re-attaching
+# each as MODULUS 2N with remainders r and r + N.
+PARTITIONS = 16
+
+UNIT_TYPES = ('part', 'chapter', 'section', 'article', 'paragraph', 'clause', 'item', 'note', 'annex')
+
+def upgrade():
+    # legal_units predates the migrations and may not exist yet
+    op.execute(f"""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'unit_type_enum') THEN
+                CREATE TYPE unit_type_enum AS ENUM ({", ".join(f"'{t}'" for t in UNIT_TYPES)});
+            END IF;
+            IF to_regclass('legal_units') IS NOT NULL THEN
+                ALTER TABLE legal_units RENAME TO legal_units_unpartitioned;
+                IF EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'legal_units_pkey') THEN
+                    ALTER TABLE legal_units_unpartitioned RENAME CONSTRAINT legal_units_pkey TO legal_units_unpartitioned_pkey;
+                END IF;
+            END IF;
+        END
+        $$;
+    """)
+
+    # The partition key must be part of the primary key
+    op.execute("""
+        CREATE TABLE legal_units (
+            id UUID NOT NULL DEFAULT gen_random_uuid(),
+            document_id UUID NOT NULL REFERENCES official_documents (id),
+            unit_type unit_type_enum NOT NULL,
+            num_label VARCHAR(100),
+            heading TEXT,
+            text_plain TEXT,
+            order_index INTEGER,
+            PRIMARY KEY (document_id, id)
+        ) PARTITION BY HASH (document_id)
+    """)
+    for remainder in range(PARTITIONS):
+        # Rewrites delete and re-insert whole documents, so vacuum each partition early
+        op.execute(f"""
+            CREATE TABLE legal_units_p{remainder:02d} PARTITION OF legal_units
+            FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {remainder})
+            WITH (autovacuum_vacuum_scale_factor = 0.05, autovacuum_analyze_scale_factor = 0.02)
+        """)
+    op.execute("CREATE INDEX idx_legal_units_doc_order ON legal_units (document_id, order_index)")
+
+    op.execute("""
+        DO $$
+        BEGIN
+            IF to_regclass('legal_units_unpartitioned') IS NOT NULL THEN
+                INSERT INTO legal_units (id, document_id, unit_type, num_label, heading, text_plain, order_index)
+                SELECT id, document_id, unit_type::text::unit_type_enum, num_label, heading, text_plain, order_index
+                FROM legal_units_unpartitioned;
+                DROP TABLE legal_units_unpartitioned;
+            END IF;
+        END
+        $$;
+    """)
+    # Autovacuum never analyzes a partitioned parent; seed its statistics
+    op.execute("ANALYZE legal_units")
+
+def downgrade():
+    op.execute("""
+        CREATE TABLE legal_units_unpartitioned (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            document_id UUID NOT NULL REFERENCES official_documents (id),
+            unit_type unit_type_enum NOT NULL,
+            num_label VARCHAR(100),
+            heading TEXT,
+            text_plain TEXT,
+            order_index INTEGER
+        )
+    """)
+    op.execute("""
+        INSERT INTO legal_units_unpartitioned (id, document_id, unit_type, num_label, heading, text_plain, order_index)
+        SELECT id, document_id, unit_type, num_label, heading, text_plain, order_index FROM legal_units
+    """)
+    op.execute("DROP TABLE legal_units")
+    op.execute("ALTER TABLE legal_units_unpartitioned RENAME TO legal_units")
+    op.execute("ALTER TABLE legal_units RENAME CONSTRAINT legal_units_unpartitioned_pkey TO legal_units_pkey")
+    op.execute("CREATE INDEX idx_legal_units_doc_order ON legal_units (document_id, order_index)")
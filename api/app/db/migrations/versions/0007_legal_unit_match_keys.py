@@ -0,0 +1,20 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0007_legal_unit_match_keys'
+down_revision = '0006_partition_legal_units'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Filled by sync_import; existing rows are backfilled with
+    # `python -m app.services.match_keys` since the folding lives in Python
+    op.add_column('legal_units', sa.Column('num_label_normalized', sa.String(100)))
+    op.add_column('legal_units', sa.Column('heading_normalized', sa.Text()))
+    op.add_column('legal_units', sa.Column('text_plain_normalized', sa.Text()))
+
+def downgrade():
+    op.drop_column('legal_units', 'text_plain_normalized')
+    op.drop_column('legal_units', 'heading_normalized')
+    op.drop_column('legal_units', 'num_label_normalized')
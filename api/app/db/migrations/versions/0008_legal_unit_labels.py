@@ -0,0 +1,36 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0008_legal_unit_labels'
+down_revision = '0007_legal_unit_match_keys'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Parsed num_label (app.utils.citations), filled by sync_import and
+    # backfilled with `python -m app.services.match_keys`
+    op.add_column('legal_units', sa.Column('label_type', sa.String(20)))
+    op.add_column('legal_units', sa.Column('label_ordinal', sa.Integer()))
+    op.add_column('legal_units', sa.Column('label_repeat', sa.SmallInteger()))
+    # Created on the partitioned parent, so every partition gets its own copy
+    op.execute("""
+        CREATE INDEX idx_legal_units_label
+        ON legal_units (document_id, label_type, label_ordinal, label_repeat)
+    """)
+
+    # Title match key for citations ("قانون کار"); the C collation lets
+    # prefix ranges use the index
+    op.add_column('official_documents', sa.Column('title_normalized', sa.Text()))
+    op.execute("""
+        CREATE INDEX idx_official_documents_title_key
+        ON official_documents (title_normalized COLLATE "C")
+    """)
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS idx_official_documents_title_key")
+    op.drop_column('official_documents', 'title_normalized')
+    op.execute("DROP INDEX IF EXISTS idx_legal_units_label")
+    op.drop_column('legal_units', 'label_repeat')
+    op.drop_column('legal_units', 'label_ordinal')
+    op.drop_column('legal_units', 'label_type')
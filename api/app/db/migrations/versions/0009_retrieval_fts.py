@@ -0,0 +1,28 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0009_retrieval_fts'
+down_revision = '0008_legal_unit_labels'
+branch_labels = None
+depends_on = None
+
+# Must match UNIT_TSVECTOR / QA_TSVECTOR in app.services.retrieval, or the
+# planner will not use the indexes
+UNIT_TSVECTOR = "to_tsvector('simple', coalesce(heading_normalized, '') || ' ' || coalesce(text_plain_normalized, ''))"
+QA_TSVECTOR = "to_tsvector('simple', coalesce(question_normalized, '') || ' ' || coalesce(answer_normalized, ''))"
+
+def upgrade():
+    # Match keys for Q&A, filled by sync_import and backfilled with
+    # `python -m app.services.match_keys`
+    op.add_column('qa_entries', sa.Column('question_normalized', sa.Text()))
+    op.add_column('qa_entries', sa.Column('answer_normalized', sa.Text()))
+
+    op.execute(f"CREATE INDEX idx_legal_units_fts ON legal_units USING gin ({UNIT_TSVECTOR})")
+    op.execute(f"CREATE INDEX idx_qa_entries_fts ON qa_entries USING gin ({QA_TSVECTOR})")
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS idx_qa_entries_fts")
+    op.execute("DROP INDEX IF EXISTS idx_legal_units_fts")
+    op.drop_column('qa_entries', 'answer_normalized')
+    op.drop_column('qa_entries', 'question_normalized')
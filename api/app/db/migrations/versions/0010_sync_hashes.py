@@ -0,0 +1,37 @@
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '0010_sync_hashes'
+down_revision = '0009_retrieval_fts'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Filled by sync_import from here on; rows imported earlier are hashed with
+    # `python -m app.services.merkle rebuild`
+    op.create_table(
+        'sync_hashes',
+        sa.Column('kind', sa.String(16), primary_key=True),
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('bucket', sa.Integer(), nullable=False),
+        sa.Column('content_hash', sa.String(32), nullable=False),
+        sa.Column('units_hash', sa.String(32)),
+        sa.Column('hi', sa.BigInteger(), nullable=False),
+        sa.Column('lo', sa.BigInteger(), nullable=False),
+    )
+    op.create_index('idx_sync_hashes_bucket', 'sync_hashes', ['kind', 'bucket'])
+    op.create_table(
+        'sync_hash_buckets',
+        sa.Column('kind', sa.String(16), primary_key=True),
+        sa.Column('bucket', sa.Integer(), primary_key=True),
+        sa.Column('hi', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('lo', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('rows', sa.Integer(), nullable=False, server_default='0'),
+    )
+
+def downgrade():
+    op.drop_table('sync_hash_buckets')
+    op.drop_index('idx_sync_hashes_bucket', table_name='sync_hashes')
+    op.drop_table('sync_hashes')
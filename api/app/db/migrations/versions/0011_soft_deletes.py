@@ -0,0 +1,37 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0011_soft_deletes'
+down_revision = '0010_sync_hashes'
+branch_labels = None
+depends_on = None
+
+QA_TSVECTOR = "to_tsvector('simple', coalesce(question_normalized, '') || ' ' || coalesce(answer_normalized, ''))"
+
+def upgrade():
+    # Set by sync tombstones; the rows stay for history and reconciliation
+    op.add_column('official_documents', sa.Column('deleted_at', sa.DateTime(timezone=True)))
+    op.add_column('qa_entries', sa.Column('deleted_at', sa.DateTime(timezone=True)))
+
+    # The lookup indexes only cover live rows, so withdrawn ones cost nothing
+    # to skip; queries must repeat `deleted_at IS NULL` for the planner to use them
+    op.execute("DROP INDEX IF EXISTS idx_official_documents_title_key")
+    op.execute("""
+        CREATE INDEX idx_official_documents_title_key
+        ON official_documents (title_normalized COLLATE "C")
+        WHERE deleted_at IS NULL
+    """)
+    op.execute("DROP INDEX IF EXISTS idx_qa_entries_fts")
+    op.execute(f"CREATE INDEX idx_qa_entries_fts ON qa_entries USING gin ({QA_TSVECTOR}) WHERE deleted_at IS NULL")
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS idx_qa_entries_fts")
+    op.execute(f"CREATE INDEX idx_qa_entries_fts ON qa_entries USING gin ({QA_TSVECTOR})")
+    op.execute("DROP INDEX IF EXISTS idx_official_documents_title_key")
+    op.execute("""
+        CREATE INDEX idx_official_documents_title_key
+        ON official_documents (title_normalized COLLATE "C")
+    """)
+    op.drop_column('qa_entries', 'deleted_at')
+    op.drop_column('official_documents', 'deleted_at')
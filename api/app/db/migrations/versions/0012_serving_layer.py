@@ -0,0 +1,82 @@
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '0012_serving_layer'
+down_revision = '0011_soft_deletes'
+branch_labels = None
+depends_on = None
+
+# Must match app.services.serving
+UNIT_TSVECTOR = "to_tsvector('simple', coalesce(u.heading_normalized, '') || ' ' || coalesce(u.text_plain_normalized, ''))"
+QA_TSVECTOR = "to_tsvector('simple', coalesce(e.question_normalized, '') || ' ' || coalesce(e.answer_normalized, ''))"
+DOCUMENT_SERVABLE = "d.status = 'published' AND d.deleted_at IS NULL"
+QA_SERVABLE = (
+    "e.moderation_status = 'published' AND e.licensing = 'allowed' "
+    "AND e.pii_status = 'clean' AND e.deleted_at IS NULL"
+)
+
+# The 0009 expression indexes, which retrieval no longer reads
+OLD_UNIT_TSVECTOR = "to_tsvector('simple', coalesce(heading_normalized, '') || ' ' || coalesce(text_plain_normalized, ''))"
+OLD_QA_TSVECTOR = "to_tsvector('simple', coalesce(question_normalized, '') || ' ' || coalesce(answer_normalized, ''))"
+
+def upgrade():
+    op.create_table(
+        'serving_units',
+        sa.Column('document_id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('unit_type', sa.String(20), nullable=False),
+        sa.Column('doc_type', sa.String(20), nullable=False),
+        sa.Column('jurisdiction', sa.String(255)),
+        sa.Column('authority', sa.String(255)),
+        sa.Column('tsv', postgresql.TSVECTOR(), nullable=False),
+    )
+    op.create_table(
+        'serving_qa',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('topic_tags', postgresql.ARRAY(sa.String())),
+        sa.Column('tsv', postgresql.TSVECTOR(), nullable=False),
+    )
+    op.execute(f"""
+        INSERT INTO serving_units (document_id, id, unit_type, doc_type, jurisdiction, authority, tsv)
+        SELECT u.document_id, u.id, u.unit_type::text, d.doc_type::text, d.jurisdiction, d.authority, {UNIT_TSVECTOR}
+        FROM legal_units u
+        JOIN official_documents d ON d.id = u.document_id
+        WHERE {DOCUMENT_SERVABLE}
+    """)
+    op.execute(f"""
+        INSERT INTO serving_qa (id, topic_tags, tsv)
+        SELECT e.id, e.topic_tags, {QA_TSVECTOR}
+        FROM qa_entries e
+        WHERE {QA_SERVABLE}
+    """)
+    # Built after the bulk load, which is much faster than maintaining them row by row
+    op.create_index('idx_serving_units_tsv', 'serving_units', ['tsv'], postgresql_using='gin')
+    op.create_index('idx_serving_qa_tsv', 'serving_qa', ['tsv'], postgresql_using='gin')
+
+    # Search moved to the serving tables; the base-table GIN indexes only slowed imports
+    op.execute("DROP INDEX IF EXISTS idx_legal_units_fts")
+    op.execute("DROP INDEX IF EXISTS idx_qa_entries_fts")
+
+    # Citation lookups only resolve servable documents
+    op.execute("DROP INDEX IF EXISTS idx_official_documents_title_key")
+    op.execute("""
+        CREATE INDEX idx_official_documents_title_key
+        ON official_documents (title_normalized COLLATE "C")
+        WHERE status = 'published' AND deleted_at IS NULL
+    """)
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS idx_official_documents_title_key")
+    op.execute("""
+        CREATE INDEX idx_official_documents_title_key
+        ON official_documents (title_normalized COLLATE "C")
+        WHERE deleted_at IS NULL
+    """)
+    op.execute(f"CREATE INDEX idx_qa_entries_fts ON qa_entries USING gin ({OLD_QA_TSVECTOR}) WHERE deleted_at IS NULL")
+    op.execute(f"CREATE INDEX idx_legal_units_fts ON legal_units USING gin ({OLD_UNIT_TSVECTOR})")
+    op.drop_index('idx_serving_qa_tsv', table_name='serving_qa')
+    op.drop_index('idx_serving_units_tsv', table_name='serving_units')
+    op.drop_table('serving_qa')
+    op.drop_table('serving_units')
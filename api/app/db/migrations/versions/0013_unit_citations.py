@@ -0,0 +1,40 @@
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '0013_unit_citations'
+down_revision = '0012_serving_layer'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Filled at import by app.services.citation_graph; existing documents by
+    # `python -m app.services.citation_graph rebuild`
+    op.create_table(
+        'unit_citations',
+        sa.Column('id', sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column('source_document_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('source_unit_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('target_document_id', postgresql.UUID(as_uuid=True)),
+        sa.Column('target_unit_id', postgresql.UUID(as_uuid=True)),
+        sa.Column('citation', sa.Text(), nullable=False),
+        sa.Column('target_title', sa.Text()),
+    )
+    op.create_index('idx_unit_citations_source', 'unit_citations', ['source_document_id'])
+    op.create_index('idx_unit_citations_target', 'unit_citations', ['target_document_id'])
+    # Citations waiting for a document with their title, looked up by equality
+    # and prefix (LIKE 'title %') as documents are imported
+    op.create_index(
+        'idx_unit_citations_pending',
+        'unit_citations',
+        ['target_title'],
+        postgresql_ops={'target_title': 'text_pattern_ops'},
+        postgresql_where=sa.text('target_document_id IS NULL')
+    )
+
+def downgrade():
+    op.drop_index('idx_unit_citations_pending', table_name='unit_citations')
+    op.drop_index('idx_unit_citations_target', table_name='unit_citations')
+    op.drop_index('idx_unit_citations_source', table_name='unit_citations')
+    op.drop_table('unit_citations')
@@ -0,0 +1,28 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0014_embedding_cache'
+down_revision = '0013_unit_citations'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'embedding_cache',
+        sa.Column('model_id', sa.String(100), primary_key=True),
+        sa.Column('content_hash', sa.String(32), primary_key=True),
+        sa.Column('dim', sa.Integer(), nullable=False),
+        sa.Column('vector', sa.LargeBinary(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_table(
+        'embedding_watermarks',
+        sa.Column('model_id', sa.String(100), primary_key=True),
+        sa.Column('kind', sa.String(16), primary_key=True),
+        sa.Column('watermark', sa.DateTime(timezone=True), nullable=False),
+    )
+
+def downgrade():
+    op.drop_table('embedding_watermarks')
+    op.drop_table('embedding_cache')
@@ -0,0 +1,29 @@
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '0015_related_links'
+down_revision = '0014_embedding_cache'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Filled by the related_links leader job or `python -m app.services.related update`
+    op.create_table(
+        'related_links',
+        sa.Column('source', sa.String(4), primary_key=True),
+        sa.Column('qa_id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('unit_id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('document_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('text_key', sa.String(32), nullable=False),
+        sa.Column('rank', sa.SmallInteger(), nullable=False),
+        sa.Column('score', sa.Float(), nullable=False),
+    )
+    op.create_index('idx_related_links_unit', 'related_links', ['source', 'unit_id'])
+    op.create_index('idx_related_links_document', 'related_links', ['document_id'])
+
+def downgrade():
+    op.drop_index('idx_related_links_document', table_name='related_links')
+    op.drop_index('idx_related_links_unit', table_name='related_links')
+    op.drop_table('related_links')
@@ -0,0 +1,170 @@
+"""
+Read routing between the primary and optional read replicas.
+
+Read-only endpoints get their session from `ReplicaRouter.session_for_read`,
+which picks a healthy replica round-robin and falls back to the primary.
+
+Replica lag is measured in sync positions: the `sync_watermarks` timestamp
+that every `sync_import` commit advances. A replica is only used when its
+watermark has reached the required position, which is the later of
+- the position a client asks for (the `sync_position` a sync import
+  returned, passed back as `X-Min-Sync-Position` for read-your-writes), and
+- the latest position this process has seen on the primary, so cached
+  responses are never filled from a replica that predates an import whose
+  invalidation already ran.
+
+Watermarks and health are probed every `health_interval` seconds per
+replica, and every LAG_RECHECK_SECONDS while a replica is behind the
+required position.
+"""
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+from app.core.settings import settings
+from app.db.base import SessionLocal, replica_engines
+from app.models.sync import SyncWatermark
+import itertools
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# How often a healthy replica that is behind the required position is re-read
+LAG_RECHECK_SECONDS = 0.25
+
+
+def parse_position(value: Optional[str]) -> Optional[datetime]:
+    """Parse an ISO 8601 sync position; naive values are taken as UTC"""
+    if not value:
+        return None
+    position = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    return _aware(position)
+
+
+def format_position(position: Optional[datetime]) -> Optional[str]:
+    return None if position is None else _aware(position).isoformat()
+
+
+def _aware(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def read_position(db: Session) -> Optional[datetime]:
+    return _aware(db.query(func.max(SyncWatermark.last_imported_at)).scalar())
+
+
+class Replica:
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.sessionmaker = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        self.name = engine.url.render_as_string(hide_password=True)
+        self.healthy = True
+        self.position: Optional[datetime] = None
+        self.checked_at: Optional[float] = None
+
+
+class ReplicaRouter:
+    def __init__(
+        self,
+        primary: Callable[[], Session],
+        replica_engines: List[Engine] = (),
+        health_interval: float = 10,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.primary = primary
+        self.replicas = [Replica(engine) for engine in replica_engines]
+        self.health_interval = health_interval
+        self.clock = clock
+        self.primary_position: Optional[datetime] = None
+        self._primary_checked_at: Optional[float] = None
+        self._cycle = itertools.cycle(range(max(len(self.replicas), 1)))
+        self._lock = threading.Lock()
+
+    def note_position(self, position: Optional[datetime]):
+        """Record a position written to the primary (called after sync imports)"""
+        position = _aware(position)
+        with self._lock:
+            if position is not None and (self.primary_position is None or position > self.primary_position):
+                self.primary_position = position
+
+    def mark_failed(self, replica: Replica, error: Exception = None):
+        if replica.healthy:
+            logger.warning(f"Read replica {replica.name} marked unhealthy: {error}")
+        replica.healthy = False
+        replica.checked_at = self.clock()
+
+    def _stale(self, checked_at: Optional[float]) -> bool:
+        return checked_at is None or self.clock() - checked_at >= self.health_interval
+
+    def _refresh_primary_position(self):
+        if not self._stale(self._primary_checked_at):
+            return
+        self._primary_checked_at = self.clock()
+        db = self.primary()
+        try:
+            self.note_position(read_position(db))
+        except Exception as e:
+            logger.warning(f"Could not read the primary sync position: {e}")
+        finally:
+            db.close()
+
+    def _probe(self, replica: Replica):
+        db = replica.sessionmaker()
+        try:
+            replica.position = read_position(db)
+            replica.checked_at = self.clock()
+            if not replica.healthy:
+                logger.info(f"Read replica {replica.name} is healthy again")
+            replica.healthy = True
+        except Exception as e:
+            self.mark_failed(replica, e)
+        finally:
+            db.close()
+
+    def _usable(self, replica: Replica, required: Optional[datetime]) -> bool:
+        caught_up = required is None or (replica.position is not None and replica.position >= required)
+        lag_recheck = replica.healthy and not caught_up and (
+            replica.checked_at is None or self.clock() - replica.checked_at >= LAG_RECHECK_SECONDS
+        )
+        if self._stale(replica.checked_at) or lag_recheck:
+            self._probe(replica)
+            caught_up = required is None or (replica.position is not None and replica.position >= required)
+        return replica.healthy and caught_up
+
+    def session_for_read(self, min_position: Optional[datetime] = None) -> Tuple[Session, Optional[Replica]]:
+        """A session on a replica that has reached `min_position`, else on the primary"""
+        if not self.replicas:
+            return self.primary(), None
+        self._refresh_primary_position()
+        required = max(
+            (p for p in (_aware(min_position), self.primary_position) if p is not None),
+            default=None
+        )
+        with self._lock:
+            start = next(self._cycle)
+        for i in range(len(self.replicas)):
+            replica = self.replicas[(start + i) % len(self.replicas)]
+            if self._usable(replica, required):
+                return replica.sessionmaker(), replica
+        return self.primary(), None
+
+    def status(self) -> dict:
+        return {
+            "primary_position": format_position(self.primary_position),
+            "replicas": [
+                {
+                    "name": replica.name,
+                    "healthy": replica.healthy,
+                    "position": format_position(replica.position),
+                }
+                for replica in self.replicas
+            ],
+        }
+
+
+read_router = ReplicaRouter(SessionLocal, replica_engines, settings.REPLICA_HEALTH_SECONDS)
@@ -1,5 +1,17 @@
-from typing import Generator
+from typing import Generator, Optional
+from fastapi import Header, HTTPException
+from sqlalchemy.exc import DBAPIError
+from app.core import cache
+from app.core.settings import settings
 from app.db.base import SessionLocal
+from app.db.bundle import BundleWatcher
+from app.db.replicas import read_router, parse_position
+
+# A replaced bundle makes every cached response suspect
+bundle_watcher = (
+    BundleWatcher(settings.EDGE_BUNDLE_PATH, lambda: cache.get_cache().clear())
+    if settings.EDGE_BUNDLE_PATH else None
+)
 
 
 def get_db() -> Generator:
@@ -11,3 +23,28 @@ def get_db() -> Generator:
         yield db
     finally:
         db.close()
+
+
+def get_read_db(x_min_sync_position: Optional[str] = Header(None)) -> Generator:
+    """
+    Database dependency for read-only endpoints
+    Served by a read replica when one is healthy and has caught up with
+    X-Min-Sync-Position (a sync_position returned by /sync/import), else by
+    the primary. On an edge node, by the snapshot bundle.
+    """
+    if bundle_watcher is not None:
+        bundle_watcher.check()
+    try:
+        min_position = parse_position(x_min_sync_position)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid X-Min-Sync-Position")
+    db, replica = read_router.session_for_read(min_position)
+    try:
+        yield db
+    except DBAPIError as e:
+        # A replica that fails mid-request is skipped until its next health probe
+        if replica is not None and e.connection_invalidated:
+            read_router.mark_failed(replica, e)
+        raise
+    finally:
+        db.close()
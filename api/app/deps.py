@@ -1,5 +1,6 @@
 from fastapi import HTTPException, Header, Depends
 from sqlalchemy.orm import Session
+from typing import Optional
 from app.db.session import get_db
 from app.core.settings import settings
 from minio import Minio
@@ -32,6 +33,15 @@ def get_minio_client() -> Minio:
         raise HTTPException(status_code=503, detail="MinIO service unavailable")
 
 
+def get_optional_minio_client() -> Optional[Minio]:
+    """
+    MinIO client, or None on an edge node, which has no object storage
+    """
+    if settings.EDGE_BUNDLE_PATH:
+        return None
+    return get_minio_client()
+
+
 def verify_bridge_token(x_bridge_token: str = Header(...)) -> bool:
     """
     Verify the bridge token for internal sync API
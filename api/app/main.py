@@ -1,7 +1,13 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.settings import settings
-from app.routers import health, stats, sync
+from app.core.compression import RequestDecompressionMiddleware, ResponseCompressionMiddleware
+from app.routers import health, stats, sync, documents, cite, retrieve, context, graph, related, suggest
+from app.services.bm25 import run_index_loop
+from app.services.catalog import run_refresh_loop
+from app.services.suggest import run_refresh_loop as run_suggest_refresh_loop
+from app.services.scheduler import create_election, default_jobs, run_leader_jobs
+import asyncio
 import logging
 
 # Configure logging
@@ -24,10 +30,67 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compressed sync uploads and negotiated response compression
+app.add_middleware(
+    RequestDecompressionMiddleware,
+    path_prefixes=("/sync/",),
+    max_body_bytes=settings.SYNC_MAX_BODY_BYTES,
+)
+app.add_middleware(
+    ResponseCompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MIN_SIZE,
+    gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+    zstd_level=settings.COMPRESSION_ZSTD_LEVEL,
+)
+
 # Include routers
 app.include_router(health.router, tags=["health"])
 app.include_router(stats.router, tags=["stats"])
-app.include_router(sync.router, prefix="/sync", tags=["sync"])
+# Edge nodes serve a read-only snapshot bundle and take no sync imports
+if not settings.EDGE_BUNDLE_PATH:
+    app.include_router(sync.router, prefix="/sync", tags=["sync"])
+app.include_router(documents.router, prefix="/documents", tags=["documents"])
+app.include_router(cite.router, prefix="/cite", tags=["cite"])
+app.include_router(retrieve.router, prefix="/retrieve", tags=["retrieve"])
+app.include_router(context.router, prefix="/context", tags=["context"])
+app.include_router(graph.router, prefix="/graph", tags=["graph"])
+app.include_router(related.router, tags=["related"])
+app.include_router(suggest.router, prefix="/suggest", tags=["suggest"])
+
+
+@app.on_event("startup")
+async def start_background_tasks():
+    """
+    Start in-process background tasks
+    """
+    if settings.CATALOG_ENABLED:
+        app.state.catalog_task = asyncio.create_task(run_refresh_loop(settings.CATALOG_REFRESH_SECONDS))
+    if settings.SUGGEST_ENABLED:
+        app.state.suggest_task = asyncio.create_task(run_suggest_refresh_loop(settings.SUGGEST_REFRESH_SECONDS))
+    # every node keeps its own BM25 index; one worker per node updates it
+    if settings.RETRIEVAL_BACKEND == "bm25" and settings.BM25_REFRESH_SECONDS > 0 and not settings.EDGE_BUNDLE_PATH:
+        app.state.bm25_task = asyncio.create_task(run_index_loop(settings.BM25_REFRESH_SECONDS))
+    if settings.LEADER_JOBS_ENABLED and not settings.EDGE_BUNDLE_PATH:
+        jobs = default_jobs()
+        if jobs:
+            app.state.leader_task = asyncio.create_task(
+                run_leader_jobs(create_election(), jobs, settings.LEADER_POLL_SECONDS)
+            )
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    """
+    Cancel background tasks; the leader task releases its advisory lock
+    """
+    for name in ("catalog_task", "suggest_task", "bm25_task", "leader_task"):
+        task = getattr(app.state, name, None)
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
 
 
 @app.get("/")
@@ -1,6 +1,6 @@
-from .official import OfficialDocument, LegalUnit
+from .official import OfficialDocument, LegalUnit, DocumentVersion, LegalUnitVersion, UnitCitation
 from .qa import QAEntry
 from .user import User
 from .sync import SyncWatermark
 
-__all__ = ["OfficialDocument", "LegalUnit", "QAEntry", "User", "SyncWatermark"]
+__all__ = ["OfficialDocument", "LegalUnit", "DocumentVersion", "LegalUnitVersion", "UnitCitation", "QAEntry", "User", "SyncWatermark"]
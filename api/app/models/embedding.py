@@ -0,0 +1,48 @@
+from sqlalchemy import Column, String, Integer, SmallInteger, Float, DateTime, LargeBinary, Index
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+from app.db.base import Base
+
+
+class EmbeddingCache(Base):
+    """
+    One vector per (model, normalized text), shared by every legal unit and
+    Q&A entry with that text (see app.services.embeddings)
+    """
+    __tablename__ = "embedding_cache"
+
+    model_id = Column(String(100), primary_key=True)
+    content_hash = Column(String(32), primary_key=True)  # content_hash of the text's match keys
+    dim = Column(Integer, nullable=False)
+    vector = Column(LargeBinary, nullable=False)  # float32, little-endian
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class EmbeddingWatermark(Base):
+    """How far the embedding job has read each kind of row, per model"""
+    __tablename__ = "embedding_watermarks"
+
+    model_id = Column(String(100), primary_key=True)  # "related:<model id>" for app.services.related
+    kind = Column(String(16), primary_key=True)  # "documents" or "qa_entries"
+    watermark = Column(DateTime(timezone=True), nullable=False)
+
+
+class RelatedLink(Base):
+    """
+    A legal unit on a Q&A entry's list of most similar units, or a Q&A entry
+    on a unit's list of most similar entries (see app.services.related)
+    """
+    __tablename__ = "related_links"
+
+    source = Column(String(4), primary_key=True)  # whose list: "qa" or "unit"
+    qa_id = Column(UUID(as_uuid=True), primary_key=True)
+    unit_id = Column(UUID(as_uuid=True), primary_key=True)
+    document_id = Column(UUID(as_uuid=True), nullable=False)  # the unit's
+    text_key = Column(String(32), nullable=False)  # the unit's text key, app.services.embeddings.text_key
+    rank = Column(SmallInteger, nullable=False)  # 1 is the most similar
+    score = Column(Float, nullable=False)  # cosine similarity
+
+    __table_args__ = (
+        Index("idx_related_links_unit", "source", "unit_id"),
+        Index("idx_related_links_document", "document_id"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text, Date, DateTime, Integer, ForeignKey
+from sqlalchemy import Column, String, Text, Date, DateTime, Integer, SmallInteger, BigInteger, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID, ENUM
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -11,6 +11,7 @@ class OfficialDocument(Base):
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     title = Column(Text, nullable=False, index=True)
+    title_normalized = Column(Text)  # app.utils.citations.title_key(title), for citation lookup
     doc_type = Column(
         ENUM('law', 'regulation', 'circular', 'guideline', name='doc_type_enum'),
         nullable=False
@@ -21,6 +22,7 @@ class OfficialDocument(Base):
     amended_date = Column(Date)
     source_url = Column(Text)
     file_s3 = Column(Text)  # "s3://advisor-docs/raw/{uuid}/{filename}"
+    text_normalized = Column(Text)
     status = Column(
         ENUM('draft', 'in_review', 'approved', 'published', name='doc_status_enum'),
         default='published',
@@ -28,16 +30,22 @@ class OfficialDocument(Base):
     )
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    deleted_at = Column(DateTime(timezone=True))  # withdrawn by a sync tombstone
 
     # Relationship
     legal_units = relationship("LegalUnit", back_populates="document", cascade="all, delete-orphan")
 
 
 class LegalUnit(Base):
+    """
+    Hash-partitioned by document_id (migration 0006), so the partition key is
+    part of the primary key. Filter on document_id to prune partitions.
+    """
     __tablename__ = "legal_units"
+    __table_args__ = {"postgresql_partition_by": "HASH (document_id)"}
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    document_id = Column(UUID(as_uuid=True), ForeignKey("official_documents.id"), nullable=False)
+    document_id = Column(UUID(as_uuid=True), ForeignKey("official_documents.id"), primary_key=True)
     unit_type = Column(
         ENUM('part', 'chapter', 'section', 'article', 'paragraph', 'clause', 'item', 'note', 'annex', name='unit_type_enum'),
         nullable=False
@@ -46,6 +54,85 @@ class LegalUnit(Base):
     heading = Column(Text)
     text_plain = Column(Text)
     order_index = Column(Integer)
+    # Match keys from app.utils.text.normalize_batch, written by sync_import
+    num_label_normalized = Column(String(100))
+    heading_normalized = Column(Text)
+    text_plain_normalized = Column(Text)
+    # num_label parsed by app.utils.citations: "ماده ۱۲ مکرر" -> ("article", 12, 1)
+    label_type = Column(String(20))
+    label_ordinal = Column(Integer)
+    label_repeat = Column(SmallInteger)
 
     # Relationship
     document = relationship("OfficialDocument", back_populates="legal_units")
+
+
+class UnitCitation(Base):
+    """
+    A citation in a legal unit's text of another legal unit (see
+    app.services.citation_graph). Rows are replaced whenever the citing
+    document's units are; target_unit_id is NULL while the cited unit is not
+    among the target document's units, and target_document_id while no
+    servable document has the cited title.
+    """
+    __tablename__ = "unit_citations"
+    __table_args__ = (
+        Index("idx_unit_citations_source", "source_document_id"),
+        Index("idx_unit_citations_target", "target_document_id"),
+    )
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    source_document_id = Column(UUID(as_uuid=True), nullable=False)
+    source_unit_id = Column(UUID(as_uuid=True), nullable=False)
+    target_document_id = Column(UUID(as_uuid=True))
+    target_unit_id = Column(UUID(as_uuid=True))
+    citation = Column(Text, nullable=False)  # the unit chain in match-key form, e.g. "تبصره 2 ماده 12"
+    # while target_document_id is NULL: the words after the unit chain, whose
+    # longest prefix that is a document's title_normalized names the target
+    target_title = Column(Text)
+
+
+class DocumentVersion(Base):
+    """
+    Append-only history of OfficialDocument metadata.
+    A version is valid on [valid_from, valid_to); the current one has valid_to NULL.
+    """
+    __tablename__ = "document_versions"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    document_id = Column(UUID(as_uuid=True), nullable=False)
+    title = Column(Text, nullable=False)
+    doc_type = Column(String(50), nullable=False)
+    jurisdiction = Column(String(255))
+    authority = Column(String(255))
+    effective_date = Column(Date)
+    amended_date = Column(Date)
+    source_url = Column(Text)
+    file_s3 = Column(Text)
+    status = Column(String(50))
+    content_hash = Column(String(32), nullable=False)
+    valid_from = Column(Date, nullable=False)
+    valid_to = Column(Date)
+    recorded_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class LegalUnitVersion(Base):
+    """
+    Append-only history of LegalUnit content.
+    Units are matched across imports by unit_key; an unchanged unit keeps its
+    open row, so a document version only adds rows for units that changed.
+    """
+    __tablename__ = "legal_unit_versions"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    document_id = Column(UUID(as_uuid=True), nullable=False)
+    unit_key = Column(String(255), nullable=False)  # "{unit_type}|{num_label}|{occurrence}"
+    content_hash = Column(String(32), nullable=False)
+    unit_type = Column(String(50), nullable=False)
+    num_label = Column(String(100))
+    heading = Column(Text)
+    text_plain = Column(Text)
+    order_index = Column(Integer)
+    valid_from = Column(Date, nullable=False)
+    valid_to = Column(Date)
+    recorded_at = Column(DateTime(timezone=True), server_default=func.now())
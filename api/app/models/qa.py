@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text, Date, DateTime, Float, ARRAY
+from sqlalchemy import Column, String, Text, Date, DateTime, Float, ARRAY, JSON
 from sqlalchemy.dialects.postgresql import UUID, ENUM
 from sqlalchemy.sql import func
 from app.db.base import Base
@@ -11,7 +11,7 @@ class QAEntry(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     question = Column(Text, nullable=False, index=True)
     answer = Column(Text, nullable=False, index=True)
-    topic_tags = Column(ARRAY(String), default=[], index=True)
+    topic_tags = Column(ARRAY(String).with_variant(JSON, "sqlite"), default=[], index=True)  # JSON in snapshot bundles
     source_url = Column(Text)
     author = Column(String(255))
     org = Column(String(255))
@@ -26,5 +26,9 @@ class QAEntry(Base):
         default='clean'
     )
     moderation_status = Column(String(50), default='published', index=True)
+    # Match keys from app.utils.text.normalize_key, written by sync_import
+    question_normalized = Column(Text)
+    answer_normalized = Column(Text)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    deleted_at = Column(DateTime(timezone=True))  # unpublished by a sync tombstone
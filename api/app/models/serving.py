@@ -0,0 +1,31 @@
+from sqlalchemy import Column, String, Index
+from sqlalchemy.dialects.postgresql import UUID, ARRAY, TSVECTOR
+from app.db.base import Base
+
+
+class ServingUnit(Base):
+    """
+    Search row for each legal unit of a servable document (see
+    app.services.serving), with the document columns retrieval filters on.
+    Maintained by sync_import; never written directly.
+    """
+    __tablename__ = "serving_units"
+    __table_args__ = (Index("idx_serving_units_tsv", "tsv", postgresql_using="gin"),)
+
+    document_id = Column(UUID(as_uuid=True), primary_key=True)
+    id = Column(UUID(as_uuid=True), primary_key=True)
+    unit_type = Column(String(20), nullable=False)
+    doc_type = Column(String(20), nullable=False)
+    jurisdiction = Column(String(255))
+    authority = Column(String(255))
+    tsv = Column(TSVECTOR, nullable=False)
+
+
+class ServingQA(Base):
+    """Search row for each servable Q&A entry, maintained like ServingUnit"""
+    __tablename__ = "serving_qa"
+    __table_args__ = (Index("idx_serving_qa_tsv", "tsv", postgresql_using="gin"),)
+
+    id = Column(UUID(as_uuid=True), primary_key=True)
+    topic_tags = Column(ARRAY(String))
+    tsv = Column(TSVECTOR, nullable=False)
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, DateTime
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Index
+from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 from app.db.base import Base
 
@@ -8,3 +9,31 @@ class SyncWatermark(Base):
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     last_imported_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class SyncHash(Base):
+    """
+    Per-row digest for /sync/reconcile (see app.services.merkle).
+    `kind` is "documents" or "qa_entries"; `bucket` is the id's first 16 bits.
+    """
+    __tablename__ = "sync_hashes"
+    __table_args__ = (Index("idx_sync_hashes_bucket", "kind", "bucket"),)
+
+    kind = Column(String(16), primary_key=True)
+    id = Column(UUID(as_uuid=True), primary_key=True)
+    bucket = Column(Integer, nullable=False)
+    content_hash = Column(String(32), nullable=False)
+    units_hash = Column(String(32))  # documents only
+    hi = Column(BigInteger, nullable=False)
+    lo = Column(BigInteger, nullable=False)
+
+
+class SyncHashBucket(Base):
+    """XOR of the row digests in one bucket, maintained incrementally on import"""
+    __tablename__ = "sync_hash_buckets"
+
+    kind = Column(String(16), primary_key=True)
+    bucket = Column(Integer, primary_key=True)
+    hi = Column(BigInteger, nullable=False, default=0)
+    lo = Column(BigInteger, nullable=False, default=0)
+    rows = Column(Integer, nullable=False, default=0)
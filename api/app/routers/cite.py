@@ -0,0 +1,53 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from app.db.session import get_read_db
+from app.core import cache
+from app.core.cache import cached
+from app.core.settings import settings
+from app.services.citations import resolve_citations
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+class CitationQuery(BaseModel):
+    q: str = Field(..., min_length=1, max_length=500)
+    document_id: Optional[uuid.UUID] = None  # overrides any title in q
+
+
+class CitationBatch(BaseModel):
+    citations: List[CitationQuery] = Field(..., min_length=1)
+
+
+@router.get("")
+@cached("cite", tags=lambda **_: [cache.DOCUMENTS_TAG])
+async def cite(
+    q: str = Query(..., min_length=1, max_length=500),
+    document_id: Optional[uuid.UUID] = None,
+    db: Session = Depends(get_read_db)
+):
+    """
+    Resolve a citation such as "ماده ۱۲ قانون کار" to its legal unit
+    The document comes from document_id when given, else from the title
+    after the unit labels.
+    """
+    return resolve_citations(db, [(q, document_id)])[0]
+
+
+@router.post("/batch")
+async def cite_batch(request: CitationBatch, db: Session = Depends(get_read_db)):
+    """
+    Resolve many citations in one round of lookups
+    Results come back in request order, one per citation.
+    """
+    if len(request.citations) > settings.CITE_MAX_BATCH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.CITE_MAX_BATCH} citations per batch"
+        )
+    results = resolve_citations(db, [(c.q, c.document_id) for c in request.citations])
+    return {"total": len(results), "results": results}
@@ -0,0 +1,44 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Literal, Optional
+from app.db.session import get_read_db
+from app.core.settings import settings
+from app.services.context import build_context
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+class ContextHit(BaseModel):
+    source: Literal["unit", "qa"]
+    id: uuid.UUID
+    document_id: Optional[uuid.UUID] = None  # required for units
+    score: float = 0.0
+
+    @model_validator(mode="after")
+    def unit_needs_document(self):
+        if self.source == "unit" and self.document_id is None:
+            raise ValueError("unit hits need document_id")
+        return self
+
+
+class ContextRequest(BaseModel):
+    hits: List[ContextHit] = Field(..., min_length=1)
+    budget: int = Field(..., ge=1)  # tokens
+    window: int = Field(1, ge=0, le=10)  # neighbouring units on each side of a hit
+
+
+@router.post("")
+async def build(request: ContextRequest, db: Session = Depends(get_read_db)):
+    """
+    Build a token-budgeted evidence pack from retrieval hits
+    Unit hits are expanded to their neighbours and enclosing article,
+    overlapping windows are merged, and passages are packed best score
+    first, each with its document title, num_labels and source_url.
+    """
+    if len(request.hits) > settings.CONTEXT_MAX_HITS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.CONTEXT_MAX_HITS} hits per request")
+    return build_context(db, [hit.model_dump() for hit in request.hits], request.budget, request.window)
@@ -0,0 +1,186 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from datetime import date
+from app.db.bundle import is_bundle
+from app.db.session import get_read_db
+from app.core.cache import cached, doc_tag
+from app.models.official import OfficialDocument, LegalUnit, DocumentVersion
+from app.services.catalog import catalog
+from app.services.versioning import document_as_of, units_as_of, valid_range_contains
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+@router.get("")
+async def filter_documents(
+    doc_type: Optional[List[str]] = Query(None),
+    status: Optional[List[str]] = Query(None),
+    jurisdiction: Optional[List[str]] = Query(None),
+    authority: Optional[List[str]] = Query(None),
+    effective_from: Optional[date] = None,
+    effective_to: Optional[date] = None,
+    amended_from: Optional[date] = None,
+    amended_to: Optional[date] = None,
+    as_of: Optional[date] = None,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Filter official documents by metadata
+    Served from the in-memory document catalog; repeated query parameters
+    (e.g. ?doc_type=law&doc_type=regulation) match any of the values.
+    With as_of, filters the document versions valid on that date instead.
+    """
+    if as_of is not None:
+        return _filter_versions(
+            db, as_of, doc_type, status, jurisdiction, authority,
+            effective_from, effective_to, amended_from, amended_to, offset, limit
+        )
+
+    if not catalog.loaded:
+        raise HTTPException(status_code=503, detail="Document catalog is loading")
+
+    mask = catalog.filter_mask(
+        doc_type=doc_type,
+        status=status,
+        jurisdiction=jurisdiction,
+        authority=authority,
+        effective_from=effective_from,
+        effective_to=effective_to,
+        amended_from=amended_from,
+        amended_to=amended_to
+    )
+    return {
+        "total": int(mask.sum()),
+        "offset": offset,
+        "limit": limit,
+        "items": catalog.rows(mask, offset=offset, limit=limit)
+    }
+
+
+@router.get("/catalog")
+async def catalog_stats():
+    """
+    Document catalog statistics
+    Returns size, refresh watermark and memory footprint
+    """
+    return {
+        "loaded": catalog.loaded,
+        "documents": len(catalog),
+        "watermark": catalog.watermark,
+        "memory": catalog.memory_usage()
+    }
+
+
+def _require_history(db: Session):
+    if is_bundle(db):
+        raise HTTPException(status_code=501, detail="Point-in-time reads are not served from snapshot bundles")
+
+
+def _filter_versions(db, as_of, doc_type, status, jurisdiction, authority,
+                     effective_from, effective_to, amended_from, amended_to, offset, limit):
+    _require_history(db)
+    query = db.query(DocumentVersion).filter(valid_range_contains(DocumentVersion, as_of))
+    for column, values in (
+        (DocumentVersion.doc_type, doc_type),
+        (DocumentVersion.status, status),
+        (DocumentVersion.jurisdiction, jurisdiction),
+        (DocumentVersion.authority, authority),
+    ):
+        if values:
+            query = query.filter(column.in_(values))
+    if effective_from is not None:
+        query = query.filter(DocumentVersion.effective_date >= effective_from)
+    if effective_to is not None:
+        query = query.filter(DocumentVersion.effective_date <= effective_to)
+    if amended_from is not None:
+        query = query.filter(DocumentVersion.amended_date >= amended_from)
+    if amended_to is not None:
+        query = query.filter(DocumentVersion.amended_date <= amended_to)
+
+    total = query.with_entities(func.count(DocumentVersion.id)).scalar()
+    versions = query.order_by(DocumentVersion.document_id).offset(offset).limit(limit).all()
+    return {
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "as_of": as_of,
+        "items": [_version_summary(v) for v in versions]
+    }
+
+
+def _version_summary(version: DocumentVersion) -> dict:
+    return {
+        "id": str(version.document_id),
+        "doc_type": version.doc_type,
+        "status": version.status,
+        "jurisdiction": version.jurisdiction,
+        "authority": version.authority,
+        "effective_date": version.effective_date,
+        "amended_date": version.amended_date,
+        "valid_from": version.valid_from,
+        "valid_to": version.valid_to,
+    }
+
+
+def _unit_dict(unit) -> dict:
+    return {
+        "unit_type": unit.unit_type,
+        "num_label": unit.num_label,
+        "heading": unit.heading,
+        "text_plain": unit.text_plain,
+        "order_index": unit.order_index,
+    }
+
+
+@router.get("/{document_id}")
+@cached("document", tags=lambda document_id, **_: [doc_tag(document_id)])
+async def get_document(
+    document_id: uuid.UUID,
+    as_of: Optional[date] = None,
+    db: Session = Depends(get_read_db)
+):
+    """
+    Get an official document with its legal units
+    With as_of, returns the text that was in force on that date
+    """
+    if as_of is not None:
+        _require_history(db)
+        version = document_as_of(db, document_id, as_of)
+        if version is None:
+            raise HTTPException(status_code=404, detail="Document not found at that date")
+        return {
+            **_version_summary(version),
+            "title": version.title,
+            "source_url": version.source_url,
+            "as_of": as_of,
+            "legal_units": [_unit_dict(u) for u in units_as_of(db, document_id, as_of)]
+        }
+
+    document = db.query(OfficialDocument).filter(
+        OfficialDocument.id == document_id,
+        OfficialDocument.deleted_at.is_(None)
+    ).first()
+    if document is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    units = db.query(LegalUnit).filter(
+        LegalUnit.document_id == document_id
+    ).order_by(LegalUnit.order_index).all()
+    return {
+        "id": str(document.id),
+        "title": document.title,
+        "doc_type": document.doc_type,
+        "status": document.status,
+        "jurisdiction": document.jurisdiction,
+        "authority": document.authority,
+        "effective_date": document.effective_date,
+        "amended_date": document.amended_date,
+        "source_url": document.source_url,
+        "legal_units": [_unit_dict(u) for u in units]
+    }
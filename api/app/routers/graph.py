@@ -0,0 +1,72 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from pydantic import BaseModel, Field
+from typing import List, Literal
+from app.db.bundle import is_bundle
+from app.db.session import get_read_db
+from app.core.settings import settings
+from app.services.citation_graph import neighbourhood
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+class NeighbourhoodRequest(BaseModel):
+    units: List[uuid.UUID] = Field(..., min_length=1)
+    direction: Literal["cited", "citing", "both"] = "cited"
+    hops: int = Field(1, ge=1)
+    limit: int = Field(100, ge=1)  # neighbours returned
+
+
+def _checked(db: Session, units: int, hops: int, limit: int):
+    if is_bundle(db):
+        raise HTTPException(status_code=501, detail="The citation graph is not served from snapshot bundles")
+    if hops > settings.GRAPH_MAX_HOPS:
+        raise HTTPException(status_code=400, detail=f"hops may be at most {settings.GRAPH_MAX_HOPS}")
+    if units > settings.GRAPH_MAX_UNITS or limit > settings.GRAPH_MAX_UNITS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.GRAPH_MAX_UNITS} units and neighbours per request")
+
+
+@router.get("/units/{unit_id}/cited")
+async def cited_units(
+    unit_id: uuid.UUID,
+    hops: int = Query(1, ge=1),
+    limit: int = Query(100, ge=1),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Legal units this unit cites
+    With hops > 1, also the units those cite, and so on; each unit carries
+    its hop distance.
+    """
+    _checked(db, 1, hops, limit)
+    return neighbourhood(db, [unit_id], hops, "cited", limit)
+
+
+@router.get("/units/{unit_id}/citing")
+async def citing_units(
+    unit_id: uuid.UUID,
+    hops: int = Query(1, ge=1),
+    limit: int = Query(100, ge=1),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Legal units that cite this unit
+    Same response shape as /cited.
+    """
+    _checked(db, 1, hops, limit)
+    return neighbourhood(db, [unit_id], hops, "citing", limit)
+
+
+@router.post("/neighbourhood")
+async def unit_neighbourhood(request: NeighbourhoodRequest, db: Session = Depends(get_read_db)):
+    """
+    Units within `hops` citations of any of the given units
+    Pass the unit hits of a retrieval to pull in the articles they refer to
+    in one call. Units come back nearest first, each once, with the
+    citations among them and the given units as `edges`.
+    """
+    _checked(db, len(request.units), request.hops, request.limit)
+    return neighbourhood(db, request.units, request.hops, request.direction, request.limit)
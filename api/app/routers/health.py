@@ -1,10 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy import text
+from app.db.bundle import bundle_info
 from app.db.session import get_db
-from app.deps import get_minio_client
+from app.deps import get_optional_minio_client
 from app.core.settings import settings
 from minio import Minio
+from typing import Optional
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,7 +16,7 @@ router = APIRouter()
 @router.get("/health")
 async def health_check(
     db: Session = Depends(get_db),
-    minio_client: Minio = Depends(get_minio_client)
+    minio_client: Optional[Minio] = Depends(get_optional_minio_client)
 ):
     """
     Health check endpoint
@@ -36,6 +38,13 @@ async def health_check(
         health_status["db"] = False
         health_status["status"] = "degraded"
     
+    # Edge nodes serve a snapshot bundle and have no object storage
+    if settings.EDGE_BUNDLE_PATH:
+        del health_status["minio"]
+        if health_status["db"]:
+            health_status["bundle"] = bundle_info(db)
+        return health_status
+    
     # Check MinIO connectivity
     try:
         minio_client.bucket_exists(settings.S3_BUCKET)
@@ -0,0 +1,50 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from app.db.bundle import is_bundle
+from app.db.session import get_read_db
+from app.services.related import related_qa, related_units
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+def _checked(db: Session):
+    if is_bundle(db):
+        raise HTTPException(status_code=501, detail="Related content is not served from snapshot bundles")
+
+
+@router.get("/qa/{qa_id}/related")
+async def qa_related_units(
+    qa_id: uuid.UUID,
+    limit: int = Query(10, ge=1),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Legal units most similar to a Q&A entry
+    Best first, with their cosine `score`; computed offline by the
+    related_links job, so at most RELATED_TOP_K.
+    """
+    _checked(db)
+    units = related_units(db, qa_id, limit)
+    if units is None:
+        raise HTTPException(status_code=404, detail="Q&A entry not found")
+    return {"qa_id": str(qa_id), "units": units}
+
+
+@router.get("/units/{unit_id}/related")
+async def unit_related_qa(
+    unit_id: uuid.UUID,
+    limit: int = Query(10, ge=1),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Q&A entries most similar to a legal unit
+    Same ranking as /qa/{qa_id}/related, in the other direction.
+    """
+    _checked(db)
+    entries = related_qa(db, unit_id, limit)
+    if entries is None:
+        raise HTTPException(status_code=404, detail="Legal unit not found")
+    return {"unit_id": str(unit_id), "qa_entries": entries}
@@ -0,0 +1,79 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+from app.db.session import get_read_db
+from app.core.settings import settings
+from app.services.query_cache import query_cache
+from app.services.retrieval import RetrievalFilters, SOURCES, retrieve
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+class RetrieveFilters(BaseModel):
+    sources: List[Literal["units", "qa"]] = list(SOURCES)
+    doc_type: Optional[List[str]] = None
+    jurisdiction: Optional[List[str]] = None
+    authority: Optional[List[str]] = None
+    unit_type: Optional[List[str]] = None
+    document_ids: Optional[List[uuid.UUID]] = None
+    topic_tags: Optional[List[str]] = None
+
+
+class RetrieveBatch(BaseModel):
+    queries: List[str] = Field(..., min_length=1)
+    filters: RetrieveFilters = Field(default_factory=RetrieveFilters)
+    limit: int = Field(10, ge=1)
+
+
+def _check_limit(limit: int):
+    if limit > settings.RETRIEVE_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit may be at most {settings.RETRIEVE_MAX_LIMIT}")
+
+
+@router.get("/cache")
+async def retrieval_cache_stats():
+    """
+    Retrieval cache statistics
+    Hits (exact and near-repeat), misses and the query time they saved
+    """
+    return query_cache.stats()
+
+
+@router.get("")
+async def retrieve_one(
+    q: str = Query(..., min_length=1),
+    sources: List[Literal["units", "qa"]] = Query(list(SOURCES)),
+    doc_type: Optional[List[str]] = Query(None),
+    unit_type: Optional[List[str]] = Query(None),
+    document_id: Optional[List[uuid.UUID]] = Query(None),
+    limit: int = Query(10, ge=1),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Retrieve legal units and Q&A entries for one query
+    Same response shape as /retrieve/batch with a single result.
+    """
+    _check_limit(limit)
+    filters = RetrievalFilters(sources=sources, doc_type=doc_type, unit_type=unit_type, document_ids=document_id)
+    return retrieve(db, [q], filters, limit)
+
+
+@router.post("/batch")
+async def retrieve_batch(request: RetrieveBatch, db: Session = Depends(get_read_db)):
+    """
+    Retrieve for many queries in one call
+    All queries share the filters, one connection and one snapshot; hits
+    come back per query in request order, and each distinct unit or Q&A
+    entry is returned once in `units` / `qa_entries`.
+    """
+    if len(request.queries) > settings.RETRIEVE_MAX_QUERIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.RETRIEVE_MAX_QUERIES} queries per batch"
+        )
+    _check_limit(request.limit)
+    return retrieve(db, request.queries, RetrievalFilters(**request.filters.model_dump()), request.limit)
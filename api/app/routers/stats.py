@@ -1,7 +1,10 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from app.db.session import get_db
+from app.db.session import get_read_db
+from app.db.replicas import read_router
+from app.core import cache
+from app.core.cache import cached, DOCUMENTS_TAG, QA_TAG
 from app.models.official import OfficialDocument
 from app.models.qa import QAEntry
 
@@ -9,28 +12,29 @@ router = APIRouter()
 
 
 @router.get("/stats")
-async def get_stats(db: Session = Depends(get_db)):
+@cached("stats", tags=lambda **_: [DOCUMENTS_TAG, QA_TAG])
+async def get_stats(db: Session = Depends(get_read_db)):
     """
     Get system statistics
-    Returns counts of official documents and Q&A entries
+    Returns counts of official documents and Q&A entries, without deleted ones
     """
     # Count official documents
-    official_docs_count = db.query(func.count(OfficialDocument.id)).scalar()
+    official_docs_count = db.query(func.count(OfficialDocument.id)).filter(OfficialDocument.deleted_at.is_(None)).scalar()
     
     # Count Q&A entries
-    qa_entries_count = db.query(func.count(QAEntry.id)).scalar()
+    qa_entries_count = db.query(func.count(QAEntry.id)).filter(QAEntry.deleted_at.is_(None)).scalar()
     
     # Additional stats by status for official documents
     official_docs_by_status = db.query(
         OfficialDocument.status,
         func.count(OfficialDocument.id)
-    ).group_by(OfficialDocument.status).all()
+    ).filter(OfficialDocument.deleted_at.is_(None)).group_by(OfficialDocument.status).all()
     
     # Additional stats by doc_type for official documents
     official_docs_by_type = db.query(
         OfficialDocument.doc_type,
         func.count(OfficialDocument.id)
-    ).group_by(OfficialDocument.doc_type).all()
+    ).filter(OfficialDocument.deleted_at.is_(None)).group_by(OfficialDocument.doc_type).all()
     
     return {
         "official_documents": {
@@ -42,3 +46,21 @@ async def get_stats(db: Session = Depends(get_db)):
             "total": qa_entries_count
         }
     }
+
+
+@router.get("/stats/cache")
+async def get_cache_stats():
+    """
+    Response cache statistics
+    Returns hit/miss/eviction counters and current size
+    """
+    return cache.get_cache().info()
+
+
+@router.get("/stats/replicas")
+async def get_replica_stats():
+    """
+    Read replica status
+    Returns each replica's health and sync position next to the primary's
+    """
+    return read_router.status()
@@ -0,0 +1,57 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Literal, Optional
+from app.core.settings import settings
+from app.db.session import get_read_db
+from app.services.suggest import document_labels, suggest_index
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+@router.get("")
+async def suggest(
+    q: str = Query(..., min_length=1, max_length=200),
+    kind: Literal["all", "title", "label"] = "all",
+    document_id: Optional[uuid.UUID] = None,
+    limit: int = Query(10, ge=1),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Type-ahead completions of a prefix
+    `titles` are documents with a title word starting with q, most cited
+    first; `labels` are the most used unit labels ("ماده 12") starting with
+    q. With document_id, `labels` are that document's units instead, in
+    document order. Served from the in-memory suggestion index.
+    """
+    if limit > settings.SUGGEST_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit may be at most {settings.SUGGEST_MAX_LIMIT}")
+    result = {"query": q}
+    if (kind != "label" or document_id is None) and not suggest_index.loaded:
+        raise HTTPException(status_code=503, detail="Suggestion index is loading")
+    if kind in ("all", "title"):
+        result["titles"] = suggest_index.titles(q, limit)
+    if kind in ("all", "label"):
+        if document_id is None:
+            result["labels"] = suggest_index.labels(q, limit)
+        else:
+            labels = document_labels(db, document_id, q, limit)
+            if labels is None:
+                raise HTTPException(status_code=404, detail="Document not found")
+            result["labels"] = labels
+    return result
+
+
+@router.get("/stats")
+async def suggest_stats():
+    """
+    Suggestion index statistics
+    Returns the indexed titles and labels, the pending list and index size
+    """
+    return {
+        "loaded": suggest_index.loaded,
+        "watermark": suggest_index.watermark,
+        **suggest_index.stats()
+    }
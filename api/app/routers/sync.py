@@ -1,14 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
+from sqlalchemy import func, case, text
 from sqlalchemy.dialects.postgresql import insert
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
-from datetime import datetime, date
+from typing import List, Literal, Optional, Dict, Any
+from datetime import datetime, date, timezone
 from app.db.session import get_db
+from app.db.replicas import read_router, format_position
+from app.core.settings import settings
 from app.deps import verify_bridge_token
+from app.core import cache
+from app.services.match_keys import unit_match_keys
+from app.services import citation_graph, merkle, serving
+from app.services.tombstones import apply_tombstones
+from app.services.versioning import version_start, record_document_version, record_unit_versions
 from app.models.official import OfficialDocument, LegalUnit
 from app.models.qa import QAEntry
 from app.models.sync import SyncWatermark
+from app.utils.citations import title_key
+from app.utils.fast_decode import PayloadDecoder, SyncImportStruct, inline_schema
+from app.utils.text import normalize_key
 import uuid
 import logging
 
@@ -16,6 +27,38 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
+_ADVANCE_POSITION_SQL = text("""
+    UPDATE sync_watermarks
+    SET last_imported_at = GREATEST(last_imported_at, clock_timestamp())
+    WHERE id = (SELECT min(id) FROM sync_watermarks)
+    RETURNING last_imported_at
+""")
+
+
+def advance_sync_position(db: Session) -> datetime:
+    """
+    Move the sync watermark to now and return the position stored. The
+    UPDATE locks the row until commit and never moves it backwards, so
+    concurrent imports commit in position order and a replica that has
+    replayed a position has every import up to it.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        position = db.execute(_ADVANCE_POSITION_SQL).scalar()
+        if position is not None:
+            return position
+    watermark = db.query(SyncWatermark).order_by(SyncWatermark.id).first()
+    position = datetime.now(timezone.utc)
+    if watermark is None:
+        db.add(SyncWatermark(last_imported_at=position))
+        db.flush()
+        return position
+    stored = watermark.last_imported_at
+    if stored is not None and stored.tzinfo is None:
+        stored = stored.replace(tzinfo=timezone.utc)
+    watermark.last_imported_at = position = max(position, stored) if stored else position
+    return position
+
+
 class LegalUnitData(BaseModel):
     unit_type: str
     num_label: Optional[str] = None
@@ -53,25 +96,55 @@ class QAData(BaseModel):
     moderation_status: str = "published"
 
 
+class TombstoneData(BaseModel):
+    kind: Literal["document", "qa_entry"]
+    id: uuid.UUID
+    # Date a document's withdrawal takes legal effect; defaults to the import date
+    effective_date: Optional[date] = None
+
+
 class SyncImportRequest(BaseModel):
     documents: List[DocumentData] = []
     qa_entries: List[QAData] = []
+    tombstones: List[TombstoneData] = []
     batch_ts: str = Field(..., description="RFC3339 timestamp")
 
 
-@router.post("/import")
+sync_decoder = PayloadDecoder(
+    SyncImportStruct,
+    SyncImportRequest,
+    use_msgspec=settings.SYNC_DECODER == "msgspec"
+)
+
+
+@router.post(
+    "/import",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": inline_schema(SyncImportRequest)}}
+        }
+    }
+)
 async def sync_import(
-    request: SyncImportRequest,
+    http_request: Request,
     db: Session = Depends(get_db),
     _: bool = Depends(verify_bridge_token)
 ):
     """
     Internal sync endpoint for importing data from Bridge service
     Secured by X-Bridge-Token header
+    The body follows SyncImportRequest and is decoded by the fast decode path
     """
+    request = sync_decoder.decode(await http_request.body())
     try:
         imported_docs = 0
         imported_qa = 0
+        import_date = datetime.utcnow().date()
+        unit_rows = []
+        replaced_unit_docs = []
+        doc_hashes = {}
+        qa_hashes = {}
         
         # Import documents
         for doc_data in request.documents:
@@ -79,6 +152,7 @@ async def sync_import(
             stmt = insert(OfficialDocument).values(
                 id=doc_data.id,
                 title=doc_data.title,
+                title_normalized=title_key(doc_data.title),
                 doc_type=doc_data.doc_type,
                 jurisdiction=doc_data.jurisdiction,
                 authority=doc_data.authority,
@@ -86,14 +160,17 @@ async def sync_import(
                 amended_date=doc_data.amended_date,
                 source_url=doc_data.source_url,
                 file_s3=doc_data.file_s3,
+                text_normalized=doc_data.text_normalized,
                 status='published',
-                updated_at=datetime.utcnow()
+                updated_at=datetime.utcnow(),
+                deleted_at=None
             )
             
             stmt = stmt.on_conflict_do_update(
                 index_elements=['id'],
                 set_=dict(
                     title=stmt.excluded.title,
+                    title_normalized=stmt.excluded.title_normalized,
                     doc_type=stmt.excluded.doc_type,
                     jurisdiction=stmt.excluded.jurisdiction,
                     authority=stmt.excluded.authority,
@@ -101,30 +178,55 @@ async def sync_import(
                     amended_date=stmt.excluded.amended_date,
                     source_url=stmt.excluded.source_url,
                     file_s3=stmt.excluded.file_s3,
+                    # Keep previously extracted text unless the source file changed
+                    text_normalized=func.coalesce(
+                        stmt.excluded.text_normalized,
+                        case(
+                            (OfficialDocument.file_s3 == stmt.excluded.file_s3, OfficialDocument.text_normalized)
+                        )
+                    ),
                     status=stmt.excluded.status,
-                    updated_at=stmt.excluded.updated_at
+                    updated_at=stmt.excluded.updated_at,
+                    # Re-importing a withdrawn document revives it
+                    deleted_at=None
                 )
             )
             
             db.execute(stmt)
             imported_docs += 1
+            doc_hashes[doc_data.id] = (
+                merkle.document_hash(doc_data),
+                merkle.units_hash(doc_data.legal_units) if doc_data.legal_units else merkle.KEEP_UNITS
+            )
+            
+            # Append to the point-in-time history
+            valid_from = version_start(doc_data, import_date)
+            record_document_version(db, doc_data, 'published', valid_from)
+            if doc_data.legal_units:
+                record_unit_versions(db, doc_data.id, doc_data.legal_units, valid_from)
             
             # Import legal units if provided
             if doc_data.legal_units:
-                # Delete existing legal units for this document
-                db.query(LegalUnit).filter(LegalUnit.document_id == doc_data.id).delete()
+                replaced_unit_docs.append(doc_data.id)
                 
-                # Insert new legal units
+                # Queue new legal units for one bulk insert
                 for unit_data in doc_data.legal_units:
-                    legal_unit = LegalUnit(
+                    unit_rows.append(dict(
                         document_id=doc_data.id,
                         unit_type=unit_data.unit_type,
                         num_label=unit_data.num_label,
                         heading=unit_data.heading,
                         text_plain=unit_data.text_plain,
                         order_index=unit_data.order_index
-                    )
-                    db.add(legal_unit)
+                    ))
+        
+        if replaced_unit_docs:
+            # One delete for the batch; the document_id list prunes it to the partitions holding those documents
+            db.query(LegalUnit).filter(
+                LegalUnit.document_id.in_(replaced_unit_docs)
+            ).delete(synchronize_session=False)
+        if unit_rows:
+            db.execute(insert(LegalUnit), unit_match_keys(unit_rows))
         
         # Import Q&A entries
         for qa_data in request.qa_entries:
@@ -132,6 +234,8 @@ async def sync_import(
                 id=qa_data.id,
                 question=qa_data.question,
                 answer=qa_data.answer,
+                question_normalized=normalize_key(qa_data.question),
+                answer_normalized=normalize_key(qa_data.answer),
                 topic_tags=qa_data.topic_tags,
                 source_url=qa_data.source_url,
                 author=qa_data.author,
@@ -141,7 +245,8 @@ async def sync_import(
                 licensing=qa_data.licensing,
                 pii_status=qa_data.pii_status,
                 moderation_status=qa_data.moderation_status,
-                updated_at=datetime.utcnow()
+                updated_at=datetime.utcnow(),
+                deleted_at=None
             )
             
             stmt = stmt.on_conflict_do_update(
@@ -149,6 +254,8 @@ async def sync_import(
                 set_=dict(
                     question=stmt.excluded.question,
                     answer=stmt.excluded.answer,
+                    question_normalized=stmt.excluded.question_normalized,
+                    answer_normalized=stmt.excluded.answer_normalized,
                     topic_tags=stmt.excluded.topic_tags,
                     source_url=stmt.excluded.source_url,
                     author=stmt.excluded.author,
@@ -158,35 +265,128 @@ async def sync_import(
                     licensing=stmt.excluded.licensing,
                     pii_status=stmt.excluded.pii_status,
                     moderation_status=stmt.excluded.moderation_status,
-                    updated_at=stmt.excluded.updated_at
+                    updated_at=stmt.excluded.updated_at,
+                    deleted_at=None
                 )
             )
             
             db.execute(stmt)
             imported_qa += 1
+            qa_hashes[qa_data.id] = (merkle.qa_hash(qa_data), None)
         
-        # Update sync watermark
-        watermark = db.query(SyncWatermark).first()
-        if watermark:
-            watermark.last_imported_at = datetime.utcnow()
-        else:
-            watermark = SyncWatermark(last_imported_at=datetime.utcnow())
-            db.add(watermark)
+        # Keep the reconciliation hash trees in step with the rows just written
+        merkle.apply_hashes(db, "documents", doc_hashes)
+        merkle.apply_hashes(db, "qa_entries", qa_hashes)
         
-        db.commit()
+        # Tombstones go last, so a withdrawal wins over an upsert of the same id in this batch
+        deleted = apply_tombstones(db, request.tombstones, import_date)
+        touched_docs = [d.id for d in request.documents] + deleted["documents"]
+        touched_qa = [q.id for q in request.qa_entries] + deleted["qa_entries"]
         
-        logger.info(f"Sync import completed: {imported_docs} documents, {imported_qa} Q&A entries")
+        # Re-extract citations wherever units were replaced or dropped
+        citation_graph.refresh_citations(db, replaced_unit_docs + deleted["documents"])
+        # and point citations made before a document arrived at it
+        citation_graph.resolve_pending(db, [d.id for d in request.documents])
         
-        return {
-            "status": "success",
-            "imported": {
-                "documents": imported_docs,
-                "qa_entries": imported_qa
-            },
-            "batch_ts": request.batch_ts
-        }
+        # Bring the serving tables in line with everything this batch touched
+        serving.refresh_documents(db, touched_docs)
+        serving.refresh_qa(db, touched_qa)
+        
+        # Update sync watermark
+        position = advance_sync_position(db)
+        
+        db.commit()
+        read_router.note_position(position)
         
     except Exception as e:
         db.rollback()
         logger.error(f"Sync import failed: {e}")
         raise HTTPException(status_code=500, detail=f"Import failed: {str(e)}")
+    
+    # Drop cached responses that depend on the rows just written
+    touched = [cache.doc_tag(d) for d in touched_docs] + [cache.qa_tag(q) for q in touched_qa]
+    if touched_docs:
+        touched.append(cache.DOCUMENTS_TAG)
+    if touched_qa:
+        touched.append(cache.QA_TAG)
+    try:
+        cache.invalidate(touched)
+    except Exception as e:
+        # the import is committed; entries it misses expire with their TTL
+        logger.error(f"Cache invalidation after sync import failed: {e}")
+    
+    logger.info(
+        f"Sync import completed: {imported_docs} documents, {imported_qa} Q&A entries, "
+        f"{len(deleted['documents'])} documents and {len(deleted['qa_entries'])} Q&A entries deleted"
+    )
+    
+    return {
+        "status": "success",
+        "imported": {
+            "documents": imported_docs,
+            "qa_entries": imported_qa
+        },
+        "deleted": {
+            "documents": len(deleted["documents"]),
+            "qa_entries": len(deleted["qa_entries"]),
+            "legal_units": deleted["legal_units"]
+        },
+        "batch_ts": request.batch_ts,
+        # Send back as X-Min-Sync-Position to read these rows from a replica
+        "sync_position": format_position(position)
+    }
+
+
+class ReconcilePrefixes(BaseModel):
+    prefixes: List[str] = Field(..., min_length=1)
+
+
+def _checked_prefixes(request: ReconcilePrefixes, leaf: bool) -> List[str]:
+    if len(request.prefixes) > settings.RECONCILE_MAX_PREFIXES:
+        raise HTTPException(status_code=400, detail=f"At most {settings.RECONCILE_MAX_PREFIXES} prefixes per request")
+    try:
+        return [merkle.check_prefix(prefix, leaf=leaf) for prefix in request.prefixes]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/reconcile")
+async def reconcile_roots(db: Session = Depends(get_db), _: bool = Depends(verify_bridge_token)):
+    """
+    Root digests of the reconciliation hash trees
+    Nodes are id prefixes of up to `depth` hex digits; a digest is the XOR of
+    its rows' digests (see app.services.merkle for the row hash)
+    """
+    return {
+        "depth": merkle.DEPTH,
+        "fanout": 1 << merkle.FANOUT_BITS,
+        "roots": {kind: merkle.tree_root(db, kind) for kind in merkle.KINDS}
+    }
+
+
+@router.post("/reconcile/{kind}/nodes")
+async def reconcile_nodes(
+    kind: Literal["documents", "qa_entries"],
+    request: ReconcilePrefixes,
+    db: Session = Depends(get_db),
+    _: bool = Depends(verify_bridge_token)
+):
+    """
+    Child digests of each prefix
+    Send every differing prefix of one level at once; empty children are omitted
+    """
+    return merkle.tree_children(db, kind, _checked_prefixes(request, leaf=False))
+
+
+@router.post("/reconcile/{kind}/rows")
+async def reconcile_rows(
+    kind: Literal["documents", "qa_entries"],
+    request: ReconcilePrefixes,
+    db: Session = Depends(get_db),
+    _: bool = Depends(verify_bridge_token)
+):
+    """
+    Row id -> digest for each differing bucket (a full-depth prefix)
+    Resend what is missing or changed through /sync/import
+    """
+    return merkle.tree_rows(db, kind, _checked_prefixes(request, leaf=True))
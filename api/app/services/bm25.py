@@ -0,0 +1,581 @@
+"""
+In-process BM25 index over servable legal units and Q&A entries.
+
+The index is a list of immutable segments (app.utils.postings) under
+BM25_INDEX_DIR. manifest.json names them, along with each segment's deletion
+bitmap and the indexer's watermarks, and is replaced atomically on every
+change. Each worker memory-maps the segments and picks up a new manifest on
+its next search. The directory is per node, so every node keeps its own
+index up to date: each worker runs `run_index_loop`, and whichever holds the
+file lock beside the directory (`lock_index`) runs the update.
+`update_index` reads the documents and Q&A entries changed since the
+watermarks (as the catalog does), marks their old postings deleted, writes
+what is still servable as one new segment, then merges the smallest segments
+once there are more than BM25_MAX_SEGMENTS, dropping deleted postings.
+
+Scores are Okapi BM25 (K1, B) with document frequencies and average length
+taken over all segments. Top-k search is block-max: a segment is cut into
+windows of WINDOW documents, and each window gets an upper bound from the
+largest frequency and shortest document of the query terms' blocks that
+overlap it. Windows are scored best bound first, and the search stops once
+no remaining bound can beat the k-th score, so most blocks of frequent
+terms are never decoded.
+"""
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from sqlalchemy import tuple_
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from app.core.settings import settings
+from app.db.base import SessionLocal
+from app.models.official import LegalUnit, OfficialDocument
+from app.models.qa import QAEntry
+from app.services.serving import servable_document, servable_qa
+from app.utils.postings import (
+    SOURCE_QA, SOURCE_UNIT, IndexedDoc, Segment, merge_segments, to_uuid, unit_type_code, uuid_bytes,
+    write_segment
+)
+from app.utils.text import key_terms
+import asyncio
+import fcntl
+import heapq
+import json
+import logging
+import math
+import os
+import shutil
+import threading
+import time
+import uuid
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+K1 = 1.2
+B = 0.75
+MANIFEST = "manifest.json"
+RELOAD_CHECK_SECONDS = 1.0
+# Documents per block-max window; a window is scored densely in one pass
+WINDOW = 4096
+
+
+def bm25_weight(tf: np.ndarray, length: np.ndarray, avg_len: float) -> np.ndarray:
+    """Term-frequency part of BM25; increasing in tf, decreasing in length"""
+    tf = np.asarray(tf, dtype=np.float64)
+    return tf * (K1 + 1) / (tf + K1 * (1 - B + B * np.asarray(length, dtype=np.float64) / avg_len))
+
+
+class IndexSnapshot:
+    """The segments of one manifest generation, with their live-document masks"""
+
+    def __init__(self, segments: Sequence[Segment], lives: Sequence[np.ndarray], generation: int = 0):
+        self.segments = list(segments)
+        self.lives = list(lives)
+        self.generation = generation
+        self.docs = sum(int(live.sum()) for live in self.lives)
+        # Collection statistics include deleted documents until they are
+        # merged away, as in Lucene, so they match the per-term df
+        self.total_docs = sum(len(segment) for segment in self.segments)
+        total_len = sum(segment.meta["total_len"] for segment in self.segments)
+        self.avg_len = total_len / self.total_docs if total_len else 1.0
+
+    def idf(self, term: str) -> float:
+        df = 0
+        for segment in self.segments:
+            t = segment.term_index(term)
+            if t is not None:
+                df += int(segment.term_df[t])
+        return math.log(1 + (self.total_docs - df + 0.5) / (df + 0.5)) if df else 0.0
+
+    def search(
+        self,
+        terms: Sequence[str],
+        k: int,
+        accept: Optional[Callable[[Segment], np.ndarray]] = None,
+        exhaustive: bool = False
+    ) -> List[Tuple[float, int, int]]:
+        """
+        Top k (score, segment index, document number) for an OR of `terms`.
+        `accept` narrows each segment's documents with a boolean mask;
+        `exhaustive` scores every posting instead of pruning by block-max bounds.
+        """
+        idfs = {term: self.idf(term) for term in dict.fromkeys(terms)}
+        idfs = {term: idf for term, idf in idfs.items() if idf > 0}
+        heap: List[Tuple[float, int, int]] = []
+        if not idfs or k <= 0:
+            return []
+        # large segments first raise the threshold early for the rest
+        for i in sorted(range(len(self.segments)), key=lambda i: -len(self.segments[i])):
+            mask = self.lives[i] if accept is None else self.lives[i] & accept(self.segments[i])
+            if not mask.any():
+                continue
+            scan = _scan_exhaustive if exhaustive else _scan_block_max
+            scan(self.segments[i], i, idfs, mask, self.avg_len, k, heap)
+        return sorted(heap, key=lambda hit: (-hit[0], hit[1], hit[2]))
+
+
+def _offer(heap: List, k: int, segment_index: int, numbers: np.ndarray, scores: np.ndarray):
+    if len(heap) >= k:
+        keep = scores > heap[0][0]
+        numbers, scores = numbers[keep], scores[keep]
+    for number, score in zip(numbers.tolist(), scores.tolist()):
+        if len(heap) < k:
+            heapq.heappush(heap, (score, segment_index, number))
+        elif score > heap[0][0]:
+            heapq.heapreplace(heap, (score, segment_index, number))
+
+
+def _scan_exhaustive(segment: Segment, segment_index: int, idfs: Dict[str, float], mask, avg_len, k, heap):
+    scores = np.zeros(len(segment))
+    lens = segment.doc_lens
+    for term, idf in idfs.items():
+        t = segment.term_index(term)
+        if t is None:
+            continue
+        numbers, tfs = segment.postings(t)
+        scores[numbers] += idf * bm25_weight(tfs, lens[numbers], avg_len)
+    numbers = np.flatnonzero((scores > 0) & mask)
+    _offer(heap, k, segment_index, numbers, scores[numbers])
+
+
+def _scan_block_max(segment: Segment, segment_index: int, idfs: Dict[str, float], mask, avg_len, k, heap):
+    query = []
+    for term, idf in idfs.items():
+        t = segment.term_index(term)
+        if t is None:
+            continue
+        b0, b1 = int(segment.term_blocks[t]), int(segment.term_blocks[t + 1])
+        last = np.asarray(segment.block_last[b0:b1], dtype=np.int64)
+        bound = idf * bm25_weight(segment.block_max_tf[b0:b1], segment.block_min_len[b0:b1], avg_len)
+        query.append((t, idf, b0, last, bound))
+    if not query:
+        return
+
+    # Window w covers documents [w * WINDOW, (w + 1) * WINDOW); a term's blocks
+    # first..last[w] overlap it, and the largest of their bounds bounds the term
+    windows = (len(segment) + WINDOW - 1) // WINDOW
+    starts = np.arange(windows, dtype=np.int64) * WINDOW
+    window_bound = np.zeros(windows)
+    spans = []
+    for t, idf, b0, last, bound in query:
+        first = np.searchsorted(last, starts, side="left")
+        final = np.minimum(np.searchsorted(last, starts + WINDOW - 1, side="left"), len(last) - 1)
+        present = first < len(last)
+        # reduceat covers the blocks ending inside the window; final may end past it
+        peak = np.maximum(np.maximum.reduceat(bound, np.minimum(first, len(last) - 1)), bound[final])
+        window_bound[present] += peak[present]
+        spans.append((first, final, present))
+
+    lens = segment.doc_lens
+    for w in np.argsort(-window_bound, kind="stable"):
+        if window_bound[w] <= 0 or (len(heap) >= k and window_bound[w] <= heap[0][0]):
+            break
+        lo = int(starts[w])
+        scores = np.zeros(min(WINDOW, len(segment) - lo))
+        for (t, idf, b0, _, _), (first, final, present) in zip(query, spans):
+            if not present[w]:
+                continue
+            a, z = int(first[w]) + b0, int(final[w]) + b0
+            start, end = segment.block_start[a], segment.block_start[z + 1]
+            numbers = np.cumsum(segment.gaps[start:end], dtype=np.int64)
+            if a > b0:
+                numbers += int(segment.block_last[a - 1])
+            inside = (numbers >= lo) & (numbers < lo + len(scores))
+            numbers = numbers[inside]
+            tfs = np.asarray(segment.tfs[start:end], dtype=np.int64)[inside]
+            scores[numbers - lo] += idf * bm25_weight(tfs, lens[numbers], avg_len)
+        hits = np.flatnonzero((scores > 0) & mask[lo:lo + len(scores)])
+        _offer(heap, k, segment_index, hits + lo, scores[hits])
+
+
+class Bm25Index:
+    """Per-process reader of the index directory"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._snapshot: Optional[IndexSnapshot] = None
+        self._manifest_stat = None
+        self._checked = 0.0
+        self._segments: Dict[Tuple[str, str], Segment] = {}
+
+    @property
+    def ready(self) -> bool:
+        return self.snapshot() is not None
+
+    def snapshot(self) -> Optional[IndexSnapshot]:
+        """Current snapshot, reloaded when the manifest has been replaced"""
+        now = time.monotonic()
+        if now - self._checked < RELOAD_CHECK_SECONDS and self._snapshot is not None:
+            return self._snapshot
+        with self._lock:
+            self._checked = now
+            for _ in range(3):
+                try:
+                    stat = os.stat(os.path.join(self.path, MANIFEST))
+                    key = (stat.st_ino, stat.st_mtime_ns)
+                    if key != self._manifest_stat:
+                        self._snapshot = self._load(read_manifest(self.path))
+                        self._manifest_stat = key
+                    break
+                except FileNotFoundError:
+                    # no index yet, or a segment merged away between reading the manifest and opening it
+                    self._snapshot = None
+                    self._manifest_stat = None
+            return self._snapshot
+
+    def _load(self, manifest: Dict) -> IndexSnapshot:
+        opened, segments, lives = {}, [], []
+        for entry in manifest["segments"]:
+            key = (manifest["index_id"], entry["name"])
+            segment = self._segments.get(key) or Segment(os.path.join(self.path, entry["name"]))
+            opened[key] = segment
+            segments.append(segment)
+            lives.append(load_live(self.path, entry, len(segment)))
+        self._segments = opened
+        return IndexSnapshot(segments, lives, manifest["generation"])
+
+    def search(
+        self,
+        queries: Sequence[Sequence[str]],
+        k: int,
+        source: int,
+        unit_types: Optional[Sequence[str]] = None,
+        groups: Optional[Iterable[uuid.UUID]] = None
+    ) -> Optional[List[List[Tuple[uuid.UUID, uuid.UUID, float]]]]:
+        """
+        Per query, the top k (id, group, score) of one source, optionally
+        limited to unit types and groups; None when there is no index yet
+        """
+        snapshot = self.snapshot()
+        if snapshot is None:
+            return None
+        codes = [unit_type_code(u) for u in unit_types] if unit_types else None
+        wanted = uuid_bytes(groups) if groups is not None else None
+        masks: Dict[int, np.ndarray] = {}
+
+        def accept(segment: Segment) -> np.ndarray:
+            mask = masks.get(id(segment))
+            if mask is None:
+                mask = np.asarray(segment.doc_source) == source
+                if codes is not None:
+                    mask &= np.isin(segment.doc_unit_type, codes)
+                if wanted is not None:
+                    mask &= np.isin(segment.doc_groups, wanted)
+                masks[id(segment)] = mask
+            return mask
+
+        results = []
+        for terms in queries:
+            hits = snapshot.search(terms, k, accept)
+            results.append([
+                (
+                    to_uuid(snapshot.segments[i].doc_ids[n]),
+                    to_uuid(snapshot.segments[i].doc_groups[n]),
+                    score
+                )
+                for score, i, n in hits
+            ])
+        return results
+
+
+# -- writing (one writer per node) ------------------------------------------
+
+
+def read_manifest(path: str) -> Dict:
+    with open(os.path.join(path, MANIFEST)) as f:
+        return json.load(f)
+
+
+def load_live(path: str, entry: Dict, docs: int) -> np.ndarray:
+    if entry.get("live") is None:
+        return np.ones(docs, dtype=bool)
+    packed = np.load(os.path.join(path, entry["name"], entry["live"]))
+    return np.unpackbits(packed, count=docs).astype(bool)
+
+
+def empty_manifest() -> Dict:
+    # segment names restart in a rebuilt index; index_id tells readers not to reuse their maps
+    return {
+        "index_id": uuid.uuid4().hex, "generation": 0, "next_segment": 1,
+        "segments": [], "watermarks": {}, "recent": {}
+    }
+
+
+class IndexWriter:
+    """Applies changes as new segments, deletion bitmaps and merges, one manifest per commit"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        try:
+            self.manifest = read_manifest(path)
+        except FileNotFoundError:
+            self.manifest = empty_manifest()
+        self._obsolete: List[str] = []
+        self._open: Dict[str, Segment] = {}
+
+    def _segment(self, name: str) -> Segment:
+        segment = self._open.get(name)
+        if segment is None:
+            segment = self._open[name] = Segment(os.path.join(self.path, name))
+        return segment
+
+    def _segment_name(self) -> str:
+        name = f"seg_{self.manifest['next_segment']:06d}"
+        self.manifest["next_segment"] += 1
+        return name
+
+    def add(self, docs: Sequence[IndexedDoc]) -> Optional[str]:
+        """Write docs as a segment; it becomes visible on commit"""
+        if not docs:
+            return None
+        name = self._segment_name()
+        meta = write_segment(os.path.join(self.path, name), docs)
+        self.manifest["segments"].append({"name": name, "docs": meta["docs"], "deleted": 0, "live": None})
+        return name
+
+    def delete_groups(self, groups: Iterable[uuid.UUID]) -> int:
+        """Mark every document of these groups deleted in the current segments"""
+        wanted = uuid_bytes(dict.fromkeys(groups))
+        if not len(wanted):
+            return 0
+        deleted = 0
+        generation = self.manifest["generation"] + 1
+        for entry in self.manifest["segments"]:
+            segment = self._segment(entry["name"])
+            live = load_live(self.path, entry, len(segment))
+            hit = live & np.isin(segment.doc_groups, wanted)
+            if not hit.any():
+                continue
+            live &= ~hit
+            deleted += int(hit.sum())
+            live_name = f"live_{generation:06d}.npy"
+            np.save(os.path.join(self.path, entry["name"], live_name), np.packbits(live))
+            if entry["live"] is not None:
+                self._obsolete.append(os.path.join(entry["name"], entry["live"]))
+            entry["live"] = live_name
+            entry["deleted"] = len(segment) - int(live.sum())
+        return deleted
+
+    def merge(self, max_segments: int) -> int:
+        """Merge the smallest segments (by live documents) until at most max_segments remain"""
+        segments = self.manifest["segments"]
+        # fully deleted segments just go
+        for entry in [e for e in segments if e["docs"] == e["deleted"]]:
+            segments.remove(entry)
+            self._obsolete.append(entry["name"])
+        if len(segments) <= max_segments:
+            return 0
+        victims = sorted(segments, key=lambda e: e["docs"] - e["deleted"])[:len(segments) - max_segments + 1]
+        # keep insertion order among the merged segments
+        victims.sort(key=segments.index)
+        opened = [self._segment(e["name"]) for e in victims]
+        lives = [load_live(self.path, e, len(s)) for e, s in zip(victims, opened)]
+        name = self._segment_name()
+        meta = merge_segments(os.path.join(self.path, name), opened, lives)
+        position = segments.index(victims[0])
+        for entry in victims:
+            segments.remove(entry)
+            self._obsolete.append(entry["name"])
+        segments.insert(position, {"name": name, "docs": meta["docs"], "deleted": 0, "live": None})
+        return len(victims)
+
+    def commit(self):
+        """Publish the manifest, then remove files no snapshot will open again"""
+        self.manifest["generation"] += 1
+        tmp = os.path.join(self.path, MANIFEST + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(self.path, MANIFEST))
+        # Readers that mapped these keep their mappings; new readers never see them
+        for name in self._obsolete:
+            self._open.pop(name, None)
+            target = os.path.join(self.path, name)
+            if os.path.isdir(target):
+                shutil.rmtree(target, ignore_errors=True)
+            elif os.path.exists(target):
+                os.remove(target)
+        self._obsolete = []
+
+
+def _unit_docs(db: Session, document_ids: Sequence[uuid.UUID]) -> List[IndexedDoc]:
+    if not document_ids:
+        return []
+    rows = db.query(
+        LegalUnit.id, LegalUnit.document_id, LegalUnit.unit_type,
+        LegalUnit.heading_normalized, LegalUnit.text_plain_normalized
+    ).filter(LegalUnit.document_id.in_(document_ids)).order_by(LegalUnit.document_id, LegalUnit.order_index)
+    return [
+        IndexedDoc(row.id, row.document_id, SOURCE_UNIT, unit_type_code(row.unit_type),
+                   key_terms(f"{row.heading_normalized or ''} {row.text_plain_normalized or ''}"))
+        for row in rows
+    ]
+
+
+def _changed(db: Session, model, since: Optional[datetime], after, batch_size: int):
+    """Rows of model updated at or after `since`, keyset-paginated on (updated_at, id)"""
+    servable = servable_document() if model is OfficialDocument else servable_qa()
+    columns = [model.id, model.updated_at, servable.label("servable")]
+    if model is QAEntry:
+        columns += [QAEntry.question_normalized, QAEntry.answer_normalized]
+    query = db.query(*columns)
+    if since is not None:
+        query = query.filter(model.updated_at >= since)
+    if after is not None:
+        query = query.filter(tuple_(model.updated_at, model.id) > after)
+    return query.order_by(model.updated_at, model.id).limit(batch_size).all()
+
+
+def _update_kind(db: Session, writer: IndexWriter, kind: str, overlap_seconds: int, batch_size: int) -> Dict[str, int]:
+    model = OfficialDocument if kind == "documents" else QAEntry
+    state = writer.manifest
+    watermark = state["watermarks"].get(kind)
+    watermark = datetime.fromisoformat(watermark) if watermark else None
+    # id -> updated_at of rows indexed inside the overlap window
+    recent: Dict[str, str] = state["recent"].get(kind, {})
+    since = watermark - timedelta(seconds=overlap_seconds) if watermark else None
+    counts = {"changed": 0, "indexed": 0, "deleted": 0}
+    after = None
+    while True:
+        rows = _changed(db, model, since, after, batch_size)
+        if not rows:
+            return counts
+        after = (rows[-1].updated_at, rows[-1].id)
+        rows = [row for row in rows if recent.get(str(row.id)) != row.updated_at.isoformat()]
+        if rows:
+            counts["changed"] += len(rows)
+            if since is not None:
+                # on the first run of a kind nothing of it is indexed yet
+                counts["deleted"] += writer.delete_groups(row.id for row in rows)
+            if kind == "documents":
+                docs = _unit_docs(db, [row.id for row in rows if row.servable])
+            else:
+                docs = [
+                    IndexedDoc(row.id, row.id, SOURCE_QA, 0,
+                               key_terms(f"{row.question_normalized or ''} {row.answer_normalized or ''}"))
+                    for row in rows if row.servable
+                ]
+            writer.add(docs)
+            counts["indexed"] += len(docs)
+            for row in rows:
+                recent[str(row.id)] = row.updated_at.isoformat()
+        watermark = max(watermark, after[0]) if watermark else after[0]
+        horizon = watermark - timedelta(seconds=overlap_seconds)
+        state["watermarks"][kind] = watermark.isoformat()
+        state["recent"][kind] = recent = {
+            key: at for key, at in recent.items() if datetime.fromisoformat(at) >= horizon
+        }
+        writer.commit()
+
+
+def update_index(
+    db: Session,
+    path: Optional[str] = None,
+    overlap_seconds: Optional[int] = None,
+    batch_size: int = 20000,
+    max_segments: Optional[int] = None
+) -> Dict:
+    """Index what changed since the last run, then merge; a missing index is built from scratch"""
+    writer = IndexWriter(path or settings.BM25_INDEX_DIR)
+    overlap = settings.BM25_REFRESH_OVERLAP_SECONDS if overlap_seconds is None else overlap_seconds
+    counts = {kind: _update_kind(db, writer, kind, overlap, batch_size) for kind in ("documents", "qa_entries")}
+    merged = writer.merge(settings.BM25_MAX_SEGMENTS if max_segments is None else max_segments)
+    writer.commit()
+    counts["merged_segments"] = merged
+    counts["segments"] = len(writer.manifest["segments"])
+    return counts
+
+
+@contextmanager
+def lock_index(path: str, wait: bool = False):
+    """
+    Exclusive lock on the node's index directory, held by its one writer;
+    yields False when another process holds it and `wait` is not set
+    """
+    lock_path = path.rstrip("/") + ".lock"
+    os.makedirs(os.path.dirname(os.path.abspath(lock_path)), exist_ok=True)
+    with open(lock_path, "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def rebuild_index(path: Optional[str] = None, batch_size: int = 20000) -> Dict:
+    """Build a fresh index next to the current one and swap it in"""
+    path = path or settings.BM25_INDEX_DIR
+    with lock_index(path, wait=True):
+        return _rebuild(path, batch_size)
+
+
+def _rebuild(path: str, batch_size: int) -> Dict:
+    staging = path.rstrip("/") + ".rebuild"
+    shutil.rmtree(staging, ignore_errors=True)
+    db = SessionLocal()
+    try:
+        counts = update_index(db, staging, overlap_seconds=0, batch_size=batch_size)
+    finally:
+        db.close()
+    retired = path.rstrip("/") + ".old"
+    shutil.rmtree(retired, ignore_errors=True)
+    if os.path.exists(path):
+        os.rename(path, retired)
+    os.rename(staging, path)
+    shutil.rmtree(retired, ignore_errors=True)
+    return counts
+
+
+def bm25_index_job(path: Optional[str] = None) -> Optional[Dict]:
+    """Update this node's index, unless another worker of the node is already at it"""
+    path = path or settings.BM25_INDEX_DIR
+    with lock_index(path) as locked:
+        if not locked:
+            return None
+        db = SessionLocal()
+        try:
+            counts = update_index(db, path)
+            logger.info(f"BM25 index updated: {counts}")
+            return counts
+        finally:
+            db.close()
+
+
+async def run_index_loop(interval: int):
+    """Keep this node's index fresh until the app shuts down"""
+    while True:
+        try:
+            await run_in_threadpool(bm25_index_job)
+        except Exception as e:
+            logger.error(f"BM25 index update failed: {e}")
+        await asyncio.sleep(interval)
+
+
+bm25_index = Bm25Index(settings.BM25_INDEX_DIR)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Maintain the BM25 index")
+    parser.add_argument("command", choices=["update", "rebuild"])
+    parser.add_argument("--batch-size", type=int, default=20000)
+    args = parser.parse_args()
+    if args.command == "rebuild":
+        print(rebuild_index(batch_size=args.batch_size))
+    else:
+        with lock_index(settings.BM25_INDEX_DIR, wait=True):
+            session = SessionLocal()
+            try:
+                print(update_index(session, batch_size=args.batch_size))
+            finally:
+                session.close()
@@ -0,0 +1,355 @@
+"""
+In-process, column-oriented catalog of `OfficialDocument` metadata.
+
+Each filterable attribute is a NumPy column: enums and free-text facets are
+dictionary-encoded to small integer codes, dates are int32 days since the
+epoch. A filter is evaluated as vectorized comparisons that AND into one
+boolean mask, so combined filters over millions of documents take
+microseconds to low milliseconds without touching Postgres.
+
+The catalog is loaded once at startup and refreshed incrementally by
+re-reading rows whose `updated_at` is past the last seen watermark.
+"""
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from app.core.settings import settings
+from app.db.base import SessionLocal
+from app.models.official import OfficialDocument
+import asyncio
+import logging
+import sys
+import threading
+import uuid
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EPOCH = date(1970, 1, 1)
+NULL_DATE = np.iinfo(np.int32).min
+NULL_CODE = -1
+PENDING_LIMIT = 65536
+
+DOC_TYPES = ("law", "regulation", "circular", "guideline")
+STATUSES = ("draft", "in_review", "approved", "published")
+
+_COLUMNS = (
+    ("doc_type", np.int8),
+    ("status", np.int8),
+    ("jurisdiction", np.int32),
+    ("authority", np.int32),
+    ("effective_date", np.int32),
+    ("amended_date", np.int32),
+)
+
+
+def date_to_days(value: Optional[date]) -> int:
+    if value is None:
+        return NULL_DATE
+    if isinstance(value, datetime):
+        value = value.date()
+    return (value - EPOCH).days
+
+
+def days_to_date(days: int) -> Optional[date]:
+    if days == NULL_DATE:
+        return None
+    return EPOCH + timedelta(days=int(days))
+
+
+def _to_key(doc_id) -> bytes:
+    """
+    An id as the "S16" catalog stores it: NumPy drops trailing NUL bytes, so
+    they are dropped here too, or keys read back from the arrays would never
+    equal the ones looked up
+    """
+    return (doc_id if isinstance(doc_id, uuid.UUID) else uuid.UUID(str(doc_id))).bytes.rstrip(b"\0")
+
+
+def _to_uuid(key) -> uuid.UUID:
+    # NumPy drops trailing NUL bytes from fixed-width bytes values
+    return uuid.UUID(bytes=bytes(key).ljust(16, b"\0"))
+
+
+class _Dictionary:
+    """Value <-> integer code mapping for a dictionary-encoded column"""
+
+    def __init__(self, values: Sequence[str] = ()):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+        for value in values:
+            self.encode(value)
+
+    def encode(self, value: Optional[str]) -> int:
+        if value is None:
+            return NULL_CODE
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.codes[value] = code
+        return code
+
+    def lookup(self, values: Iterable[str]) -> List[int]:
+        """Codes for known values; unknown values have no code and match nothing"""
+        return [self.codes[v] for v in values if v in self.codes]
+
+    def decode(self, code: int) -> Optional[str]:
+        return None if code == NULL_CODE else self.values[code]
+
+
+class DocumentCatalog:
+    def __init__(self, initial_capacity: int = 1024):
+        self._lock = threading.RLock()
+        self._size = 0
+        self._capacity = initial_capacity
+        self.ids = np.zeros(initial_capacity, dtype="S16")
+        self.alive = np.zeros(initial_capacity, dtype=bool)
+        self.columns: Dict[str, np.ndarray] = {
+            name: np.zeros(initial_capacity, dtype=dtype) for name, dtype in _COLUMNS
+        }
+        self.dictionaries = {
+            "doc_type": _Dictionary(DOC_TYPES),
+            "status": _Dictionary(STATUSES),
+            "jurisdiction": _Dictionary(),
+            "authority": _Dictionary(),
+        }
+        # id -> row index: a sorted key array plus a small dict of rows added
+        # since the last re-sort, far more compact than one dict per document
+        self._sorted_keys = np.zeros(0, dtype="S16")
+        self._sorted_rows = np.zeros(0, dtype=np.int32)
+        self._pending: Dict[bytes, int] = {}
+        self.watermark: Optional[datetime] = None
+        self.loaded = False
+
+    def __len__(self):
+        return int(self.alive[:self._size].sum())
+
+    # -- maintenance -------------------------------------------------------
+
+    def _grow(self, needed: int):
+        capacity = self._capacity
+        while capacity < needed:
+            capacity *= 2
+        if capacity == self._capacity:
+            return
+
+        def resized(array):
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[:self._size] = array[:self._size]
+            return grown
+
+        self.ids = resized(self.ids)
+        self.alive = resized(self.alive)
+        self.columns = {name: resized(array) for name, array in self.columns.items()}
+        self._capacity = capacity
+
+    def _find(self, key: bytes) -> Optional[int]:
+        row = self._pending.get(key)
+        if row is not None:
+            return row
+        i = int(np.searchsorted(self._sorted_keys, key))
+        if i < len(self._sorted_keys) and self._sorted_keys[i] == key:
+            return int(self._sorted_rows[i])
+        return None
+
+    def _reindex(self):
+        keys = self.ids[:self._size]
+        order = np.argsort(keys, kind="stable")
+        self._sorted_keys = keys[order]
+        self._sorted_rows = order.astype(np.int32)
+        self._pending = {}
+
+    def upsert(self, doc_id, doc_type, status, jurisdiction, authority, effective_date, amended_date):
+        key = _to_key(doc_id)
+        with self._lock:
+            row = self._find(key)
+            if row is None:
+                self._grow(self._size + 1)
+                row = self._size
+                self._size += 1
+                self.ids[row] = key
+                self._pending[key] = row
+                if len(self._pending) >= max(PENDING_LIMIT, self._size // 2):
+                    self._reindex()
+            self.alive[row] = True
+            self.columns["doc_type"][row] = self.dictionaries["doc_type"].encode(doc_type)
+            self.columns["status"][row] = self.dictionaries["status"].encode(status)
+            self.columns["jurisdiction"][row] = self.dictionaries["jurisdiction"].encode(jurisdiction)
+            self.columns["authority"][row] = self.dictionaries["authority"].encode(authority)
+            self.columns["effective_date"][row] = date_to_days(effective_date)
+            self.columns["amended_date"][row] = date_to_days(amended_date)
+
+    def remove(self, doc_id):
+        key = _to_key(doc_id)
+        with self._lock:
+            row = self._find(key)
+            if row is not None:
+                self.alive[row] = False
+
+    def _apply_rows(self, rows) -> int:
+        count = 0
+        for row in rows:
+            if row.deleted_at is not None:
+                self.remove(row.id)
+            else:
+                self.upsert(
+                    row.id, row.doc_type, row.status, row.jurisdiction,
+                    row.authority, row.effective_date, row.amended_date
+                )
+            if row.updated_at is not None and (self.watermark is None or row.updated_at > self.watermark):
+                self.watermark = row.updated_at
+            count += 1
+        return count
+
+    def _query(self, db: Session):
+        return db.query(
+            OfficialDocument.id,
+            OfficialDocument.doc_type,
+            OfficialDocument.status,
+            OfficialDocument.jurisdiction,
+            OfficialDocument.authority,
+            OfficialDocument.effective_date,
+            OfficialDocument.amended_date,
+            OfficialDocument.updated_at,
+            OfficialDocument.deleted_at
+        )
+
+    def load(self, db: Session, batch_size: int = 10000) -> int:
+        """Full load, streamed from a server-side cursor"""
+        count = self._apply_rows(self._query(db).yield_per(batch_size))
+        with self._lock:
+            self._reindex()
+        self.loaded = True
+        logger.info(f"Document catalog loaded: {count} documents")
+        return count
+
+    def refresh(self, db: Session, overlap_seconds: int = 300, batch_size: int = 10000) -> int:
+        """
+        Re-read documents updated since the watermark. The overlap window
+        covers rows from transactions that committed after later-stamped
+        ones; re-applying a row is idempotent.
+        """
+        if not self.loaded:
+            return self.load(db, batch_size)
+        query = self._query(db)
+        if self.watermark is not None:
+            query = query.filter(OfficialDocument.updated_at >= self.watermark - timedelta(seconds=overlap_seconds))
+        return self._apply_rows(query.yield_per(batch_size))
+
+    # -- queries -----------------------------------------------------------
+
+    def _enum_mask(self, name: str, values: Optional[Iterable[str]], n: int):
+        codes = self.dictionaries[name].lookup(values)
+        column = self.columns[name][:n]
+        if len(codes) > 8:
+            return np.isin(column, codes)
+        mask = np.zeros(n, dtype=bool)
+        for code in codes:
+            mask |= column == code
+        return mask
+
+    def _date_mask(self, name: str, start: Optional[date], end: Optional[date], n: int):
+        column = self.columns[name][:n]
+        mask = column != NULL_DATE
+        if start is not None:
+            mask &= column >= date_to_days(start)
+        if end is not None:
+            mask &= column <= date_to_days(end)
+        return mask
+
+    def filter_mask(
+        self,
+        doc_type: Optional[Sequence[str]] = None,
+        status: Optional[Sequence[str]] = None,
+        jurisdiction: Optional[Sequence[str]] = None,
+        authority: Optional[Sequence[str]] = None,
+        effective_from: Optional[date] = None,
+        effective_to: Optional[date] = None,
+        amended_from: Optional[date] = None,
+        amended_to: Optional[date] = None
+    ) -> np.ndarray:
+        """Boolean mask over catalog rows matching every given filter"""
+        with self._lock:
+            n = self._size
+            mask = self.alive[:n].copy()
+            for name, values in (
+                ("doc_type", doc_type),
+                ("status", status),
+                ("jurisdiction", jurisdiction),
+                ("authority", authority),
+            ):
+                if values:
+                    mask &= self._enum_mask(name, values, n)
+            if effective_from is not None or effective_to is not None:
+                mask &= self._date_mask("effective_date", effective_from, effective_to, n)
+            if amended_from is not None or amended_to is not None:
+                mask &= self._date_mask("amended_date", amended_from, amended_to, n)
+            return mask
+
+    def rows(self, mask: np.ndarray, offset: int = 0, limit: int = 100) -> List[dict]:
+        """Decode the matching rows in [offset, offset + limit)"""
+        positions = np.flatnonzero(mask)[offset:offset + limit]
+        items = []
+        with self._lock:
+            for row in positions:
+                items.append({
+                    "id": str(_to_uuid(self.ids[row])),
+                    "doc_type": self.dictionaries["doc_type"].decode(self.columns["doc_type"][row]),
+                    "status": self.dictionaries["status"].decode(self.columns["status"][row]),
+                    "jurisdiction": self.dictionaries["jurisdiction"].decode(self.columns["jurisdiction"][row]),
+                    "authority": self.dictionaries["authority"].decode(self.columns["authority"][row]),
+                    "effective_date": days_to_date(self.columns["effective_date"][row]),
+                    "amended_date": days_to_date(self.columns["amended_date"][row]),
+                })
+        return items
+
+    def ids_for(self, mask: np.ndarray) -> List[uuid.UUID]:
+        with self._lock:
+            return [_to_uuid(key) for key in self.ids[:len(mask)][mask]]
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Approximate bytes held, in total and extrapolated per million documents"""
+        with self._lock:
+            n = max(self._size, 1)
+            column_bytes = sum(array.itemsize for array in self.columns.values()) + self.ids.itemsize + self.alive.itemsize
+            arrays = column_bytes * self._size
+            index = (
+                self._sorted_keys.nbytes + self._sorted_rows.nbytes
+                + sys.getsizeof(self._pending) + len(self._pending) * sys.getsizeof(b"\0" * 16)
+            )
+            dictionaries = sum(
+                sys.getsizeof(v) for d in self.dictionaries.values() for v in d.values
+            )
+            total = arrays + index + dictionaries
+            return {
+                "documents": self._size,
+                "array_bytes": arrays,
+                "index_bytes": index,
+                "dictionary_bytes": dictionaries,
+                "allocated_bytes": column_bytes * self._capacity + index + dictionaries,
+                "total_bytes": total,
+                "bytes_per_million_documents": int(total / n * 1_000_000),
+            }
+
+
+catalog = DocumentCatalog()
+
+
+def refresh_catalog() -> int:
+    db = SessionLocal()
+    try:
+        return catalog.refresh(db, overlap_seconds=settings.CATALOG_REFRESH_OVERLAP_SECONDS)
+    finally:
+        db.close()
+
+
+async def run_refresh_loop(interval: int):
+    """Load the catalog, then keep it fresh until the app shuts down"""
+    while True:
+        try:
+            await run_in_threadpool(refresh_catalog)
+        except Exception as e:
+            logger.error(f"Document catalog refresh failed: {e}")
+        await asyncio.sleep(interval)
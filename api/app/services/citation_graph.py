@@ -0,0 +1,423 @@
+"""
+Cross-reference graph between legal units.
+
+Unit texts cite other units: "موضوع ماده ۵ قانون کار", "تبصره ۲ ماده ۱۲ این
+قانون". sync_import calls `refresh_citations` for every document whose units
+it replaced or withdrew. The citations in those units' match keys
+(app.utils.citations.find_citations) are resolved in two statements,
+whatever the batch size: document titles by exact match, then every unit
+chain through app.services.citations.resolve_units. The results replace the
+documents' rows in unit_citations (migration 0013). A citation without a
+title word refers to its own document. One whose title matches no servable
+document yet is kept pending, with a NULL target_document_id and its title
+words in target_title. Rows that cite a refreshed document are resolved
+again against its new units, with a NULL target_unit_id while the cited
+unit is missing.
+
+sync_import then calls `resolve_pending` for the documents it imported:
+pending rows whose title words equal a new title, or start with it, are
+pointed at the document with the longest known title, so citing a law
+before it arrives costs nothing but the wait.
+
+Each worker holds the resolved edges between servable documents as CSR
+adjacency arrays, one per direction (`CitationGraph`). The arrays are
+rebuilt when the sync watermark or the newest edge id moves, checked at
+most every CITATION_GRAPH_REFRESH_SECONDS, and neighbourhoods are
+breadth-first walks over them that never touch the database.
+
+Documents imported before citations were extracted are picked up by
+
+    python -m app.services.citation_graph rebuild
+
+PostgreSQL only; snapshot bundles carry no citation graph.
+"""
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from sqlalchemy import and_, insert, or_, text, tuple_
+from sqlalchemy.orm import Session, aliased
+from app.core.settings import settings
+from app.db.base import SessionLocal
+from app.models.official import LegalUnit, OfficialDocument, UnitCitation
+from app.services.citations import resolve_units
+from app.services.serving import servable_document
+from app.utils.citations import Citation, Mention, find_citations, parse_citation
+from app.utils.postings import to_uuid, uuid_bytes
+import logging
+import threading
+import time
+import uuid
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# One document per title; the smallest id wins ties, as nothing else orders them
+_TITLES_SQL = text("""
+    SELECT DISTINCT ON (title_normalized) title_normalized AS key, id
+    FROM official_documents
+    WHERE title_normalized COLLATE "C" = ANY(CAST(:keys AS text[]))
+      AND status = 'published' AND deleted_at IS NULL
+    ORDER BY title_normalized, id
+""")
+
+_SIGNATURE_SQL = text("""
+    SELECT (SELECT max(last_imported_at) FROM sync_watermarks),
+           (SELECT max(id) FROM unit_citations)
+""")
+
+
+def resolve_exact_titles(db: Session, keys: Iterable[str]) -> Dict[str, uuid.UUID]:
+    """Title match key -> id of the servable document with exactly that title"""
+    keys = sorted(set(keys))
+    if not keys:
+        return {}
+    return {row.key: uuid.UUID(str(row.id)) for row in db.execute(_TITLES_SQL, {"keys": keys})}
+
+
+def cited_document(mention: Mention, document_id: uuid.UUID, titles: Dict[str, uuid.UUID]) -> Optional[uuid.UUID]:
+    """The document a mention cites: its longest known title, or the citing document"""
+    if not mention.title_words:
+        return document_id
+    for title in mention.titles():
+        if title in titles:
+            return titles[title]
+    return None
+
+
+def extract_citations(db: Session, units: Sequence) -> List[Dict]:
+    """
+    unit_citations rows for the citations in `units` (with document_id, id
+    and text_plain_normalized), resolved as far as the database allows
+    """
+    found = [(unit, find_citations(unit.text_plain_normalized)) for unit in units]
+    titles = resolve_exact_titles(db, (title for _, mentions in found for m in mentions for title in m.titles()))
+    rows = {}
+    for unit, mentions in found:
+        for mention in mentions:
+            target = cited_document(mention, unit.document_id, titles)
+            # no servable document has the title yet: pending, see resolve_pending
+            title = " ".join(mention.title_words) if target is None else None
+            # a citation repeated within a unit is one edge
+            rows.setdefault((unit.id, target, title, mention.text), {
+                "source_document_id": unit.document_id,
+                "source_unit_id": unit.id,
+                "target_document_id": target,
+                "target_unit_id": None,
+                "citation": mention.text,
+                "target_title": title,
+                "units": mention.units,
+            })
+    return list(rows.values())
+
+
+def refresh_citations(db: Session, document_ids: Iterable) -> int:
+    """
+    Replace the citations made by these documents' units and re-resolve the
+    citations made of them; returns the rows now recorded for the documents
+    """
+    ids = list(dict.fromkeys(document_ids))
+    if not ids:
+        return 0
+    units = db.query(LegalUnit.document_id, LegalUnit.id, LegalUnit.text_plain_normalized).filter(
+        LegalUnit.document_id.in_(ids), LegalUnit.text_plain_normalized.isnot(None)
+    ).all()
+    rows = extract_citations(db, units)
+    incoming = db.query(UnitCitation.id, UnitCitation.target_document_id, UnitCitation.citation).filter(
+        UnitCitation.target_document_id.in_(ids), UnitCitation.source_document_id.notin_(ids)
+    ).all()
+
+    pending = [
+        (i, row["target_document_id"], Citation(row["citation"], row["units"]))
+        for i, row in enumerate(rows) if row["target_document_id"] is not None
+    ]
+    pending += [
+        (len(rows) + i, edge.target_document_id, parse_citation(edge.citation))
+        for i, edge in enumerate(incoming)
+    ]
+    resolved = {i: uuid.UUID(str(row["id"])) for i, row in resolve_units(db, pending).items()}
+
+    db.query(UnitCitation).filter(UnitCitation.source_document_id.in_(ids)).delete(synchronize_session=False)
+    values = []
+    for i, row in enumerate(rows):
+        target = resolved.get(i)
+        if target == row["source_unit_id"]:
+            continue
+        values.append({**{key: value for key, value in row.items() if key != "units"}, "target_unit_id": target})
+    if values:
+        db.execute(insert(UnitCitation), values)
+    if incoming:
+        db.bulk_update_mappings(UnitCitation, [
+            {"id": edge.id, "target_unit_id": resolved.get(len(rows) + i)} for i, edge in enumerate(incoming)
+        ])
+    return len(values)
+
+
+def resolve_pending(db: Session, document_ids: Iterable) -> int:
+    """
+    Resolve the pending citations whose title words equal or start with the
+    title of one of these documents; returns the rows resolved
+    """
+    ids = list(dict.fromkeys(document_ids))
+    if not ids:
+        return 0
+    titles = {row.title_normalized for row in db.query(OfficialDocument.title_normalized).filter(
+        OfficialDocument.id.in_(ids), OfficialDocument.title_normalized.isnot(None), servable_document()
+    )}
+    if not titles:
+        return 0
+    waiting = db.query(UnitCitation.id, UnitCitation.citation, UnitCitation.target_title).filter(
+        UnitCitation.target_document_id.is_(None),
+        or_(
+            UnitCitation.target_title.in_(titles),
+            *[UnitCitation.target_title.startswith(title + " ", autoescape=True) for title in titles]
+        )
+    ).all()
+    if not waiting:
+        return 0
+    # the longest known title wins, as at extraction, whichever document brought the row here
+    mentions = [Mention(edge.citation, [], edge.target_title.split()) for edge in waiting]
+    known = resolve_exact_titles(db, (title for mention in mentions for title in mention.titles()))
+    targets = [cited_document(mention, None, known) for mention in mentions]
+    resolved = resolve_units(db, [
+        (i, target, parse_citation(edge.citation)) for i, (edge, target) in enumerate(zip(waiting, targets))
+        if target is not None
+    ])
+    updates = [
+        {
+            "id": edge.id, "target_document_id": target, "target_title": None,
+            "target_unit_id": uuid.UUID(str(resolved[i]["id"])) if i in resolved else None,
+        }
+        for i, (edge, target) in enumerate(zip(waiting, targets)) if target is not None
+    ]
+    db.bulk_update_mappings(UnitCitation, updates)
+    return len(updates)
+
+
+def _csr(rows: np.ndarray, cols: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+    return indptr, cols[np.argsort(rows, kind="stable")].astype(np.int32)
+
+
+def _gather(adjacency: Tuple[np.ndarray, np.ndarray], nodes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(node, neighbour) for every edge leaving `nodes`, without a Python loop"""
+    indptr, indices = adjacency
+    starts = indptr[nodes]
+    counts = indptr[nodes + 1] - starts
+    total = int(counts.sum())
+    if not total:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32)
+    # positions starts[k] .. starts[k] + counts[k] for each node k
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+    return np.repeat(nodes, counts), indices[offsets]
+
+
+class CitationGraph:
+    """
+    Resolved citations as CSR adjacency arrays. Nodes are the units that
+    cite or are cited, sorted by id; `cited` holds each node's outgoing
+    edges and `citing` the same edges reversed.
+    """
+
+    def __init__(self, nodes: np.ndarray, documents: np.ndarray, sources: np.ndarray, targets: np.ndarray):
+        self.nodes = nodes  # S16 unit ids, sorted
+        self.documents = documents  # S16 document id of each node
+        self.cited = _csr(sources, targets, len(nodes))
+        self.citing = _csr(targets, sources, len(nodes))
+        self.edges = len(sources)
+
+    @classmethod
+    def from_edges(cls, source_documents, sources, target_documents, targets) -> "CitationGraph":
+        """Build from parallel S16 arrays of (source document, source unit, target document, target unit)"""
+        keys = np.concatenate([sources, targets])
+        nodes, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        documents = np.concatenate([source_documents, target_documents])[first]
+        m = len(sources)
+        pairs = np.unique(inverse[:m].astype(np.int64) * len(nodes) + inverse[m:])
+        return cls(nodes, documents, pairs // len(nodes), pairs % len(nodes)) if len(nodes) else cls.empty()
+
+    @classmethod
+    def empty(cls) -> "CitationGraph":
+        none = np.zeros(0, dtype="S16")
+        return cls(none, none, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def lookup(self, unit_ids: Iterable[uuid.UUID]) -> np.ndarray:
+        """Node numbers of the units that are in the graph"""
+        keys = uuid_bytes(unit_ids)
+        positions = np.searchsorted(self.nodes, keys)
+        found = positions < len(self.nodes)
+        found[found] = self.nodes[positions[found]] == keys[found]
+        return np.unique(positions[found])
+
+    def neighbourhood(
+        self,
+        unit_ids: Iterable[uuid.UUID],
+        hops: int = 1,
+        direction: str = "cited",
+        limit: int = 100
+    ) -> Dict:
+        """
+        Units within `hops` citations of any of `unit_ids`, nearest first, at
+        most `limit` of them, and the edges among them and the seeds
+        """
+        adjacencies = {"cited": [self.cited], "citing": [self.citing], "both": [self.cited, self.citing]}[direction]
+        seeds = self.lookup(unit_ids)
+        visited = seeds
+        found, distances = [], []
+        frontier = seeds
+        truncated = False
+        for hop in range(1, hops + 1):
+            if not len(frontier):
+                break
+            reached = np.unique(np.concatenate([_gather(a, frontier)[1] for a in adjacencies]))
+            reached = reached[~np.isin(reached, visited)]
+            room = limit - sum(len(f) for f in found)
+            if len(reached) > room:
+                reached, truncated = reached[:room], True
+            found.append(reached)
+            distances.append(np.full(len(reached), hop))
+            visited = np.union1d(visited, reached)
+            frontier = reached
+            if truncated:
+                break
+        nodes = np.concatenate(found) if found else np.zeros(0, dtype=np.int64)
+        hop_of = np.concatenate(distances) if distances else np.zeros(0, dtype=np.int64)
+        sources, targets = _gather(self.cited, visited)
+        inside = np.isin(targets, visited)
+        return {
+            "units": [
+                (to_uuid(self.nodes[n]), to_uuid(self.documents[n]), int(h)) for n, h in zip(nodes, hop_of)
+            ],
+            "edges": [
+                (to_uuid(self.nodes[s]), to_uuid(self.nodes[t])) for s, t in zip(sources[inside], targets[inside])
+            ],
+            "truncated": truncated,
+        }
+
+
+def load_graph(db: Session) -> CitationGraph:
+    """The resolved citations between servable documents"""
+    source, target = aliased(OfficialDocument), aliased(OfficialDocument)
+    query = db.query(
+        UnitCitation.source_document_id, UnitCitation.source_unit_id,
+        UnitCitation.target_document_id, UnitCitation.target_unit_id
+    ).join(
+        source, and_(source.id == UnitCitation.source_document_id, source.status == "published", source.deleted_at.is_(None))
+    ).join(
+        target, and_(target.id == UnitCitation.target_document_id, target.status == "published", target.deleted_at.is_(None))
+    ).filter(UnitCitation.target_unit_id.isnot(None))
+    rows = query.all()
+    if not rows:
+        return CitationGraph.empty()
+    return CitationGraph.from_edges(*(uuid_bytes(column) for column in zip(*rows)))
+
+
+class GraphCache:
+    """The worker's CitationGraph, rebuilt when the edges may have changed"""
+
+    def __init__(self):
+        self.graph: Optional[CitationGraph] = None
+        self._signature = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, db: Session) -> CitationGraph:
+        if self.graph is not None and time.monotonic() - self._checked < settings.CITATION_GRAPH_REFRESH_SECONDS:
+            return self.graph
+        with self._lock:
+            if self.graph is not None and time.monotonic() - self._checked < settings.CITATION_GRAPH_REFRESH_SECONDS:
+                return self.graph
+            # read before the edges, so a change during the load is seen next time
+            signature = tuple(db.execute(_SIGNATURE_SQL).one())
+            if self.graph is None or signature != self._signature:
+                started = time.perf_counter()
+                self.graph = load_graph(db)
+                self._signature = signature
+                logger.info(
+                    f"Citation graph loaded: {len(self.graph)} units, {self.graph.edges} edges "
+                    f"in {time.perf_counter() - started:.2f}s"
+                )
+            self._checked = time.monotonic()
+            return self.graph
+
+
+citation_graph = GraphCache()
+
+
+def unit_details(db: Session, units: Sequence[Tuple[uuid.UUID, uuid.UUID, int]]) -> List[Dict]:
+    """
+    Rows for (unit id, document id, hop) triples, in order; a unit of a
+    document that stopped being servable since the graph was loaded is left out
+    """
+    if not units:
+        return []
+    rows = db.query(
+        LegalUnit.id, LegalUnit.document_id, OfficialDocument.title, LegalUnit.unit_type,
+        LegalUnit.num_label, LegalUnit.heading, LegalUnit.text_plain, LegalUnit.order_index
+    ).join(OfficialDocument, OfficialDocument.id == LegalUnit.document_id).filter(
+        tuple_(LegalUnit.document_id, LegalUnit.id).in_([(d, u) for u, d, _ in units]),
+        servable_document()
+    ).all()
+    by_id = {row.id: row for row in rows}
+    return [
+        {
+            "id": str(unit_id),
+            "document_id": str(row.document_id),
+            "document_title": row.title,
+            "unit_type": row.unit_type,
+            "num_label": row.num_label,
+            "heading": row.heading,
+            "text_plain": row.text_plain,
+            "order_index": row.order_index,
+            "hop": hop,
+        }
+        for unit_id, _, hop in units
+        if (row := by_id.get(unit_id)) is not None
+    ]
+
+
+def neighbourhood(db: Session, unit_ids: Sequence[uuid.UUID], hops: int, direction: str, limit: int) -> Dict:
+    """The units around `unit_ids` with their text, and the citations among them"""
+    found = citation_graph.get(db).neighbourhood(unit_ids, hops, direction, limit)
+    units = unit_details(db, found["units"])
+    return {
+        "units": units,
+        "edges": [{"source": str(s), "target": str(t)} for s, t in found["edges"]],
+        "truncated": found["truncated"],
+    }
+
+
+def rebuild(batch_size: int = 200) -> int:
+    """Re-extract the citations of every servable document, a batch of documents per transaction"""
+    last = None
+    total = 0
+    while True:
+        db = SessionLocal()
+        try:
+            query = db.query(OfficialDocument.id).filter(servable_document())
+            if last is not None:
+                query = query.filter(OfficialDocument.id > last)
+            ids = [row.id for row in query.order_by(OfficialDocument.id).limit(batch_size)]
+            if not ids:
+                return total
+            total += refresh_citations(db, ids)
+            db.commit()
+            last = ids[-1]
+            logger.info(f"Citations rebuilt up to document {last}: {total} rows")
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Maintain the citation graph")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args()
+    print(rebuild(batch_size=args.batch_size))
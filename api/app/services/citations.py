@@ -0,0 +1,254 @@
+"""
+Citation resolution: "تبصره ۲ ماده ۱۲ قانون کار" -> legal unit.
+
+A batch resolves in at most two statements, however many citations it has:
+one for document titles and one recursive walk down each citation's unit
+chain. Every step of the walk is a lookup on idx_legal_units_label
+(document_id, label_type, label_ordinal, label_repeat) bounded to the order
+range of the enclosing unit, which runs from that unit to the next unit of
+the same type. On an edge node's snapshot bundle, titles still resolve in
+one statement, and each citation's chain is walked one lookup per level on
+the bundle's copy of that index.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.db.bundle import is_bundle
+from app.services.serving import DOCUMENT_SERVABLE
+from app.utils.citations import Citation, parse_citation
+import json
+import uuid
+
+MAX_ORDER = 2147483647
+
+# Lexicographically first title equal to the key, else starting with "key "
+_TITLES_SQL = text("""
+    SELECT k.key, d.id, d.title
+    FROM unnest(CAST(:keys AS text[])) AS k(key)
+    CROSS JOIN LATERAL (
+        SELECT id, title FROM (
+            (SELECT id, title, 0 AS rank FROM official_documents
+             WHERE title_normalized COLLATE "C" = k.key AND status = 'published' AND deleted_at IS NULL
+             LIMIT 1)
+            UNION ALL
+            (SELECT id, title, 1 AS rank FROM official_documents
+             WHERE title_normalized COLLATE "C" > k.key || ' '
+               AND title_normalized COLLATE "C" < k.key || ' ' || chr(1114111)
+               AND status = 'published' AND deleted_at IS NULL
+             ORDER BY title_normalized COLLATE "C"
+             LIMIT 1)
+        ) m
+        ORDER BY rank
+        LIMIT 1
+    ) d
+""")
+
+# One row per (citation, level); level 0 is the outermost unit
+_UNITS_SQL = text(f"""
+    WITH RECURSIVE steps AS (
+        SELECT * FROM unnest(
+            CAST(:idx AS int[]), CAST(:lvl AS int[]), CAST(:doc AS uuid[]),
+            CAST(:typ AS text[]), CAST(:ord AS int[]), CAST(:rep AS int[])
+        ) AS s(idx, lvl, document_id, label_type, label_ordinal, label_repeat)
+    ),
+    walk AS (
+        SELECT idx, -1 AS lvl, NULL::uuid AS unit_id, -1 AS lo, {MAX_ORDER} AS hi
+        FROM steps WHERE lvl = 0
+        UNION ALL
+        SELECT s.idx, s.lvl, m.unit_id, m.lo, m.hi
+        FROM walk w
+        JOIN steps s ON s.idx = w.idx AND s.lvl = w.lvl + 1
+        CROSS JOIN LATERAL (
+            SELECT u.id AS unit_id, u.order_index AS lo,
+                   coalesce((
+                       SELECT min(n.order_index) FROM legal_units n
+                       WHERE n.document_id = s.document_id AND n.label_type = s.label_type
+                         AND n.order_index > u.order_index AND n.order_index < w.hi
+                   ), w.hi) AS hi
+            FROM legal_units u
+            WHERE u.document_id = s.document_id
+              AND u.label_type = s.label_type
+              AND u.label_ordinal = s.label_ordinal
+              AND u.label_repeat = s.label_repeat
+              AND u.order_index > w.lo AND u.order_index < w.hi
+            ORDER BY u.order_index
+            LIMIT 1
+        ) m
+    )
+    SELECT w.idx, u.id, u.document_id, d.title AS document_title, u.unit_type,
+           u.num_label, u.heading, u.text_plain, u.order_index
+    FROM walk w
+    JOIN (SELECT idx, max(lvl) AS lvl FROM steps GROUP BY idx) t ON t.idx = w.idx AND t.lvl = w.lvl
+    JOIN steps s ON s.idx = w.idx AND s.lvl = w.lvl
+    JOIN legal_units u ON u.document_id = s.document_id AND u.id = w.unit_id
+    JOIN official_documents d ON d.id = u.document_id AND {DOCUMENT_SERVABLE}
+""")
+
+
+# Snapshot bundles: SQLite compares text by code point, as COLLATE "C" does
+_BUNDLE_TITLES_SQL = text("""
+    SELECT k.value AS key, d.id, d.title
+    FROM json_each(:keys) k
+    JOIN official_documents d ON d.id = coalesce(
+        (SELECT id FROM official_documents
+         WHERE title_normalized = k.value AND status = 'published' AND deleted_at IS NULL
+         LIMIT 1),
+        (SELECT id FROM official_documents
+         WHERE title_normalized > k.value || ' '
+           AND title_normalized < k.value || ' ' || char(1114111)
+           AND status = 'published' AND deleted_at IS NULL
+         ORDER BY title_normalized
+         LIMIT 1)
+    )
+""")
+
+# One level of the walk: the first matching unit in (lo, hi), and where its range ends
+_BUNDLE_STEP_SQL = text("""
+    SELECT u.id, u.order_index AS lo,
+           coalesce((
+               SELECT min(n.order_index) FROM legal_units n
+               WHERE n.document_id = u.document_id AND n.label_type = u.label_type
+                 AND n.order_index > u.order_index AND n.order_index < :hi
+           ), :hi) AS hi
+    FROM legal_units u
+    WHERE u.document_id = :doc
+      AND u.label_type = :typ
+      AND u.label_ordinal = :ord
+      AND u.label_repeat = :rep
+      AND u.order_index > :lo AND u.order_index < :hi
+    ORDER BY u.order_index
+    LIMIT 1
+""")
+
+_BUNDLE_UNIT_SQL = text(f"""
+    SELECT u.id, u.document_id, d.title AS document_title, u.unit_type,
+           u.num_label, u.heading, u.text_plain, u.order_index
+    FROM legal_units u
+    JOIN official_documents d ON d.id = u.document_id AND {DOCUMENT_SERVABLE}
+    WHERE u.document_id = :doc AND u.id = :id
+""")
+
+
+def resolve_titles(db: Session, keys: Sequence[str]) -> Dict[str, Tuple[uuid.UUID, str]]:
+    """Title match key -> (document id, title) for the keys that match a document"""
+    if not keys:
+        return {}
+    if is_bundle(db):
+        rows = db.execute(_BUNDLE_TITLES_SQL, {"keys": json.dumps(list(keys))}).all()
+        return {row.key: (uuid.UUID(row.id), row.title) for row in rows}
+    rows = db.execute(_TITLES_SQL, {"keys": list(keys)}).all()
+    return {row.key: (row.id, row.title) for row in rows}
+
+
+def unit_steps(citations: Sequence[Tuple[int, uuid.UUID, Citation]]) -> Dict[str, List]:
+    """
+    Flatten (index, document id, citation) into the parallel arrays of
+    _UNITS_SQL, outermost unit first
+    """
+    steps = {"idx": [], "lvl": [], "doc": [], "typ": [], "ord": [], "rep": []}
+    for idx, document_id, citation in citations:
+        for level, label in enumerate(reversed(citation.units)):
+            steps["idx"].append(idx)
+            steps["lvl"].append(level)
+            steps["doc"].append(str(document_id))
+            steps["typ"].append(label.unit_type)
+            steps["ord"].append(label.ordinal)
+            steps["rep"].append(label.repeat)
+    return steps
+
+
+def resolve_units(db: Session, citations: Sequence[Tuple[int, uuid.UUID, Citation]]) -> Dict[int, Dict]:
+    """Citation index -> unit row for the citations whose whole chain resolves"""
+    if not citations:
+        return {}
+    if is_bundle(db):
+        return _resolve_units_bundle(db, citations)
+    rows = db.execute(_UNITS_SQL, unit_steps(citations)).mappings().all()
+    return {row["idx"]: dict(row) for row in rows}
+
+
+def _resolve_units_bundle(db: Session, citations: Sequence[Tuple[int, uuid.UUID, Citation]]) -> Dict[int, Dict]:
+    resolved = {}
+    for idx, document_id, citation in citations:
+        doc = uuid.UUID(str(document_id)).hex
+        step = {"id": None, "lo": -1, "hi": MAX_ORDER}
+        for label in reversed(citation.units):
+            step = db.execute(_BUNDLE_STEP_SQL, {
+                "doc": doc, "typ": label.unit_type, "ord": label.ordinal, "rep": label.repeat,
+                "lo": step["lo"], "hi": step["hi"],
+            }).mappings().first()
+            if step is None:
+                break
+        if step is None:
+            continue
+        row = db.execute(_BUNDLE_UNIT_SQL, {"doc": doc, "id": step["id"]}).mappings().first()
+        if row is not None:
+            resolved[idx] = {**row, "idx": idx, "id": uuid.UUID(row["id"]), "document_id": uuid.UUID(row["document_id"])}
+    return resolved
+
+
+def _unit_dict(row: Dict) -> Dict:
+    return {
+        "id": str(row["id"]),
+        "unit_type": row["unit_type"],
+        "num_label": row["num_label"],
+        "heading": row["heading"],
+        "text_plain": row["text_plain"],
+        "order_index": row["order_index"],
+    }
+
+
+def _parsed_dict(citation: Citation) -> Dict:
+    return {
+        "units": [
+            {"unit_type": label.unit_type, "ordinal": label.ordinal, "repeat": label.repeat}
+            for label in citation.units
+        ],
+        "document_title": citation.document_title,
+    }
+
+
+def resolve_citations(db: Session, items: Sequence[Tuple[str, Optional[uuid.UUID]]]) -> List[Dict]:
+    """
+    Resolve (citation text, document id or None) pairs, in order.
+
+    `status` is "resolved", "unparsed" (no unit label found), "document_required"
+    (no title in the text and no document id), "document_not_found" or
+    "unit_not_found".
+    """
+    parsed = [parse_citation(q) for q, _ in items]
+    titles = resolve_titles(db, sorted({
+        c.document_title for c, (_, document_id) in zip(parsed, items)
+        if c.parsed and document_id is None and c.document_title
+    }))
+
+    results = []
+    pending = []
+    for idx, (citation, (q, document_id)) in enumerate(zip(parsed, items)):
+        result = {"citation": q, "status": None, "parsed": _parsed_dict(citation), "document": None, "unit": None}
+        results.append(result)
+        if not citation.parsed:
+            result["status"] = "unparsed"
+            continue
+        if document_id is None:
+            if not citation.document_title:
+                result["status"] = "document_required"
+                continue
+            if citation.document_title not in titles:
+                result["status"] = "document_not_found"
+                continue
+            document_id, title = titles[citation.document_title]
+            result["document"] = {"id": str(document_id), "title": title}
+        pending.append((idx, document_id, citation))
+
+    units = resolve_units(db, pending)
+    for idx, _, _ in pending:
+        result = results[idx]
+        row = units.get(idx)
+        if row is None:
+            result["status"] = "unit_not_found"
+            continue
+        result["status"] = "resolved"
+        result["document"] = {"id": str(row["document_id"]), "title": row["document_title"]}
+        result["unit"] = _unit_dict(row)
+    return results
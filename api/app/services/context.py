@@ -0,0 +1,229 @@
+"""
+Evidence packs for generation: retrieval hits expanded to their surrounding
+units and packed into a token budget.
+
+One statement expands every unit hit to the units within `window` positions
+of it by order_index, plus its enclosing article; hits outside the serving
+layer (app.services.serving) are ignored. Overlapping windows are
+deduplicated there, and each unit keeps the best score of the hits that
+reached it. `pack_passages` then merges each document's consecutive units
+into passages and fills the budget greedily by score. A passage that does
+not fit whole is trimmed, keeping the hit itself and then the units nearest
+to it. Token counts are estimated from characters (CONTEXT_CHARS_PER_TOKEN).
+An edge node's snapshot bundle holds only servable units, and expands hits
+with an equivalent SQLite statement.
+"""
+from typing import Dict, List, Sequence
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.core.settings import settings
+from app.db.bundle import is_bundle
+from app.models.official import OfficialDocument
+from app.models.qa import QAEntry
+from app.services.serving import servable_qa
+import json
+import math
+import uuid
+
+_EXPAND_SQL = text("""
+    WITH hits AS (
+        SELECT * FROM unnest(CAST(:doc AS uuid[]), CAST(:id AS uuid[]), CAST(:score AS float8[]))
+            AS h(document_id, id, score)
+    )
+    SELECT u.document_id, u.id, u.unit_type::text AS unit_type, u.num_label, u.heading,
+           u.text_plain, u.order_index, max(h.score) AS score, bool_or(u.id = h.id) AS is_hit
+    FROM hits h
+    JOIN serving_units s ON s.document_id = h.document_id AND s.id = h.id
+    JOIN legal_units c ON c.document_id = h.document_id AND c.id = h.id
+    LEFT JOIN LATERAL (
+        SELECT p.order_index FROM legal_units p
+        WHERE p.document_id = c.document_id AND p.unit_type = 'article'
+          AND p.order_index <= c.order_index
+        ORDER BY p.order_index DESC
+        LIMIT 1
+    ) article ON true
+    JOIN legal_units u ON u.document_id = c.document_id
+        AND (u.order_index BETWEEN c.order_index - :window AND c.order_index + :window
+             OR u.order_index = article.order_index)
+    GROUP BY u.document_id, u.id, u.unit_type, u.num_label, u.heading, u.text_plain, u.order_index
+""")
+
+
+# Snapshot bundles: hits as a JSON array of [document id hex, id hex, score]
+_BUNDLE_EXPAND_SQL = text("""
+    WITH hits AS (
+        SELECT json_extract(value, '$[0]') AS document_id, json_extract(value, '$[1]') AS id,
+               json_extract(value, '$[2]') AS score
+        FROM json_each(:hits)
+    ),
+    centres AS (
+        SELECT c.document_id, c.id, c.order_index, h.score, (
+            SELECT max(p.order_index) FROM legal_units p
+            WHERE p.document_id = c.document_id AND p.unit_type = 'article'
+              AND p.order_index <= c.order_index
+        ) AS article
+        FROM hits h
+        JOIN legal_units c ON c.document_id = h.document_id AND c.id = h.id
+    )
+    SELECT u.document_id, u.id, u.unit_type, u.num_label, u.heading,
+           u.text_plain, u.order_index, max(c.score) AS score, max(u.id = c.id) AS is_hit
+    FROM centres c
+    JOIN legal_units u ON u.document_id = c.document_id
+        AND (u.order_index BETWEEN c.order_index - :window AND c.order_index + :window
+             OR u.order_index = c.article)
+    GROUP BY u.document_id, u.id
+""")
+
+
+def estimate_tokens(*parts) -> int:
+    chars = sum(len(part) for part in parts if part)
+    return math.ceil(chars / settings.CONTEXT_CHARS_PER_TOKEN)
+
+
+def unit_tokens(unit: Dict) -> int:
+    return estimate_tokens(unit.get("num_label"), unit.get("heading"), unit.get("text_plain"))
+
+
+def unit_passages(units: Sequence[Dict]) -> List[Dict]:
+    """Group expanded units into passages of consecutive order_index per document"""
+    passages = []
+    ordered = sorted(units, key=lambda u: (str(u["document_id"]), u["order_index"]))
+    for unit in ordered:
+        last = passages[-1] if passages else None
+        if (last is not None and last["document_id"] == unit["document_id"]
+                and unit["order_index"] == last["units"][-1]["order_index"] + 1):
+            last["units"].append(unit)
+            last["score"] = max(last["score"], unit["score"])
+        else:
+            passages.append({"document_id": unit["document_id"], "score": unit["score"], "units": [unit]})
+    return passages
+
+
+def _trim_order(units: List[Dict]) -> List[Dict]:
+    """Hits first, then the other units nearest to a hit"""
+    hit_positions = [u["order_index"] for u in units if u["is_hit"]] or [units[0]["order_index"]]
+    return sorted(units, key=lambda u: (not u["is_hit"], min(abs(u["order_index"] - p) for p in hit_positions)))
+
+
+def pack_passages(passages: Sequence[Dict], budget: int) -> Dict:
+    """
+    Greedily fill `budget` tokens with passages, best score first.
+    Unit passages carry "units"; Q&A passages carry "tokens".
+    """
+    packed = []
+    used = 0
+    dropped = 0
+    for passage in sorted(passages, key=lambda p: -p["score"]):
+        if "units" not in passage:
+            if used + passage["tokens"] <= budget:
+                packed.append(passage)
+                used += passage["tokens"]
+            else:
+                dropped += 1
+            continue
+        kept = []
+        tokens = 0
+        for unit in _trim_order(passage["units"]):
+            cost = unit_tokens(unit)
+            if used + tokens + cost > budget:
+                continue
+            kept.append(unit)
+            tokens += cost
+        if not kept:
+            dropped += 1
+            continue
+        # A trimmed passage may have gaps; keep reading order
+        kept.sort(key=lambda u: u["order_index"])
+        packed.append({**passage, "units": kept, "tokens": tokens, "trimmed": len(kept) < len(passage["units"])})
+        used += tokens
+    return {"budget": budget, "used_tokens": used, "passages": packed, "dropped": dropped}
+
+
+def _expand_units(db: Session, hits: Sequence[Dict], window: int) -> List[Dict]:
+    if not hits:
+        return []
+    if is_bundle(db):
+        rows = db.execute(_BUNDLE_EXPAND_SQL, {
+            "hits": json.dumps([
+                [uuid.UUID(str(h["document_id"])).hex, uuid.UUID(str(h["id"])).hex, float(h["score"])] for h in hits
+            ]),
+            "window": window,
+        }).mappings().all()
+        return [
+            {**row, "document_id": uuid.UUID(row["document_id"]), "id": uuid.UUID(row["id"]), "is_hit": bool(row["is_hit"])}
+            for row in rows
+        ]
+    rows = db.execute(_EXPAND_SQL, {
+        "doc": [str(h["document_id"]) for h in hits],
+        "id": [str(h["id"]) for h in hits],
+        "score": [float(h["score"]) for h in hits],
+        "window": window,
+    }).mappings().all()
+    return [dict(row) for row in rows]
+
+
+def _qa_passages(db: Session, hits: Sequence[Dict]) -> List[Dict]:
+    scores = {}
+    for hit in hits:
+        scores[hit["id"]] = max(scores.get(hit["id"], float("-inf")), float(hit["score"]))
+    if not scores:
+        return []
+    entries = db.query(QAEntry).filter(QAEntry.id.in_(list(scores)), servable_qa()).all()
+    return [
+        {
+            "source": "qa",
+            "id": str(entry.id),
+            "score": scores[entry.id],
+            "question": entry.question,
+            "answer": entry.answer,
+            "source_url": entry.source_url,
+            "tokens": estimate_tokens(entry.question, entry.answer),
+        }
+        for entry in entries
+    ]
+
+
+def build_context(db: Session, hits: Sequence[Dict], budget: int, window: int = 1) -> Dict:
+    """
+    `hits` are {"source", "id", "document_id" (units), "score"} as returned by
+    /retrieve; returns the packed evidence with citation metadata
+    """
+    unit_hits = [h for h in hits if h["source"] == "unit"]
+    passages = unit_passages(_expand_units(db, unit_hits, window))
+    passages += _qa_passages(db, [h for h in hits if h["source"] == "qa"])
+    pack = pack_passages(passages, budget)
+
+    doc_ids = {p["document_id"] for p in pack["passages"] if "units" in p}
+    documents = {}
+    if doc_ids:
+        rows = db.query(OfficialDocument.id, OfficialDocument.title, OfficialDocument.source_url).filter(
+            OfficialDocument.id.in_(list(doc_ids))
+        ).all()
+        documents = {row.id: row for row in rows}
+
+    for i, passage in enumerate(pack["passages"]):
+        if "units" not in passage:
+            continue
+        document = documents.get(passage["document_id"])
+        pack["passages"][i] = {
+            "source": "unit",
+            "document_id": str(passage["document_id"]),
+            "document_title": document.title if document else None,
+            "source_url": document.source_url if document else None,
+            "score": passage["score"],
+            "tokens": passage["tokens"],
+            "trimmed": passage["trimmed"],
+            "units": [
+                {
+                    "id": str(unit["id"]),
+                    "unit_type": unit["unit_type"],
+                    "num_label": unit["num_label"],
+                    "heading": unit["heading"],
+                    "text_plain": unit["text_plain"],
+                    "order_index": unit["order_index"],
+                    "is_hit": unit["is_hit"],
+                }
+                for unit in passage["units"]
+            ],
+        }
+    return pack
@@ -0,0 +1,274 @@
+"""
+Embeddings of legal units and Q&A entries, computed once per distinct text.
+
+The `embeddings` leader job reads the documents and Q&A entries changed
+since its watermarks, keyset-paginated on (updated_at, id) with an overlap
+window as the BM25 indexer does, and takes the servable units and entries
+among them. Each text is keyed by the content_hash of its match keys, so
+texts that differ only in letter variants, digits or spacing share one key.
+A page's keys are deduplicated, the ones already in embedding_cache for the
+model are skipped, and the rest go to the embedder in batches of
+EMBEDDING_BATCH_SIZE and are stored. A resend of unchanged rows, or the
+same article in many documents, costs one indexed lookup per page and no
+model call.
+
+The model is pluggable. EMBEDDER is "hashing" for the deterministic local
+HashingTextEmbedder, or "package.module:factory" for a callable returning an
+Embedder. Vectors and watermarks are kept per `model_id`, so a new model
+starts its own cache. The leader is the only writer.
+
+    python -m app.services.embeddings update [--rescan]
+"""
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+from sqlalchemy import insert, tuple_
+from sqlalchemy.orm import Session
+from app.core.settings import settings
+from app.db.base import SessionLocal
+from app.models.embedding import EmbeddingCache, EmbeddingWatermark
+from app.models.official import LegalUnit, OfficialDocument
+from app.models.qa import QAEntry
+from app.services.query_cache import HashingEmbedder
+from app.services.serving import servable_document, servable_qa
+from app.services.versioning import content_hash
+import importlib
+import logging
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("documents", "qa_entries")
+
+
+class Embedder(ABC):
+    """A text embedding model"""
+
+    model_id = ""  # names the model and its version; vectors are cached under it
+
+    @abstractmethod
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """A (len(texts), dim) float32 array"""
+
+
+class HashingTextEmbedder(Embedder):
+    """Deterministic and dependency-free: hashed character n-grams (see query_cache.HashingEmbedder)"""
+
+    def __init__(self, dim: int = 256, n: int = 3):
+        self._embed = HashingEmbedder(dim, n)
+        self.model_id = f"hashing-{n}gram-{dim}"
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self._embed.dim), dtype=np.float32)
+        return np.stack([self._embed(text) for text in texts])
+
+
+def load_embedder(spec: str) -> Optional[Embedder]:
+    """The embedder EMBEDDER names: "none", "hashing" or "package.module:factory" """
+    if not spec or spec == "none":
+        return None
+    if spec == "hashing":
+        return HashingTextEmbedder()
+    module, _, factory = spec.partition(":")
+    if not factory:
+        raise ValueError(f"EMBEDDER must be none, hashing or package.module:factory, not {spec!r}")
+    return getattr(importlib.import_module(module), factory)()
+
+
+@lru_cache(maxsize=None)
+def get_embedder() -> Optional[Embedder]:
+    """The configured embedder, loaded once per process"""
+    return load_embedder(settings.EMBEDDER)
+
+
+@dataclass
+class EmbeddingReport:
+    rows: int = 0  # units and Q&A entries read
+    texts: int = 0  # distinct texts per page
+    cached: int = 0  # texts already in the cache
+    embedded: int = 0
+    embed_seconds: float = 0.0  # inside the embedder
+    seconds: float = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.cached / self.texts if self.texts else 0.0
+
+    @property
+    def throughput(self) -> float:
+        """Texts embedded per second of embedder time"""
+        return self.embedded / self.embed_seconds if self.embed_seconds else 0.0
+
+    def as_dict(self) -> Dict:
+        return {**asdict(self), "hit_rate": round(self.hit_rate, 4), "throughput": round(self.throughput, 1)}
+
+
+def text_key(*match_keys: Optional[str]) -> str:
+    """Cache key of a text, from its match-key fields"""
+    return content_hash(match_keys)
+
+
+def lookup_vectors(db: Session, model_id: str, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+    """Cached vectors by text key; keys not embedded yet are missing"""
+    keys = list(set(keys))
+    if not keys:
+        return {}
+    rows = db.query(EmbeddingCache.content_hash, EmbeddingCache.vector).filter(
+        EmbeddingCache.model_id == model_id, EmbeddingCache.content_hash.in_(keys)
+    )
+    return {row.content_hash: np.frombuffer(row.vector, dtype="<f4") for row in rows}
+
+
+def embed_missing(db: Session, embedder: Embedder, texts: Dict[str, str], batch_size: int, report: EmbeddingReport):
+    """Embed and store the texts (key -> text) the cache does not have yet"""
+    if not texts:
+        return
+    report.texts += len(texts)
+    cached = {row.content_hash for row in db.query(EmbeddingCache.content_hash).filter(
+        EmbeddingCache.model_id == embedder.model_id, EmbeddingCache.content_hash.in_(list(texts))
+    )}
+    report.cached += len(cached)
+    missing = [(key, text) for key, text in texts.items() if key not in cached]
+    for start in range(0, len(missing), batch_size):
+        batch = missing[start:start + batch_size]
+        started = time.perf_counter()
+        vectors = np.asarray(embedder.embed([text for _, text in batch]), dtype="<f4")
+        report.embed_seconds += time.perf_counter() - started
+        db.execute(insert(EmbeddingCache), [
+            {"model_id": embedder.model_id, "content_hash": key, "dim": vectors.shape[1], "vector": vector.tobytes()}
+            for (key, _), vector in zip(batch, vectors)
+        ])
+        report.embedded += len(batch)
+
+
+def _joined(*parts: Optional[str]) -> str:
+    return "\n".join(part for part in parts if part)
+
+
+def unit_text(row) -> Tuple[str, str]:
+    """(text key, text) of a legal unit row"""
+    return text_key(row.heading_normalized, row.text_plain_normalized), _joined(row.heading, row.text_plain)
+
+
+def qa_text(row) -> Tuple[str, str]:
+    """(text key, text) of a Q&A entry row"""
+    return text_key(row.question_normalized, row.answer_normalized), _joined(row.question, row.answer)
+
+
+def _unit_texts(db: Session, document_ids: Sequence, report: EmbeddingReport) -> Dict[str, str]:
+    if not document_ids:
+        return {}
+    rows = db.query(
+        LegalUnit.heading, LegalUnit.text_plain, LegalUnit.heading_normalized, LegalUnit.text_plain_normalized
+    ).filter(LegalUnit.document_id.in_(document_ids)).all()
+    texts = {}
+    for row in rows:
+        if row.heading_normalized or row.text_plain_normalized:
+            report.rows += 1
+            texts.setdefault(*unit_text(row))
+    return texts
+
+
+def _qa_texts(rows: Sequence, report: EmbeddingReport) -> Dict[str, str]:
+    texts = {}
+    for row in rows:
+        report.rows += 1
+        texts.setdefault(*qa_text(row))
+    return texts
+
+
+def changed_rows(db: Session, model, since: Optional[datetime], after, batch_size: int):
+    """Rows of model updated at or after `since`, keyset-paginated on (updated_at, id)"""
+    servable = servable_document() if model is OfficialDocument else servable_qa()
+    columns = [model.id, model.updated_at, servable.label("servable")]
+    if model is QAEntry:
+        columns += [QAEntry.question, QAEntry.answer, QAEntry.question_normalized, QAEntry.answer_normalized]
+    query = db.query(*columns)
+    if since is not None:
+        query = query.filter(model.updated_at >= since)
+    if after is not None:
+        query = query.filter(tuple_(model.updated_at, model.id) > after)
+    return query.order_by(model.updated_at, model.id).limit(batch_size).all()
+
+
+def _update_kind(
+    db: Session, embedder: Embedder, kind: str, overlap_seconds: Optional[int],
+    batch_size: int, embed_batch_size: int, report: EmbeddingReport
+):
+    model = OfficialDocument if kind == "documents" else QAEntry
+    state = db.get(EmbeddingWatermark, (embedder.model_id, kind))
+    since = state.watermark - timedelta(seconds=overlap_seconds) if state and overlap_seconds is not None else None
+    after = None
+    while True:
+        rows = changed_rows(db, model, since, after, batch_size)
+        if not rows:
+            return
+        after = (rows[-1].updated_at, rows[-1].id)
+        servable = [row for row in rows if row.servable]
+        if kind == "documents":
+            texts = _unit_texts(db, [row.id for row in servable], report)
+        else:
+            texts = _qa_texts(servable, report)
+        embed_missing(db, embedder, texts, embed_batch_size, report)
+        if state is None:
+            state = EmbeddingWatermark(model_id=embedder.model_id, kind=kind, watermark=after[0])
+            db.add(state)
+        else:
+            state.watermark = max(state.watermark, after[0])
+        db.commit()
+
+
+def update_embeddings(
+    db: Session,
+    embedder: Optional[Embedder] = None,
+    overlap_seconds: Optional[int] = None,
+    rescan: bool = False,
+    batch_size: int = 500,
+    embed_batch_size: Optional[int] = None
+) -> EmbeddingReport:
+    """
+    Embed the texts of rows changed since the watermarks, committing after
+    every page of `batch_size` documents or entries; `rescan` reads every row
+    """
+    embedder = embedder or get_embedder()
+    if embedder is None:
+        raise ValueError("No embedder configured (EMBEDDER=none)")
+    overlap = settings.EMBEDDING_REFRESH_OVERLAP_SECONDS if overlap_seconds is None else overlap_seconds
+    report = EmbeddingReport()
+    started = time.perf_counter()
+    for kind in KINDS:
+        _update_kind(
+            db, embedder, kind, None if rescan else overlap, batch_size,
+            embed_batch_size or settings.EMBEDDING_BATCH_SIZE, report
+        )
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def embedding_job():
+    db = SessionLocal()
+    try:
+        report = update_embeddings(db)
+        logger.info(f"Embeddings updated for {get_embedder().model_id}: {report.as_dict()}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Embed legal units and Q&A entries")
+    parser.add_argument("command", choices=["update"])
+    parser.add_argument("--rescan", action="store_true", help="read every row, not just those changed since the watermarks")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    session = SessionLocal()
+    try:
+        print(update_embeddings(session, rescan=args.rescan, batch_size=args.batch_size).as_dict())
+    finally:
+        session.close()
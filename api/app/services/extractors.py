@@ -0,0 +1,94 @@
+"""
+Text extractors for raw document files, keyed by file extension.
+
+Register additional formats with the `extractor` decorator at import time of
+a module that is imported before the ingestion process pool starts, so forked
+workers inherit the registry.
+"""
+from html.parser import HTMLParser
+from typing import Callable, Dict, Optional
+import os
+
+Extractor = Callable[[bytes], str]
+
+_REGISTRY: Dict[str, Extractor] = {}
+
+# Windows-1256 is still common for Persian files produced by older tooling
+_TEXT_ENCODINGS = ("utf-8-sig", "cp1256")
+
+
+class UnsupportedFormat(Exception):
+    """No extractor is registered for the file's extension"""
+
+
+def extractor(*extensions: str):
+    """Register a function as the extractor for the given extensions"""
+    def decorator(func: Extractor) -> Extractor:
+        for ext in extensions:
+            _REGISTRY[ext.lower().lstrip(".")] = func
+        return func
+    return decorator
+
+
+def get_extractor(filename: str) -> Optional[Extractor]:
+    ext = os.path.splitext(filename)[1].lower().lstrip(".")
+    return _REGISTRY.get(ext)
+
+
+def supported_extensions():
+    return sorted(_REGISTRY)
+
+
+def extract_text(data: bytes, filename: str) -> str:
+    func = get_extractor(filename)
+    if func is None:
+        raise UnsupportedFormat(f"No extractor for {filename}")
+    return func(data)
+
+
+def _decode(data: bytes) -> str:
+    for encoding in _TEXT_ENCODINGS:
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode("utf-8", errors="replace")
+
+
+@extractor("txt", "text")
+def extract_plain_text(data: bytes) -> str:
+    return _decode(data)
+
+
+class _HTMLTextParser(HTMLParser):
+    _SKIP = {"script", "style", "head", "noscript"}
+    _BLOCK = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "section", "article", "table"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIP:
+            self._skip_depth += 1
+        elif tag in self._BLOCK:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIP:
+            self._skip_depth = max(self._skip_depth - 1, 0)
+        elif tag in self._BLOCK:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data)
+
+
+@extractor("html", "htm")
+def extract_html(data: bytes) -> str:
+    parser = _HTMLTextParser()
+    parser.feed(_decode(data))
+    parser.close()
+    return "".join(parser.parts)
@@ -0,0 +1,185 @@
+"""
+Document file ingestion: fill `official_documents.text_normalized` from the
+raw files referenced by `file_s3`.
+
+Fetching is I/O bound and runs on threads; extraction and normalization are
+CPU bound and run in a ProcessPoolExecutor. The number of files in flight is
+capped, so at most `max_inflight` file bodies are held in memory at once while
+every extraction worker stays busy.
+"""
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+from app.db.base import SessionLocal
+from app.models.official import OfficialDocument
+from app.services.extractors import UnsupportedFormat, extract_text, get_extractor
+from app.utils.minio_helper import MinIOHelper, split_s3_url
+from app.utils.text import normalize_text
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+MAX_FILE_BYTES = 50 * 1024 * 1024
+
+
+@dataclass
+class IngestReport:
+    processed: int = 0
+    failed: int = 0
+    unsupported: int = 0
+    bytes_read: int = 0
+
+
+def extract_normalized(data: bytes, filename: str) -> str:
+    """Process-pool entry point: extract and normalize one file"""
+    return normalize_text(extract_text(data, filename))
+
+
+def run_extraction(
+    items: Iterable[Tuple[str, str]],
+    fetch: Callable[[str], bytes],
+    workers: int = None,
+    max_inflight: int = None,
+    report: IngestReport = None
+) -> Iterator[Tuple[str, Optional[str]]]:
+    """
+    Fetch and extract `items` of (item_id, object_name) concurrently.
+
+    Yields (item_id, text) as results complete; text is None when the file
+    could not be fetched or extracted. New items are only pulled from
+    `items` when a slot frees up, which is what bounds memory.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_inflight = max_inflight or workers * 2
+    report = report if report is not None else IngestReport()
+
+    with ProcessPoolExecutor(max_workers=workers) as extract_pool, \
+            ThreadPoolExecutor(max_workers=max_inflight) as fetch_pool:
+
+        def process(object_name: str) -> Tuple[int, str]:
+            data = fetch(object_name)
+            return len(data), extract_pool.submit(extract_normalized, data, object_name).result()
+
+        inflight = {}
+
+        def drain(done):
+            for future in done:
+                item_id = inflight.pop(future)
+                try:
+                    size, text = future.result()
+                    report.bytes_read += size
+                    report.processed += 1
+                except UnsupportedFormat as e:
+                    logger.warning(f"Skipping {item_id}: {e}")
+                    report.unsupported += 1
+                    text = None
+                except Exception as e:
+                    logger.error(f"Extraction failed for {item_id}: {e}")
+                    report.failed += 1
+                    text = None
+                yield item_id, text
+
+        for item_id, object_name in items:
+            if get_extractor(object_name) is None:
+                report.unsupported += 1
+                yield item_id, None
+                continue
+            if len(inflight) >= max_inflight:
+                done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                yield from drain(done)
+            inflight[fetch_pool.submit(process, object_name)] = item_id
+
+        while inflight:
+            done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+            yield from drain(done)
+
+
+def _iter_pending_documents(bucket: str, page_size: int, limit: int = None) -> Iterator[Tuple[str, str]]:
+    """Keyset-paginate documents that have a file but no extracted text"""
+    last_id = None
+    seen = 0
+    while limit is None or seen < limit:
+        db = SessionLocal()
+        try:
+            query = db.query(OfficialDocument.id, OfficialDocument.file_s3).filter(
+                OfficialDocument.text_normalized.is_(None),
+                OfficialDocument.file_s3.isnot(None)
+            )
+            if last_id is not None:
+                query = query.filter(OfficialDocument.id > last_id)
+            rows = query.order_by(OfficialDocument.id).limit(page_size).all()
+        finally:
+            db.close()
+        if not rows:
+            return
+        for doc_id, file_s3 in rows:
+            last_id = doc_id
+            try:
+                file_bucket, key = split_s3_url(file_s3)
+            except ValueError as e:
+                logger.warning(f"Document {doc_id}: {e}")
+                continue
+            if file_bucket != bucket:
+                logger.warning(f"Document {doc_id}: file in foreign bucket {file_bucket}")
+                continue
+            seen += 1
+            yield doc_id, key
+            if limit is not None and seen >= limit:
+                return
+
+
+def _store_texts(updates):
+    db = SessionLocal()
+    try:
+        db.bulk_update_mappings(OfficialDocument, updates)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def ingest_missing_text(
+    workers: int = None,
+    max_inflight: int = None,
+    batch_size: int = 100,
+    limit: int = None,
+    helper: MinIOHelper = None
+) -> IngestReport:
+    """Extract text for every document whose `text_normalized` is missing"""
+    helper = helper or MinIOHelper()
+    report = IngestReport()
+    items = _iter_pending_documents(helper.bucket_name, page_size=batch_size, limit=limit)
+    fetch = lambda name: helper.read_file(name, max_bytes=MAX_FILE_BYTES)
+
+    updates = []
+    for doc_id, text in run_extraction(items, fetch, workers=workers, max_inflight=max_inflight, report=report):
+        if text is None:
+            continue
+        updates.append({"id": doc_id, "text_normalized": text})
+        if len(updates) >= batch_size:
+            _store_texts(updates)
+            updates = []
+    if updates:
+        _store_texts(updates)
+
+    logger.info(
+        f"Ingestion finished: {report.processed} extracted, {report.unsupported} unsupported, "
+        f"{report.failed} failed, {report.bytes_read} bytes read"
+    )
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Extract text for documents missing text_normalized")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-inflight", type=int, default=None)
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+
+    ingest_missing_text(workers=args.workers, max_inflight=args.max_inflight, limit=args.limit)
@@ -0,0 +1,161 @@
+"""
+Match-key columns for legal units.
+
+`unit_match_keys` fills the *_normalized shadow columns of a batch of unit
+rows with three normalize_batch calls, and the parsed label columns
+(label_type, label_ordinal, label_repeat) from the normalized num_label.
+sync_import uses it for every import; `backfill_match_keys` applies it to
+rows written before the columns existed, and `backfill_title_keys` does the
+same for official_documents.title_normalized, re-deriving stale keys too,
+and `backfill_qa_keys` for the qa_entries question/answer keys. Backfilled
+rows are refreshed in the serving tables as they go.
+
+    python -m app.services.match_keys --batch-size 5000
+"""
+from typing import Dict, List
+from sqlalchemy import and_, or_, tuple_
+from app.db.base import SessionLocal
+from app.models.official import LegalUnit, OfficialDocument
+from app.models.qa import QAEntry
+from app.services import serving
+from app.utils.citations import parse_normalized_label, title_key
+from app.utils.text import normalize_batch
+import logging
+
+logger = logging.getLogger(__name__)
+
+MATCH_KEY_FIELDS = ("num_label", "heading", "text_plain")
+LABEL_FIELDS = ("label_type", "label_ordinal", "label_repeat")
+
+
+def unit_match_keys(rows: List[Dict]) -> List[Dict]:
+    """Add `<field>_normalized` to each unit row dict, in place"""
+    for field in MATCH_KEY_FIELDS:
+        keys = normalize_batch([row.get(field) for row in rows])
+        for row, key in zip(rows, keys):
+            row[f"{field}_normalized"] = key
+    for row in rows:
+        label = parse_normalized_label(row["num_label_normalized"])
+        if label is None:
+            row.update(dict.fromkeys(LABEL_FIELDS))
+        else:
+            row.update(label_type=label.unit_type, label_ordinal=label.ordinal, label_repeat=label.repeat)
+    return rows
+
+
+def backfill_match_keys(batch_size: int = 5000) -> int:
+    """
+    Keyset-paginate units missing match keys in (document_id, id) order and
+    write them back by primary key, so each update touches one partition
+    """
+    last = None
+    updated = 0
+    while True:
+        db = SessionLocal()
+        try:
+            query = db.query(
+                LegalUnit.document_id, LegalUnit.id,
+                LegalUnit.num_label, LegalUnit.heading, LegalUnit.text_plain
+            ).filter(or_(
+                LegalUnit.text_plain_normalized.is_(None),
+                # written before the label columns; unparseable labels are re-checked each run
+                and_(LegalUnit.label_type.is_(None), LegalUnit.num_label.isnot(None))
+            ))
+            if last is not None:
+                query = query.filter(tuple_(LegalUnit.document_id, LegalUnit.id) > last)
+            rows = [dict(row._mapping) for row in query.order_by(LegalUnit.document_id, LegalUnit.id).limit(batch_size)]
+            if not rows:
+                return updated
+            last = (rows[-1]["document_id"], rows[-1]["id"])
+            updates = [
+                {key: value for key, value in row.items() if key not in MATCH_KEY_FIELDS}
+                for row in unit_match_keys(rows)
+            ]
+            db.bulk_update_mappings(LegalUnit, updates)
+            serving.refresh_documents(db, (row["document_id"] for row in rows))
+            db.commit()
+            updated += len(rows)
+            logger.info(f"Match keys backfilled for {updated} units")
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+def backfill_title_keys(batch_size: int = 5000) -> int:
+    """
+    Write official_documents.title_normalized where it is missing or was
+    derived before title_key dropped punctuation, keyset-paginated by id;
+    every title is read, as a stale key can only be told in Python
+    """
+    last = None
+    updated = 0
+    while True:
+        db = SessionLocal()
+        try:
+            query = db.query(OfficialDocument.id, OfficialDocument.title, OfficialDocument.title_normalized)
+            if last is not None:
+                query = query.filter(OfficialDocument.id > last)
+            rows = query.order_by(OfficialDocument.id).limit(batch_size).all()
+            if not rows:
+                return updated
+            last = rows[-1].id
+            updates = [
+                {"id": row.id, "title_normalized": key}
+                for row in rows if (key := title_key(row.title)) != row.title_normalized
+            ]
+            db.bulk_update_mappings(OfficialDocument, updates)
+            db.commit()
+            updated += len(updates)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+def backfill_qa_keys(batch_size: int = 5000) -> int:
+    """Fill qa_entries question/answer keys where missing, keyset-paginated by id"""
+    last = None
+    updated = 0
+    while True:
+        db = SessionLocal()
+        try:
+            query = db.query(QAEntry.id, QAEntry.question, QAEntry.answer).filter(
+                QAEntry.question_normalized.is_(None)
+            )
+            if last is not None:
+                query = query.filter(QAEntry.id > last)
+            rows = query.order_by(QAEntry.id).limit(batch_size).all()
+            if not rows:
+                return updated
+            last = rows[-1].id
+            questions = normalize_batch([row.question for row in rows])
+            answers = normalize_batch([row.answer for row in rows])
+            db.bulk_update_mappings(QAEntry, [
+                {"id": row.id, "question_normalized": question, "answer_normalized": answer}
+                for row, question, answer in zip(rows, questions, answers)
+            ])
+            serving.refresh_qa(db, (row.id for row in rows))
+            db.commit()
+            updated += len(rows)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Backfill match-key and parsed label columns")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+    print({
+        "documents": backfill_title_keys(batch_size=args.batch_size),
+        "units": backfill_match_keys(batch_size=args.batch_size),
+        "qa_entries": backfill_qa_keys(batch_size=args.batch_size),
+    })
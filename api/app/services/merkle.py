@@ -0,0 +1,382 @@
+"""
+Hash trees for sync reconciliation.
+
+Every synced row (documents with their legal units, Q&A entries) has a
+128-bit digest: md5 over its id, `content_hash` of its sync fields and, for
+documents, the hash of its units. Rows fall into 65536 buckets by the first
+four hex digits of their id, and a bucket's digest is the XOR of its rows'
+digests. Tree nodes are id prefixes of 0-4 hex digits, and a node's digest is
+the XOR of the buckets under it, so a changed row moves exactly one bucket
+and its ancestors. sync_import keeps the buckets current with one atomic XOR
+upsert per touched bucket.
+
+A client builds the same tree over its copy (`MerkleTree`). It compares
+children level by level (`differing_buckets`) and fetches only the rows of
+the buckets that still differ (`compare_rows`). That is four node round trips
+plus one for rows, however large the corpus is.
+
+    python -m app.services.merkle rebuild --kind documents
+"""
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.db.base import SessionLocal
+from app.models.official import LegalUnit, OfficialDocument
+from app.models.qa import QAEntry
+from app.models.sync import SyncHash, SyncHashBucket
+from app.services.versioning import content_hash
+import hashlib
+import logging
+import numpy as np
+import uuid
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("documents", "qa_entries")
+FANOUT_BITS = 4
+DEPTH = 4  # hex digits in a bucket prefix
+BUCKETS = 1 << (FANOUT_BITS * DEPTH)
+
+DOCUMENT_HASH_FIELDS = (
+    "title", "doc_type", "jurisdiction", "authority", "effective_date",
+    "amended_date", "source_url", "file_s3"
+)
+UNIT_HASH_FIELDS = ("unit_type", "num_label", "heading", "text_plain", "order_index")
+QA_HASH_FIELDS = (
+    "question", "answer", "topic_tags", "source_url", "author", "org", "answered_at",
+    "quality_score", "licensing", "pii_status", "moderation_status"
+)
+
+KEEP_UNITS = object()  # apply_hashes: the import did not send units, keep the stored hash
+
+
+def _field(row, name):
+    return row.get(name) if isinstance(row, dict) else getattr(row, name)
+
+
+def document_hash(doc) -> str:
+    return content_hash(_field(doc, name) for name in DOCUMENT_HASH_FIELDS)
+
+
+def units_hash(units: Sequence) -> Optional[str]:
+    """Order-independent hash of a document's units (order_index is hashed per unit); None for no units"""
+    if not units:
+        return None
+    return content_hash(sorted(
+        content_hash(_field(unit, name) for name in UNIT_HASH_FIELDS) for unit in units
+    ))
+
+
+def qa_hash(qa) -> str:
+    values = []
+    for name in QA_HASH_FIELDS:
+        value = _field(qa, name)
+        values.append("\x1e".join(value) if name == "topic_tags" and value is not None else value)
+    return content_hash(values)
+
+
+def row_digest(row_id, row_hash: str, row_units_hash: Optional[str] = None) -> Tuple[int, int]:
+    """md5 of id, content hash and units hash as two signed 64-bit halves"""
+    digest = hashlib.md5(f"{row_id}\x1f{row_hash}\x1f{row_units_hash or ''}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big", signed=True), int.from_bytes(digest[8:], "big", signed=True)
+
+
+def bucket_of(row_id) -> int:
+    return uuid.UUID(str(row_id)).int >> (128 - FANOUT_BITS * DEPTH)
+
+
+def digest_hex(hi: int, lo: int) -> str:
+    return f"{int(hi) & 0xFFFFFFFFFFFFFFFF:016x}{int(lo) & 0xFFFFFFFFFFFFFFFF:016x}"
+
+
+def _node(prefix: str, hi, lo, rows) -> Dict:
+    return {"prefix": prefix, "digest": digest_hex(hi, lo), "rows": int(rows)}
+
+
+def check_prefix(prefix: str, leaf: bool = False) -> str:
+    prefix = prefix.lower()
+    if len(prefix) > DEPTH or (leaf and len(prefix) != DEPTH) or (not leaf and len(prefix) == DEPTH):
+        raise ValueError(f"invalid prefix length: {prefix!r}")
+    int(prefix or "0", 16)
+    return prefix
+
+
+class MerkleTree:
+    """In-memory tree over per-bucket digests, the client side of /sync/reconcile"""
+
+    def __init__(self, hi: np.ndarray, lo: np.ndarray, rows: np.ndarray):
+        self.hi = hi
+        self.lo = lo
+        self.rows = rows
+
+    @classmethod
+    def from_rows(cls, buckets: np.ndarray, hi: np.ndarray, lo: np.ndarray) -> "MerkleTree":
+        tree_hi = np.zeros(BUCKETS, dtype=np.int64)
+        tree_lo = np.zeros(BUCKETS, dtype=np.int64)
+        np.bitwise_xor.at(tree_hi, buckets, hi)
+        np.bitwise_xor.at(tree_lo, buckets, lo)
+        return cls(tree_hi, tree_lo, np.bincount(buckets, minlength=BUCKETS))
+
+    def level(self, depth: int):
+        """(hi, lo, rows) arrays of the 16**depth nodes at `depth`"""
+        shape = (1 << (FANOUT_BITS * depth), -1)
+        return (
+            np.bitwise_xor.reduce(self.hi.reshape(shape), axis=1),
+            np.bitwise_xor.reduce(self.lo.reshape(shape), axis=1),
+            self.rows.reshape(shape).sum(axis=1),
+        )
+
+    def children(self, prefixes: Iterable[str]) -> Dict[str, List[Dict]]:
+        levels = {}
+        result = {}
+        for prefix in prefixes:
+            depth = len(prefix) + 1
+            if depth not in levels:
+                levels[depth] = self.level(depth)
+            hi, lo, rows = levels[depth]
+            first = int(prefix or "0", 16) << FANOUT_BITS
+            result[prefix] = [
+                _node(f"{node:0{depth}x}", hi[node], lo[node], rows[node])
+                for node in range(first, first + (1 << FANOUT_BITS))
+                if rows[node]
+            ]
+        return result
+
+
+def differing_buckets(
+    local: Callable[[List[str]], Dict[str, List[Dict]]],
+    remote: Callable[[List[str]], Dict[str, List[Dict]]]
+) -> Tuple[List[str], int]:
+    """
+    Walk both trees from the root, descending only into children whose
+    digest or row count differ. Returns the differing bucket prefixes and the
+    number of remote calls made (one per level).
+    """
+    frontier = [""]
+    calls = 0
+    for _ in range(DEPTH):
+        mine = local(frontier)
+        theirs = remote(frontier)
+        calls += 1
+        next_frontier = []
+        for prefix in frontier:
+            a = {n["prefix"]: (n["digest"], n["rows"]) for n in mine.get(prefix, [])}
+            b = {n["prefix"]: (n["digest"], n["rows"]) for n in theirs.get(prefix, [])}
+            next_frontier.extend(sorted(child for child in a.keys() | b.keys() if a.get(child) != b.get(child)))
+        frontier = next_frontier
+        if not frontier:
+            break
+    return frontier, calls
+
+
+def compare_rows(local: Dict[str, str], remote: Dict[str, str]) -> Dict[str, List[str]]:
+    """id -> digest maps of the same buckets; what the local side must resend or delete remotely"""
+    return {
+        "missing": sorted(set(local) - set(remote)),  # resend
+        "changed": sorted(i for i in set(local) & set(remote) if local[i] != remote[i]),  # resend
+        "extra": sorted(set(remote) - set(local)),  # delete remotely
+    }
+
+
+# Database side
+
+def apply_hashes(db: Session, kind: str, rows: Dict[uuid.UUID, Tuple[str, object]]) -> int:
+    """
+    Record new content hashes for `rows` (id -> (content hash, units hash or
+    KEEP_UNITS)) and fold the digest changes into their buckets.
+    Returns the number of rows whose digest changed.
+    """
+    if not rows:
+        return 0
+    existing = {
+        row.id: row for row in db.query(SyncHash).filter(
+            SyncHash.kind == kind, SyncHash.id.in_(list(rows))
+        ).order_by(SyncHash.id).with_for_update()
+    }
+    deltas: Dict[int, List[int]] = {}
+    upserts = []
+    for row_id in sorted(rows):
+        row_hash, row_units_hash = rows[row_id]
+        old = existing.get(row_id)
+        if row_units_hash is KEEP_UNITS:
+            row_units_hash = old.units_hash if old is not None else None
+        hi, lo = row_digest(row_id, row_hash, row_units_hash)
+        bucket = bucket_of(row_id)
+        delta = deltas.setdefault(bucket, [0, 0, 0])
+        if old is not None:
+            if (old.hi, old.lo) == (hi, lo):
+                continue
+            delta[0] ^= old.hi
+            delta[1] ^= old.lo
+        else:
+            delta[2] += 1
+        delta[0] ^= hi
+        delta[1] ^= lo
+        upserts.append(dict(
+            kind=kind, id=row_id, bucket=bucket, content_hash=row_hash,
+            units_hash=row_units_hash, hi=hi, lo=lo
+        ))
+    if upserts:
+        stmt = insert(SyncHash).values(upserts)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["kind", "id"],
+            set_=dict(
+                content_hash=stmt.excluded.content_hash,
+                units_hash=stmt.excluded.units_hash,
+                hi=stmt.excluded.hi,
+                lo=stmt.excluded.lo
+            )
+        ))
+    _apply_bucket_deltas(db, kind, deltas)
+    return len(upserts)
+
+
+def remove_hashes(db: Session, kind: str, ids: Iterable[uuid.UUID]) -> int:
+    """Drop rows from the tree, e.g. when they are deleted"""
+    ids = list(ids)
+    if not ids:
+        return 0
+    removed = db.execute(
+        SyncHash.__table__.delete().where(
+            SyncHash.kind == kind, SyncHash.id.in_(ids)
+        ).returning(SyncHash.bucket, SyncHash.hi, SyncHash.lo)
+    ).all()
+    deltas: Dict[int, List[int]] = {}
+    for bucket, hi, lo in removed:
+        delta = deltas.setdefault(bucket, [0, 0, 0])
+        delta[0] ^= hi
+        delta[1] ^= lo
+        delta[2] -= 1
+    _apply_bucket_deltas(db, kind, deltas)
+    return len(removed)
+
+
+def _apply_bucket_deltas(db: Session, kind: str, deltas: Dict[int, List[int]]):
+    values = [
+        dict(kind=kind, bucket=bucket, hi=hi, lo=lo, rows=count)
+        for bucket, (hi, lo, count) in sorted(deltas.items())
+        if hi or lo or count
+    ]
+    if not values:
+        return
+    # XOR in place, so concurrent imports touching one bucket compose
+    stmt = insert(SyncHashBucket).values(values)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["kind", "bucket"],
+        set_=dict(
+            hi=SyncHashBucket.hi.op("#")(stmt.excluded.hi),
+            lo=SyncHashBucket.lo.op("#")(stmt.excluded.lo),
+            rows=SyncHashBucket.rows + stmt.excluded.rows
+        )
+    ))
+
+
+def tree_children(db: Session, kind: str, prefixes: Sequence[str]) -> Dict[str, List[Dict]]:
+    """Children of each prefix (0-3 hex digits), as MerkleTree.children"""
+    result = {prefix: [] for prefix in prefixes}
+    by_depth: Dict[int, List[str]] = {}
+    for prefix in prefixes:
+        by_depth.setdefault(len(prefix), []).append(prefix)
+    for depth, group in by_depth.items():
+        child_shift = FANOUT_BITS * (DEPTH - depth - 1)
+        rows = db.execute(text("""
+            SELECT bucket >> :child_shift AS node, bit_xor(hi) AS hi, bit_xor(lo) AS lo, sum(rows) AS rows
+            FROM sync_hash_buckets
+            WHERE kind = :kind AND bucket >> :parent_shift = ANY(CAST(:parents AS int[]))
+            GROUP BY node
+            ORDER BY node
+        """), {
+            "kind": kind,
+            "child_shift": child_shift,
+            "parent_shift": child_shift + FANOUT_BITS,
+            "parents": [int(prefix or "0", 16) for prefix in group],
+        }).all()
+        for node, hi, lo, count in rows:
+            if count:
+                child = f"{node:0{depth + 1}x}"
+                result[child[:depth]].append(_node(child, hi, lo, count))
+    return result
+
+
+def tree_rows(db: Session, kind: str, prefixes: Sequence[str]) -> Dict[str, Dict[str, str]]:
+    """id -> digest of every row in each bucket prefix (4 hex digits)"""
+    result = {prefix: {} for prefix in prefixes}
+    rows = db.query(SyncHash.id, SyncHash.bucket, SyncHash.hi, SyncHash.lo).filter(
+        SyncHash.kind == kind, SyncHash.bucket.in_([int(prefix, 16) for prefix in prefixes])
+    ).all()
+    for row_id, bucket, hi, lo in rows:
+        result[f"{bucket:0{DEPTH}x}"][str(row_id)] = digest_hex(hi, lo)
+    return result
+
+
+def tree_root(db: Session, kind: str) -> Dict:
+    hi, lo, count = db.execute(text(
+        "SELECT coalesce(bit_xor(hi), 0), coalesce(bit_xor(lo), 0), coalesce(sum(rows), 0) "
+        "FROM sync_hash_buckets WHERE kind = :kind"
+    ), {"kind": kind}).one()
+    return _node("", hi, lo, count)
+
+
+def rebuild(kind: str, batch_size: int = 2000) -> int:
+    """Recompute every row hash of `kind` from the database, then the buckets"""
+    db = SessionLocal()
+    try:
+        db.query(SyncHash).filter(SyncHash.kind == kind).delete(synchronize_session=False)
+        db.query(SyncHashBucket).filter(SyncHashBucket.kind == kind).delete(synchronize_session=False)
+        model = OfficialDocument if kind == "documents" else QAEntry
+        last = None
+        total = 0
+        while True:
+            # Deleted rows are not in the tree; see app.services.tombstones
+            query = db.query(model).filter(model.deleted_at.is_(None))
+            if last is not None:
+                query = query.filter(model.id > last)
+            batch = query.order_by(model.id).limit(batch_size).all()
+            if not batch:
+                break
+            last = batch[-1].id
+            if kind == "documents":
+                units: Dict[uuid.UUID, List] = {}
+                for unit in db.query(LegalUnit).filter(LegalUnit.document_id.in_([d.id for d in batch])):
+                    units.setdefault(unit.document_id, []).append(unit)
+                hashes = [(d.id, document_hash(d), units_hash(units.get(d.id, []))) for d in batch]
+            else:
+                hashes = [(e.id, qa_hash(e), None) for e in batch]
+            mappings = []
+            for row_id, row_hash, row_units_hash in hashes:
+                hi, lo = row_digest(row_id, row_hash, row_units_hash)
+                mappings.append(dict(
+                    kind=kind, id=row_id, bucket=bucket_of(row_id), content_hash=row_hash,
+                    units_hash=row_units_hash, hi=hi, lo=lo
+                ))
+            db.bulk_insert_mappings(SyncHash, mappings)
+            db.expunge_all()
+            total += len(batch)
+            logger.info(f"Hashed {total} {kind}")
+        db.execute(text("""
+            INSERT INTO sync_hash_buckets (kind, bucket, hi, lo, rows)
+            SELECT kind, bucket, bit_xor(hi), bit_xor(lo), count(*)
+            FROM sync_hashes WHERE kind = :kind
+            GROUP BY kind, bucket
+        """), {"kind": kind})
+        db.commit()
+        return total
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Maintain the sync reconciliation hash trees")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--kind", choices=KINDS + ("all",), default="all")
+    parser.add_argument("--batch-size", type=int, default=2000)
+    args = parser.parse_args()
+    kinds = KINDS if args.kind == "all" else (args.kind,)
+    print({kind: rebuild(kind, batch_size=args.batch_size) for kind in kinds})
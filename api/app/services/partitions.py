@@ -0,0 +1,115 @@
+"""
+Maintenance for hash-partitioned tables (see migration 0006).
+
+Partitions are vacuumed one at a time and only when their dead-tuple ratio
+passes a threshold, so each pass touches a fraction of the table instead of
+the whole of `legal_units`. Autovacuum handles leaf partitions on its own
+but never analyzes the partitioned parent, whose statistics the planner
+uses for joins; `vacuum_partitions` refreshes them after vacuuming.
+
+    python -m app.services.partitions status
+    python -m app.services.partitions vacuum --min-dead-ratio 0.1
+    python -m app.services.partitions tune --scale-factor 0.05
+"""
+from typing import Dict, List
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from app.db.base import engine
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLES = ("legal_units",)
+
+
+def partition_stats(engine: Engine, parent: str) -> List[Dict]:
+    """Per-partition live/dead tuples, size and last vacuum times"""
+    with engine.connect() as conn:
+        rows = conn.execute(text("""
+            SELECT c.relname AS name,
+                   coalesce(s.n_live_tup, 0) AS live_tuples,
+                   coalesce(s.n_dead_tup, 0) AS dead_tuples,
+                   pg_total_relation_size(c.oid) AS total_bytes,
+                   s.last_vacuum, s.last_autovacuum
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+            WHERE i.inhparent = CAST(:parent AS regclass)
+            ORDER BY c.relname
+        """), {"parent": parent}).mappings().all()
+    stats = []
+    for row in rows:
+        item = dict(row)
+        total = item["live_tuples"] + item["dead_tuples"]
+        item["dead_ratio"] = item["dead_tuples"] / total if total else 0.0
+        stats.append(item)
+    return stats
+
+
+def skew(stats: List[Dict]) -> float:
+    """Largest partition over the mean partition by live tuples; 1.0 is perfectly even"""
+    counts = [s["live_tuples"] for s in stats]
+    if not counts or not sum(counts):
+        return 1.0
+    return max(counts) / (sum(counts) / len(counts))
+
+
+def vacuum_partitions(engine: Engine, parent: str, min_dead_ratio: float = 0.1) -> List[Dict]:
+    """VACUUM (ANALYZE) partitions above `min_dead_ratio`, then ANALYZE the parent"""
+    quote = engine.dialect.identifier_preparer.quote
+    done = []
+    # VACUUM cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for item in partition_stats(engine, parent):
+            if item["dead_ratio"] < min_dead_ratio:
+                continue
+            t0 = time.perf_counter()
+            conn.execute(text(f"VACUUM (ANALYZE) {quote(item['name'])}"))
+            seconds = time.perf_counter() - t0
+            logger.info(f"Vacuumed {item['name']} ({item['dead_tuples']} dead tuples) in {seconds:.2f}s")
+            done.append({"name": item["name"], "dead_tuples": item["dead_tuples"], "seconds": seconds})
+        conn.execute(text(f"ANALYZE {quote(parent)}"))
+    return done
+
+
+def tune_autovacuum(engine: Engine, parent: str, scale_factor: float = 0.05):
+    """Set per-partition autovacuum thresholds (partitions do not inherit them)"""
+    quote = engine.dialect.identifier_preparer.quote
+    with engine.begin() as conn:
+        for item in partition_stats(engine, parent):
+            conn.execute(text(
+                f"ALTER TABLE {quote(item['name'])} SET ("
+                f"autovacuum_vacuum_scale_factor = {float(scale_factor)}, "
+                f"autovacuum_analyze_scale_factor = {float(scale_factor) / 2})"
+            ))
+
+
+def maintain_partitions(min_dead_ratio: float = 0.1) -> int:
+    """Leader job: vacuum every partitioned table's bloated partitions"""
+    if engine.dialect.name != "postgresql":
+        return 0
+    return sum(len(vacuum_partitions(engine, parent, min_dead_ratio)) for parent in PARTITIONED_TABLES)
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Maintain hash-partitioned tables")
+    parser.add_argument("command", choices=["status", "vacuum", "tune"])
+    parser.add_argument("--table", choices=PARTITIONED_TABLES, default="legal_units")
+    parser.add_argument("--min-dead-ratio", type=float, default=0.1)
+    parser.add_argument("--scale-factor", type=float, default=0.05)
+    args = parser.parse_args()
+
+    if args.command == "status":
+        stats = partition_stats(engine, args.table)
+        result = {"table": args.table, "partitions": stats, "skew": skew(stats)}
+    elif args.command == "vacuum":
+        result = vacuum_partitions(engine, args.table, args.min_dead_ratio)
+    else:
+        tune_autovacuum(engine, args.table, args.scale_factor)
+        result = partition_stats(engine, args.table)
+    print(json.dumps(result, ensure_ascii=False, indent=2, default=str))
@@ -0,0 +1,180 @@
+"""
+Retrieval result cache.
+
+Entries are keyed on a query's match-key terms (see retrieval.query_terms,
+so letter variants, digits and stopwords do not split keys) plus the
+filters and limit. They live in the process-wide response cache
+(app.core.cache), which bounds them by TTL, entry count and bytes, and shares
+them across workers on the redis backend. Each entry is tagged with the
+documents and Q&A entries in its result set, so `sync_import`'s existing
+invalidation drops exactly the entries whose hits it rewrote. An entry with
+fewer hits than its limit would take any newly imported match, so it is
+also tagged with its sources' collections and dropped on every import to
+them. A full entry only misses new rows that would outrank its hits, for at
+most the TTL.
+
+With RETRIEVAL_CACHE_SIMILARITY > 0, an exact miss is also matched against
+the cached queries' embeddings (same filters and limit only) and served from
+the nearest one when its cosine similarity reaches the threshold. The
+embedding index is per process. The default embedder hashes character
+trigrams, which catches rewordings of one question; any callable returning
+an L2-normalized vector can replace it.
+"""
+from collections import OrderedDict
+from dataclasses import asdict
+from typing import Callable, Dict, Optional, Sequence
+from app.core import cache
+from app.core.settings import settings
+import numpy as np
+import threading
+import zlib
+
+
+class HashingEmbedder:
+    """L2-normalized hashed character n-gram counts"""
+
+    def __init__(self, dim: int = 512, n: int = 3):
+        self.dim = dim
+        self.n = n
+
+    def __call__(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        padded = f" {text} "
+        for i in range(len(padded) - self.n + 1):
+            vector[zlib.crc32(padded[i:i + self.n].encode("utf-8")) % self.dim] += 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class RetrievalCache:
+    def __init__(
+        self,
+        ttl: int = 600,
+        similarity: float = 0.0,
+        max_vectors: int = 10000,
+        embedder: Callable[[str], np.ndarray] = None,
+        enabled: bool = True
+    ):
+        self.ttl = ttl
+        self.similarity = similarity
+        self.max_vectors = max_vectors
+        self.embedder = embedder or HashingEmbedder()
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._vectors: Dict[str, "OrderedDict[str, np.ndarray]"] = {}  # scope -> key -> vector
+        self._vector_count = 0
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def scope(filters, limit: int, variant: str = "") -> str:
+        """Entries are shared within a scope: same filters, limit and ranking variant (reranker)"""
+        params = {**asdict(filters), "limit": limit}
+        if variant:
+            params["variant"] = variant
+        return cache.make_key("retrieve-scope", params)
+
+    def key(self, terms: Sequence[str], scope: str) -> str:
+        return cache.make_key("retrieve", {"terms": list(terms), "scope": scope})
+
+    def get(self, terms: Sequence[str], filters, limit: int, variant: str = "") -> Optional[Dict]:
+        """Cached {"hits", "units", "qa_entries"} for a query, or None"""
+        if not self.enabled:
+            return None
+        scope = self.scope(filters, limit, variant)
+        stored = cache.get_cache().get(self.key(terms, scope))
+        semantic = False
+        if stored is cache.MISSING and self.similarity > 0:
+            stored = self._nearest(" ".join(terms), scope)
+            semantic = stored is not cache.MISSING
+        with self._lock:
+            if stored is cache.MISSING:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.semantic_hits += semantic
+            self.saved_seconds += stored["cost"]
+        return stored["entry"]
+
+    def set(self, terms: Sequence[str], filters, limit: int, entry: Dict, cost_seconds: float, variant: str = ""):
+        if not self.enabled:
+            return
+        scope = self.scope(filters, limit, variant)
+        key = self.key(terms, scope)
+        tags = [
+            cache.doc_tag(hit["document_id"]) if hit["source"] == "unit" else cache.qa_tag(hit["id"])
+            for hit in entry["hits"]
+        ]
+        if len(entry["hits"]) < limit:
+            tags += [cache.DOCUMENTS_TAG if source == "units" else cache.QA_TAG for source in filters.sources]
+        cache.get_cache().set(key, {"entry": entry, "cost": cost_seconds}, self.ttl, tags)
+        if self.similarity > 0:
+            self._remember(key, scope, self.embedder(" ".join(terms)))
+
+    def _remember(self, key: str, scope: str, vector: np.ndarray):
+        with self._lock:
+            vectors = self._vectors.setdefault(scope, OrderedDict())
+            if key in vectors:
+                vectors.move_to_end(key)
+            else:
+                self._vector_count += 1
+            vectors[key] = vector
+            while self._vector_count > self.max_vectors:
+                # drop from the scope holding the oldest vectors first
+                oldest_scope = next(s for s in self._vectors if self._vectors[s])
+                self._forget(oldest_scope, next(iter(self._vectors[oldest_scope])))
+
+    def _forget(self, scope: str, key: str):
+        vectors = self._vectors.get(scope)
+        if vectors is not None and vectors.pop(key, None) is not None:
+            self._vector_count -= 1
+            if not vectors:
+                del self._vectors[scope]
+
+    def _nearest(self, text: str, scope: str):
+        with self._lock:
+            vectors = self._vectors.get(scope)
+            if not vectors:
+                return cache.MISSING
+            keys = list(vectors)
+            matrix = np.stack(list(vectors.values()))
+        scores = matrix @ self.embedder(text)
+        for i in np.argsort(-scores):
+            if scores[i] < self.similarity:
+                break
+            stored = cache.get_cache().get(keys[i])
+            if stored is not cache.MISSING:
+                return stored
+            # evicted, expired or invalidated since it was embedded
+            with self._lock:
+                self._forget(scope, keys[i])
+        return cache.MISSING
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "saved_seconds": round(self.saved_seconds, 3),
+                "semantic_threshold": self.similarity,
+                "vectors": self._vector_count,
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.semantic_hits = self.misses = 0
+            self.saved_seconds = 0.0
+
+
+query_cache = RetrievalCache(
+    ttl=settings.RETRIEVAL_CACHE_TTL,
+    similarity=settings.RETRIEVAL_CACHE_SIMILARITY,
+    max_vectors=settings.RETRIEVAL_CACHE_MAX_VECTORS,
+    enabled=settings.RETRIEVAL_CACHE_ENABLED
+)
@@ -0,0 +1,582 @@
+"""
+Related content: for each Q&A entry the legal units most similar to it, and
+for each unit the most similar entries, by cosine similarity of their
+embeddings (app.services.embeddings).
+
+The `related_links` leader job keeps the RELATED_TOP_K best of both lists
+in related_links. Vectors come from embedding_cache, embedding any text the
+embedding job has not reached yet, and are scaled to unit length. The
+servable entries form one matrix, shared by a pool of RELATED_WORKERS
+processes; the units stream past it in (document_id, id) order,
+RELATED_BLOCK_SIZE at a time, and each block is scored against the entries
+in chunks, so a worker holds the entry matrix plus one block-by-chunk
+product. Only top-k lists come back: a unit's own list, and each entry's
+best among the block, which the leader folds into a running top k per
+entry. New blocks are read only when a slot frees up.
+
+Runs are incremental, from watermarks on documents and entries updated
+since the last run, read like the embedding job's:
+
+- an edited entry's list is recomputed against every unit, and so is the
+  list of an entry that links to a unit of a changed document;
+- a unit of a changed document, or one whose list holds an edited entry,
+  gets its list recomputed against every entry;
+- every other list can only gain members: the unit lists are merged with
+  their scores against the recomputed entries, the entry lists with their
+  scores against the units of changed documents.
+
+A changed entry, or one linking to a changed document, whose stored links
+all still reach a servable unit of the same document with the same text,
+at the stored scores, is taken as unedited, its links moved to the current
+unit ids: the overlap window reads recent rows again on every run, and a
+resent document's units come back under new ids, and this keeps neither
+from costing a pass over the units. So an incremental run leaves the same
+lists a rebuild would, and a run with an edited entry costs one pass over
+the units against the recomputed entries rather than against all of them.
+The first run for a model, and `--rebuild`, recompute everything.
+
+    python -m app.services.related update [--rebuild]
+"""
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import asdict, dataclass
+from datetime import timedelta
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from sqlalchemy import insert, or_, tuple_
+from sqlalchemy.orm import Session
+from app.core.settings import settings
+from app.db.base import SessionLocal
+from app.models.embedding import EmbeddingWatermark, RelatedLink
+from app.models.official import LegalUnit, OfficialDocument
+from app.models.qa import QAEntry
+from app.services.embeddings import (
+    KINDS, Embedder, EmbeddingReport, changed_rows, embed_missing, get_embedder, lookup_vectors, qa_text, unit_text
+)
+from app.services.serving import servable_document, servable_qa
+from app.utils.postings import to_uuid, uuid_bytes
+import logging
+import os
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+QA_CHUNK = 8192  # entries per matrix product
+WRITE_BATCH = 1000
+SCORE_TOLERANCE = 1e-4  # a stored score recomputed from the same vectors
+
+
+def top_k_rows(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Column indices and values of each row's k highest scores, highest first"""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.zeros((len(scores), 0), dtype=np.int64), np.zeros((len(scores), 0), dtype=scores.dtype)
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    values = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-values, axis=1, kind="stable")
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(values, order, axis=1)
+
+
+def merge_top_k(
+    index_a: np.ndarray, values_a: np.ndarray, index_b: np.ndarray, values_b: np.ndarray, k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Row-wise k best of two (index, value) candidate arrays"""
+    index = np.concatenate([index_a, index_b], axis=1)
+    top, values = top_k_rows(np.concatenate([values_a, values_b], axis=1), k)
+    return np.take_along_axis(index, top, axis=1), values
+
+
+def blocked_top_k(a: np.ndarray, b: np.ndarray, k: int, chunk: int = QA_CHUNK):
+    """
+    Top k of a @ b.T along both axes, computed over `chunk` rows of b at a time:
+    (row index, row values) give each row of a its best rows of b, and
+    (column index, column values) each row of b its best rows of a
+    """
+    row_index = np.zeros((len(a), 0), dtype=np.int64)
+    row_values = np.zeros((len(a), 0), dtype=np.float32)
+    column_index = [np.zeros((0, min(k, len(a))), dtype=np.int64)]
+    column_values = [np.zeros((0, min(k, len(a))), dtype=np.float32)]
+    for start in range(0, len(b), chunk):
+        scores = a @ b[start:start + chunk].T
+        index, values = top_k_rows(scores, k)
+        row_index, row_values = merge_top_k(row_index, row_values, index + start, values, k)
+        index, values = top_k_rows(scores.T, k)
+        column_index.append(index)
+        column_values.append(values)
+    return row_index, row_values, np.concatenate(column_index), np.concatenate(column_values)
+
+
+# Worker state, set once per process by _init_worker
+_entries: Optional[np.ndarray] = None
+_rescored: Optional[np.ndarray] = None
+_k = 0
+
+
+def _init_worker(entries: np.ndarray, rescored: np.ndarray, k: int):
+    global _entries, _rescored, _k
+    _entries, _rescored, _k = entries, rescored, k
+
+
+def score_block(vectors: np.ndarray, changed: np.ndarray) -> Dict[str, Tuple]:
+    """
+    Top-k lists for a block of unit vectors, in block rows and entry rows.
+
+    "changed": the changed units' best entries, and every entry's best
+    among them. "unchanged": the other units' best among the rescored
+    entries, and those entries' best among the other units.
+    """
+    result = {}
+    rows = np.flatnonzero(changed)
+    unit_index, unit_values, entry_index, entry_values = blocked_top_k(vectors[rows], _entries, _k)
+    result["changed"] = (rows, unit_index, unit_values, rows[entry_index], entry_values)
+    rows = np.flatnonzero(~changed)
+    if len(rows) and len(_rescored):
+        unit_index, unit_values, entry_index, entry_values = blocked_top_k(vectors[rows], _entries[_rescored], _k)
+        result["unchanged"] = (rows, _rescored[unit_index], unit_values, rows[entry_index], entry_values)
+    return result
+
+
+@dataclass
+class RelatedReport:
+    rebuilt: bool = False
+    qa_entries: int = 0  # servable entries scored against
+    changed_documents: int = 0
+    changed_qa: int = 0
+    units_scanned: int = 0
+    units_rescored: int = 0  # lists recomputed against every entry
+    qa_rescored: int = 0  # lists recomputed against every unit
+    links_written: int = 0
+    embedded: int = 0  # texts the embedding job had not reached
+    seconds: float = 0.0
+
+    def as_dict(self) -> Dict:
+        return asdict(self)
+
+
+def _matrix(db: Session, embedder: Embedder, keyed: Sequence[Tuple[str, str]], report: RelatedReport) -> np.ndarray:
+    """Unit-length vectors of (text key, text) pairs, in order"""
+    texts = dict(keyed)
+    embedding = EmbeddingReport()
+    embed_missing(db, embedder, texts, settings.EMBEDDING_BATCH_SIZE, embedding)
+    report.embedded += embedding.embedded
+    cached = lookup_vectors(db, embedder.model_id, texts)
+    matrix = np.stack([cached[key] for key, _ in keyed]).astype(np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1)
+
+
+def _changes(db: Session, model, since) -> Tuple[set, Optional[object]]:
+    """Ids of rows updated at or after `since`, and the latest updated_at among them"""
+    ids, after = set(), None
+    while True:
+        rows = changed_rows(db, model, since, after, 1000)
+        if not rows:
+            return ids, after[0] if after else None
+        ids.update(row.id for row in rows)
+        after = (rows[-1].updated_at, rows[-1].id)
+
+
+def _unit_blocks(db: Session, document_ids: Optional[set], block_size: int) -> Iterator[List]:
+    """Servable units with text, `block_size` at a time; only those of `document_ids` when given"""
+    after = None
+    while True:
+        query = db.query(
+            LegalUnit.id, LegalUnit.document_id, LegalUnit.heading, LegalUnit.text_plain,
+            LegalUnit.heading_normalized, LegalUnit.text_plain_normalized
+        ).join(OfficialDocument, OfficialDocument.id == LegalUnit.document_id).filter(servable_document())
+        if document_ids is not None:
+            query = query.filter(LegalUnit.document_id.in_(document_ids))
+        if after is not None:
+            query = query.filter(tuple_(LegalUnit.document_id, LegalUnit.id) > after)
+        rows = query.order_by(LegalUnit.document_id, LegalUnit.id).limit(block_size).all()
+        if not rows:
+            return
+        after = (rows[-1].document_id, rows[-1].id)
+        yield [row for row in rows if row.heading_normalized or row.text_plain_normalized]
+
+
+def _verified(
+    db: Session, embedder: Embedder, entries: Dict, current_qa: Dict, changed_docs: set, report: RelatedReport
+) -> Dict:
+    """
+    Entries (id -> vector) whose stored links all still reach a servable unit
+    of the same document with the same text key, at the stored scores: read
+    again, or near a changed document, but not edited. Their lists only need
+    merging, and come back pointing at the current units, as a resent
+    document's units get new ids.
+    """
+    links = [link for qa_id in entries for link in current_qa.get(qa_id, ())]
+    if not links:
+        return {}
+    # units of an unchanged document keep their ids; a changed one's are read whole
+    kept = {(document_id, unit_id) for unit_id, document_id, _, _ in links if document_id not in changed_docs}
+    resent = {document_id for _, document_id, _, _ in links if document_id in changed_docs}
+    units: Dict[Tuple, List] = {}
+    keyed = {}
+    for row in db.query(
+        LegalUnit.id, LegalUnit.document_id, LegalUnit.heading, LegalUnit.text_plain,
+        LegalUnit.heading_normalized, LegalUnit.text_plain_normalized
+    ).join(OfficialDocument, OfficialDocument.id == LegalUnit.document_id).filter(
+        or_(tuple_(LegalUnit.document_id, LegalUnit.id).in_(kept), LegalUnit.document_id.in_(resent)),
+        servable_document()
+    ).order_by(LegalUnit.document_id, LegalUnit.id):
+        if row.heading_normalized or row.text_plain_normalized:
+            key, text = unit_text(row)
+            units.setdefault((row.document_id, key), []).append(row.id)
+            keyed[key] = text
+    keys = list(keyed)
+    vectors = dict(zip(keys, _matrix(db, embedder, list(keyed.items()), report))) if keys else {}
+
+    verified = {}
+    for qa_id, vector in entries.items():
+        found, taken = [], set()
+        for unit_id, document_id, key, score in current_qa.get(qa_id, ()):
+            # a unit keeps its own id when it still has it; units sharing a text are taken in id order
+            candidates = [u for u in units.get((document_id, key), ()) if u not in taken]
+            if not candidates or abs(float(vectors[key] @ vector) - score) >= SCORE_TOLERANCE:
+                break
+            unit_id = unit_id if unit_id in candidates else candidates[0]
+            taken.add(unit_id)
+            found.append((unit_id, document_id, key, score))
+        else:
+            if found:
+                verified[qa_id] = found
+    return verified
+
+
+def _merged(current: Sequence[Tuple], candidates: Sequence[Tuple], k: int) -> List[Tuple]:
+    """The k best of two lists of (id, ..., score), each id once"""
+    best = {}
+    for link in (*current, *candidates):
+        best.setdefault(link[0], link)
+    return sorted(best.values(), key=lambda link: -link[-1])[:k]
+
+
+def _changed_list(current: Sequence[Tuple], merged: Sequence[Tuple]) -> bool:
+    return [link[0] for link in current] != [link[0] for link in merged]
+
+
+class _Writer:
+    """Buffers link rows and inserts them in batches"""
+
+    def __init__(self, db: Session, report: RelatedReport):
+        self.db, self.report, self.rows = db, report, []
+
+    def unit_list(self, unit_id, document_id, key, links: Sequence[Tuple]):
+        for rank, (qa_id, score) in enumerate(links, start=1):
+            self._add("unit", qa_id, unit_id, document_id, key, rank, score)
+
+    def qa_list(self, qa_id, links: Sequence[Tuple]):
+        for rank, (unit_id, document_id, key, score) in enumerate(links, start=1):
+            self._add("qa", qa_id, unit_id, document_id, key, rank, score)
+
+    def _add(self, source, qa_id, unit_id, document_id, key, rank, score):
+        self.rows.append({
+            "source": source, "qa_id": qa_id, "unit_id": unit_id, "document_id": document_id,
+            "text_key": key, "rank": rank, "score": float(score)
+        })
+        if len(self.rows) >= WRITE_BATCH:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.db.execute(insert(RelatedLink), self.rows)
+            self.report.links_written += len(self.rows)
+            self.rows = []
+
+
+def update_related(
+    db: Session,
+    embedder: Optional[Embedder] = None,
+    rebuild: bool = False,
+    top_k: Optional[int] = None,
+    min_score: Optional[float] = None,
+    workers: Optional[int] = None,
+    block_size: Optional[int] = None,
+    overlap_seconds: Optional[int] = None
+) -> RelatedReport:
+    """Bring related_links up to date with the rows changed since the watermarks, in one transaction"""
+    embedder = embedder or get_embedder()
+    if embedder is None:
+        raise ValueError("No embedder configured (EMBEDDER=none)")
+    k = top_k or settings.RELATED_TOP_K
+    min_score = settings.RELATED_MIN_SCORE if min_score is None else min_score
+    workers = workers or settings.RELATED_WORKERS or os.cpu_count() or 1
+    block_size = block_size or settings.RELATED_BLOCK_SIZE
+    overlap = settings.EMBEDDING_REFRESH_OVERLAP_SECONDS if overlap_seconds is None else overlap_seconds
+    report = RelatedReport()
+    started = time.perf_counter()
+
+    model_id = f"related:{embedder.model_id}"
+    states = {kind: db.get(EmbeddingWatermark, (model_id, kind)) for kind in KINDS}
+    rebuild = report.rebuilt = rebuild or any(state is None for state in states.values())
+    marks = {}
+    changed_docs, marks["documents"] = _changes(
+        db, OfficialDocument, None if rebuild else states["documents"].watermark - timedelta(seconds=overlap)
+    )
+    changed_qa, marks["qa_entries"] = _changes(
+        db, QAEntry, None if rebuild else states["qa_entries"].watermark - timedelta(seconds=overlap)
+    )
+    report.changed_documents, report.changed_qa = len(changed_docs), len(changed_qa)
+    if not rebuild and not changed_docs and not changed_qa:
+        report.seconds = time.perf_counter() - started
+        return report
+
+    entries = db.query(
+        QAEntry.id, QAEntry.question, QAEntry.answer, QAEntry.question_normalized, QAEntry.answer_normalized
+    ).filter(servable_qa()).order_by(QAEntry.id).all()
+    qa_ids = [row.id for row in entries]
+    report.qa_entries = len(qa_ids)
+
+    if not qa_ids:
+        db.query(RelatedLink).delete(synchronize_session=False)
+        _advance(db, model_id, states, marks)
+        report.seconds = time.perf_counter() - started
+        return report
+    matrix = _matrix(db, embedder, [qa_text(row) for row in entries], report)
+
+    # entry lists: recomputed in full for `stale`, merged for the rest
+    if rebuild:
+        db.query(RelatedLink).delete(synchronize_session=False)
+        current_qa: Dict = {}
+        stale, edited, moved = set(qa_ids), set(), set()
+    else:
+        current_qa = {}
+        for link in db.query(
+            RelatedLink.qa_id, RelatedLink.unit_id, RelatedLink.document_id, RelatedLink.text_key, RelatedLink.score
+        ).filter(RelatedLink.source == "qa").order_by(RelatedLink.qa_id, RelatedLink.rank):
+            current_qa.setdefault(link.qa_id, []).append((link.unit_id, link.document_id, link.text_key, link.score))
+        position = {qa_id: i for i, qa_id in enumerate(qa_ids)}
+        touched = {
+            qa_id for qa_id, links in current_qa.items()
+            if any(document_id in changed_docs for _, document_id, _, _ in links)
+        }
+        touched = {qa_id for qa_id in changed_qa | touched if qa_id in position}
+        verified = _verified(
+            db, embedder, {qa_id: matrix[position[qa_id]] for qa_id in touched}, current_qa, changed_docs, report
+        )
+        stale, edited = touched - set(verified), changed_qa - set(verified)
+        # lists of resent units are rewritten under the units' new ids
+        moved = {qa_id for qa_id, links in verified.items() if _changed_list(current_qa[qa_id], links)}
+        current_qa.update(verified)
+        for qa_id in stale | edited:
+            current_qa.pop(qa_id, None)
+        if stale | edited:
+            db.query(RelatedLink).filter(
+                RelatedLink.source == "qa", RelatedLink.qa_id.in_(stale | edited)
+            ).delete(synchronize_session=False)
+        if changed_docs:
+            db.query(RelatedLink).filter(
+                RelatedLink.source == "unit", RelatedLink.document_id.in_(changed_docs)
+            ).delete(synchronize_session=False)
+
+    rescored = np.array([i for i, qa_id in enumerate(qa_ids) if qa_id in stale], dtype=np.int64)
+    report.qa_rescored = len(rescored)
+    best = np.full((len(qa_ids), 0), -1, dtype=np.int64)
+    best_scores = np.zeros((len(qa_ids), 0), dtype=np.float32)
+    unit_ids, unit_docs, unit_keys, offset = [], [], [], 0
+    writer = _Writer(db, report)
+
+    def apply(result: Dict, start: int, rows: List, keys: List, current_units: Dict):
+        nonlocal best, best_scores
+        block_rows, index, values, entry_rows, entry_values = result["changed"]
+        for row, top, scores in zip(block_rows, index, values):
+            unit = rows[row]
+            writer.unit_list(unit.id, unit.document_id, keys[row], [
+                (qa_ids[i], score) for i, score in zip(top, scores) if score >= min_score
+            ])
+        best, best_scores = merge_top_k(best, best_scores, entry_rows + start, entry_values, k)
+        if "unchanged" in result:
+            block_rows, index, values, entry_rows, entry_values = result["unchanged"]
+            for row, top, scores in zip(block_rows, index, values):
+                unit = rows[row]
+                current = current_units.get(unit.id, [])
+                candidates = [(qa_ids[i], score) for i, score in zip(top, scores) if score >= min_score]
+                merged = _merged(current, candidates, k)
+                if _changed_list(current, merged):
+                    db.query(RelatedLink).filter(
+                        RelatedLink.source == "unit", RelatedLink.unit_id == unit.id
+                    ).delete(synchronize_session=False)
+                    writer.unit_list(unit.id, unit.document_id, keys[row], merged)
+            index, values = merge_top_k(best[rescored], best_scores[rescored], entry_rows + start, entry_values, k)
+            # entries keep k columns once they have seen k units
+            if best.shape[1] < index.shape[1]:
+                pad = index.shape[1] - best.shape[1]
+                best = np.pad(best, ((0, 0), (0, pad)), constant_values=-1)
+                best_scores = np.pad(best_scores, ((0, 0), (0, pad)), constant_values=-np.inf)
+            best[rescored], best_scores[rescored] = index, values
+
+    # every unit is scanned when some entry lists are recomputed, else only those of
+    # changed documents and those listing an edited entry
+    scope = None
+    if not rebuild and not len(rescored):
+        scope = changed_docs | {row.document_id for row in db.query(RelatedLink.document_id).filter(
+            RelatedLink.source == "unit", RelatedLink.qa_id.in_(edited)
+        ).distinct()} if edited else changed_docs
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(matrix, rescored, k)) as pool:
+        inflight = {}
+        for rows in _unit_blocks(db, scope, block_size):
+            if not rows:
+                continue
+            keyed = [unit_text(row) for row in rows]
+            vectors = _matrix(db, embedder, keyed, report)
+            current_units = {}
+            if rebuild:
+                changed = np.ones(len(rows), dtype=bool)
+            else:
+                for link in db.query(RelatedLink.unit_id, RelatedLink.qa_id, RelatedLink.score).filter(
+                    RelatedLink.source == "unit", RelatedLink.unit_id.in_([row.id for row in rows])
+                ).order_by(RelatedLink.unit_id, RelatedLink.rank):
+                    current_units.setdefault(link.unit_id, []).append((link.qa_id, link.score))
+                changed = np.array([
+                    row.document_id in changed_docs
+                    or any(qa_id in edited for qa_id, _ in current_units.get(row.id, ()))
+                    for row in rows
+                ])
+                recomputed = [
+                    row.id for row, flag in zip(rows, changed) if flag and row.document_id not in changed_docs
+                ]
+                if recomputed:
+                    db.query(RelatedLink).filter(
+                        RelatedLink.source == "unit", RelatedLink.unit_id.in_(recomputed)
+                    ).delete(synchronize_session=False)
+            report.units_scanned += len(rows)
+            report.units_rescored += int(changed.sum())
+            unit_ids.append(uuid_bytes([row.id for row in rows]))
+            unit_docs.append(uuid_bytes([row.document_id for row in rows]))
+            keys = [key for key, _ in keyed]
+            unit_keys.extend(keys)
+            inflight[pool.submit(score_block, vectors, changed)] = (offset, rows, keys, current_units)
+            offset += len(rows)
+            if len(inflight) >= workers * 2:
+                done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    apply(future.result(), *inflight.pop(future))
+        for future in list(inflight):
+            apply(future.result(), *inflight.pop(future))
+
+    unit_ids = np.concatenate(unit_ids) if unit_ids else np.zeros(0, dtype="S16")
+    unit_docs = np.concatenate(unit_docs) if unit_docs else np.zeros(0, dtype="S16")
+    is_stale = np.zeros(len(qa_ids), dtype=bool)
+    is_stale[rescored] = True
+    for i, qa_id in enumerate(qa_ids):
+        candidates = [
+            (to_uuid(unit_ids[j]), to_uuid(unit_docs[j]), unit_keys[j], score)
+            for j, score in zip(best[i], best_scores[i]) if j >= 0 and score >= min_score
+        ]
+        if is_stale[i]:
+            writer.qa_list(qa_id, candidates)
+            continue
+        current = current_qa.get(qa_id, [])
+        merged = _merged(current, candidates, k)
+        if qa_id in moved or _changed_list(current, merged):
+            db.query(RelatedLink).filter(
+                RelatedLink.source == "qa", RelatedLink.qa_id == qa_id
+            ).delete(synchronize_session=False)
+            writer.qa_list(qa_id, merged)
+    writer.flush()
+    _advance(db, model_id, states, marks)
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def _advance(db: Session, model_id: str, states: Dict, marks: Dict):
+    for kind in KINDS:
+        state, mark = states[kind], marks[kind]
+        if mark is None:
+            continue
+        if state is None:
+            db.add(EmbeddingWatermark(model_id=model_id, kind=kind, watermark=mark))
+        else:
+            state.watermark = max(state.watermark, mark)
+    db.commit()
+
+
+def related_units(db: Session, qa_id, limit: int) -> Optional[List[Dict]]:
+    """A servable Q&A entry's most similar servable units, best first; None for an unknown entry"""
+    if db.query(QAEntry.id).filter(QAEntry.id == qa_id, servable_qa()).first() is None:
+        return None
+    links = db.query(RelatedLink.unit_id, RelatedLink.document_id, RelatedLink.score).filter(
+        RelatedLink.source == "qa", RelatedLink.qa_id == qa_id
+    ).order_by(RelatedLink.rank).limit(limit).all()
+    if not links:
+        return []
+    rows = db.query(
+        LegalUnit.id, LegalUnit.document_id, OfficialDocument.title, LegalUnit.unit_type,
+        LegalUnit.num_label, LegalUnit.heading, LegalUnit.text_plain
+    ).join(OfficialDocument, OfficialDocument.id == LegalUnit.document_id).filter(
+        tuple_(LegalUnit.document_id, LegalUnit.id).in_([(link.document_id, link.unit_id) for link in links]),
+        servable_document()
+    ).all()
+    by_id = {row.id: row for row in rows}
+    return [
+        {
+            "id": str(link.unit_id),
+            "document_id": str(row.document_id),
+            "document_title": row.title,
+            "unit_type": row.unit_type,
+            "num_label": row.num_label,
+            "heading": row.heading,
+            "text_plain": row.text_plain,
+            "score": round(link.score, 4),
+        }
+        for link in links
+        if (row := by_id.get(link.unit_id)) is not None
+    ]
+
+
+def related_qa(db: Session, unit_id, limit: int) -> Optional[List[Dict]]:
+    """
+    A servable unit's most similar servable Q&A entries, best first; None for an unknown unit
+    The unit's document comes from its stored links, so the lookup reads one
+    partition of legal_units; only a unit without links is looked up by id alone.
+    """
+    link = db.query(RelatedLink.document_id).filter(
+        RelatedLink.source == "unit", RelatedLink.unit_id == unit_id
+    ).first()
+    unit = db.query(LegalUnit.id).join(OfficialDocument, OfficialDocument.id == LegalUnit.document_id).filter(
+        *([LegalUnit.document_id == link.document_id] if link is not None else []),
+        LegalUnit.id == unit_id, servable_document()
+    ).first()
+    if unit is None:
+        return None
+    rows = db.query(
+        QAEntry.id, QAEntry.question, QAEntry.answer, QAEntry.topic_tags, QAEntry.source_url, RelatedLink.score
+    ).join(RelatedLink, RelatedLink.qa_id == QAEntry.id).filter(
+        RelatedLink.source == "unit", RelatedLink.unit_id == unit_id, servable_qa()
+    ).order_by(RelatedLink.rank).limit(limit).all()
+    return [
+        {
+            "id": str(row.id),
+            "question": row.question,
+            "answer": row.answer,
+            "topic_tags": row.topic_tags,
+            "source_url": row.source_url,
+            "score": round(row.score, 4),
+        }
+        for row in rows
+    ]
+
+
+def related_job():
+    db = SessionLocal()
+    try:
+        report = update_related(db)
+        logger.info(f"Related links updated: {report.as_dict()}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Link Q&A entries and legal units by embedding similarity")
+    parser.add_argument("command", choices=["update"])
+    parser.add_argument("--rebuild", action="store_true", help="recompute every list, not just those the changes touch")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    session = SessionLocal()
+    try:
+        print(update_related(session, rebuild=args.rebuild, workers=args.workers).as_dict())
+    finally:
+        session.close()
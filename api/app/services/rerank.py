@@ -0,0 +1,259 @@
+"""
+Second-stage reranking of retrieval candidates.
+
+With RERANKER set, retrieval takes the first stage's RERANK_CANDIDATES best
+hits per query instead of `limit`, and the reranker reorders them. Each
+candidate gets a row of FEATURES, computed for the whole candidate set at
+once:
+
+- lexical: the first-stage score over the query's best, so ts_rank_cd and
+  BM25 scales compare
+- vector: cosine of the query's and the candidate's embeddings (EMBEDDER,
+  through embedding_cache); 0 without an embedder or a cached vector
+- quality: a Q&A entry's quality_score, clipped to [0, 1]
+- recency: halves every `recency_half_life_days`, from a Q&A entry's
+  answered_at or a document's amended_date, else its effective_date
+- authority: a weight per doc_type, so a law can outrank a guideline; Q&A
+  entries take the "qa" weight
+- qa: 1 for Q&A entries, so the weights can balance the two sources
+
+RERANKER=linear scores a row as its dot product with weights read from the
+JSON file at RERANK_WEIGHTS_PATH (DEFAULT_CONFIG without one). The file is
+written by hand or by `python -m benchmarks.eval_rerank --train`, which fits
+the weights to relevance judgments and reports recall@k and nDCG before and
+after reranking. RERANKER=package.module:factory plugs in any Reranker.
+Loading the signals is one query per source for a whole batch; scoring a
+few hundred candidates is a handful of array operations.
+"""
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import date
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+from app.core.settings import settings
+from app.models.official import LegalUnit, OfficialDocument
+from app.models.qa import QAEntry
+from app.services.embeddings import Embedder, lookup_vectors, text_key
+from app.services.versioning import content_hash
+import importlib
+import json
+import math
+import uuid
+import numpy as np
+
+FEATURES = ("lexical", "vector", "quality", "recency", "authority", "qa")
+
+DEFAULT_CONFIG = {
+    "weights": {"lexical": 1.0, "vector": 0.5, "quality": 0.2, "recency": 0.1, "authority": 0.2, "qa": 0.0},
+    "bias": 0.0,
+    "recency_half_life_days": 1825,
+    "authority": {"law": 1.0, "regulation": 0.8, "circular": 0.6, "guideline": 0.4, "qa": 0.5},
+}
+
+
+class Reranker(ABC):
+    """Scores rows of FEATURES; higher ranks first"""
+
+    model_id = ""  # names the model and its weights; part of the retrieval cache key
+    half_life_days = float(DEFAULT_CONFIG["recency_half_life_days"])
+    authority: Dict[str, float] = DEFAULT_CONFIG["authority"]
+
+    @abstractmethod
+    def score(self, features: np.ndarray) -> np.ndarray:
+        """One score per row"""
+
+
+class LinearReranker(Reranker):
+    def __init__(self, config: Optional[Dict] = None):
+        config = {**DEFAULT_CONFIG, **(config or {})}
+        self.config = config
+        self.weights = np.array([float(config["weights"].get(name, 0.0)) for name in FEATURES], dtype=np.float32)
+        self.bias = float(config["bias"])
+        self.half_life_days = float(config["recency_half_life_days"])
+        self.authority = {name: float(weight) for name, weight in config["authority"].items()}
+        self.model_id = "linear-" + content_hash([json.dumps(config, sort_keys=True)])[:12]
+
+    @classmethod
+    def from_file(cls, path: str) -> "LinearReranker":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def score(self, features: np.ndarray) -> np.ndarray:
+        return features @ self.weights + self.bias
+
+
+def load_reranker(spec: str, weights_path: str = "") -> Optional[Reranker]:
+    """The reranker RERANKER names: "none", "linear" or "package.module:factory" """
+    if not spec or spec == "none":
+        return None
+    if spec == "linear":
+        return LinearReranker.from_file(weights_path) if weights_path else LinearReranker()
+    module, _, factory = spec.partition(":")
+    if not factory:
+        raise ValueError(f"RERANKER must be none, linear or package.module:factory, not {spec!r}")
+    return getattr(importlib.import_module(module), factory)()
+
+
+@lru_cache(maxsize=None)
+def get_reranker() -> Optional[Reranker]:
+    """The configured reranker, loaded once per process"""
+    return load_reranker(settings.RERANKER, settings.RERANK_WEIGHTS_PATH)
+
+
+@dataclass
+class Signals:
+    """What the features are computed from, one row per distinct candidate of a batch"""
+    index: Dict[str, int]  # hit id -> row
+    vectors: np.ndarray  # unit length; zero rows when not embedded, no columns without an embedder
+    quality: np.ndarray
+    days: np.ndarray  # date.toordinal() of the date recency counts from, NaN for none
+    authority: np.ndarray
+    qa: np.ndarray
+
+
+def _ordinal(value: Optional[date]) -> float:
+    return float(value.toordinal()) if value is not None else math.nan
+
+
+def load_signals(
+    db: Session, grouped: Sequence[Sequence[Dict]], reranker: Reranker, embedder: Optional[Embedder] = None
+) -> Signals:
+    """Signals for every hit in `grouped`; hits no longer in the database are left out"""
+    unit_keys = {(uuid.UUID(h["document_id"]), uuid.UUID(h["id"])) for g in grouped for h in g if h["source"] == "unit"}
+    qa_ids = {uuid.UUID(h["id"]) for g in grouped for h in g if h["source"] == "qa"}
+    rows: List[Tuple] = []  # (id, text key, quality, days, authority, qa)
+    if unit_keys:
+        for row in db.query(
+            LegalUnit.id, LegalUnit.heading_normalized, LegalUnit.text_plain_normalized,
+            OfficialDocument.doc_type, OfficialDocument.amended_date, OfficialDocument.effective_date
+        ).join(OfficialDocument, OfficialDocument.id == LegalUnit.document_id).filter(
+            tuple_(LegalUnit.document_id, LegalUnit.id).in_(list(unit_keys))
+        ):
+            rows.append((
+                str(row.id), text_key(row.heading_normalized, row.text_plain_normalized), 0.0,
+                _ordinal(row.amended_date or row.effective_date), reranker.authority.get(row.doc_type, 0.0), 0.0
+            ))
+    if qa_ids:
+        for row in db.query(
+            QAEntry.id, QAEntry.question_normalized, QAEntry.answer_normalized, QAEntry.quality_score, QAEntry.answered_at
+        ).filter(QAEntry.id.in_(list(qa_ids))):
+            rows.append((
+                str(row.id), text_key(row.question_normalized, row.answer_normalized),
+                min(max(row.quality_score or 0.0, 0.0), 1.0), _ordinal(row.answered_at),
+                reranker.authority.get("qa", 0.0), 1.0
+            ))
+    vectors = np.zeros((len(rows), 0), dtype=np.float32)
+    if embedder is not None and rows:
+        cached = lookup_vectors(db, embedder.model_id, [row[1] for row in rows])
+        dim = next((len(v) for v in cached.values()), 0)
+        vectors = np.zeros((len(rows), dim), dtype=np.float32)
+        for i, row in enumerate(rows):
+            if row[1] in cached:
+                vectors[i] = cached[row[1]]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms > 0, norms, 1)
+    columns = list(zip(*rows)) if rows else [()] * 6
+    return Signals(
+        index={hit_id: i for i, hit_id in enumerate(columns[0])},
+        vectors=vectors,
+        quality=np.array(columns[2], dtype=np.float32),
+        days=np.array(columns[3], dtype=np.float64),
+        authority=np.array(columns[4], dtype=np.float32),
+        qa=np.array(columns[5], dtype=np.float32),
+    )
+
+
+def candidate_features(
+    hits: Sequence[Dict], signals: Signals, query_vector: Optional[np.ndarray], reranker: Reranker, today: date
+) -> np.ndarray:
+    """(len(hits), len(FEATURES)) float32 rows for one query's candidates, all in `signals`"""
+    rows = np.fromiter((signals.index[hit["id"]] for hit in hits), dtype=np.int64, count=len(hits))
+    scores = np.fromiter((hit["score"] for hit in hits), dtype=np.float32, count=len(hits))
+    features = np.zeros((len(hits), len(FEATURES)), dtype=np.float32)
+    best = scores.max() if len(scores) else 0.0
+    if best > 0:
+        features[:, 0] = scores / best
+    if query_vector is not None and signals.vectors.shape[1] == len(query_vector):
+        features[:, 1] = signals.vectors[rows] @ query_vector
+    features[:, 2] = signals.quality[rows]
+    age = np.maximum(today.toordinal() - signals.days[rows], 0)
+    features[:, 3] = np.nan_to_num(np.exp2(-age / reranker.half_life_days))
+    features[:, 4] = signals.authority[rows]
+    features[:, 5] = signals.qa[rows]
+    return features
+
+
+def query_vectors(embedder: Optional[Embedder], queries: Sequence[str]) -> List[Optional[np.ndarray]]:
+    if embedder is None or not queries:
+        return [None] * len(queries)
+    vectors = np.asarray(embedder.embed(list(queries)), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return list(vectors / np.where(norms > 0, norms, 1))
+
+
+def rerank(
+    hits: Sequence[Dict], signals: Signals, query_vector: Optional[np.ndarray],
+    reranker: Reranker, limit: int, today: date
+) -> List[Dict]:
+    """The reranker's top `limit` of one query's candidates, scored; the first-stage score moves to lexical_score"""
+    hits = [hit for hit in hits if hit["id"] in signals.index]
+    if not hits:
+        return []
+    scores = reranker.score(candidate_features(hits, signals, query_vector, reranker, today))
+    order = np.argsort(-scores, kind="stable")[:limit]
+    return [{**hits[i], "score": float(scores[i]), "lexical_score": hits[i]["score"]} for i in order]
+
+
+def rerank_hits(
+    db: Session, reranker: Reranker, queries: Sequence[str], grouped: Sequence[Sequence[Dict]],
+    limit: int, embedder: Optional[Embedder] = None, today: Optional[date] = None
+) -> List[List[Dict]]:
+    """Rerank per-query candidate lists, loading the signals of the whole batch at once"""
+    signals = load_signals(db, grouped, reranker, embedder)
+    vectors = query_vectors(embedder if signals.vectors.shape[1] else None, queries)
+    today = today or date.today()
+    return [rerank(hits, signals, vector, reranker, limit, today) for hits, vector in zip(grouped, vectors)]
+
+
+# -- offline evaluation ------------------------------------------------------
+
+def recall_at_k(ranked: Sequence[str], relevant: Dict[str, float], k: int) -> float:
+    """Share of the relevant ids (grade > 0) in the top k"""
+    wanted = {hit_id for hit_id, grade in relevant.items() if grade > 0}
+    if not wanted:
+        return 0.0
+    return len(wanted.intersection(ranked[:k])) / len(wanted)
+
+
+def ndcg_at_k(ranked: Sequence[str], relevant: Dict[str, float], k: int) -> float:
+    """Normalized discounted cumulative gain with graded relevance (2^grade - 1 gains)"""
+    def dcg(grades):
+        return sum((2 ** grade - 1) / math.log2(rank + 2) for rank, grade in enumerate(grades))
+
+    ideal = dcg(sorted((g for g in relevant.values() if g > 0), reverse=True)[:k])
+    if ideal == 0:
+        return 0.0
+    return dcg([relevant.get(hit_id, 0) for hit_id in ranked[:k]]) / ideal
+
+
+def fit_weights(
+    features: np.ndarray, labels: np.ndarray, epochs: int = 500, learning_rate: float = 0.5, l2: float = 1e-3
+) -> Dict:
+    """
+    Logistic regression of relevance (labels 0/1) on candidate feature rows,
+    by batch gradient descent; the weights part of a LinearReranker config
+    """
+    features = np.asarray(features, dtype=np.float64)
+    labels = np.asarray(labels, dtype=np.float64)
+    # balance relevant and irrelevant candidates, which are far fewer
+    positive = labels.mean() if len(labels) else 0.0
+    sample_weights = np.where(labels > 0, 0.5 / max(positive, 1e-9), 0.5 / max(1 - positive, 1e-9))
+    weights, bias = np.zeros(features.shape[1]), 0.0
+    for _ in range(epochs):
+        predicted = 1 / (1 + np.exp(-(features @ weights + bias)))
+        error = (predicted - labels) * sample_weights
+        weights -= learning_rate * (features.T @ error / len(labels) + l2 * weights)
+        bias -= learning_rate * error.mean()
+    return {"weights": {name: round(float(w), 6) for name, w in zip(FEATURES, weights)}, "bias": round(float(bias), 6)}
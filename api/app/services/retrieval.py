@@ -0,0 +1,388 @@
+"""
+Lexical retrieval over legal units and Q&A entries.
+
+Queries are folded with normalize_key and matched as an OR of their terms
+against the stored, GIN-indexed tsvectors of the serving tables
+(app.services.serving), which hold only servable rows, ranked by
+ts_rank_cd. `retrieve` runs a whole batch of queries as one statement per
+source, a LATERAL top-k over unnest(queries), so every query sees the same
+snapshot through one connection. With RETRIEVAL_BACKEND=bm25, hits come
+from the in-process BM25 index (app.services.bm25) instead, wherever it can
+serve the filters. On an edge node, the snapshot bundle's FTS5 indexes are
+searched, one statement per query and source, ranked by bm25(). Each
+distinct hit is then loaded once, however many queries returned it. Per-query results are cached by
+app.services.query_cache. The Postgres path is PostgreSQL only.
+
+With RERANKER set (not on edge nodes), the first stage returns
+RERANK_CANDIDATES hits per query and app.services.rerank picks the `limit`
+best of them.
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import text, tuple_
+from sqlalchemy.orm import Session
+from app.models.official import LegalUnit, OfficialDocument
+from app.models.qa import QAEntry
+from app.core.settings import settings
+from app.db.bundle import is_bundle
+from app.services.bm25 import bm25_index
+from app.services.catalog import catalog
+from app.services.embeddings import get_embedder
+from app.services.query_cache import query_cache
+from app.services.rerank import Reranker, get_reranker, rerank_hits
+from app.services.serving import servable_document, servable_qa
+from app.utils.postings import SOURCE_QA, SOURCE_UNIT
+from app.utils.text import key_terms, normalize_key
+import json
+import time
+import uuid
+
+SOURCES = ("units", "qa")
+MAX_TERMS = 32
+
+
+@dataclass
+class RetrievalFilters:
+    sources: Sequence[str] = SOURCES
+    doc_type: Optional[List[str]] = None
+    jurisdiction: Optional[List[str]] = None
+    authority: Optional[List[str]] = None
+    unit_type: Optional[List[str]] = None
+    document_ids: Optional[List[uuid.UUID]] = None
+    topic_tags: Optional[List[str]] = None  # Q&A entries sharing any tag
+
+
+def query_terms(query: str) -> List[str]:
+    """Distinct match-key terms of a query, in order, without stopwords"""
+    return list(dict.fromkeys(key_terms(normalize_key(query))))[:MAX_TERMS]
+
+
+def to_tsquery_text(terms: Sequence[str]) -> str:
+    """OR of quoted terms, for to_tsquery('simple', ...)"""
+    return " | ".join(f"'{term}'" for term in terms)
+
+
+def _unit_filters(filters: RetrievalFilters, params: Dict) -> str:
+    """Extra WHERE conditions on serving_units s, each starting with AND"""
+    clauses = []
+    for name, column in (
+        ("doc_type", "s.doc_type"),
+        ("jurisdiction", "s.jurisdiction"),
+        ("authority", "s.authority"),
+        ("unit_type", "s.unit_type"),
+    ):
+        values = getattr(filters, name)
+        if values:
+            params[name] = list(values)
+            clauses.append(f"{column} = ANY(CAST(:{name} AS text[]))")
+    if filters.document_ids:
+        params["document_ids"] = [str(d) for d in filters.document_ids]
+        clauses.append("s.document_id = ANY(CAST(:document_ids AS uuid[]))")
+    return "".join(f" AND {clause}" for clause in clauses)
+
+
+def _qa_filters(filters: RetrievalFilters, params: Dict) -> str:
+    clauses = []
+    if filters.topic_tags:
+        params["topic_tags"] = list(filters.topic_tags)
+        clauses.append("s.topic_tags && CAST(:topic_tags AS varchar[])")
+    return "".join(f" AND {clause}" for clause in clauses)
+
+
+def _unit_hits_sql(where: str):
+    return text(f"""
+        SELECT q.idx - 1 AS idx, h.id, h.document_id, h.score
+        FROM unnest(CAST(:tsq AS text[])) WITH ORDINALITY AS q(tsq, idx)
+        CROSS JOIN LATERAL (
+            SELECT s.id, s.document_id, ts_rank_cd(s.tsv, to_tsquery('simple', q.tsq)) AS score
+            FROM serving_units s
+            WHERE s.tsv @@ to_tsquery('simple', q.tsq){where}
+            ORDER BY score DESC
+            LIMIT :k
+        ) h
+    """)
+
+
+def _qa_hits_sql(where: str):
+    return text(f"""
+        SELECT q.idx - 1 AS idx, h.id, h.score
+        FROM unnest(CAST(:tsq AS text[])) WITH ORDINALITY AS q(tsq, idx)
+        CROSS JOIN LATERAL (
+            SELECT s.id, ts_rank_cd(s.tsv, to_tsquery('simple', q.tsq)) AS score
+            FROM serving_qa s
+            WHERE s.tsv @@ to_tsquery('simple', q.tsq){where}
+            ORDER BY score DESC
+            LIMIT :k
+        ) h
+    """)
+
+
+# Snapshot bundles (app.services.snapshots): ids are hex, filters are JSON arrays
+_FTS_UNITS_SQL = """
+    SELECT u.id, u.document_id, -bm25(units_fts) AS score
+    FROM units_fts
+    JOIN legal_units u ON u.row_id = units_fts.rowid
+    JOIN official_documents d ON d.id = u.document_id
+    WHERE units_fts MATCH :match{where}
+    ORDER BY bm25(units_fts)
+    LIMIT :k
+"""
+_FTS_QA_SQL = """
+    SELECT e.id, -bm25(qa_fts) AS score
+    FROM qa_fts
+    JOIN qa_entries e ON e.row_id = qa_fts.rowid
+    WHERE qa_fts MATCH :match{where}
+    ORDER BY bm25(qa_fts)
+    LIMIT :k
+"""
+
+
+def to_fts_match(terms: Sequence[str]) -> str:
+    """OR of quoted terms, for an FTS5 MATCH"""
+    return " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def _fts_filters(filters: RetrievalFilters, params: Dict) -> Tuple[str, str]:
+    """Extra WHERE conditions for _FTS_UNITS_SQL and _FTS_QA_SQL, each starting with AND"""
+    units = []
+    for name, column in (
+        ("doc_type", "d.doc_type"),
+        ("jurisdiction", "d.jurisdiction"),
+        ("authority", "d.authority"),
+        ("unit_type", "u.unit_type"),
+    ):
+        values = getattr(filters, name)
+        if values:
+            params[name] = json.dumps(list(values))
+            units.append(f"{column} IN (SELECT value FROM json_each(:{name}))")
+    if filters.document_ids:
+        params["document_ids"] = json.dumps([uuid.UUID(str(d)).hex for d in filters.document_ids])
+        units.append("u.document_id IN (SELECT value FROM json_each(:document_ids))")
+    qa = []
+    if filters.topic_tags:
+        params["topic_tags"] = json.dumps(list(filters.topic_tags))
+        qa.append(
+            "EXISTS (SELECT 1 FROM json_each(e.topic_tags) t "
+            "WHERE t.value IN (SELECT value FROM json_each(:topic_tags)))"
+        )
+    return "".join(f" AND {c}" for c in units), "".join(f" AND {c}" for c in qa)
+
+
+def _fts_search(db: Session, terms: Sequence[List[str]], filters: RetrievalFilters, limit: int) -> List[List[Dict]]:
+    """Per-query hit lists from a snapshot bundle's FTS5 indexes"""
+    params = {"k": limit}
+    unit_where, qa_where = _fts_filters(filters, params)
+    unit_sql = text(_FTS_UNITS_SQL.format(where=unit_where))
+    qa_sql = text(_FTS_QA_SQL.format(where=qa_where))
+    hits = []
+    for idx, words in enumerate(terms):
+        params["match"] = to_fts_match(words)
+        if "units" in filters.sources:
+            for row in db.execute(unit_sql, params):
+                hits.append((idx, "unit", uuid.UUID(row.id), uuid.UUID(row.document_id), row.score))
+        if "qa" in filters.sources:
+            for row in db.execute(qa_sql, params):
+                hits.append((idx, "qa", uuid.UUID(row.id), None, row.score))
+    return group_hits(len(terms), hits, limit)
+
+
+def group_hits(query_count: int, hits: Sequence[Tuple], limit: int) -> List[List[Dict]]:
+    """
+    (query index, source, id, document id, score) rows -> per-query hit lists,
+    best first and cut to `limit` across sources
+    """
+    grouped = [[] for _ in range(query_count)]
+    for idx, source, hit_id, document_id, score in hits:
+        hit = {"source": source, "id": str(hit_id), "score": float(score)}
+        if document_id is not None:
+            hit["document_id"] = str(document_id)
+        grouped[idx].append(hit)
+    for hits_for_query in grouped:
+        hits_for_query.sort(key=lambda hit: -hit["score"])
+        del hits_for_query[limit:]
+    return grouped
+
+
+def _load_units(db: Session, keys) -> Dict[str, Dict]:
+    if not keys:
+        return {}
+    rows = db.query(LegalUnit, OfficialDocument.title, OfficialDocument.source_url).join(
+        OfficialDocument, OfficialDocument.id == LegalUnit.document_id
+    ).filter(
+        tuple_(LegalUnit.document_id, LegalUnit.id).in_(list(keys)),
+        servable_document()
+    ).all()
+    return {
+        str(unit.id): {
+            "document_id": str(unit.document_id),
+            "document_title": title,
+            "source_url": source_url,
+            "unit_type": unit.unit_type,
+            "num_label": unit.num_label,
+            "heading": unit.heading,
+            "text_plain": unit.text_plain,
+            "order_index": unit.order_index,
+        }
+        for unit, title, source_url in rows
+    }
+
+
+def _load_qa(db: Session, ids) -> Dict[str, Dict]:
+    if not ids:
+        return {}
+    entries = db.query(QAEntry).filter(QAEntry.id.in_(list(ids)), servable_qa()).all()
+    return {
+        str(entry.id): {
+            "question": entry.question,
+            "answer": entry.answer,
+            "topic_tags": entry.topic_tags,
+            "source_url": entry.source_url,
+            "quality_score": entry.quality_score,
+        }
+        for entry in entries
+    }
+
+
+def _bm25_search(terms: Sequence[List[str]], filters: RetrievalFilters, limit: int) -> Optional[List[List[Dict]]]:
+    """
+    Per-query hit lists from the in-process BM25 index, or None when it
+    cannot answer: no index yet, a topic_tags filter, or document filters
+    before the catalog has loaded
+    """
+    if filters.topic_tags and "qa" in filters.sources:
+        return None
+    groups = None
+    if filters.doc_type or filters.jurisdiction or filters.authority:
+        if not catalog.loaded:
+            return None
+        groups = set(catalog.ids_for(catalog.filter_mask(
+            doc_type=filters.doc_type, jurisdiction=filters.jurisdiction, authority=filters.authority
+        )))
+    if filters.document_ids:
+        groups = set(filters.document_ids) if groups is None else groups & set(filters.document_ids)
+    hits = []
+    for source, code in (("units", SOURCE_UNIT), ("qa", SOURCE_QA)):
+        if source not in filters.sources:
+            continue
+        if source == "units":
+            found = bm25_index.search(terms, limit, code, filters.unit_type, groups)
+        else:
+            found = bm25_index.search(terms, limit, code)
+        if found is None:
+            return None
+        for idx, results in enumerate(found):
+            for hit_id, group, score in results:
+                if source == "units":
+                    hits.append((idx, "unit", hit_id, group, score))
+                else:
+                    hits.append((idx, "qa", hit_id, None, score))
+    return group_hits(len(terms), hits, limit)
+
+
+def _search(db: Session, terms: Sequence[List[str]], filters: RetrievalFilters, limit: int) -> List[List[Dict]]:
+    """
+    Per-query hit lists, from a snapshot bundle on an edge node, from the
+    BM25 index when configured, else one statement per source
+    """
+    if is_bundle(db):
+        return _fts_search(db, terms, filters, limit)
+    if settings.RETRIEVAL_BACKEND == "bm25":
+        grouped = _bm25_search(terms, filters, limit)
+        if grouped is not None:
+            return grouped
+    tsqueries = [to_tsquery_text(t) for t in terms]
+    hits = []
+    if "units" in filters.sources:
+        params = {"tsq": list(tsqueries), "k": limit}
+        sql = _unit_hits_sql(_unit_filters(filters, params))
+        for row in db.execute(sql, params):
+            hits.append((row.idx, "unit", row.id, row.document_id, row.score))
+    if "qa" in filters.sources:
+        params = {"tsq": list(tsqueries), "k": limit}
+        sql = _qa_hits_sql(_qa_filters(filters, params))
+        for row in db.execute(sql, params):
+            hits.append((row.idx, "qa", row.id, None, row.score))
+    return group_hits(len(tsqueries), hits, limit)
+
+
+def _ranked(
+    db: Session, queries: Sequence[str], terms: Sequence[List[str]], filters: RetrievalFilters,
+    limit: int, reranker: Optional[Reranker]
+) -> List[List[Dict]]:
+    if reranker is None:
+        return _search(db, terms, filters, limit)
+    candidates = _search(db, terms, filters, max(limit, settings.RERANK_CANDIDATES))
+    return rerank_hits(db, reranker, queries, candidates, limit, get_embedder())
+
+
+def search(
+    db: Session, queries: Sequence[str], filters: RetrievalFilters, limit: int = 10, reranker: Optional[Reranker] = None
+) -> List[List[Dict]]:
+    """Per-query hit lists without the cache or payloads, reranked by `reranker` when given"""
+    return _ranked(db, queries, [query_terms(query) for query in queries], filters, limit, reranker)
+
+
+def _payload_keys(grouped: Sequence[List[Dict]]):
+    unit_keys = {(uuid.UUID(h["document_id"]), uuid.UUID(h["id"])) for g in grouped for h in g if h["source"] == "unit"}
+    qa_ids = {uuid.UUID(h["id"]) for g in grouped for h in g if h["source"] == "qa"}
+    return unit_keys, qa_ids
+
+
+def retrieve(db: Session, queries: Sequence[str], filters: RetrievalFilters, limit: int = 10) -> Dict:
+    """
+    Top `limit` hits per query, grouped per query in request order, with each
+    distinct unit and Q&A entry returned once in `units` / `qa_entries`.
+    Queries found in the retrieval cache skip the database; the rest are
+    searched together and cached one entry per query.
+    """
+    terms = [query_terms(query) for query in queries]
+    reranker = get_reranker()
+    if reranker is not None and is_bundle(db):
+        reranker = None
+    variant = reranker.model_id if reranker else ""
+    grouped: List[Optional[List[Dict]]] = [None] * len(queries)
+    units: Dict[str, Dict] = {}
+    qa_entries: Dict[str, Dict] = {}
+    misses = []
+    cached = 0
+    for idx, words in enumerate(terms):
+        if not words:
+            grouped[idx] = []
+            continue
+        entry = query_cache.get(words, filters, limit, variant)
+        if entry is None:
+            misses.append(idx)
+            continue
+        cached += 1
+        grouped[idx] = entry["hits"]
+        units.update(entry["units"])
+        qa_entries.update(entry["qa_entries"])
+
+    if misses:
+        t0 = time.perf_counter()
+        fresh = _ranked(db, [queries[idx] for idx in misses], [terms[idx] for idx in misses], filters, limit, reranker)
+        unit_keys, qa_ids = _payload_keys(fresh)
+        fresh_units = _load_units(db, unit_keys)
+        fresh_qa = _load_qa(db, qa_ids)
+        cost = (time.perf_counter() - t0) / len(misses)
+        units.update(fresh_units)
+        qa_entries.update(fresh_qa)
+        for idx, hits in zip(misses, fresh):
+            grouped[idx] = hits
+            query_cache.set(terms[idx], filters, limit, {
+                "hits": hits,
+                "units": {h["id"]: fresh_units[h["id"]] for h in hits if h["id"] in fresh_units},
+                "qa_entries": {h["id"]: fresh_qa[h["id"]] for h in hits if h["id"] in fresh_qa},
+            }, cost, variant)
+
+    return {
+        "results": [{"query": query, "hits": group} for query, group in zip(queries, grouped)],
+        "units": units,
+        "qa_entries": qa_entries,
+        "stats": {
+            "queries": len(queries),
+            "hits": sum(len(g) for g in grouped),
+            "distinct_hits": len(units) + len(qa_entries),
+            "cached": cached,
+        },
+    }
@@ -0,0 +1,110 @@
+"""
+Periodic background jobs that must run once per deployment, not once per
+worker process.
+
+Every worker runs `run_leader_jobs`, but only the current advisory-lock
+leader (see app.core.leader) executes due jobs; the others just keep
+competing for the lock so one of them takes over if the leader goes away.
+Per-process state such as the document catalog is refreshed by each worker
+itself, and per-node state such as the BM25 index by one worker per node;
+neither is scheduled here.
+"""
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional
+from starlette.concurrency import run_in_threadpool
+from app.core.leader import LeaderElection
+from app.core.settings import settings
+from app.db.base import SessionLocal, engine
+from app.routers.stats import get_stats
+from app.services.embeddings import embedding_job
+from app.services.partitions import maintain_partitions
+from app.services.related import related_job
+from app.services.storage_reconcile import reconcile_storage
+import asyncio
+import inspect
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+LEADER_LOCK = "core:background-jobs"
+
+
+@dataclass
+class LeaderJob:
+    name: str
+    interval: int
+    func: Callable[[], Any]  # sync functions run in the threadpool
+    last_run: Optional[float] = None
+
+    def due(self, now: float) -> bool:
+        return self.last_run is None or now - self.last_run >= self.interval
+
+
+async def run_due_jobs(jobs: List[LeaderJob], now: float) -> List[str]:
+    """Run every due job once; a failing job is logged and retried next interval"""
+    ran = []
+    for job in jobs:
+        if not job.due(now):
+            continue
+        job.last_run = now
+        try:
+            if inspect.iscoroutinefunction(job.func):
+                await job.func()
+            else:
+                await run_in_threadpool(job.func)
+            ran.append(job.name)
+        except Exception as e:
+            logger.error(f"Background job {job.name} failed: {e}")
+    return ran
+
+
+async def run_leader_jobs(election: LeaderElection, jobs: List[LeaderJob], poll_seconds: int):
+    """Compete for leadership and run due jobs while leading, until cancelled"""
+    try:
+        while True:
+            try:
+                if await run_in_threadpool(election.try_acquire):
+                    await run_due_jobs(jobs, time.monotonic())
+                else:
+                    # whoever leads now owns the schedule; run promptly if we take over
+                    for job in jobs:
+                        job.last_run = None
+            except Exception as e:
+                logger.error(f"Leader election for {election.name} failed: {e}")
+            await asyncio.sleep(poll_seconds)
+    finally:
+        election.release()
+
+
+async def refresh_stats():
+    """Recompute the cached /stats response so requests never pay for the counts"""
+    db = SessionLocal()
+    try:
+        await get_stats.refresh(db=db)
+    finally:
+        db.close()
+
+
+def reconcile_storage_job():
+    reconcile_storage(max_workers=settings.RECONCILE_WORKERS)
+
+
+def default_jobs() -> List[LeaderJob]:
+    jobs = []
+    # warming a per-process memory cache from one worker would only help that worker
+    if settings.CACHE_BACKEND == "redis" and settings.STATS_REFRESH_SECONDS > 0:
+        jobs.append(LeaderJob("stats_refresh", settings.STATS_REFRESH_SECONDS, refresh_stats))
+    if settings.RECONCILE_INTERVAL_SECONDS > 0:
+        jobs.append(LeaderJob("storage_reconcile", settings.RECONCILE_INTERVAL_SECONDS, reconcile_storage_job))
+    if settings.PARTITION_VACUUM_SECONDS > 0:
+        jobs.append(LeaderJob("partition_vacuum", settings.PARTITION_VACUUM_SECONDS, maintain_partitions))
+    if settings.EMBEDDER != "none" and settings.EMBEDDING_REFRESH_SECONDS > 0:
+        jobs.append(LeaderJob("embeddings", settings.EMBEDDING_REFRESH_SECONDS, embedding_job))
+    if settings.EMBEDDER != "none" and settings.RELATED_REFRESH_SECONDS > 0:
+        jobs.append(LeaderJob("related_links", settings.RELATED_REFRESH_SECONDS, related_job))
+    return jobs
+
+
+def create_election() -> LeaderElection:
+    return LeaderElection(engine, LEADER_LOCK)
@@ -0,0 +1,119 @@
+"""
+Serving layer: the subset of the corpus consumers may see, precomputed for
+retrieval.
+
+A document is servable when it is published and not withdrawn; a Q&A entry
+when it is published, licensed, free of PII and not deleted. serving_units
+and serving_qa (migration 0012) hold one row per servable legal unit and
+Q&A entry, with its tsvector stored and GIN-indexed and, for units, the
+document columns retrieval filters on. Search therefore scans only servable
+rows, without a join or a per-row to_tsvector.
+
+The tables are maintained incrementally: sync_import refreshes exactly the
+documents and entries a batch touched, with one DELETE and one
+INSERT ... SELECT per kind. `python -m app.services.serving rebuild`
+recomputes them from scratch. PostgreSQL only.
+"""
+from typing import Iterable
+from sqlalchemy import and_, text
+from sqlalchemy.orm import Session
+from app.db.base import SessionLocal
+from app.models.official import OfficialDocument
+from app.models.qa import QAEntry
+from app.models.serving import ServingUnit, ServingQA
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Must match the rows of migration 0012
+UNIT_TSVECTOR = "to_tsvector('simple', coalesce(u.heading_normalized, '') || ' ' || coalesce(u.text_plain_normalized, ''))"
+QA_TSVECTOR = "to_tsvector('simple', coalesce(e.question_normalized, '') || ' ' || coalesce(e.answer_normalized, ''))"
+
+DOCUMENT_SERVABLE = "d.status = 'published' AND d.deleted_at IS NULL"
+QA_SERVABLE = (
+    "e.moderation_status = 'published' AND e.licensing = 'allowed' "
+    "AND e.pii_status = 'clean' AND e.deleted_at IS NULL"
+)
+
+_INSERT_UNITS = f"""
+    INSERT INTO serving_units (document_id, id, unit_type, doc_type, jurisdiction, authority, tsv)
+    SELECT u.document_id, u.id, u.unit_type::text, d.doc_type::text, d.jurisdiction, d.authority, {UNIT_TSVECTOR}
+    FROM legal_units u
+    JOIN official_documents d ON d.id = u.document_id
+    WHERE {DOCUMENT_SERVABLE}
+"""
+_INSERT_QA = f"""
+    INSERT INTO serving_qa (id, topic_tags, tsv)
+    SELECT e.id, e.topic_tags, {QA_TSVECTOR}
+    FROM qa_entries e
+    WHERE {QA_SERVABLE}
+"""
+
+
+def servable_document():
+    """DOCUMENT_SERVABLE as an ORM predicate on OfficialDocument"""
+    return and_(OfficialDocument.status == "published", OfficialDocument.deleted_at.is_(None))
+
+
+def servable_qa():
+    """QA_SERVABLE as an ORM predicate on QAEntry"""
+    return and_(
+        QAEntry.moderation_status == "published",
+        QAEntry.licensing == "allowed",
+        QAEntry.pii_status == "clean",
+        QAEntry.deleted_at.is_(None),
+    )
+
+
+def refresh_documents(db: Session, document_ids: Iterable) -> int:
+    """Replace the serving rows of these documents; returns the rows now servable"""
+    ids = list(dict.fromkeys(document_ids))
+    if not ids:
+        return 0
+    db.query(ServingUnit).filter(ServingUnit.document_id.in_(ids)).delete(synchronize_session=False)
+    # The document_id list prunes the legal_units scan to the partitions holding them
+    return db.execute(
+        text(_INSERT_UNITS + " AND u.document_id = ANY(CAST(:ids AS uuid[]))"),
+        {"ids": [str(d) for d in ids]}
+    ).rowcount
+
+
+def refresh_qa(db: Session, qa_ids: Iterable) -> int:
+    """Replace the serving rows of these Q&A entries; returns the rows now servable"""
+    ids = list(dict.fromkeys(qa_ids))
+    if not ids:
+        return 0
+    db.query(ServingQA).filter(ServingQA.id.in_(ids)).delete(synchronize_session=False)
+    return db.execute(
+        text(_INSERT_QA + " AND e.id = ANY(CAST(:ids AS uuid[]))"),
+        {"ids": [str(q) for q in ids]}
+    ).rowcount
+
+
+def rebuild() -> dict:
+    """Recompute both serving tables in one transaction"""
+    db = SessionLocal()
+    try:
+        db.execute(text("TRUNCATE serving_units, serving_qa"))
+        counts = {
+            "units": db.execute(text(_INSERT_UNITS)).rowcount,
+            "qa_entries": db.execute(text(_INSERT_QA)).rowcount,
+        }
+        db.commit()
+        logger.info(f"Serving tables rebuilt: {counts}")
+        return counts
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Maintain the serving tables")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args()
+    print(rebuild())
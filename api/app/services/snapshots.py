@@ -0,0 +1,306 @@
+"""
+Snapshot bundles for edge read nodes.
+
+A bundle is one SQLite file with the servable documents, their legal units
+and the servable Q&A entries (app.services.serving), under the primary's
+table and column names, so app.db.bundle can serve the read API from it.
+Legal units and Q&A entries have FTS5 indexes over their match keys, kept in
+step by triggers. Values are stored the way SQLAlchemy binds them on SQLite:
+UUIDs as 32-digit hex, dates and timestamps as ISO text, topic_tags as JSON.
+file_s3 and text_normalized, which the read API never returns, are left empty.
+
+bundle_meta records the format, a snapshot_id and the watermark: the latest
+updated_at the snapshot has seen. A delta has the same tables, holding the
+rows updated since its base's watermark (less SNAPSHOT_OVERLAP_SECONDS);
+rows that stopped being servable are carried with deleted_at set. Applying
+a delta to the bundle whose snapshot_id it names replaces those documents
+with their units and those Q&A entries, in a copy that is then swapped in.
+A withdrawn document keeps its row, with deleted_at set, so the document
+catalog drops it on its next refresh. Deltas chain: each names the snapshot
+it was built against.
+
+    python -m app.services.snapshots full bundle.sqlite
+    python -m app.services.snapshots delta --base bundle.sqlite delta.sqlite
+    python -m app.services.snapshots apply bundle.sqlite delta.sqlite
+
+Match-key backfills do not touch updated_at; take a full snapshot after one.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import create_engine, tuple_
+from sqlalchemy.orm import Session
+from app.core.settings import settings
+from app.db.base import SessionLocal
+from app.db.bundle import BUNDLE_FORMAT
+from app.models.official import LegalUnit, OfficialDocument
+from app.models.qa import QAEntry
+from app.services.serving import servable_document, servable_qa
+import logging
+import os
+import shutil
+import sqlite3
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Not needed by the read API; kept as empty columns so ORM reads still map
+_EMPTY_COLUMNS = {"file_s3", "text_normalized"}
+
+_TABLES = (
+    # table, has an integer row_id for its FTS index, key constraint
+    (OfficialDocument.__table__, False, "PRIMARY KEY (id)"),
+    (LegalUnit.__table__, True, "UNIQUE (document_id, id)"),
+    (QAEntry.__table__, True, "UNIQUE (id)"),
+)
+
+_INDEXES = [
+    "CREATE INDEX idx_official_documents_title_key ON official_documents (title_normalized)",
+    "CREATE INDEX idx_legal_units_order ON legal_units (document_id, order_index)",
+    "CREATE INDEX idx_legal_units_label ON legal_units (document_id, label_type, label_ordinal, label_repeat)",
+]
+
+# FTS5 table -> (content table, indexed match-key columns)
+FTS_TABLES = {
+    "units_fts": ("legal_units", ("heading_normalized", "text_plain_normalized")),
+    "qa_fts": ("qa_entries", ("question_normalized", "answer_normalized")),
+}
+
+
+def _affinity(column) -> str:
+    return {int: "INTEGER", float: "REAL"}.get(column.type.python_type, "TEXT")
+
+
+def _schema() -> List[str]:
+    statements = ["CREATE TABLE bundle_meta (key TEXT PRIMARY KEY, value TEXT)"]
+    for table, row_id, key in _TABLES:
+        columns = [f"{column.name} {_affinity(column)}" for column in table.columns]
+        if row_id:
+            columns.insert(0, "row_id INTEGER PRIMARY KEY")
+        statements.append(f"CREATE TABLE {table.name} ({', '.join(columns + [key])})")
+    return statements + _INDEXES
+
+
+def _fts_schema() -> List[str]:
+    statements = []
+    for fts, (table, columns) in FTS_TABLES.items():
+        names = ", ".join(columns)
+        new = ", ".join(f"new.{c}" for c in columns)
+        old = ", ".join(f"old.{c}" for c in columns)
+        statements += [
+            f"CREATE VIRTUAL TABLE {fts} USING fts5({names}, content='{table}', content_rowid='row_id')",
+            f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+            f"CREATE TRIGGER {table}_fts_insert AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {fts}(rowid, {names}) VALUES (new.row_id, {new}); END",
+            f"CREATE TRIGGER {table}_fts_delete AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.row_id, {old}); END",
+        ]
+    return statements
+
+
+def read_meta(path: str) -> Dict[str, str]:
+    conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+    try:
+        return dict(conn.execute("SELECT key, value FROM bundle_meta").fetchall())
+    finally:
+        conn.close()
+
+
+def _changed(db: Session, model, since: Optional[datetime], servable_only: bool, after, batch_size: int):
+    """Rows of model to export, keyset-paginated on (updated_at, id), with a servable flag"""
+    servable = servable_document() if model is OfficialDocument else servable_qa()
+    columns = [c for c in model.__table__.columns if c.name not in _EMPTY_COLUMNS]
+    query = db.query(*columns, servable.label("servable"))
+    if servable_only:
+        query = query.filter(servable)
+    if since is not None:
+        query = query.filter(model.updated_at >= since)
+    if after is not None:
+        query = query.filter(tuple_(model.updated_at, model.id) > after)
+    return query.order_by(model.updated_at, model.id).limit(batch_size).all()
+
+
+def _export_rows(rows) -> List[Dict]:
+    exported = []
+    for row in rows:
+        values = dict(row._mapping)
+        if not values.pop("servable"):
+            # a delta carries rows that left the serving layer as deletions
+            values["deleted_at"] = values["deleted_at"] or values["updated_at"]
+        exported.append(values)
+    return exported
+
+
+def _export(db: Session, conn, model, since: Optional[datetime], servable_only: bool, batch_size: int) -> Dict:
+    table = model.__table__
+    empty = {name: None for name in _EMPTY_COLUMNS if name in table.c}
+    counts = {"rows": 0, "deleted": 0, "legal_units": 0, "watermark": None}
+    after = None
+    while True:
+        rows = _changed(db, model, since, servable_only, after, batch_size)
+        if not rows:
+            return counts
+        after = (rows[-1].updated_at, rows[-1].id)
+        counts["watermark"] = after[0]
+        exported = [{**values, **empty} for values in _export_rows(rows)]
+        conn.execute(table.insert(), exported)
+        counts["rows"] += len(exported)
+        counts["deleted"] += sum(1 for values in exported if values["deleted_at"] is not None)
+        if model is OfficialDocument:
+            live = [values["id"] for values in exported if values["deleted_at"] is None]
+            if live:
+                units = db.query(*LegalUnit.__table__.columns).filter(LegalUnit.document_id.in_(live)).all()
+                if units:
+                    conn.execute(LegalUnit.__table__.insert(), [dict(unit._mapping) for unit in units])
+                counts["legal_units"] += len(units)
+
+
+def build_snapshot(
+    db: Session,
+    path: str,
+    base: Optional[Dict[str, str]] = None,
+    overlap_seconds: Optional[int] = None,
+    batch_size: int = 5000
+) -> Dict[str, str]:
+    """
+    Write a full bundle to `path`, or with `base` (the bundle_meta of the
+    snapshot an edge node holds) a delta against it; returns the new meta
+    """
+    kind = "full" if base is None else "delta"
+    since = None
+    if base is not None:
+        if base.get("format") != str(BUNDLE_FORMAT):
+            raise ValueError(f"Base snapshot has format {base.get('format')}, expected {BUNDLE_FORMAT}")
+        if base.get("watermark"):
+            overlap = settings.SNAPSHOT_OVERLAP_SECONDS if overlap_seconds is None else overlap_seconds
+            since = datetime.fromisoformat(base["watermark"]) - timedelta(seconds=overlap)
+
+    tmp = path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    engine = create_engine(f"sqlite:///{tmp}")
+    try:
+        with engine.begin() as conn:
+            for statement in _schema():
+                conn.exec_driver_sql(statement)
+            documents = _export(db, conn, OfficialDocument, since, kind == "full", batch_size)
+            qa_entries = _export(db, conn, QAEntry, since, kind == "full", batch_size)
+            watermarks = [w for w in (documents["watermark"], qa_entries["watermark"]) if w is not None]
+            if since is not None:
+                watermarks.append(datetime.fromisoformat(base["watermark"]))
+            watermark = max(watermarks).isoformat() if watermarks else None
+            meta = {
+                "format": str(BUNDLE_FORMAT),
+                "kind": kind,
+                "snapshot_id": uuid.uuid4().hex,
+                "watermark": watermark,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "documents": str(documents["rows"] - documents["deleted"]),
+                "legal_units": str(documents["legal_units"]),
+                "qa_entries": str(qa_entries["rows"] - qa_entries["deleted"]),
+                "deleted_documents": str(documents["deleted"]),
+                "deleted_qa_entries": str(qa_entries["deleted"]),
+            }
+            if base is not None:
+                meta["base_id"] = base["snapshot_id"]
+            conn.exec_driver_sql(
+                "INSERT INTO bundle_meta (key, value) VALUES (?, ?)",
+                [(k, v) for k, v in meta.items() if v is not None]
+            )
+            if kind == "full":
+                for statement in _fts_schema():
+                    conn.exec_driver_sql(statement)
+            conn.exec_driver_sql(f"PRAGMA user_version = {BUNDLE_FORMAT}")
+        with engine.connect() as conn:
+            conn.exec_driver_sql("ANALYZE")
+            conn.exec_driver_sql("VACUUM")
+    finally:
+        engine.dispose()
+    os.replace(tmp, path)
+    logger.info(f"Snapshot written to {path}: {meta}")
+    return meta
+
+
+def _columns(table, skip: Iterable[str] = ()) -> str:
+    return ", ".join(c.name for c in table.columns if c.name not in skip)
+
+
+def apply_delta(bundle_path: str, delta_path: str) -> Dict[str, str]:
+    """Apply a delta to a copy of the bundle and swap it in; returns the new meta"""
+    base = read_meta(bundle_path)
+    delta = read_meta(delta_path)
+    if delta.get("kind") != "delta" or delta.get("format") != base.get("format"):
+        raise ValueError(f"{delta_path} is not a format {base.get('format')} delta")
+    if delta.get("base_id") != base.get("snapshot_id"):
+        raise ValueError(
+            f"Delta {delta.get('snapshot_id')} applies to snapshot {delta.get('base_id')}, "
+            f"the bundle is {base.get('snapshot_id')}"
+        )
+
+    units = _columns(LegalUnit.__table__)
+    qa = _columns(QAEntry.__table__)
+    tmp = bundle_path + ".apply"
+    shutil.copyfile(bundle_path, tmp)
+    conn = sqlite3.connect(tmp)
+    try:
+        conn.execute("ATTACH DATABASE ? AS delta", (f"file:{os.path.abspath(delta_path)}?mode=ro",))
+        with conn:
+            # the FTS triggers drop and add the postings of every replaced row
+            conn.execute("DELETE FROM legal_units WHERE document_id IN (SELECT id FROM delta.official_documents)")
+            conn.execute("INSERT OR REPLACE INTO official_documents SELECT * FROM delta.official_documents")
+            conn.execute(f"INSERT INTO legal_units ({units}) SELECT {units} FROM delta.legal_units")
+            conn.execute("DELETE FROM qa_entries WHERE id IN (SELECT id FROM delta.qa_entries)")
+            conn.execute(f"INSERT INTO qa_entries ({qa}) SELECT {qa} FROM delta.qa_entries WHERE deleted_at IS NULL")
+            meta = {
+                **base,
+                "snapshot_id": delta["snapshot_id"],
+                "watermark": delta.get("watermark"),
+                "created_at": delta["created_at"],
+                "documents": str(conn.execute(
+                    "SELECT count(*) FROM official_documents WHERE deleted_at IS NULL"
+                ).fetchone()[0]),
+                "legal_units": str(conn.execute("SELECT count(*) FROM legal_units").fetchone()[0]),
+                "qa_entries": str(conn.execute("SELECT count(*) FROM qa_entries").fetchone()[0]),
+            }
+            conn.execute("DELETE FROM bundle_meta")
+            conn.executemany(
+                "INSERT INTO bundle_meta (key, value) VALUES (?, ?)",
+                [(k, v) for k, v in meta.items() if v is not None]
+            )
+        conn.execute("DETACH DATABASE delta")
+        for fts in FTS_TABLES:
+            conn.execute(f"INSERT INTO {fts}({fts}) VALUES ('optimize')")
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp, bundle_path)
+    logger.info(f"Delta {delta['snapshot_id']} applied to {bundle_path}")
+    return meta
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Build and apply edge snapshot bundles")
+    commands = parser.add_subparsers(dest="command", required=True)
+    full = commands.add_parser("full", help="write a full bundle")
+    full.add_argument("path")
+    delta = commands.add_parser("delta", help="write the changes since a bundle or delta")
+    delta.add_argument("--base", required=True, help="the snapshot the edge node holds")
+    delta.add_argument("path")
+    for command in (full, delta):
+        command.add_argument("--batch-size", type=int, default=5000)
+    apply = commands.add_parser("apply", help="apply a delta to a bundle in place")
+    apply.add_argument("bundle")
+    apply.add_argument("delta")
+    args = parser.parse_args()
+
+    if args.command == "apply":
+        print(apply_delta(args.bundle, args.delta))
+    else:
+        session = SessionLocal()
+        try:
+            base_meta = read_meta(args.base) if args.command == "delta" else None
+            print(build_snapshot(session, args.path, base_meta, batch_size=args.batch_size))
+        finally:
+            session.close()
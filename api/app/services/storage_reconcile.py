@@ -0,0 +1,230 @@
+"""
+Reconciliation between the object store and `official_documents.file_s3`.
+
+Finds orphaned objects (present in the bucket, referenced by no document) and
+dangling references (documents whose `file_s3` points at a missing object).
+
+Both sides are streamed in byte order and merge-joined, so memory use is
+independent of bucket size. The key space under the prefix is split into
+shards at the hex digits after it (object keys follow "raw/{uuid}/{filename}"),
+with the first shard open below and the last open above, so keys whose next
+character is not a lowercase hex digit are still covered. Shards are
+processed concurrently in a thread pool because listing and cursor fetches
+are I/O bound.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, List, Optional, Tuple
+from app.db.base import SessionLocal
+from app.models.official import OfficialDocument
+from app.utils.minio_helper import MinIOHelper
+import logging
+
+logger = logging.getLogger(__name__)
+
+SHARD_CHARS = "0123456789abcdef"
+
+
+@dataclass
+class ReconcileReport:
+    """Outcome of a reconciliation run; samples are capped to bound memory"""
+    objects_scanned: int = 0
+    references_scanned: int = 0
+    orphaned_count: int = 0
+    dangling_count: int = 0
+    deleted_count: int = 0
+    orphaned_sample: List[str] = field(default_factory=list)
+    dangling_sample: List[Tuple[str, str]] = field(default_factory=list)
+
+    def merge(self, other: "ReconcileReport", sample_limit: int):
+        self.objects_scanned += other.objects_scanned
+        self.references_scanned += other.references_scanned
+        self.orphaned_count += other.orphaned_count
+        self.dangling_count += other.dangling_count
+        self.deleted_count += other.deleted_count
+        room = sample_limit - len(self.orphaned_sample)
+        self.orphaned_sample.extend(other.orphaned_sample[:max(room, 0)])
+        room = sample_limit - len(self.dangling_sample)
+        self.dangling_sample.extend(other.dangling_sample[:max(room, 0)])
+
+    def as_dict(self):
+        return {
+            "objects_scanned": self.objects_scanned,
+            "references_scanned": self.references_scanned,
+            "orphaned": self.orphaned_count,
+            "dangling": self.dangling_count,
+            "deleted": self.deleted_count,
+            "orphaned_sample": self.orphaned_sample,
+            "dangling_sample": [
+                {"document_id": doc_id, "object_name": name}
+                for doc_id, name in self.dangling_sample
+            ],
+        }
+
+
+def merge_join(
+    object_names: Iterable[str],
+    references: Iterable[Tuple[str, str]]
+) -> Iterator[Tuple[str, Optional[str], str]]:
+    """
+    Merge-join two key-sorted streams.
+
+    `object_names` yields object keys, `references` yields (document_id, key)
+    pairs. Yields ("orphan", None, key) for objects nobody references and
+    ("dangling", document_id, key) for references without an object. Several
+    documents may share a key.
+    """
+    objects = iter(object_names)
+    refs = iter(references)
+    obj = next(objects, None)
+    ref = next(refs, None)
+    while obj is not None or ref is not None:
+        if ref is None or (obj is not None and obj < ref[1]):
+            yield ("orphan", None, obj)
+            obj = next(objects, None)
+        elif obj is None or ref[1] < obj:
+            yield ("dangling", ref[0], ref[1])
+            ref = next(refs, None)
+        else:
+            matched = obj
+            obj = next(objects, None)
+            while ref is not None and ref[1] == matched:
+                ref = next(refs, None)
+
+
+def successor(prefix: str) -> Optional[str]:
+    """The least key above every key starting with `prefix`; None for "", which has none"""
+    while prefix:
+        if ord(prefix[-1]) < 0x10FFFF:
+            return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        prefix = prefix[:-1]
+    return None
+
+
+def shard_prefixes(prefix: str, shard_chars: str = SHARD_CHARS) -> List[Tuple[Optional[str], Optional[str]]]:
+    """
+    Return [lower, upper) key bounds for each shard under `prefix`, split at
+    prefix + each shard character after the first. None leaves a bound open
+    (the prefix's start or end), so together they cover every key under it.
+    """
+    bounds = [None] + [prefix + c for c in shard_chars[1:]] + [None]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _iter_objects(helper: MinIOHelper, prefix: str, lower: Optional[str], upper: Optional[str]) -> Iterator[str]:
+    """Stream the object keys under `prefix` in [lower, upper), byte-ordered"""
+    # start_after is exclusive: start just below `lower`, past the keys of lower shards
+    start_after = None if lower is None else lower[:-1] + chr(ord(lower[-1]) - 1) + chr(0x10FFFF)
+    for name in helper.iter_files(prefix=prefix, start_after=start_after):
+        if lower is not None and name < lower:
+            continue
+        if upper is not None and name >= upper:
+            return
+        yield name
+
+
+def _iter_references(
+    bucket: str, prefix: str, lower: Optional[str], upper: Optional[str], batch_size: int
+) -> Iterator[Tuple[str, str]]:
+    """Stream (document_id, object_name) for file_s3 values under `prefix` in [lower, upper), byte-ordered"""
+    url_prefix = f"s3://{bucket}/"
+    key = OfficialDocument.file_s3.collate("C")
+    # the URL prefix is never empty, so the range under it always has an end
+    end = url_prefix + upper if upper is not None else successor(url_prefix + prefix)
+    db = SessionLocal()
+    try:
+        rows = db.query(OfficialDocument.id, OfficialDocument.file_s3).filter(
+            key >= url_prefix + (prefix if lower is None else lower),
+            key < end
+        ).order_by(key).yield_per(batch_size)
+        for doc_id, file_s3 in rows:
+            yield str(doc_id), file_s3[len(url_prefix):]
+    finally:
+        db.close()
+
+
+def _reconcile_shard(
+    helper: MinIOHelper,
+    prefix: str,
+    lower: Optional[str],
+    upper: Optional[str],
+    delete_orphans: bool,
+    sample_limit: int,
+    batch_size: int
+) -> ReconcileReport:
+    report = ReconcileReport()
+
+    def objects():
+        for name in _iter_objects(helper, prefix, lower, upper):
+            report.objects_scanned += 1
+            yield name
+
+    def references():
+        for ref in _iter_references(helper.bucket_name, prefix, lower, upper, batch_size):
+            report.references_scanned += 1
+            yield ref
+
+    pending = []
+    for kind, doc_id, name in merge_join(objects(), references()):
+        if kind == "orphan":
+            report.orphaned_count += 1
+            if len(report.orphaned_sample) < sample_limit:
+                report.orphaned_sample.append(name)
+            if delete_orphans:
+                pending.append(name)
+                if len(pending) >= batch_size:
+                    report.deleted_count += len(pending) - len(helper.delete_files(pending))
+                    pending = []
+        else:
+            report.dangling_count += 1
+            if len(report.dangling_sample) < sample_limit:
+                report.dangling_sample.append((doc_id, name))
+    if pending:
+        report.deleted_count += len(pending) - len(helper.delete_files(pending))
+    return report
+
+
+def reconcile_storage(
+    prefix: str = "raw/",
+    delete_orphans: bool = False,
+    max_workers: int = 8,
+    sample_limit: int = 100,
+    batch_size: int = 1000,
+    helper: MinIOHelper = None
+) -> ReconcileReport:
+    """
+    Reconcile the bucket under `prefix` against document file references.
+    With `delete_orphans`, orphaned objects are removed in bulk as they are found.
+    """
+    helper = helper or MinIOHelper()
+    report = ReconcileReport()
+    shards = shard_prefixes(prefix)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [
+            pool.submit(_reconcile_shard, helper, prefix, lower, upper, delete_orphans, sample_limit, batch_size)
+            for lower, upper in shards
+        ]
+        for future in futures:
+            report.merge(future.result(), sample_limit)
+
+    logger.info(
+        f"Storage reconcile on s3://{helper.bucket_name}/{prefix}: "
+        f"{report.orphaned_count} orphaned, {report.dangling_count} dangling, "
+        f"{report.deleted_count} deleted"
+    )
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Reconcile MinIO objects with official_documents.file_s3")
+    parser.add_argument("--prefix", default="raw/")
+    parser.add_argument("--delete-orphans", action="store_true")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    result = reconcile_storage(prefix=args.prefix, delete_orphans=args.delete_orphans, max_workers=args.workers)
+    print(json.dumps(result.as_dict(), ensure_ascii=False, indent=2))
@@ -0,0 +1,394 @@
+"""
+Type-ahead over document titles and legal unit labels, served from memory.
+
+Titles are indexed at every word start of their title_normalized, so
+"دادرسی" completes "قانون آیین دادرسی مدنی" as "قانون" does, which the
+btree on title cannot. A PrefixIndex holds its texts as one UTF-8 buffer
+and an array of the byte offsets of their word starts, sorted by the text
+that follows each offset. UTF-8 byte order is code point order, so the
+completions of a prefix are one contiguous range of that array, found with
+two binary searches and no per-entry strings. Distinct num_label_normalized
+values ("ماده 12", "تبصره 1") are a second index, matched from the start.
+
+Completions are ranked by popularity: log1p of the number of other
+documents citing a document (unit_citations), or of the units carrying a
+label, plus TITLE_START_BONUS when the prefix starts the title rather than
+a later word. The best of a range are taken with one argpartition, so even
+a one-letter prefix matching most of 100k titles ranks in about a
+millisecond (benchmarks/bench_suggest.py).
+
+Each worker loads the index at startup and refreshes it from updated_at
+every SUGGEST_REFRESH_SECONDS, with an overlap window, as the catalog does.
+Documents changed by a sync import shadow their old entries and are scanned
+from a pending list until it outgrows PENDING_LIMIT; the arrays are then
+rebuilt from memory, without a query. A refresh builds a new snapshot and
+swaps it in, so a request never sees a half-applied one. Popularity and the
+label index are reloaded every SUGGEST_RELOAD_SECONDS.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, replace
+from datetime import timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.core.settings import settings
+from app.db.base import SessionLocal
+from app.db.bundle import is_bundle
+from app.models.official import LegalUnit, OfficialDocument, UnitCitation
+from app.services.serving import servable_document
+from app.utils.text import normalize_key
+import asyncio
+import logging
+import math
+import threading
+import time
+import uuid
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TITLE_START_BONUS = 1.0
+PENDING_LIMIT = 1024  # changed documents scanned linearly before the arrays are rebuilt
+MAX_WORD_STARTS = 24  # indexed per text; later words of very long titles are not
+
+
+def query_key(text: str) -> str:
+    """Match key of a typed prefix; a trailing space is kept, so "قانون " does not complete "قانونی" """
+    key = normalize_key(text) or ""
+    return key + " " if key and text[-1:].isspace() else key
+
+
+def _word_starts(data: bytes) -> List[int]:
+    starts = [0]
+    at = data.find(b" ")
+    while at != -1 and len(starts) < MAX_WORD_STARTS:
+        starts.append(at + 1)
+        at = data.find(b" ", at + 1)
+    return starts
+
+
+def _best(owners: np.ndarray, scores: np.ndarray, k: int) -> List[Tuple[int, float]]:
+    """The k best (owner, score) of a range, one per owner; -inf scores are left out"""
+    n = len(scores)
+    m = min(n, 4 * k)  # an owner appears once per matching word, so take a few spare
+    while True:
+        picked = np.argpartition(-scores, m - 1)[:m] if m < n else np.arange(n)
+        picked = picked[np.lexsort((owners[picked], -scores[picked]))]
+        found, seen = [], set()
+        for j in picked:
+            if scores[j] == -np.inf:
+                return found
+            owner = int(owners[j])
+            if owner not in seen:
+                seen.add(owner)
+                found.append((owner, float(scores[j])))
+                if len(found) == k:
+                    return found
+        if m == n:
+            return found
+        m = min(n, m * 4)
+
+
+class PrefixIndex:
+    """
+    Immutable prefix index over normalized texts, each with a weight. With
+    word_starts, a text matches a prefix that starts any of its words, else
+    only one that starts the text.
+    """
+
+    def __init__(self, texts: Sequence[str], weights: Sequence[float], word_starts: bool = True):
+        encoded = [text.replace("\0", "").encode("utf-8") for text in texts]
+        self.offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        starts, owners, at_start = [], [], []
+        position = 0
+        for i, data in enumerate(encoded):
+            self.offsets[i] = position
+            for start in (_word_starts(data) if word_starts else [0]):
+                starts.append(position + start)
+                owners.append(i)
+                at_start.append(start == 0)
+            position += len(data) + 1
+        self.offsets[len(encoded)] = position
+        # texts end in a NUL, which sorts before any character, so a text
+        # sorts before its extensions and a slice may run into the next text
+        self.blob = b"\0".join(encoded) + b"\0"
+        ends = self.offsets[1:] - 1
+        blob = self.blob
+        order = sorted(range(len(starts)), key=lambda j: blob[starts[j]:ends[owners[j]]])
+        self.starts = array("q", (starts[j] for j in order))
+        self.owners = np.array(owners, dtype=np.int32)[order] if order else np.zeros(0, dtype=np.int32)
+        weights = np.asarray(weights, dtype=np.float32)
+        bonus = np.where(np.array(at_start, dtype=bool), TITLE_START_BONUS, 0.0).astype(np.float32)
+        self.scores = (weights[self.owners] + bonus[order]) if order else np.zeros(0, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def text(self, i: int) -> str:
+        return self.blob[self.offsets[i]:self.offsets[i + 1] - 1].decode("utf-8")
+
+    def range(self, prefix: str) -> Tuple[int, int]:
+        """Positions [lo, hi) of the word starts the prefix matches"""
+        key = prefix.encode("utf-8")
+        blob, starts, size = self.blob, self.starts, len(key)
+        positions = range(len(starts))
+
+        def at(j):
+            return blob[starts[j]:starts[j] + size]
+
+        lo = bisect_left(positions, key, key=at)
+        return lo, bisect_right(positions, key, lo=lo, key=at)
+
+    def top(self, prefix: str, k: int, alive: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """The k best (text number, score) completions of a prefix; texts not `alive` are skipped"""
+        if not prefix or k <= 0:
+            return []
+        lo, hi = self.range(prefix)
+        if lo == hi:
+            return []
+        owners, scores = self.owners[lo:hi], self.scores[lo:hi]
+        if alive is not None:
+            scores = np.where(alive[owners], scores, -np.inf)
+        return _best(owners, scores, k)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.blob) + self.offsets.nbytes + self.starts.itemsize * len(self.starts) + self.owners.nbytes + self.scores.nbytes
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    titles: PrefixIndex
+    ids: List[uuid.UUID]  # title number -> document id
+    display: List[str]  # title number -> title as published
+    rows: Dict[uuid.UUID, int]  # document id -> title number
+    alive: np.ndarray  # False once a refresh has changed or withdrawn the document
+    pending: Dict[uuid.UUID, Tuple[str, str, float]]  # changed documents: (key, title, popularity)
+    popularity: Dict[uuid.UUID, float]
+    labels: PrefixIndex
+    label_display: List[str]
+    label_units: List[int]
+
+
+def _popularity(db: Session) -> Dict[uuid.UUID, float]:
+    """log1p of the number of other documents citing each cited document"""
+    if is_bundle(db):
+        return {}  # bundles carry no citation graph
+    rows = db.query(
+        UnitCitation.target_document_id, func.count(func.distinct(UnitCitation.source_document_id))
+    ).filter(
+        UnitCitation.source_document_id != UnitCitation.target_document_id
+    ).group_by(UnitCitation.target_document_id)
+    return {document_id: math.log1p(count) for document_id, count in rows}
+
+
+def _labels(db: Session) -> Tuple[PrefixIndex, List[str], List[int]]:
+    rows = db.query(
+        LegalUnit.num_label_normalized, func.min(LegalUnit.num_label), func.count()
+    ).filter(LegalUnit.num_label_normalized.isnot(None)).group_by(LegalUnit.num_label_normalized).all()
+    index = PrefixIndex([row[0] for row in rows], [math.log1p(row[2]) for row in rows], word_starts=False)
+    return index, [row[1] for row in rows], [row[2] for row in rows]
+
+
+def _titles(
+    ids: List[uuid.UUID], keys: Sequence[str], titles: List[str], popularity: Dict[uuid.UUID, float]
+) -> Dict:
+    return {
+        "titles": PrefixIndex(keys, [popularity.get(doc_id, 0.0) for doc_id in ids]),
+        "ids": ids,
+        "display": titles,
+        "rows": {doc_id: i for i, doc_id in enumerate(ids)},
+        "alive": np.ones(len(ids), dtype=bool),
+        "pending": {},
+    }
+
+
+class SuggestIndex:
+    def __init__(self):
+        self._lock = threading.Lock()  # one refresh at a time; requests read the current snapshot
+        self._snapshot: Optional[_Snapshot] = None
+        self._loaded_at = 0.0
+        self.watermark = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._snapshot is not None
+
+    @staticmethod
+    def _query(db: Session):
+        return db.query(
+            OfficialDocument.id,
+            OfficialDocument.title,
+            OfficialDocument.title_normalized,
+            OfficialDocument.updated_at,
+            servable_document().label("servable")
+        )
+
+    def _advance(self, updated_at):
+        if updated_at is not None and (self.watermark is None or updated_at > self.watermark):
+            self.watermark = updated_at
+
+    def _load(self, db: Session, batch_size: int) -> int:
+        popularity = _popularity(db)
+        ids, keys, titles = [], [], []
+        count = 0
+        for row in self._query(db).yield_per(batch_size):
+            count += 1
+            self._advance(row.updated_at)
+            if row.servable:
+                ids.append(row.id)
+                keys.append(row.title_normalized or normalize_key(row.title))
+                titles.append(row.title)
+        labels, label_display, label_units = _labels(db)
+        self._snapshot = _Snapshot(
+            **_titles(ids, keys, titles, popularity), popularity=popularity,
+            labels=labels, label_display=label_display, label_units=label_units
+        )
+        self._loaded_at = time.monotonic()
+        logger.info(f"Suggestion index loaded: {len(ids)} titles, {len(labels)} labels")
+        return count
+
+    def load(self, db: Session, batch_size: int = 10000) -> int:
+        """Full load of titles, labels and popularity"""
+        with self._lock:
+            return self._load(db, batch_size)
+
+    def refresh(
+        self, db: Session, overlap_seconds: int = 300, reload_seconds: int = 3600, batch_size: int = 10000
+    ) -> int:
+        """
+        Re-read documents updated since the watermark into the pending list,
+        rebuilding the arrays when it outgrows PENDING_LIMIT; a full load
+        before the first refresh and every `reload_seconds`
+        """
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or time.monotonic() - self._loaded_at >= reload_seconds:
+                return self._load(db, batch_size)
+            query = self._query(db)
+            if self.watermark is not None:
+                query = query.filter(OfficialDocument.updated_at >= self.watermark - timedelta(seconds=overlap_seconds))
+            alive, pending = snapshot.alive, snapshot.pending
+            count = 0
+            for row in query.yield_per(batch_size):
+                count += 1
+                self._advance(row.updated_at)
+                key = row.title_normalized or normalize_key(row.title)
+                wanted = (key, row.title) if row.servable else None
+                i = snapshot.rows.get(row.id)
+                if row.id in pending:
+                    current = pending[row.id][:2]
+                elif i is not None and alive[i]:
+                    current = (snapshot.titles.text(i), snapshot.display[i])
+                else:
+                    current = None
+                if wanted == current:
+                    continue  # re-read from the overlap window
+                if alive is snapshot.alive:
+                    alive, pending = alive.copy(), dict(pending)
+                if i is not None:
+                    alive[i] = False
+                if wanted is None:
+                    pending.pop(row.id, None)
+                else:
+                    pending[row.id] = (key, row.title, snapshot.popularity.get(row.id, 0.0))
+            if alive is not snapshot.alive:
+                snapshot = replace(snapshot, alive=alive, pending=pending)
+                if len(pending) > PENDING_LIMIT:
+                    snapshot = self._rebuilt(snapshot)
+                self._snapshot = snapshot
+            return count
+
+    @staticmethod
+    def _rebuilt(snapshot: _Snapshot) -> _Snapshot:
+        live = np.flatnonzero(snapshot.alive)
+        ids = [snapshot.ids[i] for i in live] + list(snapshot.pending)
+        keys = [snapshot.titles.text(i) for i in live] + [entry[0] for entry in snapshot.pending.values()]
+        titles = [snapshot.display[i] for i in live] + [entry[1] for entry in snapshot.pending.values()]
+        return replace(snapshot, **_titles(ids, keys, titles, snapshot.popularity))
+
+    # -- queries -----------------------------------------------------------
+
+    def titles(self, prefix: str, limit: int) -> List[Dict]:
+        """Best `limit` documents with a title word starting with the prefix"""
+        snapshot = self._snapshot
+        key = query_key(prefix)
+        if snapshot is None or not key:
+            return []
+        found = [
+            (snapshot.ids[i], snapshot.display[i], score)
+            for i, score in snapshot.titles.top(key, limit, snapshot.alive)
+        ]
+        word = " " + key
+        for doc_id, (text, title, popularity) in snapshot.pending.items():
+            if text.startswith(key):
+                found.append((doc_id, title, popularity + TITLE_START_BONUS))
+            elif word in text:
+                found.append((doc_id, title, popularity))
+        found.sort(key=lambda item: (-item[2], item[1]))
+        return [
+            {"id": str(doc_id), "title": title, "score": round(score, 4)}
+            for doc_id, title, score in found[:limit]
+        ]
+
+    def labels(self, prefix: str, limit: int) -> List[Dict]:
+        """Most used unit labels starting with the prefix"""
+        snapshot = self._snapshot
+        key = query_key(prefix)
+        if snapshot is None or not key:
+            return []
+        return [
+            {"label": snapshot.label_display[i], "units": snapshot.label_units[i], "score": round(score, 4)}
+            for i, score in snapshot.labels.top(key, limit)
+        ]
+
+    def stats(self) -> Dict[str, int]:
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {"titles": 0, "pending": 0, "labels": 0, "index_bytes": 0}
+        return {
+            "titles": int(snapshot.alive.sum()) + len(snapshot.pending),
+            "pending": len(snapshot.pending),
+            "labels": len(snapshot.labels),
+            "index_bytes": snapshot.titles.nbytes + snapshot.labels.nbytes,
+        }
+
+
+def document_labels(db: Session, document_id: uuid.UUID, prefix: str, limit: int) -> Optional[List[Dict]]:
+    """A servable document's units whose label starts with the prefix, in document order; None for no such document"""
+    document = db.query(OfficialDocument.id).filter(OfficialDocument.id == document_id, servable_document()).first()
+    if document is None:
+        return None
+    key = query_key(prefix)
+    if not key:
+        return []
+    rows = db.query(LegalUnit.id, LegalUnit.num_label, LegalUnit.unit_type).filter(
+        LegalUnit.document_id == document_id,
+        LegalUnit.num_label_normalized.startswith(key, autoescape=True)
+    ).order_by(LegalUnit.order_index).limit(limit)
+    return [{"id": str(row.id), "label": row.num_label, "unit_type": row.unit_type} for row in rows]
+
+
+suggest_index = SuggestIndex()
+
+
+def refresh_suggestions() -> int:
+    db = SessionLocal()
+    try:
+        return suggest_index.refresh(
+            db, settings.SUGGEST_REFRESH_OVERLAP_SECONDS, settings.SUGGEST_RELOAD_SECONDS
+        )
+    finally:
+        db.close()
+
+
+async def run_refresh_loop(interval: int):
+    """Load the suggestion index, then keep it fresh until the app shuts down"""
+    while True:
+        try:
+            await run_in_threadpool(refresh_suggestions)
+        except Exception as e:
+            logger.error(f"Suggestion index refresh failed: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,88 @@
+"""
+Sync tombstones: documents withdrawn and Q&A entries unpublished upstream.
+
+Each kind is applied as a handful of set-based statements, whatever the
+batch size. Documents and Q&A entries are soft-deleted (deleted_at), which
+keeps their history and takes them out of the partial title index;
+sync_import then drops them from the serving tables. A withdrawn document's
+legal units are deleted outright in one statement, pruned to their
+partitions by document_id, and its open history rows are closed on the
+withdrawal date. Both kinds leave the reconciliation hash trees, so a later
+import of the same id revives the row.
+"""
+from datetime import date
+from typing import Dict, List, Sequence
+from sqlalchemy import func, text, update
+from sqlalchemy.orm import Session
+from app.models.official import OfficialDocument, LegalUnit
+from app.models.qa import QAEntry
+from app.services import merkle
+import uuid
+
+# Like record_document_version, a withdrawal cannot end a version before it started
+_CLOSE_VERSIONS_SQL = """
+    UPDATE {table} v SET valid_to = greatest(v.valid_from, t.valid_to)
+    FROM unnest(CAST(:ids AS uuid[]), CAST(:dates AS date[])) AS t(document_id, valid_to)
+    WHERE v.document_id = t.document_id AND v.valid_to IS NULL
+"""
+
+
+def split_tombstones(tombstones: Sequence, import_date: date):
+    """Document id -> withdrawal date, and Q&A entry ids; the last tombstone for an id wins"""
+    documents: Dict[uuid.UUID, date] = {}
+    for tombstone in tombstones:
+        if tombstone.kind == "document":
+            documents[tombstone.id] = tombstone.effective_date or import_date
+    qa_entries = list(dict.fromkeys(t.id for t in tombstones if t.kind == "qa_entry"))
+    return documents, qa_entries
+
+
+def withdraw_documents(db: Session, documents: Dict[uuid.UUID, date]) -> Dict:
+    """Soft-delete documents, drop their units and close their history"""
+    if not documents:
+        return {"documents": [], "legal_units": 0}
+    withdrawn = [row[0] for row in db.execute(
+        update(OfficialDocument)
+        .where(OfficialDocument.id.in_(list(documents)), OfficialDocument.deleted_at.is_(None))
+        .values(deleted_at=func.now(), updated_at=func.now())
+        .returning(OfficialDocument.id)
+    )]
+    if not withdrawn:
+        return {"documents": [], "legal_units": 0}
+
+    units = db.query(LegalUnit).filter(
+        LegalUnit.document_id.in_(withdrawn)
+    ).delete(synchronize_session=False)
+    params = {"ids": [str(d) for d in withdrawn], "dates": [documents[d] for d in withdrawn]}
+    db.execute(text(_CLOSE_VERSIONS_SQL.format(table="document_versions")), params)
+    db.execute(text(_CLOSE_VERSIONS_SQL.format(table="legal_unit_versions")), params)
+    merkle.remove_hashes(db, "documents", withdrawn)
+    return {"documents": withdrawn, "legal_units": units}
+
+
+def unpublish_qa(db: Session, ids: List[uuid.UUID]) -> List[uuid.UUID]:
+    """Soft-delete Q&A entries and flip them to unpublished"""
+    if not ids:
+        return []
+    unpublished = [row[0] for row in db.execute(
+        update(QAEntry)
+        .where(QAEntry.id.in_(ids), QAEntry.deleted_at.is_(None))
+        .values(moderation_status="unpublished", deleted_at=func.now(), updated_at=func.now())
+        .returning(QAEntry.id)
+    )]
+    merkle.remove_hashes(db, "qa_entries", unpublished)
+    return unpublished
+
+
+def apply_tombstones(db: Session, tombstones: Sequence, import_date: date) -> Dict:
+    """
+    Returns the ids actually deleted per kind and the number of legal units
+    removed; ids that were already deleted or never imported are skipped
+    """
+    documents, qa_ids = split_tombstones(tombstones, import_date)
+    withdrawn = withdraw_documents(db, documents)
+    return {
+        "documents": withdrawn["documents"],
+        "qa_entries": unpublish_qa(db, qa_ids),
+        "legal_units": withdrawn["legal_units"],
+    }
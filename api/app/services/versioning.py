@@ -0,0 +1,173 @@
+"""
+Point-in-time history for official documents and their legal units.
+
+Validity is legal time: a version becomes valid on the document's
+`amended_date` (or `effective_date` for the original text) and stays valid
+until the next version starts. Each import only closes and appends rows for
+what actually changed; unchanged units keep their open row.
+"""
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import and_, or_, func
+from sqlalchemy.orm import Session
+from app.models.official import DocumentVersion, LegalUnitVersion
+import hashlib
+
+_SEP = "\x1f"
+
+DOCUMENT_FIELDS = (
+    "title", "doc_type", "jurisdiction", "authority", "effective_date",
+    "amended_date", "source_url", "file_s3", "status"
+)
+UNIT_FIELDS = ("unit_type", "num_label", "heading", "text_plain")
+
+
+def content_hash(values: Iterable) -> str:
+    """
+    md5 over the fields joined by U+001F, NULL as empty string. Matches
+    md5(coalesce(f1::text, '') || chr(31) || ...) so migrations can
+    backfill hashes in SQL.
+    """
+    parts = []
+    for value in values:
+        if value is None:
+            parts.append("")
+        elif isinstance(value, date):
+            parts.append(value.isoformat())
+        else:
+            parts.append(str(value))
+    return hashlib.md5(_SEP.join(parts).encode("utf-8")).hexdigest()
+
+
+def unit_keys(units: List) -> List[str]:
+    """
+    Stable identity for each unit across imports: type, label and the
+    occurrence of that (type, label) pair in document order, since labels
+    like "بند الف" repeat under different articles.
+    """
+    order = sorted(
+        range(len(units)),
+        key=lambda i: (units[i].order_index is None, units[i].order_index or 0, i)
+    )
+    seen: Dict[Tuple[str, str], int] = {}
+    keys = [None] * len(units)
+    for i in order:
+        unit = units[i]
+        pair = (unit.unit_type, unit.num_label or "")
+        seen[pair] = seen.get(pair, 0) + 1
+        keys[i] = f"{pair[0]}|{pair[1]}|{seen[pair]}"
+    return keys
+
+
+def valid_at(model, as_of: date):
+    """Predicate selecting the version of `model` valid on `as_of`"""
+    return and_(
+        model.valid_from <= as_of,
+        or_(model.valid_to.is_(None), model.valid_to > as_of)
+    )
+
+
+def valid_range_contains(model, as_of: date):
+    """Same as valid_at, phrased to use the GiST index on the validity range"""
+    return func.daterange(model.valid_from, model.valid_to, "[)").op("@>")(as_of)
+
+
+def version_start(doc_data, fallback_date: date) -> date:
+    """Legal date from which an imported document's content applies"""
+    return doc_data.amended_date or doc_data.effective_date or fallback_date
+
+
+def record_document_version(db: Session, doc_data, status: str, valid_from: date) -> bool:
+    """
+    Append a document version if its metadata changed. Returns True when a
+    new version was written.
+    """
+    values = {field: getattr(doc_data, field, None) for field in DOCUMENT_FIELDS}
+    values["status"] = status
+    digest = content_hash(values[field] for field in DOCUMENT_FIELDS)
+
+    current = db.query(DocumentVersion).filter(
+        DocumentVersion.document_id == doc_data.id,
+        DocumentVersion.valid_to.is_(None)
+    ).with_for_update().first()
+    if current is not None:
+        if current.content_hash == digest:
+            return False
+        # A backdated resend cannot rewrite history; it starts when the current version does
+        valid_from = max(valid_from, current.valid_from)
+        current.valid_to = valid_from
+
+    db.add(DocumentVersion(
+        document_id=doc_data.id,
+        content_hash=digest,
+        valid_from=valid_from,
+        **values
+    ))
+    db.flush()
+    return True
+
+
+def record_unit_versions(db: Session, document_id, units: List, valid_from: date) -> Dict[str, int]:
+    """
+    Diff incoming units against the open unit versions of a document: close
+    removed or changed units and append new content. Order changes alone are
+    applied in place, since ordering is presentation and not legal content.
+    """
+    open_rows = {
+        row.unit_key: row
+        for row in db.query(LegalUnitVersion).filter(
+            LegalUnitVersion.document_id == document_id,
+            LegalUnitVersion.valid_to.is_(None)
+        ).with_for_update()
+    }
+    counts = {"added": 0, "changed": 0, "removed": 0, "unchanged": 0}
+    incoming = set()
+
+    for key, unit in zip(unit_keys(units), units):
+        incoming.add(key)
+        digest = content_hash(getattr(unit, field) for field in UNIT_FIELDS)
+        row = open_rows.get(key)
+        if row is not None and row.content_hash == digest:
+            if row.order_index != unit.order_index:
+                row.order_index = unit.order_index
+            counts["unchanged"] += 1
+            continue
+        start = valid_from
+        if row is not None:
+            start = max(valid_from, row.valid_from)
+            row.valid_to = start
+            counts["changed"] += 1
+        else:
+            counts["added"] += 1
+        db.add(LegalUnitVersion(
+            document_id=document_id,
+            unit_key=key,
+            content_hash=digest,
+            unit_type=unit.unit_type,
+            num_label=unit.num_label,
+            heading=unit.heading,
+            text_plain=unit.text_plain,
+            order_index=unit.order_index,
+            valid_from=start
+        ))
+
+    for key, row in open_rows.items():
+        if key not in incoming:
+            row.valid_to = max(valid_from, row.valid_from)
+            counts["removed"] += 1
+    db.flush()
+    return counts
+
+
+def document_as_of(db: Session, document_id, as_of: date) -> Optional[DocumentVersion]:
+    return db.query(DocumentVersion).filter(
+        DocumentVersion.document_id == document_id,
+        valid_at(DocumentVersion, as_of)
+    ).first()
+
+
+def units_as_of(db: Session, document_id, as_of: date) -> List[LegalUnitVersion]:
+    return db.query(LegalUnitVersion).filter(
+        LegalUnitVersion.document_id == document_id,
+        valid_at(LegalUnitVersion, as_of)
+    ).order_by(LegalUnitVersion.order_index).all()
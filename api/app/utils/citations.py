@@ -0,0 +1,246 @@
+"""
+Parsing of Persian legal unit labels and citations.
+
+A unit label such as "ماده ۱۲", "بند ب" or "ماده ۱۲ مکرر" parses to a
+`UnitLabel(unit_type, ordinal, repeat)`: the unit type from the leading
+word, the ordinal from Persian/Arabic/ASCII digits, a Persian letter
+(الف = 1, ب = 2, پ = 3, ... in Persian alphabet order) or an ordinal word
+(اول, دوم, ...), and `repeat` for "مکرر" insertions (ماده ۱۲ مکرر = 1,
+ماده ۱۲ مکرر ۲ = 2). Letters are ordered by the Persian alphabet; laws that
+letter their clauses in abjad order still round-trip, since labels and
+citations go through the same mapping.
+
+A citation such as "تبصره ۲ ماده ۱۲ قانون کار" lists units innermost first,
+optionally followed by the document title. `find_citations` picks the
+citations out of running text, where a unit word only counts when an
+ordinal follows it and letters only number clauses and items; the title is
+left open, since only the known titles tell where it ends.
+"""
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+from app.utils.text import normalize_key
+import re
+
+# Leading words in match-key form (see normalize_key)
+UNIT_WORDS = {
+    "ماده": "article",
+    "تبصره": "note",
+    "بند": "clause",
+    "جزء": "item",
+    "جز": "item",
+    "فقره": "paragraph",
+    "فصل": "chapter",
+    "مبحث": "section",
+    "قسمت": "section",
+    "بخش": "part",
+    "باب": "part",
+    "پیوست": "annex",
+}
+
+LETTER_ORDINALS = {
+    letter: i + 1 for i, letter in enumerate(
+        ["الف", "ب", "پ", "ت", "ث", "ج", "چ", "ح", "خ", "د", "ذ", "ر", "ز", "ژ", "س", "ش",
+         "ص", "ض", "ط", "ظ", "ع", "غ", "ف", "ق", "ک", "گ", "ل", "م", "ن", "و", "ه", "ی"]
+    )
+}
+
+_CARDINALS = {
+    "یک": 1, "دو": 2, "سه": 3, "چهار": 4, "پنج": 5, "شش": 6, "هفت": 7, "هشت": 8, "نه": 9,
+    "ده": 10, "یازده": 11, "دوازده": 12, "سیزده": 13, "چهارده": 14, "پانزده": 15,
+    "شانزده": 16, "هفده": 17, "هجده": 18, "هیجده": 18, "نوزده": 19, "بیست": 20,
+}
+_ORDINAL_WORDS = {"اول": 1, "نخست": 1, "یکم": 1, "سوم": 3, "واحده": 1}
+
+REPEAT_WORD = "مکرر"
+
+# Words between the unit chain and the document title
+_CONNECTORS = {"از", "در", "مندرج", "موضوع"}
+
+# Words that open a document title in running text
+TITLE_WORDS = {
+    "قانون", "آیین", "آییننامه", "تصویبنامه", "دستورالعمل", "بخشنامه",
+    "مقررات", "اساسنامه", "لایحه", "مصوبه", "کنوانسیون", "موافقتنامه",
+}
+MAX_TITLE_WORDS = 12
+
+# "قانون حاضر" (this law) is the citing document itself, as is any
+# citation without a title word, such as "ماده ۵ این قانون"
+_PRESENT_WORD = "حاضر"
+
+# Unit types numbered by letter (بند الف); others take numbers or ordinal words
+_LETTERED = {"clause", "item", "paragraph"}
+
+_TOKEN_RE = re.compile(r"\d+|[^\s\d,،؛;:()\[\]\-–.]+")
+
+
+@dataclass(frozen=True)
+class UnitLabel:
+    unit_type: str
+    ordinal: int
+    repeat: int = 0
+
+
+@dataclass
+class Citation:
+    text: str
+    units: List[UnitLabel] = field(default_factory=list)  # innermost first
+    document_title: Optional[str] = None  # in match-key form
+
+    @property
+    def parsed(self) -> bool:
+        return bool(self.units)
+
+
+@dataclass
+class Mention:
+    """A citation found in running text"""
+    text: str  # the unit chain in match-key form, e.g. "تبصره 2 ماده 12"
+    units: List[UnitLabel]  # innermost first
+    # The words from a title word on, at most MAX_TITLE_WORDS; empty when the
+    # citation refers to the citing document itself
+    title_words: List[str] = field(default_factory=list)
+
+    def titles(self) -> List[str]:
+        """Candidate document titles, longest first"""
+        return [" ".join(self.title_words[:n]) for n in range(len(self.title_words), 0, -1)]
+
+
+def _tokens(key: str) -> List[str]:
+    return _TOKEN_RE.findall(key)
+
+
+def parse_ordinal(token: str) -> Optional[int]:
+    """Ordinal of a token in match-key form, or None"""
+    if token.isdigit():
+        return int(token)
+    if token in LETTER_ORDINALS:
+        return LETTER_ORDINALS[token]
+    if token in _ORDINAL_WORDS:
+        return _ORDINAL_WORDS[token]
+    if token in _CARDINALS:
+        return _CARDINALS[token]
+    if token.endswith("م") and token[:-1] in _CARDINALS:
+        return _CARDINALS[token[:-1]]
+    return None
+
+
+def _parse_units(tokens: List[str], start: int, single: bool):
+    """Unit labels from tokens[start:]; returns (labels, next index)"""
+    labels = []
+    i = start
+    while i < len(tokens) and tokens[i] in UNIT_WORDS:
+        unit_type = UNIT_WORDS[tokens[i]]
+        i += 1
+        ordinal = parse_ordinal(tokens[i]) if i < len(tokens) else None
+        if ordinal is None:
+            # "تبصره" or "ماده واحده" alone: the only one of its kind
+            if i < len(tokens) and tokens[i] not in UNIT_WORDS and single:
+                return [], start
+            ordinal = 1
+        else:
+            i += 1
+        repeat = 0
+        if i < len(tokens) and tokens[i] == REPEAT_WORD:
+            i += 1
+            repeat = 1
+            if i < len(tokens) and tokens[i].isdigit():
+                repeat = int(tokens[i])
+                i += 1
+        labels.append(UnitLabel(unit_type, ordinal, repeat))
+        if single:
+            break
+    return labels, i
+
+
+def parse_normalized_label(key: Optional[str]) -> Optional[UnitLabel]:
+    """parse_num_label for a label already in match-key form"""
+    if not key:
+        return None
+    tokens = _tokens(key)
+    labels, end = _parse_units(tokens, 0, single=True)
+    if not labels or end != len(tokens):
+        return None
+    return labels[0]
+
+
+def parse_num_label(label: Optional[str]) -> Optional[UnitLabel]:
+    """UnitLabel for a label such as "ماده ۱۲", or None when it does not parse"""
+    return parse_normalized_label(normalize_key(label))
+
+
+def title_key(title: Optional[str]) -> Optional[str]:
+    """
+    official_documents.title_normalized: the title in match-key form, split
+    into tokens as citations are, so a cited title equals the stored key even
+    when the title has punctuation ("... (در امور مدنی)")
+    """
+    if title is None:
+        return None
+    return " ".join(_tokens(normalize_key(title)))
+
+
+def parse_citation(text: str) -> Citation:
+    key = normalize_key(text) or ""
+    tokens = _tokens(key)
+    units, i = _parse_units(tokens, 0, single=False)
+    citation = Citation(text=text, units=units)
+    if units:
+        while i < len(tokens) and tokens[i] in _CONNECTORS:
+            i += 1
+        if i < len(tokens):
+            citation.document_title = " ".join(tokens[i:])
+    return citation
+
+
+def _running_label(tokens: List[str], i: int) -> Tuple[Optional[UnitLabel], int]:
+    """The unit label at tokens[i] in running text; returns (label or None, next index)"""
+    unit_type = UNIT_WORDS[tokens[i]]
+    i += 1
+    token = tokens[i] if i < len(tokens) else None
+    ordinal = None
+    if token is not None and (unit_type in _LETTERED or token not in LETTER_ORDINALS):
+        ordinal = parse_ordinal(token)
+    if ordinal is None:
+        # "تبصره ماده ۵": the only note of an article; a bare "ماده" is no citation
+        if token in UNIT_WORDS:
+            return UnitLabel(unit_type, 1), i
+        return None, i
+    i += 1
+    repeat = 0
+    if i < len(tokens) and tokens[i] == REPEAT_WORD:
+        i += 1
+        repeat = 1
+        if i < len(tokens) and tokens[i].isdigit():
+            repeat = int(tokens[i])
+            i += 1
+    return UnitLabel(unit_type, ordinal, repeat), i
+
+
+def find_citations(key: Optional[str]) -> List[Mention]:
+    """Citations in a text already in match-key form, in order of appearance"""
+    tokens = _tokens(key or "")
+    mentions = []
+    i = 0
+    while i < len(tokens):
+        if tokens[i] not in UNIT_WORDS:
+            i += 1
+            continue
+        start = i
+        units = []
+        while i < len(tokens) and tokens[i] in UNIT_WORDS:
+            label, end = _running_label(tokens, i)
+            if label is None:
+                break
+            units.append(label)
+            i = end
+        if not units:
+            i = start + 1
+            continue
+        mention = Mention(text=" ".join(tokens[start:i]), units=units)
+        j = i
+        while j < len(tokens) and tokens[j] in _CONNECTORS:
+            j += 1
+        if j < len(tokens) and tokens[j] in TITLE_WORDS and not (j + 1 < len(tokens) and tokens[j + 1] == _PRESENT_WORD):
+            mention.title_words = tokens[j:j + MAX_TITLE_WORDS]
+        mentions.append(mention)
+    return mentions
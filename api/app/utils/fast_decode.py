@@ -0,0 +1,110 @@
+"""
+Fast decode path for sync payloads.
+
+msgspec decodes the raw JSON body directly into slotted Structs that mirror
+the Pydantic sync models field for field, skipping the intermediate dict
+tree and per-object model construction. The import code only reads
+attributes, so the Structs are drop-in replacements.
+
+If msgspec rejects a payload, it is re-validated with the Pydantic model:
+a payload Pydantic accepts is used as-is, and a rejected one raises the
+exact errors the regular FastAPI body validation would have produced.
+"""
+from datetime import date
+from typing import List, Literal, Optional, Type
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+import uuid
+import msgspec
+
+
+class LegalUnitStruct(msgspec.Struct):
+    unit_type: str
+    num_label: Optional[str] = None
+    heading: Optional[str] = None
+    text_plain: Optional[str] = None
+    order_index: Optional[int] = None
+
+
+class DocumentStruct(msgspec.Struct):
+    id: uuid.UUID
+    title: str
+    doc_type: str
+    jurisdiction: Optional[str] = None
+    authority: Optional[str] = None
+    effective_date: Optional[date] = None
+    amended_date: Optional[date] = None
+    source_url: Optional[str] = None
+    file_s3: Optional[str] = None
+    text_normalized: Optional[str] = None
+    legal_units: Optional[List[LegalUnitStruct]] = []
+
+
+class QAStruct(msgspec.Struct):
+    id: uuid.UUID
+    question: str
+    answer: str
+    topic_tags: List[str] = []
+    source_url: Optional[str] = None
+    author: Optional[str] = None
+    org: Optional[str] = None
+    answered_at: Optional[date] = None
+    quality_score: Optional[float] = None
+    licensing: str = "allowed"
+    pii_status: str = "clean"
+    moderation_status: str = "published"
+
+
+class TombstoneStruct(msgspec.Struct):
+    kind: Literal["document", "qa_entry"]
+    id: uuid.UUID
+    effective_date: Optional[date] = None
+
+
+class SyncImportStruct(msgspec.Struct):
+    batch_ts: str
+    documents: List[DocumentStruct] = []
+    qa_entries: List[QAStruct] = []
+    tombstones: List[TombstoneStruct] = []
+
+
+class PayloadDecoder:
+    """Decode request bodies into `struct_type`, validated like `model`"""
+
+    def __init__(self, struct_type: Type[msgspec.Struct], model: Type[BaseModel], use_msgspec: bool = True):
+        # strict=False allows the same str -> int/float/bool coercions as Pydantic's lax mode
+        self._decoder = msgspec.json.Decoder(struct_type, strict=False)
+        self.model = model
+        self.use_msgspec = use_msgspec
+
+    def decode(self, body: bytes):
+        if self.use_msgspec:
+            try:
+                return self._decoder.decode(body)
+            except (msgspec.ValidationError, msgspec.DecodeError):
+                pass
+        try:
+            return self.model.model_validate_json(body)
+        except ValidationError as e:
+            raise RequestValidationError(
+                [{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)],
+                body=body
+            )
+
+
+def inline_schema(model: Type[BaseModel]) -> dict:
+    """JSON schema of `model` with $defs references inlined, for openapi_extra"""
+    schema = model.model_json_schema()
+    defs = schema.pop("$defs", {})
+
+    def resolve(node):
+        if isinstance(node, dict):
+            ref = node.get("$ref")
+            if ref is not None:
+                return resolve(defs[ref.split("/")[-1]])
+            return {key: resolve(value) for key, value in node.items()}
+        if isinstance(node, list):
+            return [resolve(value) for value in node]
+        return node
+
+    return resolve(schema)
@@ -1,11 +1,24 @@
 from minio import Minio
+from minio.deleteobjects import DeleteObject
 from minio.error import S3Error
 from app.core.settings import settings
+from datetime import timedelta
+from typing import Dict, Iterable, Iterator, List
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def split_s3_url(url: str):
+    """Split "s3://bucket/key" into (bucket, key)"""
+    if not url or not url.startswith("s3://"):
+        raise ValueError(f"Not an s3:// URL: {url}")
+    bucket, _, key = url[len("s3://"):].partition("/")
+    if not bucket or not key:
+        raise ValueError(f"Not an s3:// object URL: {url}")
+    return bucket, key
+
+
 class MinIOHelper:
     """Helper class for MinIO operations"""
     
@@ -51,6 +64,28 @@ class MinIOHelper:
             logger.error(f"Error downloading file {object_name}: {e}")
             raise
     
+    def read_file(self, object_name: str, max_bytes: int = None) -> bytes:
+        """
+        Read an object into memory.
+        Raises ValueError if the object is larger than `max_bytes`.
+        """
+        response = None
+        try:
+            response = self.client.get_object(self.bucket_name, object_name)
+            if max_bytes is None:
+                return response.read()
+            data = response.read(max_bytes + 1)
+            if len(data) > max_bytes:
+                raise ValueError(f"Object {object_name} exceeds {max_bytes} bytes")
+            return data
+        except S3Error as e:
+            logger.error(f"Error reading file {object_name}: {e}")
+            raise
+        finally:
+            if response is not None:
+                response.close()
+                response.release_conn()
+    
     def delete_file(self, object_name: str):
         """Delete a file from MinIO"""
         try:
@@ -59,23 +94,74 @@ class MinIOHelper:
             logger.error(f"Error deleting file {object_name}: {e}")
             raise
     
-    def list_files(self, prefix: str = ""):
-        """List files in the bucket"""
+    def delete_files(self, object_names: Iterable[str]) -> List[str]:
+        """
+        Delete many files with bulk DeleteObjects requests (1000 keys per call).
+        Accepts any iterable, including generators, so memory stays bounded.
+        Returns the names that could not be deleted.
+        """
+        failed = []
         try:
-            objects = self.client.list_objects(self.bucket_name, prefix=prefix, recursive=True)
-            return [obj.object_name for obj in objects]
+            errors = self.client.remove_objects(
+                self.bucket_name,
+                (DeleteObject(name) for name in object_names)
+            )
+            for error in errors:
+                logger.error(f"Error deleting file {error.name}: {error.code} {error.message}")
+                failed.append(error.name)
+        except S3Error as e:
+            logger.error(f"Error deleting files: {e}")
+            raise
+        return failed
+    
+    def iter_files(self, prefix: str = "", start_after: str = None) -> Iterator[str]:
+        """Lazily iterate over object names in the bucket, in key order"""
+        try:
+            objects = self.client.list_objects(
+                self.bucket_name,
+                prefix=prefix,
+                recursive=True,
+                start_after=start_after
+            )
+            for obj in objects:
+                yield obj.object_name
         except S3Error as e:
             logger.error(f"Error listing files: {e}")
             raise
     
+    def list_files(self, prefix: str = ""):
+        """List files in the bucket"""
+        return list(self.iter_files(prefix))
+    
     def get_file_url(self, object_name: str, expires_in_seconds: int = 3600):
         """Get a presigned URL for file access"""
         try:
             return self.client.presigned_get_object(
                 self.bucket_name,
                 object_name,
-                expires=expires_in_seconds
+                expires=timedelta(seconds=expires_in_seconds)
             )
         except S3Error as e:
             logger.error(f"Error generating presigned URL for {object_name}: {e}")
             raise
+    
+    def get_file_urls(self, object_names: Iterable[str], expires_in_seconds: int = 3600) -> Dict[str, str]:
+        """
+        Get presigned URLs for many files.
+        Presigning is local HMAC work once the client has cached the bucket
+        region (first call), so this stays a plain loop; a thread pool would
+        only add GIL contention.
+        """
+        expires = timedelta(seconds=expires_in_seconds)
+        urls = {}
+        try:
+            for object_name in object_names:
+                urls[object_name] = self.client.presigned_get_object(
+                    self.bucket_name,
+                    object_name,
+                    expires=expires
+                )
+        except S3Error as e:
+            logger.error(f"Error generating presigned URLs: {e}")
+            raise
+        return urls
@@ -0,0 +1,251 @@
+"""
+Immutable on-disk postings segments for the BM25 index (app.services.bm25).
+
+A segment is a directory of .npy arrays, written once and memory-mapped on
+open, so all workers on a node share one copy through the page cache:
+
+    terms.bin, term_offsets.npy      sorted UTF-8 term dictionary
+    term_df.npy, term_blocks.npy     per term: document frequency, block range
+    block_last.npy, block_start.npy  per block: last document number, first posting
+    block_max_tf.npy, block_min_len.npy
+                                     per block: bounds for block-max scoring
+    gaps.npy, tfs.npy                postings: document number gaps, term frequencies
+    doc_*.npy                        per document: length, id, group, source, unit type
+
+Documents are numbered 0..n-1 in insertion order. A term's postings are in
+document order, cut into blocks of BLOCK_SIZE. Each posting stores the gap
+from the previous posting of the same term (the first one its document
+number), so a whole term decodes with one cumsum and a single block from the
+previous block's last document. Gaps and frequencies use the narrowest
+unsigned dtype that holds the segment's largest value.
+"""
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+import heapq
+import json
+import os
+import uuid
+import numpy as np
+
+BLOCK_SIZE = 128
+
+SOURCE_UNIT = 0
+SOURCE_QA = 1
+# legal_units.unit_type values; code 0 means none (Q&A entries)
+UNIT_TYPES = ("part", "chapter", "section", "article", "paragraph", "clause", "item", "note", "annex")
+
+
+@dataclass
+class IndexedDoc:
+    id: uuid.UUID
+    group: uuid.UUID  # document_id for units, the entry's own id for Q&A; deletes go by group
+    source: int
+    unit_type: int
+    terms: Sequence[str]
+
+
+def unit_type_code(unit_type: Optional[str]) -> int:
+    return UNIT_TYPES.index(unit_type) + 1 if unit_type in UNIT_TYPES else 0
+
+
+def uuid_bytes(values) -> np.ndarray:
+    return np.array([value.bytes for value in values], dtype="S16")
+
+
+def to_uuid(raw: bytes) -> uuid.UUID:
+    # S16 drops trailing NUL bytes
+    return uuid.UUID(bytes=raw.ljust(16, b"\0"))
+
+
+def _narrow(values: np.ndarray) -> np.ndarray:
+    top = int(values.max()) if len(values) else 0
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if top <= np.iinfo(dtype).max:
+            return values.astype(dtype)
+    return values.astype(np.uint64)
+
+
+def _write(path: str, terms: Iterator[Tuple[bytes, np.ndarray, np.ndarray]], docs: Dict[str, np.ndarray]) -> Dict:
+    """Write a segment from (term, document numbers, frequencies) in term order"""
+    os.makedirs(path)
+    lens = docs["lens"]
+    names, dfs, gaps, tfs = [], [], [], []
+    block_last, block_start, block_max_tf, block_min_len, term_blocks = [], [], [], [], [0]
+    postings = 0
+    for term, numbers, freqs in terms:
+        names.append(term)
+        dfs.append(len(numbers))
+        starts = np.arange(0, len(numbers), BLOCK_SIZE)
+        ends = np.minimum(starts + BLOCK_SIZE, len(numbers))
+        gaps.append(np.diff(numbers, prepend=0))
+        tfs.append(freqs)
+        block_last.append(numbers[ends - 1])
+        block_start.append(starts + postings)
+        block_max_tf.append(np.maximum.reduceat(freqs, starts))
+        block_min_len.append(np.minimum.reduceat(lens[numbers], starts))
+        term_blocks.append(term_blocks[-1] + len(starts))
+        postings += len(numbers)
+
+    def cat(parts, dtype):
+        return np.concatenate(parts).astype(dtype) if parts else np.zeros(0, dtype=dtype)
+
+    arrays = {
+        "term_offsets": np.cumsum([0] + [len(name) for name in names], dtype=np.int64),
+        "term_df": np.array(dfs, dtype=np.int32),
+        "term_blocks": np.array(term_blocks, dtype=np.int64),
+        "block_last": cat(block_last, np.uint32),
+        "block_start": np.append(cat(block_start, np.int64), postings),
+        "block_max_tf": cat(block_max_tf, np.uint32),
+        "block_min_len": cat(block_min_len, np.uint32),
+        "gaps": _narrow(cat(gaps, np.int64)),
+        "tfs": _narrow(cat(tfs, np.int64)),
+        "doc_lens": lens.astype(np.uint32),
+        "doc_ids": docs["ids"],
+        "doc_groups": docs["groups"],
+        "doc_source": docs["source"].astype(np.uint8),
+        "doc_unit_type": docs["unit_type"].astype(np.uint8),
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(path, name + ".npy"), array)
+    with open(os.path.join(path, "terms.bin"), "wb") as f:
+        f.write(b"".join(names))
+    meta = {"docs": len(lens), "terms": len(names), "postings": postings, "total_len": int(lens.sum())}
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    return meta
+
+
+def write_segment(path: str, docs: Sequence[IndexedDoc]) -> Dict:
+    """Invert `docs` into a new segment at `path`"""
+    inverted: Dict[str, Tuple[List[int], List[int]]] = {}
+    lens = np.zeros(len(docs), dtype=np.int64)
+    for number, doc in enumerate(docs):
+        lens[number] = len(doc.terms)
+        for term, tf in Counter(doc.terms).items():
+            entry = inverted.get(term)
+            if entry is None:
+                entry = inverted[term] = ([], [])
+            entry[0].append(number)
+            entry[1].append(tf)
+    encoded = sorted((term.encode("utf-8"), term) for term in inverted)
+    terms = (
+        (raw, np.array(inverted[term][0], dtype=np.int64), np.array(inverted[term][1], dtype=np.int64))
+        for raw, term in encoded
+    )
+    return _write(path, terms, {
+        "lens": lens,
+        "ids": uuid_bytes(doc.id for doc in docs),
+        "groups": uuid_bytes(doc.group for doc in docs),
+        "source": np.array([doc.source for doc in docs], dtype=np.uint8),
+        "unit_type": np.array([doc.unit_type for doc in docs], dtype=np.uint8),
+    })
+
+
+class Segment:
+    """Read side of a segment; every array is a read-only memory map"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        for name in (
+            "term_offsets", "term_df", "term_blocks", "block_last", "block_start", "block_max_tf",
+            "block_min_len", "gaps", "tfs", "doc_lens", "doc_ids", "doc_groups", "doc_source", "doc_unit_type",
+        ):
+            setattr(self, name, np.load(os.path.join(path, name + ".npy"), mmap_mode="r"))
+        terms_path = os.path.join(path, "terms.bin")
+        # np.memmap refuses empty files
+        self.terms_bin = np.memmap(terms_path, dtype=np.uint8, mode="r") if os.path.getsize(terms_path) else b""
+
+    def __len__(self):
+        return self.meta["docs"]
+
+    def _term(self, t: int) -> bytes:
+        return bytes(self.terms_bin[self.term_offsets[t]:self.term_offsets[t + 1]])
+
+    def term_index(self, term: str) -> Optional[int]:
+        """Binary search of the term dictionary"""
+        key = term.encode("utf-8")
+        lo, hi = 0, self.meta["terms"]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < self.meta["terms"] and self._term(lo) == key else None
+
+    def terms(self) -> Iterator[Tuple[bytes, int]]:
+        raw = bytes(self.terms_bin)
+        offsets = np.asarray(self.term_offsets)
+        for t in range(self.meta["terms"]):
+            yield raw[offsets[t]:offsets[t + 1]], t
+
+    def postings(self, t: int) -> Tuple[np.ndarray, np.ndarray]:
+        """All (document numbers, frequencies) of term t"""
+        start = self.block_start[self.term_blocks[t]]
+        end = self.block_start[self.term_blocks[t + 1]]
+        return np.cumsum(self.gaps[start:end], dtype=np.int64), np.asarray(self.tfs[start:end], dtype=np.int64)
+
+    def block(self, t: int, b: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(document numbers, frequencies) of block b, which belongs to term t"""
+        start, end = self.block_start[b], self.block_start[b + 1]
+        base = int(self.block_last[b - 1]) if b > self.term_blocks[t] else 0
+        numbers = np.cumsum(self.gaps[start:end], dtype=np.int64)
+        if base:
+            numbers += base
+        return numbers, np.asarray(self.tfs[start:end], dtype=np.int64)
+
+
+def merge_segments(path: str, segments: Sequence[Segment], lives: Sequence[np.ndarray]) -> Dict:
+    """
+    Write the live documents of `segments` as one segment, renumbered in
+    segment order, so merged postings stay sorted by plain concatenation
+    """
+    remaps = []
+    base = 0
+    for segment, live in zip(segments, lives):
+        remap = np.full(len(segment), -1, dtype=np.int64)
+        remap[live] = np.arange(base, base + int(live.sum()))
+        remaps.append(remap)
+        base += int(live.sum())
+
+    def merged_terms():
+        streams = [_tagged(segment, i) for i, segment in enumerate(segments)]
+        current, parts = None, []
+        for raw, i, t in heapq.merge(*streams):
+            if raw != current and parts:
+                yield from _joined(current, parts)
+                parts = []
+            current = raw
+            numbers, freqs = segments[i].postings(t)
+            numbers = remaps[i][numbers]
+            keep = numbers >= 0
+            parts.append((numbers[keep], freqs[keep]))
+        if parts:
+            yield from _joined(current, parts)
+
+    def pick(name, dtype=None):
+        array = np.concatenate([np.asarray(getattr(s, name))[live] for s, live in zip(segments, lives)])
+        return array if dtype is None else array.astype(dtype)
+
+    return _write(path, merged_terms(), {
+        "lens": pick("doc_lens", np.int64),
+        "ids": pick("doc_ids"),
+        "groups": pick("doc_groups"),
+        "source": pick("doc_source"),
+        "unit_type": pick("doc_unit_type"),
+    })
+
+
+def _tagged(segment: Segment, i: int) -> Iterator[Tuple[bytes, int, int]]:
+    for raw, t in segment.terms():
+        yield raw, i, t
+
+
+def _joined(term: bytes, parts):
+    numbers = np.concatenate([p[0] for p in parts])
+    if len(numbers):
+        yield term, numbers, np.concatenate([p[1] for p in parts])
@@ -0,0 +1,132 @@
+"""
+Persian text normalization helpers.
+
+normalize_text keeps extracted documents readable (paragraphs, letters and
+marks as written). normalize_key / normalize_batch produce match keys for
+equality, dedup and search: letter variants and digits folded, diacritics,
+tatweel, ZWNJ and bidi marks removed, whitespace collapsed, lowercased.
+"""
+from typing import List, Optional, Sequence
+import re
+
+# Arabic code points that have a distinct Persian form
+_CHAR_MAP = {
+    "ي": "ی",  # ARABIC YEH -> FARSI YEH
+    "ى": "ی",  # ALEF MAKSURA -> FARSI YEH
+    "ك": "ک",  # ARABIC KAF -> KEHEH
+    "\u0640": None,  # TATWEEL
+}
+
+# Persian (U+06F0..) and Arabic-Indic (U+0660..) digits -> ASCII
+_DIGIT_MAP = {
+    **{0x06F0 + i: str(i) for i in range(10)},
+    **{0x0660 + i: str(i) for i in range(10)},
+}
+
+_TRANSLATION = str.maketrans({**{ord(k): v for k, v in _CHAR_MAP.items()}, **_DIGIT_MAP})
+
+_WHITESPACE_RE = re.compile(r"[ \t\u00a0\u200e\u200f]+")
+_BLANK_LINES_RE = re.compile(r"\n\s*\n+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize Persian text: unify Arabic/Persian letter variants, convert
+    Persian and Arabic-Indic digits to ASCII, and collapse whitespace while
+    keeping paragraph breaks.
+    """
+    if not text:
+        return ""
+    text = text.translate(_TRANSLATION)
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = _WHITESPACE_RE.sub(" ", text)
+    text = "\n".join(line.strip() for line in text.split("\n"))
+    text = _BLANK_LINES_RE.sub("\n\n", text)
+    return text.strip()
+
+
+# Folding for match keys, on top of _CHAR_MAP and _DIGIT_MAP
+_KEY_CHAR_MAP = {
+    **_CHAR_MAP,
+    "ة": "ه",  # TEH MARBUTA -> HEH
+    "ۀ": "ه",  # HEH WITH YEH ABOVE -> HEH
+    "أ": "ا",  # ALEF WITH HAMZA ABOVE
+    "إ": "ا",  # ALEF WITH HAMZA BELOW
+    "ٱ": "ا",  # ALEF WASLA
+    "ؤ": "و",  # WAW WITH HAMZA ABOVE
+    # ZWNJ is removed so "می‌شود" and "میشود" give the same key
+    "\u200c": None, "\u200d": None, "\u200e": None, "\u200f": None,
+    "\u061c": None, "\ufeff": None,
+}
+_KEY_SPACES = "\t\n\r\v\f\u00a0\u2000\u2001\u2002\u2003\u2004\u2005\u2006\u2007\u2008\u2009\u200a\u202f\u3000"
+
+_KEY_TRANSLATION = str.maketrans({
+    **{ord(k): v for k, v in _KEY_CHAR_MAP.items()},
+    **_DIGIT_MAP,
+    # Arabic harakat, Quranic marks and superscript alef
+    **{cp: None for cp in range(0x064B, 0x0660)},
+    0x0670: None,
+    **{ord(c): " " for c in _KEY_SPACES},
+})
+
+# The same table as (old, new) pairs. On one long string, a str.replace per
+# mapped character is several times faster than str.translate, which does a
+# dict lookup for every non-ASCII character. No replacement produces a
+# character that is itself mapped, so the order does not matter.
+_KEY_REPLACEMENTS = tuple(
+    (chr(cp), "" if value is None else value) for cp, value in _KEY_TRANSLATION.items()
+)
+
+# Joins a batch into one string; Postgres text cannot contain NUL, so
+# imported values never do
+_BATCH_SEP = "\x00"
+_KEY_SPACE_RUN_RE = re.compile(r" {2,}")
+# Strings folded per joined string; larger chunks fall out of CPU cache
+_BATCH_CHUNK = 1024
+
+
+def normalize_key(text: Optional[str]) -> Optional[str]:
+    """Match key for one string; None stays None"""
+    if text is None:
+        return None
+    return _KEY_SPACE_RUN_RE.sub(" ", text.translate(_KEY_TRANSLATION)).strip().lower()
+
+
+def _fold_joined(present: List[str]) -> List[str]:
+    joined = _BATCH_SEP.join(present)
+    for old, new in _KEY_REPLACEMENTS:
+        if old in joined:
+            joined = joined.replace(old, new)
+    # spaces left next to a separator are stripped per part
+    parts = _KEY_SPACE_RUN_RE.sub(" ", joined).lower().split(_BATCH_SEP)
+    if len(parts) != len(present):
+        # an input contained the separator itself
+        return [normalize_key(t) for t in present]
+    return [part.strip() for part in parts]
+
+
+def normalize_batch(texts: Sequence[Optional[str]]) -> List[Optional[str]]:
+    """
+    normalize_key over a list: strings are joined, folded and collapsed as
+    one string per chunk of _BATCH_CHUNK and split again, so per-call
+    overhead is paid once per chunk instead of once per string.
+    """
+    present = [t for t in texts if t]
+    keys = []
+    for start in range(0, len(present), _BATCH_CHUNK):
+        keys.extend(_fold_joined(present[start:start + _BATCH_CHUNK]))
+    it = iter(keys)
+    return [None if t is None else (next(it) if t else "") for t in texts]
+
+
+# Function words that would match most rows and only dilute ranking
+STOPWORDS = frozenset(
+    "و در به از که این آن را با است برای یا تا بر هم نیز چه چیست آیا می ها های اگر باید شود".split()
+)
+
+_TERM_RE = re.compile(r"[^\W_]+")
+
+
+def key_terms(key: Optional[str]) -> List[str]:
+    """Search terms of a match key, in order with repeats: words of two or more characters, minus stopwords"""
+    return [term for term in _TERM_RE.findall(key or "") if len(term) > 1 and term not in STOPWORDS]
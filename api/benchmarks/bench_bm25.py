@@ -0,0 +1,92 @@
+"""
+BM25 index benchmark: segment build throughput, merge time and top-k
+latency (block-max against exhaustive scoring) for a synthetic Zipf corpus.
+
+    python -m benchmarks.bench_bm25 --documents 500000 --segments 4
+"""
+import argparse
+import random
+import shutil
+import tempfile
+import time
+import uuid
+
+import numpy as np
+
+from app.services.bm25 import Bm25Index, IndexWriter
+from app.utils.postings import SOURCE_UNIT, IndexedDoc
+
+VOCABULARY = 50_000
+
+
+def corpus(n: int, rng: random.Random, weights) -> list:
+    groups = [uuid.uuid4() for _ in range(max(n // 50, 1))]
+    return [
+        IndexedDoc(uuid.uuid4(), rng.choice(groups), SOURCE_UNIT, rng.randrange(1, 10),
+                   [f"w{i}" for i in rng.choices(range(VOCABULARY), cum_weights=weights, k=rng.randrange(10, 120))])
+        for _ in range(n)
+    ]
+
+
+def percentiles(samples):
+    return np.percentile(np.array(samples) * 1e3, [50, 95])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, default=500_000)
+    parser.add_argument("--segments", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    weights = np.cumsum([1 / (i + 1) for i in range(VOCABULARY)]).tolist()
+    path = tempfile.mkdtemp(prefix="bench_bm25_")
+    try:
+        writer = IndexWriter(path)
+        per_segment = args.documents // args.segments
+        build = 0.0
+        for _ in range(args.segments):
+            docs = corpus(per_segment, rng, weights)
+            t0 = time.perf_counter()
+            writer.add(docs)
+            writer.commit()
+            build += time.perf_counter() - t0
+        print(f"build: {per_segment * args.segments} docs in {build:.1f}s, "
+              f"{per_segment * args.segments / build:.0f} docs/s")
+
+        queries = [
+            [f"w{i}" for i in rng.choices(range(VOCABULARY), cum_weights=weights, k=rng.randrange(1, 5))]
+            for _ in range(args.queries)
+        ]
+        index = Bm25Index(path)
+        snapshot = index.snapshot()
+        for name, exhaustive in (("exhaustive", True), ("block-max", False)):
+            samples = []
+            for terms in queries:
+                t0 = time.perf_counter()
+                snapshot.search(terms, args.k, exhaustive=exhaustive)
+                samples.append(time.perf_counter() - t0)
+            p50, p95 = percentiles(samples)
+            print(f"search [{name}, {args.segments} segments]: p50 {p50:.2f} ms, p95 {p95:.2f} ms")
+
+        t0 = time.perf_counter()
+        writer.merge(max_segments=1)
+        writer.commit()
+        print(f"merge: {args.segments} segments in {time.perf_counter() - t0:.1f}s")
+        index._checked = 0
+        snapshot = index.snapshot()
+        samples = []
+        for terms in queries:
+            t0 = time.perf_counter()
+            snapshot.search(terms, args.k)
+            samples.append(time.perf_counter() - t0)
+        p50, p95 = percentiles(samples)
+        print(f"search [block-max, 1 segment]: p50 {p50:.2f} ms, p95 {p95:.2f} ms")
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Document catalog benchmark: build time, combined-filter latency and memory
+footprint for a synthetic corpus.
+
+    python -m benchmarks.bench_catalog --documents 1000000
+"""
+from datetime import date, timedelta
+import argparse
+import random
+import time
+import uuid
+
+from app.services.catalog import DocumentCatalog, DOC_TYPES, STATUSES
+
+
+def build(n: int, seed: int = 7) -> DocumentCatalog:
+    rng = random.Random(seed)
+    jurisdictions = [f"jurisdiction-{i}" for i in range(40)]
+    authorities = [f"authority-{i}" for i in range(300)]
+    start = date(1980, 1, 1)
+    cat = DocumentCatalog(initial_capacity=n)
+    for _ in range(n):
+        effective = start + timedelta(days=rng.randrange(16000))
+        amended = effective + timedelta(days=rng.randrange(3000)) if rng.random() < 0.4 else None
+        cat.upsert(
+            uuid.uuid4(), rng.choice(DOC_TYPES), rng.choice(STATUSES),
+            rng.choice(jurisdictions), rng.choice(authorities), effective, amended
+        )
+    cat._reindex()
+    return cat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    cat = build(args.documents)
+    print(f"build: {args.documents} docs in {time.perf_counter() - t0:.1f}s")
+
+    filters = {
+        "doc_type": dict(doc_type=["law"]),
+        "type+status+jurisdiction": dict(doc_type=["law", "regulation"], status=["published"], jurisdiction=["jurisdiction-3"]),
+        "all facets + date ranges": dict(
+            doc_type=["law"], status=["published"], jurisdiction=["jurisdiction-3"],
+            authority=["authority-10", "authority-11"],
+            effective_from=date(2000, 1, 1), effective_to=date(2015, 1, 1),
+            amended_from=date(2005, 1, 1)
+        ),
+    }
+    for name, kwargs in filters.items():
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            mask = cat.filter_mask(**kwargs)
+        elapsed = (time.perf_counter() - t0) / args.repeat
+        print(f"filter [{name}]: {elapsed * 1e6:.0f} us, {int(mask.sum())} matches")
+
+    usage = cat.memory_usage()
+    print(f"memory: {usage['total_bytes'] / 2**20:.1f} MiB total, "
+          f"{usage['bytes_per_million_documents'] / 2**20:.1f} MiB per million documents")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Sync upload compression benchmark: wire size and end-to-end time for an
+identity, gzip and zstd encoded batch.
+
+The server side is the real RequestDecompressionMiddleware feeding the sync
+decoder, driven in 64 KiB chunks the way uvicorn delivers a request body.
+Transfer time is modelled from the link speed; database work is the same
+for every encoding and is left out.
+
+    python -m benchmarks.bench_compression --megabytes 50 --mbits 100 1000
+"""
+import argparse
+import asyncio
+import gzip
+import time
+
+import zstandard
+
+from app.core.compression import RequestDecompressionMiddleware
+from app.routers.sync import sync_decoder
+from benchmarks.bench_sync_decode import make_payload
+
+CHUNK = 64 * 1024
+
+
+async def _decode_app(scope, receive, send):
+    chunks = []
+    more_body = True
+    while more_body:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        more_body = message.get("more_body", False)
+    sync_decoder.decode(b"".join(chunks))
+
+
+def serve(body: bytes, encoding: str) -> float:
+    """Seconds for the middleware to inflate and the sync decoder to decode `body`"""
+    middleware = RequestDecompressionMiddleware(_decode_app)
+    headers = [] if encoding == "identity" else [(b"content-encoding", encoding.encode())]
+    scope = {"type": "http", "path": "/sync/import", "headers": headers}
+    chunks = [body[i:i + CHUNK] for i in range(0, len(body), CHUNK)]
+
+    async def run():
+        position = 0
+
+        async def receive():
+            nonlocal position
+            chunk = chunks[position]
+            position += 1
+            return {"type": "http.request", "body": chunk, "more_body": position < len(chunks)}
+
+        async def send(message):
+            pass
+
+        await middleware(scope, receive, send)
+
+    t0 = time.perf_counter()
+    asyncio.run(run())
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--megabytes", type=int, default=50)
+    parser.add_argument("--mbits", type=float, nargs="+", default=[100, 1000])
+    args = parser.parse_args()
+
+    raw = make_payload(args.megabytes)
+    encoders = {
+        "identity": lambda data: data,
+        "gzip": lambda data: gzip.compress(data, compresslevel=6),
+        "zstd": lambda data: zstandard.ZstdCompressor(level=3).compress(data),
+    }
+    print(f"payload: {len(raw) / 2**20:.1f} MiB")
+    header = f"{'encoding':>9} {'wire MiB':>9} {'ratio':>6} {'client s':>9} {'server s':>9}"
+    header += "".join(f" {f'@{mbit:g}Mbit s':>12}" for mbit in args.mbits)
+    print(header)
+    for name, encode in encoders.items():
+        t0 = time.perf_counter()
+        body = encode(raw)
+        client = time.perf_counter() - t0
+        server = min(serve(body, name) for _ in range(3))
+        line = f"{name:>9} {len(body) / 2**20:9.1f} {len(raw) / len(body):6.1f} {client:9.3f} {server:9.3f}"
+        for mbit in args.mbits:
+            transfer = len(body) * 8 / (mbit * 1e6)
+            line += f" {client + transfer + server:12.2f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+legal_units partitioning benchmark: an unpartitioned table against the
+16-way hash-partitioned layout of migration 0006, after the same
+sync-style churn (whole documents deleted and re-inserted).
+
+Reports VACUUM time (whole table, and the largest single partition, which
+bounds how long one maintenance step holds resources) and per-document
+read latency, and checks from EXPLAIN that reads touch a single partition.
+Runs in a scratch schema on the configured database and drops it after.
+
+    python -m benchmarks.bench_partitions --documents 20000 --units 200 --churn 0.2
+"""
+import argparse
+import random
+import statistics
+import time
+
+from sqlalchemy import create_engine, text
+
+from app.core.settings import settings
+
+SCHEMA = "bench_partitions"
+PARTITIONS = 16
+
+COLUMNS = """
+    id UUID NOT NULL DEFAULT gen_random_uuid(),
+    document_id UUID NOT NULL,
+    unit_type TEXT NOT NULL,
+    num_label VARCHAR(100),
+    text_plain TEXT,
+    order_index INTEGER
+"""
+
+
+def setup(conn, documents: int, units: int):
+    conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+    conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    conn.execute(text(f"CREATE TABLE {SCHEMA}.docs AS SELECT gen_random_uuid() AS id FROM generate_series(1, {documents})"))
+    conn.execute(text(f"CREATE TABLE {SCHEMA}.plain ({COLUMNS}, PRIMARY KEY (id))"))
+    conn.execute(text(f"CREATE TABLE {SCHEMA}.hashed ({COLUMNS}, PRIMARY KEY (document_id, id)) PARTITION BY HASH (document_id)"))
+    for r in range(PARTITIONS):
+        conn.execute(text(
+            f"CREATE TABLE {SCHEMA}.hashed_p{r:02d} PARTITION OF {SCHEMA}.hashed "
+            f"FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {r})"
+        ))
+    for table in ("plain", "hashed"):
+        conn.execute(text(f"CREATE INDEX ON {SCHEMA}.{table} (document_id, order_index)"))
+        # autovacuum off so both tables carry the same dead tuples into the measurement
+        if table == "plain":
+            conn.execute(text(f"ALTER TABLE {SCHEMA}.plain SET (autovacuum_enabled = false)"))
+        else:
+            for r in range(PARTITIONS):
+                conn.execute(text(f"ALTER TABLE {SCHEMA}.hashed_p{r:02d} SET (autovacuum_enabled = false)"))
+        insert_units(conn, table, f"SELECT id FROM {SCHEMA}.docs", units)
+        conn.execute(text(f"VACUUM ANALYZE {SCHEMA}.{table}"))
+
+
+def insert_units(conn, table: str, doc_query: str, units: int):
+    conn.execute(text(f"""
+        INSERT INTO {SCHEMA}.{table} (document_id, unit_type, num_label, text_plain, order_index)
+        SELECT d.id, 'article', 'ماده ' || n, repeat('متن ماده قانون ', 20), n
+        FROM ({doc_query}) d, generate_series(1, {units}) n
+    """))
+
+
+def churn(conn, table: str, fraction: float, units: int, seed: int):
+    """Rewrite `fraction` of the documents the way sync_import does"""
+    doc_query = f"SELECT id FROM {SCHEMA}.docs WHERE abs(hashtext(id::text || '{seed}')) % 1000 < {int(fraction * 1000)}"
+    conn.execute(text(f"DELETE FROM {SCHEMA}.{table} WHERE document_id IN ({doc_query})"))
+    insert_units(conn, table, doc_query, units)
+
+
+def timed_vacuum(conn, relation: str) -> float:
+    t0 = time.perf_counter()
+    conn.execute(text(f"VACUUM (ANALYZE) {SCHEMA}.{relation}"))
+    return time.perf_counter() - t0
+
+
+def read_latency(conn, table: str, doc_ids, repeat: int = 3):
+    samples = []
+    query = text(f"SELECT * FROM {SCHEMA}.{table} WHERE document_id = :d ORDER BY order_index")
+    for _ in range(repeat):
+        for doc_id in doc_ids:
+            t0 = time.perf_counter()
+            conn.execute(query, {"d": doc_id}).fetchall()
+            samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return statistics.median(samples) * 1000, samples[int(len(samples) * 0.95)] * 1000
+
+
+def partitions_scanned(conn, doc_id) -> int:
+    plan = conn.execute(
+        text(f"EXPLAIN (FORMAT JSON) SELECT * FROM {SCHEMA}.hashed WHERE document_id = :d"),
+        {"d": doc_id}
+    ).scalar()
+    relations = set()
+
+    def walk(node):
+        if "Relation Name" in node:
+            relations.add(node["Relation Name"])
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan[0]["Plan"])
+    return len(relations)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default=settings.SQLALCHEMY_DATABASE_URI)
+    parser.add_argument("--documents", type=int, default=20000)
+    parser.add_argument("--units", type=int, default=200)
+    parser.add_argument("--churn", type=float, default=0.2)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch schema")
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+    if engine.dialect.name != "postgresql":
+        raise SystemExit("bench_partitions needs PostgreSQL")
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        print(f"loading {args.documents} documents x {args.units} units ...")
+        setup(conn, args.documents, args.units)
+        for round_ in range(args.rounds):
+            for table in ("plain", "hashed"):
+                churn(conn, table, args.churn, args.units, seed=round_)
+        print(f"churned {args.churn:.0%} of documents x {args.rounds} rounds")
+
+        plain_vacuum = timed_vacuum(conn, "plain")
+        partition_times = [timed_vacuum(conn, f"hashed_p{r:02d}") for r in range(PARTITIONS)]
+
+        rng = random.Random(1)
+        doc_ids = [row[0] for row in conn.execute(text(f"SELECT id FROM {SCHEMA}.docs"))]
+        sample = rng.sample(doc_ids, min(500, len(doc_ids)))
+        plain_p50, plain_p95 = read_latency(conn, "plain", sample)
+        hashed_p50, hashed_p95 = read_latency(conn, "hashed", sample)
+        scanned = partitions_scanned(conn, str(sample[0]))
+
+        print(f"{'layout':>12} {'vacuum s':>9} {'max step s':>11} {'read p50 ms':>12} {'read p95 ms':>12}")
+        print(f"{'plain':>12} {plain_vacuum:9.2f} {plain_vacuum:11.2f} {plain_p50:12.3f} {plain_p95:12.3f}")
+        print(f"{'hash x16':>12} {sum(partition_times):9.2f} {max(partition_times):11.2f} {hashed_p50:12.3f} {hashed_p95:12.3f}")
+        print(f"partitions in a per-document plan: {scanned} of {PARTITIONS}")
+
+        if not args.keep:
+            conn.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Reranking latency: features and scores for one query's candidate set, from
+signals already loaded (the per-query cost; loading them is one query per
+source for the whole batch). Synthetic, no database needed.
+
+    python -m benchmarks.bench_rerank --candidates 300 --dim 256
+"""
+from datetime import date
+import argparse
+import statistics
+import time
+import uuid
+
+import numpy as np
+
+from app.services.rerank import LinearReranker, Signals, rerank
+
+
+def synthetic(n: int, dim: int, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    ids = [str(uuid.uuid4()) for _ in range(n)]
+    vectors = rng.normal(size=(n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    today = date(2025, 1, 1).toordinal()
+    days = today - rng.integers(0, 10000, n).astype(np.float64)
+    days[rng.random(n) < 0.2] = np.nan
+    signals = Signals(
+        index={hit_id: i for i, hit_id in enumerate(ids)},
+        vectors=vectors,
+        quality=rng.random(n).astype(np.float32),
+        days=days,
+        authority=rng.choice([1.0, 0.8, 0.6, 0.4], n).astype(np.float32),
+        qa=(rng.random(n) < 0.3).astype(np.float32),
+    )
+    hits = [{"source": "unit", "id": hit_id, "document_id": hit_id, "score": float(s)} for hit_id, s in zip(ids, rng.random(n) * 10)]
+    query = rng.normal(size=dim).astype(np.float32)
+    return hits, signals, query / np.linalg.norm(query)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--candidates", type=int, default=300)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    hits, signals, query = synthetic(args.candidates, args.dim)
+    reranker = LinearReranker()
+    today = date(2025, 1, 1)
+    rerank(hits, signals, query, reranker, args.limit, today)  # warm up
+    samples = []
+    for _ in range(args.rounds):
+        t0 = time.perf_counter()
+        rerank(hits, signals, query, reranker, args.limit, today)
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    print(f"{args.candidates} candidates, dim {args.dim}, top {args.limit}, {args.rounds} rounds")
+    print(f"median {statistics.median(samples) * 1e6:8.1f} us")
+    print(f"p99    {samples[int(len(samples) * 0.99) - 1] * 1e6:8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Multi-query retrieval: N sequential single-query retrievals, each on its own
+session the way N /retrieve requests would be, against one /retrieve/batch
+style call for all N. Queries are 4-word snippets drawn from the configured
+database's legal units, so it needs an imported PostgreSQL database.
+
+    python -m benchmarks.bench_retrieve_batch --queries 16 --rounds 20
+"""
+import argparse
+import random
+import statistics
+import time
+
+from sqlalchemy import text
+
+from app.db.base import SessionLocal, engine
+from app.services.retrieval import RetrievalFilters, retrieve
+
+
+def sample_queries(count: int, seed: int):
+    with engine.connect() as conn:
+        texts = [row[0] for row in conn.execute(text(
+            "SELECT text_plain_normalized FROM legal_units TABLESAMPLE SYSTEM (1) "
+            "WHERE text_plain_normalized IS NOT NULL LIMIT 2000"
+        ))]
+    if not texts:
+        raise SystemExit("no legal units with match keys; import data and run app.services.match_keys first")
+    rng = random.Random(seed)
+    queries = []
+    while len(queries) < count:
+        words = rng.choice(texts).split()
+        if len(words) >= 4:
+            start = rng.randrange(len(words) - 3)
+            queries.append(" ".join(words[start:start + 4]))
+    return queries
+
+
+def sequential(queries, filters, limit):
+    for query in queries:
+        db = SessionLocal()
+        try:
+            retrieve(db, [query], filters, limit)
+        finally:
+            db.close()
+
+
+def batched(queries, filters, limit):
+    db = SessionLocal()
+    try:
+        return retrieve(db, queries, filters, limit)
+    finally:
+        db.close()
+
+
+def timed(func, rounds):
+    samples = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=16)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    if engine.dialect.name != "postgresql":
+        raise SystemExit("bench_retrieve_batch needs PostgreSQL")
+
+    filters = RetrievalFilters()
+    queries = sample_queries(args.queries, seed=1)
+    batched(queries, filters, args.limit)  # warm caches and the pool
+
+    seq_ms = timed(lambda: sequential(queries, filters, args.limit), args.rounds)
+    batch_ms = timed(lambda: batched(queries, filters, args.limit), args.rounds)
+    stats = batched(queries, filters, args.limit)["stats"]
+    print(f"{args.queries} queries, top {args.limit}, median of {args.rounds} rounds")
+    print(f"sequential: {seq_ms:8.1f} ms")
+    print(f"batch:      {batch_ms:8.1f} ms ({seq_ms / batch_ms:.1f}x)")
+    print(f"hits {stats['hits']}, distinct {stats['distinct_hits']}")
+
+
+if __name__ == "__main__":
+    main()
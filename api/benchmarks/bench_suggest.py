@@ -0,0 +1,81 @@
+"""
+Suggestion index benchmark: build time, completion latency percentiles and
+index size for synthetic Persian titles.
+
+    python -m benchmarks.bench_suggest --titles 100000
+"""
+import argparse
+import math
+import random
+import time
+
+import numpy as np
+
+from app.services.suggest import PrefixIndex, TITLE_START_BONUS, query_key
+from app.utils.text import normalize_key
+
+HEADS = ["قانون", "آیین نامه", "بخشنامه", "دستورالعمل", "اصلاحیه", "تصویب نامه", "قانون اصلاح"]
+WORDS = (
+    "آیین دادرسی مدنی کیفری کار تامین اجتماعی مالیات های مستقیم ارزش افزوده تجارت ثبت اسناد املاک "
+    "شهرداری ها بیمه بازار سرمایه پولی بانکی گمرکی مبارزه با پولشویی حمایت خانواده مجازات اسلامی "
+    "نحوه اجرای محکومیت مالی بودجه سال برنامه توسعه اقتصادی فرهنگی نظام صنفی کشور روابط موجر مستاجر"
+).split()
+
+
+def titles(n: int, seed: int = 7):
+    rng = random.Random(seed)
+    for i in range(n):
+        words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 9)))
+        yield normalize_key(f"{rng.choice(HEADS)} {words} {i}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--titles", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    keys = list(titles(args.titles))
+    rng = random.Random(11)
+    # log1p of citing documents, as the service weights titles; a few are cited far more than the rest
+    weights = [math.log1p(int(rng.paretovariate(1.2)) - 1) for _ in keys]
+
+    t0 = time.perf_counter()
+    index = PrefixIndex(keys, weights)
+    print(f"build: {args.titles} titles, {len(index.starts)} word starts in {time.perf_counter() - t0:.1f}s, "
+          f"{index.nbytes / 2**20:.1f} MiB")
+
+    # prefixes of 1 to 12 characters of random title words, the short ones matching most titles
+    queries = []
+    for _ in range(args.queries):
+        words = rng.choice(keys).split()
+        start = rng.randrange(len(words))
+        text = " ".join(words[start:start + 2])
+        queries.append(query_key(text[:rng.randint(1, 12)]))
+    for prefix in queries[:100]:
+        index.top(prefix, args.limit)  # warm up
+
+    latencies = []
+    matched = 0
+    for prefix in queries:
+        t0 = time.perf_counter()
+        found = index.top(prefix, args.limit)
+        latencies.append(time.perf_counter() - t0)
+        matched += bool(found)
+    latencies = np.array(latencies) * 1e3
+    print(f"top-{args.limit}: p50 {np.percentile(latencies, 50):.3f} ms, p99 {np.percentile(latencies, 99):.3f} ms, "
+          f"max {latencies.max():.3f} ms over {len(queries)} prefixes ({matched} matched)")
+
+    spans = {letter: index.range(letter) for letter in {key[0] for key in keys}}
+    worst = max(spans, key=lambda letter: spans[letter][1] - spans[letter][0])
+    lo, hi = spans[worst]
+    t0 = time.perf_counter()
+    for _ in range(200):
+        found = index.top(worst, args.limit)
+    print(f"one-letter prefix matching {hi - lo} word starts: {(time.perf_counter() - t0) / 200 * 1e3:.3f} ms, "
+          f"best score {found[0][1]:.2f} (title start bonus {TITLE_START_BONUS})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Sync payload decode benchmark: FastAPI's default path (json.loads + Pydantic
+validation) against the msgspec fast path, on a synthetic batch.
+
+    python -m benchmarks.bench_sync_decode --megabytes 50
+"""
+import argparse
+import json
+import random
+import time
+import uuid
+
+from app.routers.sync import SyncImportRequest, sync_decoder
+
+WORDS = "قانون ماده تبصره بند دادگاه رأی اعتراض مهلت شکایت مالیات قرارداد".split()
+
+
+def make_payload(megabytes: int, seed: int = 7) -> bytes:
+    rng = random.Random(seed)
+    documents = []
+    size = 0
+    while size < megabytes * 1024 * 1024:
+        units = [
+            {
+                "unit_type": "article",
+                "num_label": f"ماده {i}",
+                "heading": None,
+                "text_plain": " ".join(rng.choice(WORDS) for _ in range(60)),
+                "order_index": i,
+            }
+            for i in range(1, 41)
+        ]
+        doc = {
+            "id": str(uuid.uuid4()),
+            "title": "قانون " + " ".join(rng.choice(WORDS) for _ in range(5)),
+            "doc_type": "law",
+            "jurisdiction": "ایران",
+            "authority": "مجلس",
+            "effective_date": "2020-01-01",
+            "legal_units": units,
+        }
+        documents.append(doc)
+        size += len(json.dumps(doc, ensure_ascii=False).encode("utf-8"))
+    return json.dumps({"documents": documents, "qa_entries": [], "batch_ts": "2024-01-01T00:00:00Z"},
+                      ensure_ascii=False).encode("utf-8")
+
+
+def timed(label, func, body, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func(body)
+        best = min(best, time.perf_counter() - t0)
+    print(f"{label}: {best:.3f}s ({len(body) / best / 2**20:.0f} MiB/s)")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--megabytes", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    body = make_payload(args.megabytes)
+    print(f"payload: {len(body) / 2**20:.1f} MiB")
+    slow = timed("json.loads + pydantic", lambda b: SyncImportRequest.model_validate(json.loads(b)), body, args.repeat)
+    timed("pydantic model_validate_json", SyncImportRequest.model_validate_json, body, args.repeat)
+    fast = timed("msgspec structs", sync_decoder.decode, body, args.repeat)
+    print(f"speedup vs default path: {slow / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
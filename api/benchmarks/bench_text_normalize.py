@@ -0,0 +1,66 @@
+"""
+Match-key normalization throughput for legal units: normalize_key called
+per string against normalize_batch over the whole batch, on synthetic units
+mixing Arabic letter variants, Persian digits, ZWNJ and diacritics.
+
+    python -m benchmarks.bench_text_normalize --units 500000
+"""
+import argparse
+import random
+import time
+
+from app.services.match_keys import unit_match_keys
+from app.utils.text import normalize_batch, normalize_key
+
+WORDS = "قانون ماده تبصره بند دادگاه رأی اعتراض مهلت شكايت ماليات قرارداد می‌شود مسؤول اَحکام".split()
+DIGITS = "۰۱۲۳۴۵۶۷۸۹"
+
+
+def make_units(count: int, seed: int = 3):
+    rng = random.Random(seed)
+    units = []
+    for i in range(count):
+        number = "".join(rng.choice(DIGITS) for _ in range(rng.randint(1, 3)))
+        units.append({
+            "num_label": f"ماده {number}",
+            "heading": " ".join(rng.choice(WORDS) for _ in range(4)) if i % 4 == 0 else None,
+            "text_plain": " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 80))),
+        })
+    return units
+
+
+def per_minute(count: int, seconds: float) -> str:
+    return f"{count / seconds * 60 / 1e6:.1f}M units/min"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--units", type=int, default=500000)
+    args = parser.parse_args()
+
+    units = make_units(args.units)
+    fields = ("num_label", "heading", "text_plain")
+
+    t0 = time.perf_counter()
+    for unit in units:
+        for field in fields:
+            normalize_key(unit[field])
+    single = time.perf_counter() - t0
+    print(f"normalize_key per string: {single:.2f}s ({per_minute(args.units, single)})")
+
+    t0 = time.perf_counter()
+    for field in fields:
+        normalize_batch([unit[field] for unit in units])
+    batch = time.perf_counter() - t0
+    print(f"normalize_batch:          {batch:.2f}s ({per_minute(args.units, batch)})")
+
+    # what sync_import pays, in batches the size of a large import
+    t0 = time.perf_counter()
+    for start in range(0, args.units, 20000):
+        unit_match_keys([dict(unit) for unit in units[start:start + 20000]])
+    rows = time.perf_counter() - t0
+    print(f"unit_match_keys (20k):    {rows:.2f}s ({per_minute(args.units, rows)})")
+
+
+if __name__ == "__main__":
+    main()
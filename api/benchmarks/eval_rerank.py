@@ -0,0 +1,111 @@
+"""
+Offline evaluation of the reranker against relevance judgments: recall@k
+and nDCG@k for the first stage alone and reranked. With --train, linear
+weights are fitted to the judgments and written as a RERANK_WEIGHTS_PATH
+file, then evaluated the same way on the --holdout share of the queries.
+Judgments are JSON lines, with grades above 0 for relevant hits:
+
+    {"query": "مهلت اعتراض به رای", "relevant": {"<unit or Q&A entry id>": 2, "<id>": 1}}
+
+It reads the configured database, and the embedding cache when EMBEDDER is set.
+
+    python -m benchmarks.eval_rerank judgments.jsonl --k 10 [--weights w.json] [--train out.json --holdout 0.3]
+"""
+from datetime import date
+import argparse
+import json
+import random
+import statistics
+import time
+
+import numpy as np
+
+from app.core.settings import settings
+from app.db.base import SessionLocal
+from app.services.embeddings import get_embedder
+from app.services.rerank import (
+    LinearReranker, candidate_features, fit_weights, get_reranker, load_signals, ndcg_at_k, query_vectors,
+    recall_at_k, rerank_hits
+)
+from app.services.retrieval import RetrievalFilters, search
+
+
+def load_judgments(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def metrics(rankings, judgments, k):
+    return {
+        f"recall@{k}": statistics.fmean(recall_at_k(r, j["relevant"], k) for r, j in zip(rankings, judgments)),
+        f"ndcg@{k}": statistics.fmean(ndcg_at_k(r, j["relevant"], k) for r, j in zip(rankings, judgments)),
+    }
+
+
+def evaluate(db, reranker, embedder, judgments, candidates, k):
+    t0 = time.perf_counter()
+    reranked = rerank_hits(db, reranker, [j["query"] for j in judgments], candidates, k, embedder)
+    seconds = time.perf_counter() - t0
+    result = metrics([[h["id"] for h in hits] for hits in reranked], judgments, k)
+    result["ms_per_query"] = seconds * 1000 / max(len(judgments), 1)
+    return result
+
+
+def training_rows(db, reranker, embedder, judgments, candidates):
+    signals = load_signals(db, candidates, reranker, embedder)
+    vectors = query_vectors(embedder if signals.vectors.shape[1] else None, [j["query"] for j in judgments])
+    features, labels, today = [], [], date.today()
+    for judgment, hits, vector in zip(judgments, candidates, vectors):
+        hits = [h for h in hits if h["id"] in signals.index]
+        if hits:
+            features.append(candidate_features(hits, signals, vector, reranker, today))
+            labels.extend(1.0 if judgment["relevant"].get(h["id"], 0) > 0 else 0.0 for h in hits)
+    return np.concatenate(features), np.array(labels)
+
+
+def show(name, result):
+    print(f"{name:<12}" + "  ".join(f"{key} {value:.4f}" for key, value in result.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("judgments")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--candidates", type=int, default=settings.RERANK_CANDIDATES)
+    parser.add_argument("--weights", help="linear weights file to evaluate instead of the configured reranker")
+    parser.add_argument("--train", help="fit linear weights to the judgments and write them here")
+    parser.add_argument("--holdout", type=float, default=0.3, help="share of queries kept out of training")
+    args = parser.parse_args()
+
+    judgments = load_judgments(args.judgments)
+    reranker = LinearReranker.from_file(args.weights) if args.weights else get_reranker() or LinearReranker()
+    embedder = get_embedder()
+    db = SessionLocal()
+    try:
+        candidates = search(db, [j["query"] for j in judgments], RetrievalFilters(), args.candidates)
+        print(f"{len(judgments)} queries, {args.candidates} candidates, reranker {reranker.model_id}")
+        show("first stage", metrics([[h["id"] for h in hits] for hits in candidates], judgments, args.k))
+        show("reranked", evaluate(db, reranker, embedder, judgments, candidates, args.k))
+        if not args.train:
+            return
+
+        order = list(range(len(judgments)))
+        random.Random(7).shuffle(order)
+        cut = int(len(order) * args.holdout)
+        test, train = sorted(order[:cut]) or order, sorted(order[cut:])
+        features, labels = training_rows(db, reranker, embedder, [judgments[i] for i in train], [candidates[i] for i in train])
+        config = {**reranker.config, **fit_weights(features, labels)} if isinstance(reranker, LinearReranker) else fit_weights(features, labels)
+        with open(args.train, "w", encoding="utf-8") as f:
+            json.dump(config, f, ensure_ascii=False, indent=2)
+        print(f"trained on {len(train)} queries ({int(labels.sum())} relevant of {len(labels)} candidates) -> {args.train}")
+        held = [judgments[i] for i in test]
+        held_candidates = [candidates[i] for i in test]
+        show("first stage", metrics([[h["id"] for h in hits] for hits in held_candidates], held, args.k))
+        show("before", evaluate(db, reranker, embedder, held, held_candidates, args.k))
+        show("trained", evaluate(db, LinearReranker(config), embedder, held, held_candidates, args.k))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
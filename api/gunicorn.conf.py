@@ -0,0 +1,29 @@
+"""
+Gunicorn settings for multi-process serving:
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+WEB_CONCURRENCY sets the worker count (unset or 0: one per core). It is
+exported to the workers, which size their database pools from
+DB_CONNECTION_BUDGET / WEB_CONCURRENCY. With more than one worker, the
+per-process CACHE_BACKEND=memory is disabled (app.core.cache); use redis.
+"""
+import multiprocessing
+import os
+
+workers = int(os.environ.get("WEB_CONCURRENCY") or 0) or multiprocessing.cpu_count()
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+worker_class = "uvicorn_worker.UvicornWorker"
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+
+# Large sync imports can take a while; keep-alive matches typical proxy defaults
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "300"))
+graceful_timeout = 30
+keepalive = 5
+
+# No preload: each worker creates its own engine, pool and catalog after fork
+preload_app = False
+
+accesslog = "-"
+errorlog = "-"
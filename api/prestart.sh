@@ -33,5 +33,10 @@ echo "Running Alembic migrations..."
 cd /app
 alembic upgrade head
 
+if [ "${SERVER_MODE:-reload}" = "gunicorn" ]; then
+    echo "Starting FastAPI with gunicorn..."
+    exec gunicorn -c gunicorn.conf.py app.main:app
+fi
+
 echo "Starting FastAPI..."
 exec uvicorn app.main:app --host 0.0.0.0 --port 8000 --reload
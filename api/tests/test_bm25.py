@@ -0,0 +1,150 @@
+import math
+import os
+import random
+import uuid
+import numpy as np
+import pytest
+from app.services import retrieval
+from app.services.bm25 import B, K1, Bm25Index, IndexSnapshot, IndexWriter, bm25_index_job, load_live, lock_index
+from app.services.retrieval import RetrievalFilters
+from app.utils.postings import BLOCK_SIZE, SOURCE_QA, SOURCE_UNIT, IndexedDoc, Segment, write_segment
+
+VOCABULARY = [f"t{i}" for i in range(300)]
+
+
+def corpus(n, seed=3, groups=None):
+    rng = random.Random(seed)
+    weights = [1 / (i + 1) for i in range(len(VOCABULARY))]
+    group_ids = groups or [uuid.uuid4() for _ in range(max(n // 5, 1))]
+    return [
+        IndexedDoc(uuid.uuid4(), rng.choice(group_ids), SOURCE_UNIT, rng.randrange(1, 10),
+                   rng.choices(VOCABULARY, weights, k=rng.randrange(1, 60)))
+        for _ in range(n)
+    ]
+
+
+def test_segment_round_trip(tmp_path):
+    docs = corpus(700)
+    write_segment(str(tmp_path / "seg"), docs)
+    segment = Segment(str(tmp_path / "seg"))
+    assert len(segment) == 700
+    assert segment.gaps.dtype == np.uint16 or segment.gaps.dtype == np.uint8
+    assert segment.term_index("missing") is None
+    for term in ("t0", "t7", "t299"):
+        t = segment.term_index(term)
+        expected = [(n, doc.terms.count(term)) for n, doc in enumerate(docs) if term in doc.terms]
+        numbers, tfs = segment.postings(t)
+        assert list(zip(numbers.tolist(), tfs.tolist())) == expected
+        # blocks decode independently to the same postings
+        blocks = [segment.block(t, b) for b in range(segment.term_blocks[t], segment.term_blocks[t + 1])]
+        assert np.concatenate([b[0] for b in blocks]).tolist() == numbers.tolist()
+        assert all(len(b[0]) <= BLOCK_SIZE for b in blocks)
+
+
+def test_scores_follow_bm25(tmp_path):
+    docs = [
+        IndexedDoc(uuid.uuid4(), uuid.uuid4(), SOURCE_UNIT, 1, terms)
+        for terms in (["مهلت", "اعتراض", "مهلت"], ["اعتراض", "رای", "دادگاه", "تجدیدنظر"], ["دادگاه"])
+    ]
+    write_segment(str(tmp_path / "seg"), docs)
+    snapshot = IndexSnapshot([Segment(str(tmp_path / "seg"))], [np.ones(3, dtype=bool)])
+    avg = 8 / 3
+
+    def expected(tf, length, df):
+        return math.log(1 + (3 - df + 0.5) / (df + 0.5)) * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / avg))
+
+    hits = snapshot.search(["مهلت", "اعتراض"], k=5)
+    assert [n for _, _, n in hits] == [0, 1]
+    assert hits[0][0] == pytest.approx(expected(2, 3, 1) + expected(1, 3, 2))
+    assert hits[1][0] == pytest.approx(expected(1, 4, 2))
+
+
+def test_block_max_matches_exhaustive(tmp_path):
+    segments, lives = [], []
+    rng = np.random.default_rng(5)
+    for i, n in enumerate((3000, 800, 50)):
+        write_segment(str(tmp_path / f"s{i}"), corpus(n, seed=i))
+        segments.append(Segment(str(tmp_path / f"s{i}")))
+        lives.append(rng.random(n) > 0.1)
+    snapshot = IndexSnapshot(segments, lives)
+    for terms in (["t0"], ["t0", "t1"], ["t3", "t50", "t200"], ["t299", "t0"], ["missing", "t10"]):
+        for k in (1, 10, 100):
+            fast = snapshot.search(terms, k)
+            slow = snapshot.search(terms, k, exhaustive=True)
+            assert [h[0] for h in fast] == pytest.approx([h[0] for h in slow])
+            assert all(lives[i][n] for _, i, n in fast)
+
+
+def test_writer_deletes_merges_and_readers_reload(tmp_path):
+    path = str(tmp_path / "index")
+    groups = [uuid.uuid4() for _ in range(40)]
+    reader = Bm25Index(path)
+    assert reader.search([["t0"]], 5, SOURCE_UNIT) is None
+
+    writer = IndexWriter(path)
+    for seed in range(4):
+        writer.add(corpus(300, seed=seed, groups=groups))
+        writer.commit()
+    assert writer.delete_groups(groups[:10]) > 0
+    writer.commit()
+
+    reader._checked = 0
+    gone = {g.bytes for g in groups[:10]}
+    hits = reader.search([["t0", "t1"]], 50, SOURCE_UNIT)[0]
+    assert hits and not any(group.bytes in gone for _, group, _ in hits)
+
+    assert writer.merge(max_segments=2) == 3
+    writer.commit()
+    assert len(writer.manifest["segments"]) == 2
+    assert sorted(os.listdir(path)) == sorted(["manifest.json"] + [e["name"] for e in writer.manifest["segments"]])
+    merged = max(writer.manifest["segments"], key=lambda e: e["name"])
+    assert merged["deleted"] == 0
+    assert load_live(path, merged, merged["docs"]).all()
+
+    reader._checked = 0
+    snapshot = reader.snapshot()
+    deleted = sum(1 for s in range(4) for d in corpus(300, seed=s, groups=groups) if d.group.bytes in gone)
+    assert snapshot.docs == 1200 - deleted
+    fast = snapshot.search(["t0", "t1"], 50)
+    assert [h[0] for h in fast] == pytest.approx([h[0] for h in snapshot.search(["t0", "t1"], 50, exhaustive=True)])
+
+
+def test_one_writer_per_node_directory(tmp_path):
+    path = str(tmp_path / "index")
+    with lock_index(path) as locked:
+        assert locked
+        # another worker of the node skips its update; no session is opened
+        assert bm25_index_job(path) is None
+        with lock_index(path) as again:
+            assert not again
+    with lock_index(path) as locked:
+        assert locked
+
+
+def test_reader_filters_by_source_unit_type_and_group(tmp_path):
+    path = str(tmp_path / "index")
+    doc, other = uuid.uuid4(), uuid.uuid4()
+    qa = uuid.uuid4()
+    units = [
+        IndexedDoc(uuid.uuid4(), doc, SOURCE_UNIT, 4, ["مهلت", "اعتراض"]),  # article
+        IndexedDoc(uuid.uuid4(), doc, SOURCE_UNIT, 8, ["مهلت"]),  # note
+        IndexedDoc(uuid.uuid4(), other, SOURCE_UNIT, 4, ["مهلت"]),
+        IndexedDoc(qa, qa, SOURCE_QA, 0, ["مهلت", "اعتراض", "رای"]),
+    ]
+    writer = IndexWriter(path)
+    writer.add(units)
+    writer.commit()
+    index = Bm25Index(path)
+    assert {h[0] for h in index.search([["مهلت"]], 10, SOURCE_UNIT)[0]} == {u.id for u in units[:3]}
+    assert [h[0] for h in index.search([["مهلت"]], 10, SOURCE_QA)[0]] == [qa]
+    assert [h[0] for h in index.search([["مهلت"]], 10, SOURCE_UNIT, ["article"], [doc])[0]] == [units[0].id]
+
+    retrieval.bm25_index, saved = index, retrieval.bm25_index
+    try:
+        grouped = retrieval._bm25_search([["مهلت", "اعتراض"]], RetrievalFilters(document_ids=[doc]), 2)
+        # the shorter unit outranks the Q&A entry with the same matches
+        assert [(h["source"], h["id"]) for h in grouped[0]] == [("unit", str(units[0].id)), ("qa", str(qa))]
+        assert grouped[0][0]["document_id"] == str(doc)
+        assert retrieval._bm25_search([["مهلت"]], RetrievalFilters(topic_tags=["x"]), 2) is None
+    finally:
+        retrieval.bm25_index = saved
@@ -0,0 +1,194 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from app.core import cache as cache_module
+from app.core.cache import LRUCache, RedisCache, cached, make_key, doc_tag
+from app.main import app
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.ops = []
+
+    def __getattr__(self, name):
+        def op(*args, **kwargs):
+            self.ops.append((name, args, kwargs))
+            return self
+        return op
+
+    def execute(self):
+        for name, args, kwargs in self.ops:
+            getattr(self.client, name)(*args, **kwargs)
+
+
+class FakeRedis:
+    """Local stand-in for the redis-py commands RedisCache uses"""
+
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def sadd(self, key, member):
+        self.data.setdefault(key, set()).add(member)
+
+    def expire(self, key, ttl, nx=False, gt=False):
+        current = self.ttls.get(key)
+        if (nx and current is not None) or (gt and (current is None or ttl <= current)):
+            return False
+        self.ttls[key] = ttl
+        return True
+
+    def smembers(self, key):
+        return self.data.get(key, set())
+
+    def delete(self, *keys):
+        return sum(self.data.pop(k, None) is not None for k in keys)
+
+    def scan_iter(self, match):
+        return [k for k in self.data if k.startswith(match.rstrip("*"))]
+
+
+@pytest.fixture
+def lru():
+    previous = cache_module.get_cache()
+    backend = LRUCache(max_entries=3, max_bytes=1024, clock=FakeClock())
+    cache_module.set_cache(backend)
+    yield backend
+    cache_module.set_cache(previous)
+
+
+def test_lru_ttl_expiry(lru):
+    lru.set("a", {"v": 1}, ttl=10)
+    assert lru.get("a") == {"v": 1}
+    lru.clock.now = 11
+    assert lru.get("a") is cache_module._MISSING
+    assert lru.stats.expirations == 1
+
+
+def test_lru_evicts_least_recently_used(lru):
+    for key in "abc":
+        lru.set(key, key, ttl=60)
+    lru.get("a")
+    lru.set("d", "d", ttl=60)
+    assert lru.get("b") is cache_module._MISSING
+    assert lru.get("a") == "a"
+    assert lru.stats.evictions == 1
+
+
+def test_lru_size_bound(lru):
+    lru.set("big1", "x" * 600, ttl=60)
+    lru.set("big2", "y" * 600, ttl=60)
+    assert lru.info()["bytes"] <= 1024
+    assert lru.get("big1") is cache_module._MISSING
+    lru.set("huge", "z" * 2000, ttl=60)
+    assert lru.get("huge") is cache_module._MISSING
+
+
+def test_tag_invalidation_is_precise(lru):
+    lru.set("doc1", 1, ttl=60, tags=[doc_tag("1")])
+    lru.set("doc2", 2, ttl=60, tags=[doc_tag("2")])
+    assert lru.invalidate_tags([doc_tag("1")]) == 1
+    assert lru.get("doc1") is cache_module._MISSING
+    assert lru.get("doc2") == 2
+
+
+def test_make_key_ignores_non_plain_params():
+    assert make_key("ns", {"q": "x", "db": object()}) == make_key("ns", {"q": "x", "db": object()})
+    assert make_key("ns", {"q": "x"}) != make_key("ns", {"q": "y"})
+
+
+def test_cached_decorator_sync_and_async(lru):
+    calls = []
+
+    @cached("sync", ttl=60, tags=lambda doc_id, **_: [doc_tag(doc_id)])
+    def read(doc_id: str, db=None):
+        calls.append(doc_id)
+        return {"id": doc_id}
+
+    @cached("async", ttl=60)
+    async def read_async(doc_id: str):
+        calls.append("async")
+        return {"id": doc_id}
+
+    assert read("1", db=object()) == read("1", db=object()) == {"id": "1"}
+    assert calls == ["1"]
+    cache_module.invalidate([doc_tag("1")])
+    read("1")
+    assert calls == ["1", "1"]
+
+    assert asyncio.run(read_async("2")) == asyncio.run(read_async("2"))
+    assert calls.count("async") == 1
+
+
+def test_redis_cache_with_local_stand_in():
+    backend = RedisCache(FakeRedis())
+    backend.set("k", {"v": 1}, ttl=60, tags=["documents"])
+    assert backend.get("k") == {"v": 1}
+    assert backend.invalidate_tags(["documents"]) == 1
+    assert backend.get("k") is cache_module._MISSING
+    assert backend.info()["hits"] == 1
+
+
+class UnreachableRedis(FakeRedis):
+    """Every command fails, as redis-py's do while the server is down"""
+
+    def __getattribute__(self, name):
+        if name in ("get", "set", "smembers", "delete"):
+            raise ConnectionError("redis is down")
+        return super().__getattribute__(name)
+
+
+def test_redis_cache_fails_open():
+    client = UnreachableRedis()
+    backend = RedisCache(client)
+    assert backend.get("k") is cache_module._MISSING
+    backend.set("k", {"v": 1}, ttl=60, tags=["documents"])
+    assert backend.invalidate_tags(["documents", "qa_entries"]) == 0
+    assert backend.info()["misses"] == 1 and backend.info()["errors"] == 4
+
+
+def test_redis_tag_set_outlives_its_longest_entry():
+    client = FakeRedis()
+    backend = RedisCache(client)
+    backend.set("long", 1, ttl=3600, tags=["documents"])
+    backend.set("short", 2, ttl=60, tags=["documents"])
+    # a shorter entry must not expire the set while "long" still needs invalidating
+    assert client.ttls[backend.prefix + "tag:documents"] == 3600
+    backend.set("longer", 3, ttl=7200, tags=["documents"])
+    assert client.ttls[backend.prefix + "tag:documents"] == 7200
+
+
+def test_cache_stats_endpoint(lru):
+    response = TestClient(app).get("/stats/cache")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["backend"] == "memory"
+    for field in ("hits", "misses", "evictions", "hit_rate"):
+        assert field in data
+
+
+def test_memory_backend_is_disabled_with_several_workers(monkeypatch):
+    monkeypatch.setattr(cache_module.settings, "CACHE_BACKEND", "memory")
+    monkeypatch.setattr(cache_module.settings, "WEB_CONCURRENCY", 1)
+    assert isinstance(cache_module.create_cache(), LRUCache)
+    # an import's invalidation would only reach one worker's LRU
+    monkeypatch.setattr(cache_module.settings, "WEB_CONCURRENCY", 4)
+    assert isinstance(cache_module.create_cache(), cache_module.NullCache)
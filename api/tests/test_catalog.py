@@ -0,0 +1,94 @@
+import uuid
+import pytest
+from datetime import date
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services.catalog import DocumentCatalog, catalog, date_to_days, days_to_date
+
+
+@pytest.fixture
+def docs():
+    cat = DocumentCatalog(initial_capacity=2)
+    ids = [uuid.uuid4() for _ in range(5)]
+    cat.upsert(ids[0], "law", "published", "Iran", "Majlis", date(2020, 1, 1), None)
+    cat.upsert(ids[1], "regulation", "published", "Iran", "Cabinet", date(2021, 6, 1), date(2023, 5, 1))
+    cat.upsert(ids[2], "law", "draft", "Tehran", "Majlis", None, None)
+    cat.upsert(ids[3], "guideline", "published", None, None, date(2019, 3, 3), None)
+    cat.upsert(ids[4], "circular", "approved", "Iran", "Judiciary", date(2022, 2, 2), date(2022, 12, 1))
+    return cat, ids
+
+
+def test_date_encoding_round_trip():
+    assert days_to_date(date_to_days(date(2023, 5, 1))) == date(2023, 5, 1)
+    assert days_to_date(date_to_days(None)) is None
+
+
+def test_enum_and_facet_filters(docs):
+    cat, ids = docs
+    assert cat.ids_for(cat.filter_mask(doc_type=["law"])) == [ids[0], ids[2]]
+    assert cat.ids_for(cat.filter_mask(doc_type=["law", "regulation"], status=["published"])) == [ids[0], ids[1]]
+    assert cat.ids_for(cat.filter_mask(jurisdiction=["Iran"], authority=["Cabinet", "Judiciary"])) == [ids[1], ids[4]]
+    assert cat.filter_mask(authority=["Unknown"]).sum() == 0
+
+
+def test_date_range_filters_skip_nulls(docs):
+    cat, ids = docs
+    assert cat.ids_for(cat.filter_mask(effective_to=date(2020, 12, 31))) == [ids[0], ids[3]]
+    assert cat.ids_for(cat.filter_mask(amended_from=date(2023, 1, 1))) == [ids[1]]
+    assert cat.ids_for(cat.filter_mask(effective_from=date(2020, 1, 1), amended_to=date(2022, 12, 31))) == [ids[4]]
+
+
+def test_upsert_updates_in_place_and_remove(docs):
+    cat, ids = docs
+    cat.upsert(ids[2], "law", "published", "Tehran", "Majlis", None, None)
+    assert len(cat) == 5
+    assert ids[2] in cat.ids_for(cat.filter_mask(status=["published"]))
+    cat.remove(ids[0])
+    assert len(cat) == 4
+    assert ids[0] not in cat.ids_for(cat.filter_mask(doc_type=["law"]))
+
+
+def test_rows_and_memory_usage(docs):
+    cat, ids = docs
+    rows = cat.rows(cat.filter_mask(doc_type=["regulation"]))
+    assert rows == [{
+        "id": str(ids[1]),
+        "doc_type": "regulation",
+        "status": "published",
+        "jurisdiction": "Iran",
+        "authority": "Cabinet",
+        "effective_date": date(2021, 6, 1),
+        "amended_date": date(2023, 5, 1),
+    }]
+    usage = cat.memory_usage()
+    assert usage["documents"] == 5
+    assert usage["bytes_per_million_documents"] > 0
+
+
+def test_documents_endpoint():
+    client = TestClient(app)
+    doc_id = uuid.uuid4()
+    catalog.upsert(doc_id, "law", "published", "Iran", "Majlis", date(2020, 1, 1), None)
+    catalog.loaded = True
+    try:
+        response = client.get("/documents", params={"doc_type": ["law", "regulation"], "effective_from": "2019-01-01"})
+        assert response.status_code == 200
+        data = response.json()
+        assert str(doc_id) in [item["id"] for item in data["items"]]
+
+        response = client.get("/documents/catalog")
+        assert response.status_code == 200
+        assert response.json()["documents"] >= 1
+    finally:
+        catalog.remove(doc_id)
+
+
+def test_ids_ending_in_nul_bytes_are_found_after_reindex():
+    cat = DocumentCatalog(initial_capacity=2)
+    doc_id = uuid.UUID(bytes=uuid.uuid4().bytes[:14] + b"\0\0")
+    cat.upsert(doc_id, "law", "published", None, None, None, None)
+    cat._reindex()
+    cat.upsert(doc_id, "regulation", "published", None, None, None, None)
+    assert len(cat) == 1 and cat.ids_for(cat.filter_mask(doc_type=["regulation"])) == [doc_id]
+    cat.remove(doc_id)
+    assert len(cat) == 0
@@ -0,0 +1,191 @@
+import uuid
+import pytest
+from datetime import datetime
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.db.base import Base
+from app.models.official import LegalUnit, OfficialDocument, UnitCitation
+from app.models.sync import SyncWatermark
+from app.services import citation_graph
+from app.services.citation_graph import CitationGraph, GraphCache, cited_document
+from app.utils.citations import UnitLabel, find_citations, title_key
+from app.utils.postings import uuid_bytes
+from app.utils.text import normalize_key
+
+
+def mentions(text):
+    return [(m.text, m.units, m.title_words) for m in find_citations(normalize_key(text))]
+
+
+def test_find_citations_in_running_text():
+    found = mentions("کارفرما موضوع تبصره ۲ ماده ۱۲ قانون کار، مکلف است")
+    assert found == [("تبصره 2 ماده 12", [UnitLabel("note", 2), UnitLabel("article", 12)], ["قانون", "کار", "مکلف", "است"])]
+    # own document: no title word, "این قانون" or "قانون حاضر"
+    assert [m[2] for m in mentions("ماده ۵ و بند الف ماده ۶ این قانون و تبصره ماده ۷ قانون حاضر")] == [[], [], []]
+    assert mentions("تبصره ماده ۷")[0][1] == [UnitLabel("note", 1), UnitLabel("article", 7)]
+    assert mentions("ماده ۱۲ مکرر ۲")[0][1] == [UnitLabel("article", 12, 2)]
+    # a unit word without an ordinal, or an article numbered by a letter, cites nothing
+    assert mentions("در این ماده و تبصره آن") == []
+
+
+def test_cited_document_takes_the_longest_known_title():
+    labour, amended = uuid.uuid4(), uuid.uuid4()
+    citing = uuid.uuid4()
+    titles = {"قانون کار": labour, "قانون کار اصلاحی": amended}
+    [own, other, unknown] = find_citations(normalize_key(
+        "ماده ۵ این قانون و ماده ۷ قانون کار اصلاحی مصوب ۱۴۰۰ و ماده ۹ قانون تجارت"
+    ))
+    assert cited_document(own, citing, titles) == citing
+    assert cited_document(other, citing, titles) == amended
+    assert cited_document(unknown, citing, titles) is None
+
+
+def graph(edges):
+    """Graph over (source, target) pairs of small ints, each its own document"""
+    ids = [uuid.UUID(int=n + 1) for n in range(max(max(e) for e in edges) + 1)]
+    columns = [[ids[s] for s, _ in edges], [ids[s] for s, _ in edges], [ids[t] for _, t in edges], [ids[t] for _, t in edges]]
+    return CitationGraph.from_edges(*(uuid_bytes(c) for c in columns)), ids
+
+
+def test_csr_neighbourhoods_by_direction_and_hop():
+    g, ids = graph([(0, 1), (0, 2), (1, 3), (3, 4), (2, 1), (0, 1), (5, 0)])
+    assert (len(g), g.edges) == (6, 6)
+
+    def hops(result):
+        return {ids.index(u): hop for u, _, hop in result["units"]}
+
+    assert hops(g.neighbourhood([ids[0]])) == {1: 1, 2: 1}
+    assert hops(g.neighbourhood([ids[0]], hops=3)) == {1: 1, 2: 1, 3: 2, 4: 3}
+    assert hops(g.neighbourhood([ids[1]], direction="citing")) == {0: 1, 2: 1}
+    assert hops(g.neighbourhood([ids[1]], hops=2, direction="citing")) == {0: 1, 2: 1, 5: 2}
+    assert hops(g.neighbourhood([ids[0]], direction="both")) == {1: 1, 2: 1, 5: 1}
+    assert hops(g.neighbourhood([ids[3], ids[4]])) == {}
+    # node documents travel with the nodes
+    assert g.neighbourhood([ids[0]])["units"][0][1] == ids[1]
+
+    result = g.neighbourhood([ids[0]], hops=3, limit=3)
+    assert result["truncated"] and hops(result) == {1: 1, 2: 1, 3: 2}
+    assert sorted((ids.index(s), ids.index(t)) for s, t in result["edges"]) == [(0, 1), (0, 2), (1, 3), (2, 1)]
+    assert g.neighbourhood([uuid.uuid4()]) == {"units": [], "edges": [], "truncated": False}
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[
+        OfficialDocument.__table__, LegalUnit.__table__, UnitCitation.__table__, SyncWatermark.__table__
+    ])
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def add_document(db, title, labels, status="published"):
+    doc = OfficialDocument(id=uuid.uuid4(), title=title, doc_type="law", status=status)
+    db.add(doc)
+    units = [
+        LegalUnit(id=uuid.uuid4(), document_id=doc.id, unit_type="article", num_label=label, text_plain=f"متن {label}", order_index=i)
+        for i, label in enumerate(labels, start=1)
+    ]
+    db.add_all(units)
+    db.commit()
+    return doc, units
+
+
+def cite(db, source, target):
+    db.add(UnitCitation(
+        source_document_id=source.document_id, source_unit_id=source.id,
+        target_document_id=target.document_id, target_unit_id=target.id, citation=target.num_label
+    ))
+    db.commit()
+
+
+def test_cached_graph_serves_servable_units(db, monkeypatch):
+    labour, (a1, a2) = add_document(db, "قانون کار", ["ماده ۱", "ماده ۲"])
+    tax, (t1,) = add_document(db, "قانون مالیات", ["ماده ۱"])
+    draft, (d1,) = add_document(db, "پیش نویس", ["ماده ۱"], status="draft")
+    cite(db, a1, a2)
+    cite(db, a1, t1)
+    cite(db, a1, d1)
+    db.add(UnitCitation(
+        source_document_id=labour.id, source_unit_id=a2.id,
+        target_document_id=tax.id, target_unit_id=None, citation="ماده 9"
+    ))
+    db.commit()
+
+    monkeypatch.setattr("app.services.citation_graph.citation_graph", GraphCache())
+    monkeypatch.setattr(citation_graph.settings, "CITATION_GRAPH_REFRESH_SECONDS", 0)
+    result = citation_graph.neighbourhood(db, [a1.id], 1, "cited", 10)
+    # neither the draft nor the unresolved citation is in the graph
+    assert [(u["id"], u["document_title"], u["hop"]) for u in result["units"]] == sorted(
+        [(str(a2.id), "قانون کار", 1), (str(t1.id), "قانون مالیات", 1)]
+    )
+    assert result["units"][0]["num_label"] in ("ماده ۱", "ماده ۲")
+    assert len(result["edges"]) == 2
+
+    # a new edge moves the signature, so the graph is reloaded
+    loaded = citation_graph.citation_graph.get(db)
+    assert citation_graph.citation_graph.get(db) is loaded
+    cite(db, t1, a1)
+    assert citation_graph.citation_graph.get(db) is not loaded
+    assert [u["id"] for u in citation_graph.neighbourhood(db, [a1.id], 1, "citing", 10)["units"]] == [str(t1.id)]
+
+    # withdrawn after loading: its units are left out
+    db.get(OfficialDocument, tax.id).deleted_at = datetime.utcnow()
+    db.commit()
+    monkeypatch.setattr(citation_graph.settings, "CITATION_GRAPH_REFRESH_SECONDS", 3600)
+    assert [u["id"] for u in citation_graph.neighbourhood(db, [a1.id], 1, "cited", 10)["units"]] == [str(a2.id)]
+
+
+def test_citation_of_a_document_imported_later_is_resolved_on_its_arrival(db, monkeypatch):
+    # the statements behind these are PostgreSQL's; the same lookups over the ORM
+    def titles(db, keys):
+        rows = db.query(OfficialDocument.title_normalized, OfficialDocument.id).filter(
+            OfficialDocument.title_normalized.in_(set(keys))
+        )
+        return dict(rows.all())
+
+    def units(db, citations):
+        found = {}
+        for i, document_id, citation in citations:
+            row = db.query(LegalUnit.id).filter(
+                LegalUnit.document_id == document_id, LegalUnit.num_label_normalized == citation.text
+            ).first()
+            if row is not None:
+                found[i] = {"id": row.id}
+        return found
+
+    monkeypatch.setattr(citation_graph, "resolve_exact_titles", titles)
+    monkeypatch.setattr(citation_graph, "resolve_units", units)
+
+    def add(title, labels, texts):
+        doc = OfficialDocument(id=uuid.uuid4(), title=title, title_normalized=title_key(title), doc_type="law", status="published")
+        db.add(doc)
+        db.add_all([
+            LegalUnit(
+                id=uuid.uuid4(), document_id=doc.id, unit_type="article", num_label=label,
+                num_label_normalized=normalize_key(label), text_plain=text, text_plain_normalized=normalize_key(text), order_index=i
+            )
+            for i, (label, text) in enumerate(zip(labels, texts), start=1)
+        ])
+        db.commit()
+        return doc
+
+    rules = add("آیین نامه اجرایی", ["ماده ۱"], ["موضوع ماده ۵ قانون کار مصوب ۱۳۶۹ و ماده ۲ قانون تجارت"])
+    assert citation_graph.refresh_citations(db, [rules.id]) == 2
+    pending = db.query(UnitCitation).filter(UnitCitation.target_document_id.is_(None)).all()
+    assert sorted(row.target_title.split()[1] for row in pending) == ["تجارت", "کار"]
+
+    # the cited law arrives in a later batch
+    labour = add("قانون کار", ["ماده ۵"], ["متن ماده"])
+    assert citation_graph.resolve_pending(db, [labour.id]) == 1
+    db.commit()
+    edge = db.query(UnitCitation).filter(UnitCitation.target_document_id == labour.id).one()
+    assert edge.target_unit_id == db.query(LegalUnit.id).filter(LegalUnit.document_id == labour.id).scalar()
+    assert edge.target_title is None and edge.source_document_id == rules.id
+    # the other citation is still waiting, for a title that starts its words
+    [waiting] = db.query(UnitCitation).filter(UnitCitation.target_document_id.is_(None)).all()
+    assert waiting.target_title.startswith("قانون تجارت")
+    trade = add("قانون تجارت", ["ماده ۲"], ["متن ماده"])
+    assert citation_graph.resolve_pending(db, [trade.id, labour.id]) == 1
+    assert db.query(UnitCitation).filter(UnitCitation.target_document_id.is_(None)).count() == 0
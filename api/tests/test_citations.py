@@ -0,0 +1,93 @@
+import uuid
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from app.db.base import Base
+from app.models.official import OfficialDocument
+from app.services import match_keys
+from app.services.citations import resolve_citations, unit_steps
+from app.services.match_keys import unit_match_keys
+from app.utils.citations import UnitLabel, find_citations, parse_citation, parse_num_label, title_key
+from app.utils.text import normalize_key
+
+
+def test_parse_num_label_forms():
+    assert parse_num_label("ماده ۱۲") == parse_num_label("ماده١٢") == UnitLabel("article", 12)
+    assert parse_num_label("بند الف") == UnitLabel("clause", 1)
+    assert parse_num_label("بند (ج)") == UnitLabel("clause", 6)
+    assert parse_num_label("بند ك") == UnitLabel("clause", 25)
+    assert parse_num_label("فصل سوم") == UnitLabel("chapter", 3)
+    assert parse_num_label("تبصره یک") == UnitLabel("note", 1)
+    assert parse_num_label("تبصره") == UnitLabel("note", 1)
+    assert parse_num_label("ماده واحده") == UnitLabel("article", 1)
+    assert parse_num_label("ماده ۱۲ مکرر") == UnitLabel("article", 12, 1)
+    assert parse_num_label("ماده ۱۲ مکرر ۲") == UnitLabel("article", 12, 2)
+
+
+def test_parse_num_label_rejects_free_text():
+    assert parse_num_label(None) is None
+    assert parse_num_label("مقدمه") is None
+    assert parse_num_label("ماده ۱۲ قانون کار") is None
+
+
+def test_parse_citation_chain_and_title():
+    citation = parse_citation("تبصره ۲ ماده ۱۲ از قانون كار")
+    assert citation.units == [UnitLabel("note", 2), UnitLabel("article", 12)]
+    assert citation.document_title == "قانون کار"
+    assert parse_citation("بند الف ماده ۵").document_title is None
+    assert not parse_citation("قانون کار").parsed
+
+
+def test_title_key_matches_cited_titles_with_punctuation():
+    title = "قانون آیین دادرسی دادگاه‌های عمومی و انقلاب (در امور مدنی)"
+    key = title_key(title)
+    assert key == "قانون آیین دادرسی دادگاههای عمومی و انقلاب در امور مدنی"
+    assert parse_citation(f"ماده ۵ {title}").document_title == key
+    [mention] = find_citations(normalize_key(f"موضوع ماده ۵ {title}"))
+    assert key in mention.titles()
+    assert title_key("قانون کار") == normalize_key("قانون کار") and title_key(None) is None
+
+
+def test_unit_match_keys_fills_label_columns():
+    rows = unit_match_keys([
+        {"num_label": "ماده ۷ مکرر", "heading": None, "text_plain": None},
+        {"num_label": "مقدمه", "heading": None, "text_plain": None},
+    ])
+    assert (rows[0]["label_type"], rows[0]["label_ordinal"], rows[0]["label_repeat"]) == ("article", 7, 1)
+    assert (rows[1]["label_type"], rows[1]["label_ordinal"], rows[1]["label_repeat"]) == (None, None, None)
+
+
+def test_unit_steps_are_outermost_first():
+    doc = uuid.uuid4()
+    steps = unit_steps([(3, doc, parse_citation("تبصره ۲ ماده ۱۲"))])
+    assert steps == {
+        "idx": [3, 3], "lvl": [0, 1], "doc": [str(doc)] * 2,
+        "typ": ["article", "note"], "ord": [12, 2], "rep": [0, 0],
+    }
+
+
+def test_resolve_citations_reports_unresolvable_without_querying():
+    # neither needs a lookup, so no session is touched
+    results = resolve_citations(None, [("قانون کار", None), ("ماده ۱۲", None)])
+    assert [r["status"] for r in results] == ["unparsed", "document_required"]
+    assert results[1]["parsed"]["units"] == [{"unit_type": "article", "ordinal": 12, "repeat": 0}]
+
+
+def test_backfill_title_keys_commits_batch_by_batch(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path}/titles.db")
+    Base.metadata.create_all(engine, tables=[OfficialDocument.__table__])
+    sessions = sessionmaker(bind=engine)
+    db = sessions()
+    titles = ["قانون کار (اصلاحی)", "قانون تجارت", "قانون مالیات‌ها", "آیین نامه"]
+    db.add_all([
+        OfficialDocument(id=uuid.uuid4(), title=title, title_normalized=title_key(title) if i == 1 else None, doc_type="law")
+        for i, title in enumerate(titles)
+    ])
+    db.commit()
+    commits = []
+    monkeypatch.setattr(match_keys, "SessionLocal", sessions)
+    event.listen(sessions, "after_commit", lambda session: commits.append(1))
+
+    assert match_keys.backfill_title_keys(batch_size=3) == 3
+    assert len(commits) == 2
+    assert {row.title_normalized for row in db.query(OfficialDocument)} == {title_key(title) for title in titles}
+    assert match_keys.backfill_title_keys(batch_size=3) == 0
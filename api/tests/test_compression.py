@@ -0,0 +1,97 @@
+import gzip
+import zstandard
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from app.core.compression import (
+    _DECODERS, ZSTD_INPUT_SLICE, RequestDecompressionMiddleware, ResponseCompressionMiddleware, negotiate_encoding
+)
+
+PAYLOAD = ('{"batch_ts": "2024-01-01", "text": "' + "ماده قانون " * 2000 + '"}').encode("utf-8")
+
+
+def make_app(max_body_bytes=10 * 1024 * 1024):
+    app = FastAPI()
+    app.add_middleware(RequestDecompressionMiddleware, path_prefixes=("/sync/",), max_body_bytes=max_body_bytes)
+    app.add_middleware(ResponseCompressionMiddleware, minimum_size=500)
+
+    @app.post("/sync/echo")
+    async def echo(request: Request):
+        body = await request.body()
+        return {"size": len(body), "encoding": request.headers.get("content-encoding")}
+
+    @app.get("/big")
+    async def big():
+        return {"text": "ماده " * 1000}
+
+    @app.get("/small")
+    async def small():
+        return {"ok": True}
+
+    @app.get("/stream")
+    async def stream():
+        return StreamingResponse((("ماده " * 500).encode() for _ in range(4)), media_type="text/plain")
+
+    return app
+
+
+def test_gzip_and_zstd_request_bodies_are_inflated():
+    client = TestClient(make_app())
+    for encoding, body in (
+        ("gzip", gzip.compress(PAYLOAD)),
+        ("zstd", zstandard.ZstdCompressor().compress(PAYLOAD)),
+    ):
+        response = client.post("/sync/echo", content=body, headers={"Content-Encoding": encoding})
+        assert response.status_code == 200
+        assert response.json() == {"size": len(PAYLOAD), "encoding": None}
+
+
+def test_bad_request_bodies_are_rejected():
+    client = TestClient(make_app(max_body_bytes=1000))
+    assert client.post("/sync/echo", content=b"x", headers={"Content-Encoding": "br"}).status_code == 415
+    assert client.post("/sync/echo", content=gzip.compress(PAYLOAD), headers={"Content-Encoding": "gzip"}).status_code == 413
+    truncated = gzip.compress(b"short")[:-6]
+    assert client.post("/sync/echo", content=truncated, headers={"Content-Encoding": "gzip"}).status_code == 400
+
+
+def test_inflation_stops_at_the_cap():
+    bomb = b"\0" * (64 * 1024 * 1024)
+    client = TestClient(make_app(max_body_bytes=1000))
+    for encoding, body in (("gzip", gzip.compress(bomb)), ("zstd", zstandard.ZstdCompressor().compress(bomb))):
+        response = client.post("/sync/echo", content=body, headers={"Content-Encoding": encoding})
+        assert response.status_code == 413
+        # one small chunk never inflates far past the cap
+        decoder = _DECODERS[encoding]()
+        assert len(decoder.decompress(body, 1000)) <= 1000 + 128 * 1024 * ZSTD_INPUT_SLICE // 4
+
+
+def test_negotiate_encoding():
+    assert negotiate_encoding("gzip, deflate, br, zstd") == "zstd"
+    assert negotiate_encoding("zstd;q=0.5, gzip") == "gzip"
+    assert negotiate_encoding("*") == "zstd"
+    assert negotiate_encoding("gzip;q=0, identity") is None
+    assert negotiate_encoding("") is None
+    # the wildcard weighs only the codings the header leaves unnamed
+    assert negotiate_encoding("zstd;q=0, *;q=1") == "gzip"
+    assert negotiate_encoding("*, zstd;q=0") == "gzip"
+    assert negotiate_encoding("gzip;q=0.8, *;q=0.5") == "gzip"
+    assert negotiate_encoding("zstd;q=0, gzip;q=0, *") is None
+
+
+def test_response_compression():
+    client = TestClient(make_app())
+    response = client.get("/big", headers={"Accept-Encoding": "zstd"})
+    assert response.headers["content-encoding"] == "zstd"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert zstandard.ZstdDecompressor().decompressobj().decompress(response.content) == ('{"text":"' + "ماده " * 1000 + '"}').encode()
+
+    response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json()["text"].startswith("ماده")
+
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+    response = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.text == "ماده " * 2000
@@ -0,0 +1,33 @@
+import uuid
+from app.services.context import estimate_tokens, pack_passages, unit_passages
+
+
+def unit(doc, order, score, is_hit=False, chars=30):
+    return {"document_id": doc, "id": uuid.uuid4(), "order_index": order, "score": score,
+            "is_hit": is_hit, "num_label": None, "heading": None, "text_plain": "x" * chars}
+
+
+def test_estimate_tokens_counts_all_parts():
+    assert estimate_tokens("abc", None, "abcd") == 3
+    assert estimate_tokens() == 0
+
+
+def test_unit_passages_merge_consecutive_units_per_document():
+    a, b = uuid.uuid4(), uuid.uuid4()
+    passages = unit_passages([unit(a, 3, 0.1), unit(a, 1, 0.5, True), unit(a, 2, 0.5), unit(a, 7, 0.2, True), unit(b, 4, 0.9, True)])
+    assert [(p["document_id"], [u["order_index"] for u in p["units"]], p["score"]) for p in passages] == sorted([
+        (a, [1, 2, 3], 0.5), (a, [7], 0.2), (b, [4], 0.9)
+    ], key=lambda p: (str(p[0]), p[1][0]))
+
+
+def test_pack_passages_fills_by_score_and_trims_around_hits():
+    doc = uuid.uuid4()
+    best = {"document_id": doc, "score": 0.9, "units": [unit(doc, 1, 0.9), unit(doc, 2, 0.9, True), unit(doc, 3, 0.9)]}
+    qa = {"source": "qa", "id": "q", "score": 0.5, "tokens": 15}
+    pack = pack_passages([qa, best], budget=25)
+    # 10 tokens per unit: the hit and one neighbour fit, then the Q&A does not
+    assert [u["order_index"] for u in pack["passages"][0]["units"]] == [1, 2]
+    assert pack["passages"][0]["trimmed"]
+    assert pack["used_tokens"] == 20
+    assert pack["dropped"] == 1
+    assert pack_passages([qa, best], budget=100)["dropped"] == 0
@@ -0,0 +1,111 @@
+import uuid
+import numpy as np
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.db.base import Base
+from app.models.embedding import EmbeddingCache, EmbeddingWatermark
+from app.models.official import LegalUnit, OfficialDocument
+from app.models.qa import QAEntry
+from app.services.embeddings import (
+    Embedder, HashingTextEmbedder, load_embedder, lookup_vectors, text_key, update_embeddings
+)
+from app.services.match_keys import unit_match_keys
+from app.utils.text import normalize_key
+
+T0 = datetime(2024, 1, 1, 12, 0)
+
+
+class CountingEmbedder(HashingTextEmbedder):
+    def __init__(self):
+        super().__init__(dim=32)
+        self.calls = []
+
+    def embed(self, texts):
+        self.calls.append(list(texts))
+        return super().embed(texts)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[
+        OfficialDocument.__table__, LegalUnit.__table__, QAEntry.__table__,
+        EmbeddingCache.__table__, EmbeddingWatermark.__table__
+    ])
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def add_document(db, texts, status="published", updated_at=T0):
+    doc = OfficialDocument(id=uuid.uuid4(), title="قانون", doc_type="law", status=status, updated_at=updated_at)
+    db.add(doc)
+    rows = unit_match_keys([
+        {"num_label": f"ماده {i}", "heading": None, "text_plain": text, "unit_type": "article", "order_index": i}
+        for i, text in enumerate(texts, start=1)
+    ])
+    db.add_all(LegalUnit(id=uuid.uuid4(), document_id=doc.id, **row) for row in rows)
+    db.commit()
+    return doc
+
+
+def test_hashing_embedder_is_deterministic():
+    embedder = HashingTextEmbedder(dim=64)
+    vectors = embedder.embed(["مهلت اعتراض", "مهلت اعتراض", "نرخ مالیات"])
+    assert vectors.shape == (3, 64) and vectors.dtype == np.float32
+    assert np.array_equal(vectors[0], vectors[1]) and not np.array_equal(vectors[0], vectors[2])
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+    assert embedder.model_id == "hashing-3gram-64"
+    assert embedder.embed([]).shape == (0, 64)
+
+
+def test_load_embedder_specs():
+    assert load_embedder("none") is None
+    assert isinstance(load_embedder("hashing"), HashingTextEmbedder)
+    assert isinstance(load_embedder("app.services.embeddings:HashingTextEmbedder"), HashingTextEmbedder)
+    with pytest.raises(ValueError):
+        load_embedder("app.services.embeddings")
+    # a plugin must implement embed
+    with pytest.raises(TypeError):
+        type("Unfinished", (Embedder,), {"model_id": "unfinished"})()
+
+
+def test_identical_texts_are_embedded_once(db):
+    shared = "کارفرما مکلف به پرداخت مزد است"
+    add_document(db, [shared, "مهلت اعتراض ده روز است"])
+    # the same article with Arabic letters and digits folds to the same key
+    add_document(db, ["كارفرما مكلف به پرداخت مزد است", "مهلت ۳۰ روز"])
+    add_document(db, ["متن پیش نویس"], status="draft")
+    db.add(QAEntry(
+        id=uuid.uuid4(), question="مهلت اعتراض؟", answer="ده روز", topic_tags=[],
+        question_normalized=normalize_key("مهلت اعتراض؟"), answer_normalized=normalize_key("ده روز"), updated_at=T0
+    ))
+    db.commit()
+
+    embedder = CountingEmbedder()
+    report = update_embeddings(db, embedder, embed_batch_size=2)
+    assert (report.rows, report.texts, report.cached, report.embedded) == (5, 4, 0, 4)
+    assert [len(call) for call in embedder.calls] == [2, 1, 1]
+    assert report.as_dict()["hit_rate"] == 0.0 and report.throughput > 0
+
+    vectors = lookup_vectors(db, embedder.model_id, [text_key(None, normalize_key(shared)), "missing"])
+    assert list(vectors) == [text_key(None, normalize_key(shared))]
+    assert np.allclose(vectors[text_key(None, normalize_key(shared))], embedder.embed([shared])[0])
+
+    # a resend within the overlap window re-reads the rows but embeds nothing
+    embedder.calls.clear()
+    report = update_embeddings(db, embedder)
+    assert (report.texts, report.cached, report.embedded, report.hit_rate) == (4, 4, 0, 1.0)
+    assert embedder.calls == []
+
+    # without an overlap, only rows stamped at or after the watermark are read
+    add_document(db, [shared, "متن تازه"], updated_at=T0 + timedelta(hours=1))
+    report = update_embeddings(db, embedder, overlap_seconds=0)
+    assert (report.rows, report.texts, report.cached, report.embedded) == (7, 5, 4, 1)
+    assert embedder.calls == [["متن تازه"]]
+    assert db.get(EmbeddingWatermark, (embedder.model_id, "documents")).watermark == T0 + timedelta(hours=1)
+
+    # another model keeps its own cache
+    assert update_embeddings(db, HashingTextEmbedder(dim=16)).embedded == 5
@@ -0,0 +1,67 @@
+import json
+import uuid
+import pytest
+from fastapi.exceptions import RequestValidationError
+from app.routers.sync import SyncImportRequest, sync_decoder
+from app.utils.fast_decode import PayloadDecoder, SyncImportStruct, DocumentStruct, inline_schema
+
+
+def payload(**overrides):
+    data = {
+        "documents": [{
+            "id": str(uuid.uuid4()),
+            "title": "قانون نمونه",
+            "doc_type": "law",
+            "effective_date": "2020-01-01",
+            "legal_units": [{"unit_type": "article", "num_label": "ماده ۱", "order_index": "1"}]
+        }],
+        "qa_entries": [{"id": str(uuid.uuid4()), "question": "q", "answer": "a", "quality_score": 1}],
+        "batch_ts": "2024-01-01T00:00:00Z"
+    }
+    data.update(overrides)
+    return json.dumps(data).encode("utf-8")
+
+
+def test_fast_path_matches_pydantic_values():
+    body = payload()
+    fast = sync_decoder.decode(body)
+    slow = SyncImportRequest.model_validate_json(body)
+    assert isinstance(fast, SyncImportStruct)
+    assert isinstance(fast.documents[0], DocumentStruct)
+    for attr in ("id", "title", "doc_type", "effective_date", "amended_date"):
+        assert getattr(fast.documents[0], attr) == getattr(slow.documents[0], attr)
+    assert fast.documents[0].legal_units[0].order_index == 1
+    assert fast.qa_entries[0].quality_score == 1.0
+    assert fast.qa_entries[0].topic_tags == slow.qa_entries[0].topic_tags == []
+
+
+def test_defaults_are_not_shared():
+    a = sync_decoder.decode(payload())
+    b = sync_decoder.decode(payload())
+    a.qa_entries[0].topic_tags.append("x")
+    assert b.qa_entries[0].topic_tags == []
+
+
+def test_invalid_payload_raises_pydantic_errors():
+    body = payload(documents=[{"id": "not-a-uuid", "title": "t", "doc_type": "law"}])
+    with pytest.raises(RequestValidationError) as fast_error:
+        sync_decoder.decode(body)
+    slow = PayloadDecoder(SyncImportStruct, SyncImportRequest, use_msgspec=False)
+    with pytest.raises(RequestValidationError) as slow_error:
+        slow.decode(body)
+    assert fast_error.value.errors() == slow_error.value.errors()
+    assert fast_error.value.errors()[0]["loc"] == ("body", "documents", 0, "id")
+
+
+def test_missing_batch_ts_and_bad_json():
+    with pytest.raises(RequestValidationError) as e:
+        sync_decoder.decode(b'{"documents": []}')
+    assert e.value.errors()[0]["loc"] == ("body", "batch_ts")
+    with pytest.raises(RequestValidationError):
+        sync_decoder.decode(b"{not json")
+
+
+def test_inline_schema_has_no_refs():
+    schema = inline_schema(SyncImportRequest)
+    assert "$ref" not in json.dumps(schema)
+    assert "documents" in schema["properties"]
@@ -0,0 +1,64 @@
+import pytest
+from app.services import extractors
+from app.services.extractors import UnsupportedFormat, extract_text, extractor, supported_extensions
+from app.services.ingest import IngestReport, run_extraction
+from app.utils.minio_helper import split_s3_url
+from app.utils.text import normalize_text
+
+
+def test_normalize_text_persian_variants():
+    assert normalize_text("ماده ۱۲ و ٣  كتابـها") == "ماده 12 و 3 کتابها"
+    assert normalize_text("علي\r\n\r\n\n  بعد") == "علی\n\nبعد"
+    assert normalize_text(None) == ""
+
+
+def test_plain_text_extractor_handles_cp1256():
+    data = "قانون کار".encode("cp1256")
+    assert extract_text(data, "raw/x/law.txt") == "قانون کار"
+
+
+def test_html_extractor_drops_scripts_and_keeps_blocks():
+    html = "<html><head><title>t</title></head><body><script>x=1</script><p>ماده ۱</p><p>متن</p></body></html>"
+    assert normalize_text(extract_text(html.encode("utf-8"), "doc.HTML")) == "ماده 1\n\nمتن"
+
+
+def test_extractor_registry_is_pluggable(monkeypatch):
+    # register into a copy, so csvx is gone again after the test
+    monkeypatch.setattr(extractors, "_REGISTRY", dict(extractors._REGISTRY))
+
+    @extractor("csvx")
+    def extract_csvx(data):
+        return data.decode().replace(",", " ")
+
+    assert "csvx" in supported_extensions()
+    assert extract_text(b"a,b", "f.csvx") == "a b"
+    with pytest.raises(UnsupportedFormat):
+        extract_text(b"", "f.unknown")
+
+
+def test_split_s3_url():
+    assert split_s3_url("s3://advisor-docs/raw/1/a.pdf") == ("advisor-docs", "raw/1/a.pdf")
+    with pytest.raises(ValueError):
+        split_s3_url("https://example.com/a")
+
+
+def test_run_extraction_bounds_inflight_and_reports():
+    files = {f"raw/{i}/doc.txt": f"متن {i}".encode("utf-8") for i in range(20)}
+    files["raw/bad/doc.pdf"] = b"%PDF"
+    items = [(name.split("/")[1], name) for name in files]
+    fetched = []
+
+    def fetch(name):
+        if name == "raw/3/doc.txt":
+            raise IOError("boom")
+        fetched.append(name)
+        return files[name]
+
+    report = IngestReport()
+    results = dict(run_extraction(items, fetch, workers=2, max_inflight=3, report=report))
+    assert results["7"] == "متن 7"
+    assert results["3"] is None
+    assert results["bad"] is None
+    assert report.processed == 19
+    assert report.failed == 1
+    assert report.unsupported == 1
@@ -4,7 +4,7 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from app.main import app
 from app.db.base import Base
-from app.db.session import get_db
+from app.db.session import get_db, get_read_db
 from app.core.settings import settings
 import uuid
 from datetime import datetime
@@ -27,6 +27,7 @@ def override_get_db():
 
 
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_read_db] = override_get_db
 
 client = TestClient(app)
 
@@ -0,0 +1,63 @@
+import asyncio
+from sqlalchemy import create_engine
+from app.core import cache as cache_module
+from app.core.cache import LRUCache, cached
+from app.core.leader import LeaderElection, lock_key
+from app.db.base import pool_sizing
+from app.services.scheduler import LeaderJob, run_due_jobs
+
+
+def test_pool_sizing_stays_within_budget():
+    for budget, workers in ((40, 1), (40, 8), (40, 16), (100, 3)):
+        pool_size, max_overflow = pool_sizing(budget, workers)
+        assert pool_size >= 1 and max_overflow >= 0
+        assert (pool_size + max_overflow) * workers <= max(budget, 2 * workers)
+    assert pool_sizing(40, 0) == pool_sizing(40, 1)
+
+
+def test_lock_key_is_stable_signed_64_bit():
+    assert lock_key("core:background-jobs") == lock_key("core:background-jobs")
+    assert lock_key("a") != lock_key("b")
+    assert -2**63 <= lock_key("a") < 2**63
+
+
+def test_single_process_database_always_leads():
+    election = LeaderElection(create_engine("sqlite://"), "jobs")
+    assert election.try_acquire()
+    assert election.is_leader
+    election.release()
+
+
+def test_due_jobs_run_once_per_interval():
+    calls = []
+
+    async def async_job():
+        calls.append("async")
+
+    def failing_job():
+        calls.append("failing")
+        raise RuntimeError("boom")
+
+    jobs = [LeaderJob("a", 60, async_job), LeaderJob("s", 10, lambda: calls.append("sync")), LeaderJob("f", 60, failing_job)]
+    assert asyncio.run(run_due_jobs(jobs, now=0.0)) == ["a", "s"]
+    assert asyncio.run(run_due_jobs(jobs, now=5.0)) == []
+    assert asyncio.run(run_due_jobs(jobs, now=10.0)) == ["s"]
+    assert calls == ["async", "sync", "failing", "sync"]
+
+
+def test_cached_refresh_overwrites_entry():
+    previous = cache_module.get_cache()
+    cache_module.set_cache(LRUCache())
+    try:
+        counter = {"n": 0}
+
+        @cached("refresh", ttl=60)
+        async def read(db=None):
+            counter["n"] += 1
+            return counter["n"]
+
+        assert asyncio.run(read(db=object())) == 1
+        assert asyncio.run(read.refresh(db=object())) == 2
+        assert asyncio.run(read(db=object())) == 2
+    finally:
+        cache_module.set_cache(previous)
@@ -0,0 +1,104 @@
+import uuid
+from datetime import date
+import numpy as np
+from app.services.merkle import (
+    BUCKETS, DEPTH, MerkleTree, bucket_of, check_prefix, compare_rows, differing_buckets,
+    digest_hex, document_hash, qa_hash, row_digest, units_hash
+)
+
+CORPUS = 1_000_000
+
+
+def test_row_hashes_are_stable_and_cover_units():
+    doc = {"title": "قانون کار", "doc_type": "law", "jurisdiction": None, "authority": None,
+           "effective_date": date(1990, 1, 1), "amended_date": None, "source_url": None, "file_s3": None}
+    units = [{"unit_type": "article", "num_label": "ماده ۱", "heading": None, "text_plain": "متن", "order_index": 1},
+             {"unit_type": "article", "num_label": "ماده ۲", "heading": None, "text_plain": "متن", "order_index": 2}]
+    assert document_hash(doc) == document_hash(dict(doc))
+    assert units_hash(units) == units_hash(list(reversed(units)))
+    assert units_hash([]) is None
+    row_id = uuid.UUID("3f2a0000-0000-0000-0000-000000000001")
+    assert bucket_of(row_id) == 0x3f2a
+    assert row_digest(row_id, document_hash(doc), units_hash(units)) != row_digest(row_id, document_hash(doc), None)
+    assert qa_hash({"question": "q", "answer": "a", "topic_tags": ["x", "y"], "source_url": None, "author": None,
+                    "org": None, "answered_at": None, "quality_score": 0.5, "licensing": "allowed",
+                    "pii_status": "clean", "moderation_status": "published"}) != qa_hash({
+        "question": "q", "answer": "a", "topic_tags": ["xy"], "source_url": None, "author": None,
+        "org": None, "answered_at": None, "quality_score": 0.5, "licensing": "allowed",
+        "pii_status": "clean", "moderation_status": "published"})
+    assert digest_hex(-1, 1) == "f" * 16 + "0" * 15 + "1"
+
+
+def test_check_prefix():
+    assert check_prefix("3F") == "3f"
+    assert check_prefix("3f2a", leaf=True) == "3f2a"
+    for bad, leaf in (("3f2a", False), ("3f", True), ("zz", False), ("3f2a0", False)):
+        try:
+            check_prefix(bad, leaf=leaf)
+        except ValueError:
+            continue
+        raise AssertionError(bad)
+
+
+def test_incremental_xor_matches_rebuild():
+    rng = np.random.default_rng(5)
+    buckets = rng.integers(0, BUCKETS, 1000)
+    hi, lo = rng.integers(-2**63, 2**63 - 1, (2, 1000), dtype=np.int64)
+    tree = MerkleTree.from_rows(buckets, hi, lo)
+    # change row 7 by XORing its old digest out and the new one in
+    new_hi, new_lo = np.int64(42), np.int64(-42)
+    tree.hi[buckets[7]] ^= hi[7] ^ new_hi
+    tree.lo[buckets[7]] ^= lo[7] ^ new_lo
+    hi[7], lo[7] = new_hi, new_lo
+    rebuilt = MerkleTree.from_rows(buckets, hi, lo)
+    assert (tree.hi == rebuilt.hi).all() and (tree.lo == rebuilt.lo).all()
+
+
+def _rows(buckets, hi, lo, ids, prefixes):
+    wanted = np.array([int(p, 16) for p in prefixes])
+    rows = {p: {} for p in prefixes}
+    for i in np.flatnonzero(np.isin(buckets, wanted)):
+        rows[f"{buckets[i]:0{DEPTH}x}"][str(ids[i])] = digest_hex(hi[i], lo[i])
+    return rows
+
+
+def test_drift_on_a_million_rows_touches_only_differing_buckets():
+    rng = np.random.default_rng(11)
+    ids = np.arange(CORPUS)
+    buckets = rng.integers(0, BUCKETS, CORPUS)
+    hi, lo = rng.integers(-2**63, 2**63 - 1, (2, CORPUS), dtype=np.int64)
+
+    # Core drifted from Bridge on 0.1% of rows: changed, lost and stale extras
+    changed = rng.choice(CORPUS, 600, replace=False)
+    lost = rng.choice(np.setdiff1d(ids, changed), 200, replace=False)
+    r_hi, r_lo = hi.copy(), lo.copy()
+    r_hi[changed] = rng.integers(-2**63, 2**63 - 1, len(changed), dtype=np.int64)
+    keep = np.ones(CORPUS, dtype=bool)
+    keep[lost] = False
+    extra_ids = np.arange(CORPUS, CORPUS + 200)
+    extra_buckets = rng.integers(0, BUCKETS, 200)
+    extra_hi, extra_lo = rng.integers(-2**63, 2**63 - 1, (2, 200), dtype=np.int64)
+    r_ids = np.concatenate([ids[keep], extra_ids])
+    r_buckets = np.concatenate([buckets[keep], extra_buckets])
+    r_hi = np.concatenate([r_hi[keep], extra_hi])
+    r_lo = np.concatenate([r_lo[keep], extra_lo])
+
+    bridge = MerkleTree.from_rows(buckets, hi, lo)
+    core = MerkleTree.from_rows(r_buckets, r_hi, r_lo)
+    prefixes, calls = differing_buckets(bridge.children, core.children)
+    assert calls == DEPTH
+    assert len(prefixes) <= 1000
+
+    local = _rows(buckets, hi, lo, ids, prefixes)
+    remote = _rows(r_buckets, r_hi, r_lo, r_ids, prefixes)
+    diff = {"missing": [], "changed": [], "extra": []}
+    fetched = 0
+    for prefix in prefixes:
+        fetched += len(remote[prefix])
+        for key, values in compare_rows(local[prefix], remote[prefix]).items():
+            diff[key] += values
+    assert sorted(map(int, diff["changed"])) == sorted(changed.tolist())
+    assert sorted(map(int, diff["missing"])) == sorted(lost.tolist())
+    assert sorted(map(int, diff["extra"])) == extra_ids.tolist()
+    # only the drifted buckets' rows cross the wire, not the corpus
+    assert fetched < CORPUS * 0.03
@@ -0,0 +1,83 @@
+import pytest
+from app.core import cache as cache_module
+from app.core.cache import DOCUMENTS_TAG, QA_TAG, LRUCache, doc_tag
+from app.services.query_cache import HashingEmbedder, RetrievalCache
+from app.services.retrieval import RetrievalFilters, query_terms
+
+ENTRY = {
+    "hits": [{"source": "unit", "id": "u1", "document_id": "d1", "score": 0.4}],
+    "units": {"u1": {"num_label": "ماده ۱"}},
+    "qa_entries": {},
+}
+
+
+@pytest.fixture(autouse=True)
+def memory_backend():
+    previous = cache_module.get_cache()
+    cache_module.set_cache(LRUCache())
+    yield
+    cache_module.set_cache(previous)
+
+
+def test_exact_hit_on_folded_terms_and_saved_time():
+    qc = RetrievalCache()
+    filters = RetrievalFilters()
+    qc.set(query_terms("مهلت اعتراض به رأی چیست"), filters, 10, ENTRY, cost_seconds=0.25)
+    assert qc.get(query_terms("مهلت اعتراض به راي؟"), filters, 10) == ENTRY
+    assert qc.get(query_terms("مهلت اعتراض به رأی"), RetrievalFilters(doc_type=["law"]), 10) is None
+    assert qc.get(query_terms("مهلت اعتراض به رأی"), filters, 5) is None
+    # a reranker's rankings are kept apart from the first stage's
+    assert qc.get(query_terms("مهلت اعتراض به رأی"), filters, 10, "linear-abc") is None
+    stats = qc.stats()
+    assert (stats["hits"], stats["misses"], stats["saved_seconds"]) == (1, 3, 0.25)
+
+
+def test_sync_invalidation_drops_entries_holding_the_document():
+    qc = RetrievalCache()
+    terms = query_terms("مهلت اعتراض")
+    qc.set(terms, RetrievalFilters(), 10, ENTRY, 0.1)
+    cache_module.invalidate([doc_tag("d2")])
+    assert qc.get(terms, RetrievalFilters(), 10) == ENTRY
+    cache_module.invalidate([doc_tag("d1")])
+    assert qc.get(terms, RetrievalFilters(), 10) is None
+
+
+def test_short_result_sets_are_dropped_on_any_import_to_their_sources():
+    qc = RetrievalCache()
+    terms = query_terms("مهلت اعتراض")
+    qc.set(terms, RetrievalFilters(), 1, ENTRY, 0.1)
+    qc.set(terms, RetrievalFilters(), 10, ENTRY, 0.1)
+    qc.set(terms, RetrievalFilters(sources=("units",)), 10, ENTRY, 0.1)
+    # a new Q&A entry could join only the result set that has room and searches Q&A
+    cache_module.invalidate([QA_TAG])
+    assert qc.get(terms, RetrievalFilters(), 1) == ENTRY
+    assert qc.get(terms, RetrievalFilters(), 10) is None
+    assert qc.get(terms, RetrievalFilters(sources=("units",)), 10) == ENTRY
+    cache_module.invalidate([DOCUMENTS_TAG])
+    assert qc.get(terms, RetrievalFilters(sources=("units",)), 10) is None
+
+
+def test_semantic_match_for_near_repeats():
+    qc = RetrievalCache(similarity=0.8)
+    filters = RetrievalFilters()
+    qc.set(query_terms("مهلت اعتراض به رأی دادگاه تجدید نظر"), filters, 10, ENTRY, 0.1)
+    assert qc.get(query_terms("مهلت اعتراض رأی دادگاه تجدیدنظر"), filters, 10) == ENTRY
+    assert qc.get(query_terms("شرایط ثبت شرکت سهامی خاص"), filters, 10) is None
+    assert qc.stats()["semantic_hits"] == 1
+
+
+def test_semantic_index_is_bounded_and_forgets_dropped_entries():
+    qc = RetrievalCache(similarity=0.5, max_vectors=2)
+    filters = RetrievalFilters()
+    for text in ("مهلت اعتراض", "ثبت شرکت", "مالیات بر ارث"):
+        qc.set(query_terms(text), filters, 10, ENTRY, 0.1)
+    assert qc.stats()["vectors"] == 2
+    cache_module.invalidate([doc_tag("d1")])
+    assert qc.get(query_terms("مالیات ارث"), filters, 10) is None
+    assert qc.stats()["vectors"] < 2
+
+
+def test_hashing_embedder_is_unit_length():
+    vector = HashingEmbedder(dim=64)("مهلت اعتراض")
+    assert abs(float(vector @ vector) - 1.0) < 1e-5
+    assert not HashingEmbedder()("").any()
@@ -0,0 +1,170 @@
+import uuid
+import numpy as np
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from app.db.base import Base
+from app.models.embedding import EmbeddingCache, EmbeddingWatermark, RelatedLink
+from app.models.official import LegalUnit, OfficialDocument
+from app.models.qa import QAEntry
+from app.services.embeddings import HashingTextEmbedder
+from app.services.match_keys import unit_match_keys
+from app.services.related import blocked_top_k, related_qa, related_units, update_related
+from app.utils.text import normalize_key
+
+T0 = datetime(2024, 1, 1, 12, 0)
+
+
+def test_blocked_top_k_matches_full_product():
+    rng = np.random.default_rng(7)
+    a, b = rng.normal(size=(13, 8)).astype(np.float32), rng.normal(size=(29, 8)).astype(np.float32)
+    scores = a @ b.T
+    row_index, row_values, column_index, column_values = blocked_top_k(a, b, 4, chunk=5)
+    assert np.array_equal(row_index, np.argsort(-scores, axis=1)[:, :4])
+    assert np.allclose(row_values, -np.sort(-scores, axis=1)[:, :4])
+    assert np.array_equal(column_index, np.argsort(-scores.T, axis=1)[:, :4])
+    assert np.allclose(column_values, -np.sort(-scores.T, axis=1)[:, :4])
+    # fewer rows than k
+    assert blocked_top_k(a[:2], b, 4)[2].shape == (29, 2)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[
+        OfficialDocument.__table__, LegalUnit.__table__, QAEntry.__table__,
+        EmbeddingCache.__table__, EmbeddingWatermark.__table__, RelatedLink.__table__
+    ])
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def add_document(db, title, texts, updated_at):
+    doc = OfficialDocument(id=uuid.uuid4(), title=title, doc_type="law", status="published", updated_at=updated_at)
+    db.add(doc)
+    rows = unit_match_keys([
+        {"num_label": f"ماده {i}", "heading": None, "text_plain": text, "unit_type": "article", "order_index": i}
+        for i, text in enumerate(texts, start=1)
+    ])
+    units = [LegalUnit(id=uuid.uuid4(), document_id=doc.id, **row) for row in rows]
+    db.add_all(units)
+    db.commit()
+    return doc, units
+
+
+def add_entry(db, question, answer, updated_at):
+    entry = QAEntry(
+        id=uuid.uuid4(), question=question, answer=answer, topic_tags=[],
+        question_normalized=normalize_key(question), answer_normalized=normalize_key(answer), updated_at=updated_at
+    )
+    db.add(entry)
+    db.commit()
+    return entry
+
+
+def links(db):
+    return sorted((l.source, l.qa_id, l.unit_id, l.rank) for l in db.query(RelatedLink))
+
+
+def run(db, **kwargs):
+    return update_related(db, HashingTextEmbedder(dim=64), top_k=2, workers=1, block_size=2, overlap_seconds=0, **kwargs)
+
+
+def test_incremental_runs_match_a_rebuild(db):
+    _, (wage, notice, _) = add_document(db, "قانون کار", [
+        "کارفرما مکلف است مزد کارگر را در پایان هر ماه پرداخت کند",
+        "مهلت اعتراض به رای هیات ده روز از تاریخ ابلاغ است",
+        "ساعات کار هفتگی چهل و چهار ساعت است",
+    ], T0 - timedelta(hours=1))
+    tax, _ = add_document(db, "قانون مالیات", ["نرخ مالیات بر درآمد اجاره ده درصد است"], T0)
+    salary = add_entry(db, "مزد کارگر چه زمانی پرداخت می شود؟", "کارفرما باید مزد را در پایان هر ماه پرداخت کند", T0)
+    appeal = add_entry(db, "مهلت اعتراض به رای چقدر است؟", "ده روز از تاریخ ابلاغ رای", T0)
+
+    report = run(db)
+    assert report.rebuilt and (report.qa_entries, report.units_scanned, report.units_rescored) == (2, 4, 4)
+    assert report.embedded == 6
+    assert related_units(db, salary.id, 10)[0]["id"] == str(wage.id)
+    assert related_units(db, appeal.id, 1)[0]["id"] == str(notice.id)
+    assert [e["id"] for e in related_qa(db, notice.id, 10)][0] == str(appeal.id)
+    assert related_units(db, uuid.uuid4(), 10) is None and related_qa(db, uuid.uuid4(), 10) is None
+
+    # rows at the watermarks are read again, but the entries check out as unedited
+    first = links(db)
+    report = run(db)
+    assert not report.rebuilt and (report.changed_documents, report.units_scanned, report.qa_rescored) == (1, 1, 0)
+    assert links(db) == first
+
+    # a new document scans its own units (and the re-read one)
+    later = T0 + timedelta(hours=1)
+    _, (rent,) = add_document(db, "آیین نامه اجاره", ["مالیات اجاره ملک مسکونی ده درصد درآمد اجاره است"], later)
+    report = run(db)
+    assert (report.units_scanned, report.qa_rescored) == (2, 0)
+
+    # a changed entry is rescored against every unit; a withdrawn document drops out
+    entry = db.get(QAEntry, appeal.id)
+    entry.question, entry.question_normalized = "نرخ مالیات اجاره چند درصد است؟", normalize_key("نرخ مالیات اجاره چند درصد است؟")
+    entry.answer, entry.answer_normalized = "ده درصد درآمد اجاره", normalize_key("ده درصد درآمد اجاره")
+    entry.updated_at = later + timedelta(hours=1)
+    db.get(OfficialDocument, tax.id).deleted_at = later
+    db.get(OfficialDocument, tax.id).updated_at = later + timedelta(hours=1)
+    db.commit()
+    report = run(db)
+    assert not report.rebuilt and report.units_scanned == 4
+    assert related_units(db, appeal.id, 1)[0]["id"] == str(rent.id)
+    assert str(tax.id) not in {u["document_id"] for u in related_units(db, appeal.id, 10)}
+
+    incremental = links(db)
+    run(db, rebuild=True)
+    assert links(db) == incremental
+
+
+def test_resent_document_keeps_entry_lists_without_a_full_pass(db):
+    labour, _ = add_document(db, "قانون کار", [
+        "کارفرما مکلف است مزد کارگر را در پایان هر ماه پرداخت کند",
+        "مهلت اعتراض به رای هیات ده روز از تاریخ ابلاغ است",
+    ], T0)
+    add_document(db, "قانون مالیات", ["نرخ مالیات بر درآمد اجاره ده درصد است"], T0 - timedelta(hours=1))
+    salary = add_entry(db, "مزد کارگر چه زمانی پرداخت می شود؟", "کارفرما باید مزد را در پایان هر ماه پرداخت کند", T0)
+    run(db)
+
+    # sync replaces a resent document's units, with the same texts under new ids
+    later = T0 + timedelta(hours=1)
+    texts = [unit.text_plain for unit in db.query(LegalUnit).filter(LegalUnit.document_id == labour.id)]
+    db.query(LegalUnit).filter(LegalUnit.document_id == labour.id).delete()
+    rows = unit_match_keys([
+        {"num_label": f"ماده {i}", "heading": None, "text_plain": text, "unit_type": "article", "order_index": i}
+        for i, text in enumerate(texts, start=1)
+    ])
+    db.add_all([LegalUnit(id=uuid.uuid4(), document_id=labour.id, **row) for row in rows])
+    db.get(OfficialDocument, labour.id).updated_at = later
+    db.commit()
+
+    report = run(db)
+    assert (report.changed_documents, report.qa_rescored, report.units_scanned) == (1, 0, 2)
+    current = {unit.id for unit in db.query(LegalUnit).filter(LegalUnit.document_id == labour.id)}
+    assert {link["id"] for link in related_units(db, salary.id, 10)} & {str(u) for u in current}
+    incremental = links(db)
+    run(db, rebuild=True)
+    assert links(db) == incremental
+
+
+def test_related_qa_looks_the_unit_up_in_its_document(db):
+    _, (wage, hours) = add_document(db, "قانون کار", [
+        "کارفرما مکلف است مزد کارگر را در پایان هر ماه پرداخت کند",
+        "ساعات کار هفتگی چهل و چهار ساعت است",
+    ], T0)
+    salary = add_entry(db, "مزد کارگر چه زمانی پرداخت می شود؟", "کارفرما باید مزد را در پایان هر ماه پرداخت کند", T0)
+    run(db)
+    db.query(RelatedLink).filter(RelatedLink.source == "unit", RelatedLink.unit_id == hours.id).delete()
+    db.commit()
+
+    statements = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+    assert [e["id"] for e in related_qa(db, wage.id, 10)] == [str(salary.id)]
+    unit_lookup = [s for s in statements if "FROM legal_units" in s]
+    assert unit_lookup and "legal_units.document_id = " in unit_lookup[0]
+
+    # a unit without links is still known, just with an empty list
+    assert related_qa(db, hours.id, 10) == []
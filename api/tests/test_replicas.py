@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.db.replicas import ReplicaRouter, parse_position, format_position
+from app.models.sync import SyncWatermark
+
+T0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_db(tmp_path, name, position=None):
+    engine = create_engine(f"sqlite:///{tmp_path / name}")
+    SyncWatermark.__table__.create(engine)
+    if position is not None:
+        set_position(engine, position)
+    return engine
+
+
+def set_position(engine, position):
+    db = sessionmaker(bind=engine)()
+    db.query(SyncWatermark).delete()
+    db.add(SyncWatermark(last_imported_at=position))
+    db.commit()
+    db.close()
+
+
+def routed(router, min_position=None):
+    db, replica = router.session_for_read(min_position)
+    db.close()
+    return replica
+
+
+def test_position_round_trip():
+    assert parse_position(format_position(T0)) == T0
+    assert parse_position("2024-01-01T00:00:00Z") == T0
+    assert parse_position("2024-01-01T00:00:00") == T0
+    assert parse_position(None) is None
+
+
+def test_no_replicas_uses_primary(tmp_path):
+    primary = make_db(tmp_path, "primary.db", T0)
+    router = ReplicaRouter(sessionmaker(bind=primary))
+    assert routed(router) is None
+
+
+def test_lagging_replica_falls_back_until_caught_up(tmp_path):
+    clock = FakeClock()
+    primary = make_db(tmp_path, "primary.db", T0)
+    replica = make_db(tmp_path, "replica.db", T0)
+    router = ReplicaRouter(sessionmaker(bind=primary), [replica], health_interval=10, clock=clock)
+    assert routed(router) is router.replicas[0]
+
+    # read-your-writes: the client asks for a position the replica has not reached
+    later = T0 + timedelta(seconds=5)
+    set_position(primary, later)
+    router.note_position(later)
+    assert routed(router) is None
+    assert routed(router, min_position=later) is None
+
+    set_position(replica, later)
+    clock.now += 1
+    assert routed(router, min_position=later) is router.replicas[0]
+
+
+def test_unhealthy_replica_is_skipped_until_next_probe(tmp_path):
+    clock = FakeClock()
+    primary = make_db(tmp_path, "primary.db", T0)
+    broken = create_engine(f"sqlite:///{tmp_path / 'missing.db'}")  # no sync_watermarks table
+    router = ReplicaRouter(sessionmaker(bind=primary), [broken], health_interval=10, clock=clock)
+    assert routed(router) is None
+    assert router.status()["replicas"][0]["healthy"] is False
+
+    SyncWatermark.__table__.create(broken)
+    set_position(broken, T0)
+    clock.now += 5
+    assert routed(router) is None
+    clock.now += 5
+    assert routed(router) is router.replicas[0]
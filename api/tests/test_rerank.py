@@ -0,0 +1,118 @@
+import json
+import uuid
+import numpy as np
+import pytest
+from datetime import date
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.db.base import Base
+from app.models.embedding import EmbeddingCache
+from app.models.official import LegalUnit, OfficialDocument
+from app.models.qa import QAEntry
+from app.services.embeddings import HashingTextEmbedder, embed_missing, EmbeddingReport, unit_text
+from app.services.rerank import (
+    FEATURES, LinearReranker, Reranker, fit_weights, load_reranker, ndcg_at_k, recall_at_k, rerank_hits
+)
+from app.utils.text import normalize_key
+
+TODAY = date(2025, 1, 1)
+
+
+def test_metrics():
+    relevant = {"a": 2, "b": 1, "c": 0}
+    assert recall_at_k(["x", "a", "b"], relevant, 2) == 0.5
+    assert recall_at_k(["x"], {}, 5) == 0.0
+    assert ndcg_at_k(["a", "b", "x"], relevant, 3) == pytest.approx(1.0)
+    assert ndcg_at_k(["b", "a"], relevant, 2) < 1.0
+    assert ndcg_at_k(["x", "y"], relevant, 2) == 0.0
+
+
+def test_load_reranker(tmp_path):
+    assert load_reranker("none") is None
+    default = load_reranker("linear")
+    path = tmp_path / "weights.json"
+    path.write_text(json.dumps({"weights": {"lexical": 1.0, "authority": 2.0}}))
+    loaded = load_reranker("linear", str(path))
+    assert loaded.weights[FEATURES.index("authority")] == 2.0 and loaded.weights[FEATURES.index("vector")] == 0.0
+    # the weights name the model, so cached rankings of one do not serve the other
+    assert loaded.model_id != default.model_id and loaded.model_id == LinearReranker(json.loads(path.read_text())).model_id
+    with pytest.raises(ValueError):
+        load_reranker("app.services.rerank")
+    # a plugin must implement score
+    with pytest.raises(TypeError):
+        type("Unfinished", (Reranker,), {"model_id": "unfinished"})()
+
+
+def test_fit_weights_learns_the_informative_feature():
+    rng = np.random.default_rng(3)
+    features = rng.random((400, len(FEATURES)))
+    labels = (features[:, FEATURES.index("quality")] > 0.7).astype(float)
+    weights = fit_weights(features, labels)["weights"]
+    assert max(weights, key=weights.get) == "quality"
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[
+        OfficialDocument.__table__, LegalUnit.__table__, QAEntry.__table__, EmbeddingCache.__table__
+    ])
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def add_unit(db, doc_type, text, amended_date=None):
+    doc = OfficialDocument(id=uuid.uuid4(), title="t", doc_type=doc_type, status="published", amended_date=amended_date)
+    unit = LegalUnit(
+        id=uuid.uuid4(), document_id=doc.id, unit_type="article", num_label="ماده ۱", text_plain=text,
+        text_plain_normalized=normalize_key(text), order_index=1
+    )
+    db.add_all([doc, unit])
+    db.commit()
+    return unit
+
+
+def hit(unit, score):
+    return {"source": "unit", "id": str(unit.id), "document_id": str(unit.document_id), "score": score}
+
+
+def test_rerank_promotes_authority_recency_and_quality(db):
+    law = add_unit(db, "law", "مهلت اعتراض ده روز است", date(2024, 6, 1))
+    guideline = add_unit(db, "guideline", "مهلت اعتراض ده روز است", date(2010, 1, 1))
+    entry = QAEntry(
+        id=uuid.uuid4(), question="مهلت اعتراض؟", answer="ده روز", topic_tags=[], quality_score=0.9,
+        question_normalized=normalize_key("مهلت اعتراض؟"), answer_normalized=normalize_key("ده روز")
+    )
+    db.add(entry)
+    db.commit()
+    candidates = [[
+        hit(guideline, 2.0), hit(law, 1.8),
+        {"source": "qa", "id": str(entry.id), "score": 1.0},
+        {"source": "unit", "id": str(uuid.uuid4()), "document_id": str(uuid.uuid4()), "score": 5.0},  # since deleted
+    ]]
+
+    reranker = LinearReranker({"weights": {"lexical": 1.0, "recency": 0.5, "authority": 0.5}})
+    [ranked] = rerank_hits(db, reranker, ["مهلت اعتراض"], candidates, 10, today=TODAY)
+    assert [h["id"] for h in ranked] == [str(law.id), str(guideline.id), str(entry.id)]
+    assert ranked[1]["lexical_score"] == 2.0 and ranked[0]["score"] > ranked[1]["score"]
+
+    # quality lifts the answer; the cut applies after reranking
+    reranker = LinearReranker({"weights": {"lexical": 1.0, "quality": 1.0}})
+    [ranked] = rerank_hits(db, reranker, ["مهلت اعتراض"], candidates, 1, today=TODAY)
+    assert [h["id"] for h in ranked] == [str(entry.id)]
+
+
+def test_vector_feature_uses_cached_embeddings(db):
+    embedder = HashingTextEmbedder(dim=64)
+    close = add_unit(db, "law", "کارفرما مکلف به پرداخت مزد ماهانه کارگر است")
+    far = add_unit(db, "law", "نرخ مالیات بر ارزش افزوده نه درصد است")
+    row = db.query(LegalUnit).filter(LegalUnit.id.in_([close.id, far.id])).all()
+    embed_missing(db, embedder, dict(unit_text(r) for r in row), 16, EmbeddingReport())
+    reranker = LinearReranker({"weights": {"vector": 1.0}})
+    candidates = [[hit(far, 3.0), hit(close, 1.0)]]
+    [ranked] = rerank_hits(db, reranker, ["پرداخت مزد کارگر"], candidates, 2, embedder, TODAY)
+    assert [h["id"] for h in ranked] == [str(close.id), str(far.id)]
+    # without an embedder the vector feature is zero and the first-stage order stands
+    [ranked] = rerank_hits(db, LinearReranker({"weights": {"lexical": 1.0, "vector": 1.0}}), ["پرداخت مزد کارگر"], candidates, 2, None, TODAY)
+    assert [h["id"] for h in ranked] == [str(far.id), str(close.id)]
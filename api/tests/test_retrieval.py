@@ -0,0 +1,46 @@
+import uuid
+from app.services.retrieval import RetrievalFilters, group_hits, query_terms, retrieve, to_tsquery_text
+
+
+def test_query_terms_fold_and_drop_stopwords():
+    assert query_terms("مهلت اعتراض به رأی چیست؟") == ["مهلت", "اعتراض", "رای"]
+    assert query_terms("ماده ۱۲ و ماده 12") == ["ماده", "12"]
+    assert query_terms("و به از") == []
+
+
+def test_to_tsquery_text_ors_quoted_terms():
+    assert to_tsquery_text(["مهلت", "12"]) == "'مهلت' | '12'"
+
+
+def test_group_hits_orders_and_cuts_per_query():
+    doc, a, b, c = (uuid.uuid4() for _ in range(4))
+    grouped = group_hits(3, [
+        (0, "unit", a, doc, 0.2),
+        (0, "qa", b, None, 0.5),
+        (0, "unit", c, doc, 0.1),
+        (2, "unit", a, doc, 0.3),
+    ], limit=2)
+    assert [h["id"] for h in grouped[0]] == [str(b), str(a)]
+    assert grouped[0][1]["document_id"] == str(doc)
+    assert grouped[1] == []
+    assert grouped[2] == [{"source": "unit", "id": str(a), "score": 0.3, "document_id": str(doc)}]
+
+
+def test_retrieve_without_terms_skips_the_database():
+    result = retrieve(None, ["و به", "از"], RetrievalFilters(), limit=5)
+    assert [r["hits"] for r in result["results"]] == [[], []]
+    assert result["stats"] == {"queries": 2, "hits": 0, "distinct_hits": 0, "cached": 0}
+
+
+def test_filters_read_the_serving_columns():
+    from app.services.retrieval import _qa_filters, _unit_filters
+    params = {}
+    doc = uuid.uuid4()
+    where = _unit_filters(RetrievalFilters(doc_type=["law"], unit_type=["article"], document_ids=[doc]), params)
+    assert where == (
+        " AND s.doc_type = ANY(CAST(:doc_type AS text[]))"
+        " AND s.unit_type = ANY(CAST(:unit_type AS text[]))"
+        " AND s.document_id = ANY(CAST(:document_ids AS uuid[]))"
+    )
+    assert params == {"doc_type": ["law"], "unit_type": ["article"], "document_ids": [str(doc)]}
+    assert _qa_filters(RetrievalFilters(), {}) == ""
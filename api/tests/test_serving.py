@@ -0,0 +1,70 @@
+import uuid
+from types import SimpleNamespace
+from sqlalchemy.dialects import postgresql
+from app.models.serving import ServingQA, ServingUnit
+from app.services.serving import (
+    DOCUMENT_SERVABLE, QA_SERVABLE, refresh_documents, refresh_qa, servable_document, servable_qa
+)
+
+
+def compiled(predicate):
+    sql = str(predicate.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    return sql.replace("official_documents.", "d.").replace("qa_entries.", "e.")
+
+
+def test_orm_predicates_match_sql():
+    for predicate, sql in ((servable_document(), DOCUMENT_SERVABLE), (servable_qa(), QA_SERVABLE)):
+        assert compiled(predicate).replace("::VARCHAR", "") == sql
+
+
+def test_empty_refresh_skips_the_database():
+    assert refresh_documents(None, []) == 0
+    assert refresh_qa(None, iter(())) == 0
+
+
+class RecordingQuery:
+    def __init__(self, session, model):
+        self.session, self.model = session, model
+
+    def filter(self, criterion):
+        self.criterion = criterion
+        return self
+
+    def delete(self, synchronize_session):
+        self.session.deleted.append((self.model, self.criterion))
+        return 0
+
+
+class RecordingSession:
+    """Records the deletes and statements refresh_* issue, as PostgreSQL is not available here"""
+
+    def __init__(self, rowcount):
+        self.rowcount, self.deleted, self.executed = rowcount, [], []
+
+    def query(self, model):
+        return RecordingQuery(self, model)
+
+    def execute(self, statement, params):
+        self.executed.append((str(statement), params))
+        return SimpleNamespace(rowcount=self.rowcount)
+
+
+def test_refresh_replaces_the_rows_of_the_given_ids():
+    a, b = uuid.uuid4(), uuid.uuid4()
+    db = RecordingSession(rowcount=3)
+    assert refresh_documents(db, [a, b, a]) == 3
+    (model, criterion), = db.deleted
+    assert model is ServingUnit and criterion.compare(ServingUnit.document_id.in_([a, b]))
+    (sql, params), = db.executed
+    assert sql.lstrip().startswith("INSERT INTO serving_units") and DOCUMENT_SERVABLE in sql
+    assert sql.rstrip().endswith("AND u.document_id = ANY(CAST(:ids AS uuid[]))")
+    assert params == {"ids": [str(a), str(b)]}
+
+    db = RecordingSession(rowcount=1)
+    assert refresh_qa(db, (q for q in [b, b])) == 1
+    (model, criterion), = db.deleted
+    assert model is ServingQA and criterion.compare(ServingQA.id.in_([b]))
+    (sql, params), = db.executed
+    assert sql.lstrip().startswith("INSERT INTO serving_qa") and QA_SERVABLE in sql
+    assert sql.rstrip().endswith("AND e.id = ANY(CAST(:ids AS uuid[]))")
+    assert params == {"ids": [str(b)]}
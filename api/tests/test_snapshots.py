@@ -0,0 +1,150 @@
+import uuid
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.db.base import Base
+from app.db.bundle import BundleWatcher, bundle_info, bundle_sessionmaker
+from app.models.official import LegalUnit, OfficialDocument
+from app.models.qa import QAEntry
+from app.services.citations import resolve_citations
+from app.services.context import build_context
+from app.services.match_keys import unit_match_keys
+from app.services.query_cache import RetrievalCache
+from app.services.retrieval import RetrievalFilters, retrieve
+from app.services.snapshots import apply_delta, build_snapshot, read_meta
+from app.utils.text import normalize_key
+
+T0 = datetime(2024, 1, 1, 12, 0)
+
+
+@pytest.fixture
+def primary():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[
+        OfficialDocument.__table__, LegalUnit.__table__, QAEntry.__table__
+    ])
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture(autouse=True)
+def no_retrieval_cache(monkeypatch):
+    monkeypatch.setattr("app.services.retrieval.query_cache", RetrievalCache(enabled=False))
+
+
+def add_document(db, title, units, status="published", updated_at=T0):
+    doc = OfficialDocument(
+        id=uuid.uuid4(), title=title, title_normalized=normalize_key(title), doc_type="law",
+        jurisdiction="Iran", authority="Majlis", status=status, updated_at=updated_at,
+        file_s3="s3://advisor-docs/raw/x.pdf", text_normalized="متن کامل"
+    )
+    db.add(doc)
+    rows = unit_match_keys([
+        {"num_label": label, "heading": None, "text_plain": text, "unit_type": unit_type, "order_index": i}
+        for i, (unit_type, label, text) in enumerate(units, start=1)
+    ])
+    for row in rows:
+        db.add(LegalUnit(id=uuid.uuid4(), document_id=doc.id, **row))
+    db.commit()
+    return doc
+
+
+def add_qa(db, question, answer, tags, updated_at=T0, **overrides):
+    entry = QAEntry(
+        id=uuid.uuid4(), question=question, answer=answer, topic_tags=tags,
+        question_normalized=normalize_key(question), answer_normalized=normalize_key(answer),
+        updated_at=updated_at, **overrides
+    )
+    db.add(entry)
+    db.commit()
+    return entry
+
+
+def open_bundle(path):
+    return bundle_sessionmaker(str(path))()
+
+
+def test_full_snapshot_serves_the_read_paths(primary, tmp_path):
+    labour = add_document(primary, "قانون کار", [
+        ("article", "ماده ۱", "مهلت اعتراض کارگر ده روز است"),
+        ("note", "تبصره ۱", "مهلت در تعطیلات تمدید می‌شود"),
+        ("article", "ماده ۲", "کارفرما مکلف به پرداخت مزد است"),
+    ])
+    add_document(primary, "پیش نویس قانون", [("article", "ماده ۱", "مهلت اعتراض پیش نویس")], status="draft")
+    qa = add_qa(primary, "مهلت اعتراض چقدر است؟", "ده روز", ["کار"])
+    add_qa(primary, "مهلت اعتراض محرمانه", "شماره تماس", ["کار"], pii_status="contains")
+
+    meta = build_snapshot(primary, str(tmp_path / "bundle.sqlite"))
+    assert (meta["kind"], meta["documents"], meta["legal_units"], meta["qa_entries"]) == ("full", "1", "3", "1")
+    db = open_bundle(tmp_path / "bundle.sqlite")
+    assert bundle_info(db)["snapshot_id"] == meta["snapshot_id"]
+    assert db.get(OfficialDocument, labour.id).file_s3 is None
+
+    result = retrieve(db, ["مهلت اعتراض"], RetrievalFilters(), 10)
+    hits = result["results"][0]["hits"]
+    assert {h["source"] for h in hits} == {"unit", "qa"}
+    assert all(h["document_id"] == str(labour.id) for h in hits if h["source"] == "unit")
+    assert {h["id"] for h in hits if h["source"] == "qa"} == {str(qa.id)}
+    assert result["qa_entries"][str(qa.id)]["topic_tags"] == ["کار"]
+    units = retrieve(db, ["مهلت"], RetrievalFilters(sources=["units"], unit_type=["note"]), 10)
+    assert [u["num_label"] for u in units["units"].values()] == ["تبصره ۱"]
+    assert retrieve(db, ["مهلت"], RetrievalFilters(sources=["qa"], topic_tags=["مالیات"]), 10)["stats"]["hits"] == 0
+
+    resolved = resolve_citations(db, [("تبصره ۱ ماده ۱ قانون کار", None), ("ماده ۲", labour.id), ("ماده ۹ قانون کار", None)])
+    assert [r["status"] for r in resolved] == ["resolved", "resolved", "unit_not_found"]
+    assert resolved[0]["unit"]["num_label"] == "تبصره ۱"
+    assert resolved[0]["document"] == {"id": str(labour.id), "title": "قانون کار"}
+    assert resolve_citations(db, [("ماده ۱ پیش نویس قانون", None)])[0]["status"] == "document_not_found"
+
+    note = next(h for h in retrieve(db, ["تعطیلات"], RetrievalFilters(sources=["units"]), 1)["results"][0]["hits"])
+    pack = build_context(db, [{**note, "id": uuid.UUID(note["id"]), "document_id": labour.id}], budget=1000, window=0)
+    passage = pack["passages"][0]
+    assert passage["document_title"] == "قانون کار"
+    # the note and its enclosing article
+    assert [(u["num_label"], u["is_hit"]) for u in passage["units"]] == [("ماده ۱", False), ("تبصره ۱", True)]
+
+
+def test_delta_replaces_changed_rows_and_carries_deletions(primary, tmp_path):
+    labour = add_document(primary, "قانون کار", [("article", "ماده ۱", "مهلت اعتراض ده روز")])
+    tax = add_document(primary, "قانون مالیات", [("article", "ماده ۱", "نرخ مالیات")])
+    qa = add_qa(primary, "مهلت اعتراض", "ده روز", ["کار"])
+    bundle = tmp_path / "bundle.sqlite"
+    base = build_snapshot(primary, str(bundle))
+    assert datetime.fromisoformat(base["watermark"]) == T0
+
+    later = T0 + timedelta(hours=1)
+    for unit in primary.query(LegalUnit).filter(LegalUnit.document_id == labour.id):
+        unit.text_plain_normalized = "مهلت اعتراض بیست روز"
+    primary.get(OfficialDocument, labour.id).updated_at = later
+    tax_row = primary.get(OfficialDocument, tax.id)
+    tax_row.deleted_at, tax_row.updated_at = later, later
+    entry = primary.get(QAEntry, qa.id)
+    entry.moderation_status, entry.updated_at = "unpublished", later
+    added = add_qa(primary, "نرخ مالیات", "ده درصد", ["مالیات"], updated_at=later)
+    primary.commit()
+
+    delta = build_snapshot(primary, str(tmp_path / "delta.sqlite"), base=read_meta(str(bundle)), overlap_seconds=0)
+    assert (delta["kind"], delta["base_id"]) == ("delta", base["snapshot_id"])
+    assert (delta["deleted_documents"], delta["deleted_qa_entries"], delta["qa_entries"]) == ("1", "1", "1")
+
+    changes = []
+    watcher = BundleWatcher(str(bundle), lambda: changes.append(1))
+    watcher.check()
+    meta = apply_delta(str(bundle), str(tmp_path / "delta.sqlite"))
+    assert watcher.check() and changes == [1]
+    assert (meta["snapshot_id"], meta["documents"], meta["qa_entries"]) == (delta["snapshot_id"], "1", "1")
+
+    db = open_bundle(bundle)
+    hits = retrieve(db, ["بیست"], RetrievalFilters(sources=["units"]), 10)["results"][0]["hits"]
+    assert [h["document_id"] for h in hits] == [str(labour.id)]
+    assert retrieve(db, ["ده"], RetrievalFilters(sources=["units"]), 10)["stats"]["hits"] == 0
+    assert retrieve(db, ["نرخ"], RetrievalFilters(), 10)["qa_entries"].keys() == {str(added.id)}
+    # the withdrawn document stays as a deleted row for the catalog, without units
+    assert db.get(OfficialDocument, tax.id).deleted_at is not None
+    assert db.query(LegalUnit).filter(LegalUnit.document_id == tax.id).count() == 0
+    assert resolve_citations(db, [("ماده ۱ قانون مالیات", None)])[0]["status"] == "document_not_found"
+
+    with pytest.raises(ValueError, match="applies to snapshot"):
+        apply_delta(str(bundle), str(tmp_path / "delta.sqlite"))
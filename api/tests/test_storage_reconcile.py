@@ -0,0 +1,131 @@
+import uuid
+import pytest
+from datetime import timedelta
+from types import SimpleNamespace
+from minio.deleteobjects import DeleteError
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from app.db.base import Base
+from app.models.official import OfficialDocument
+from app.utils.minio_helper import MinIOHelper
+from app.services import storage_reconcile
+from app.services.storage_reconcile import merge_join, reconcile_storage, shard_prefixes, successor
+
+
+class FakeMinio:
+    """Minimal in-memory stand-in for the Minio client"""
+
+    def __init__(self, names):
+        self.names = sorted(names)
+        self.presign_calls = 0
+
+    def list_objects(self, bucket, prefix="", recursive=False, start_after=None):
+        for name in self.names:
+            if name.startswith(prefix) and (start_after is None or name > start_after):
+                yield SimpleNamespace(object_name=name)
+
+    def remove_objects(self, bucket, delete_object_list):
+        for obj in delete_object_list:
+            if obj.name in self.names:
+                self.names.remove(obj.name)
+            else:
+                yield DeleteError("NoSuchKey", "missing", obj.name, None)
+
+    def presigned_get_object(self, bucket, object_name, expires):
+        assert isinstance(expires, timedelta)
+        self.presign_calls += 1
+        return f"https://minio/{bucket}/{object_name}?X-Amz-Expires={int(expires.total_seconds())}"
+
+
+def make_helper(names):
+    helper = MinIOHelper.__new__(MinIOHelper)
+    helper.client = FakeMinio(names)
+    helper.bucket_name = "advisor-docs"
+    return helper
+
+
+def test_iter_files_is_lazy_and_prefixed():
+    helper = make_helper(["raw/a/1.pdf", "raw/b/2.pdf", "other/x"])
+    names = helper.iter_files(prefix="raw/")
+    assert next(names) == "raw/a/1.pdf"
+    assert list(names) == ["raw/b/2.pdf"]
+    assert helper.list_files("raw/") == ["raw/a/1.pdf", "raw/b/2.pdf"]
+
+
+def test_delete_files_returns_failures():
+    helper = make_helper(["raw/a/1.pdf", "raw/b/2.pdf"])
+    failed = helper.delete_files(n for n in ["raw/a/1.pdf", "raw/missing"])
+    assert failed == ["raw/missing"]
+    assert helper.client.names == ["raw/b/2.pdf"]
+
+
+def test_get_file_urls_batch():
+    helper = make_helper([])
+    urls = helper.get_file_urls(["raw/a/1.pdf", "raw/b/2.pdf"], expires_in_seconds=60)
+    assert set(urls) == {"raw/a/1.pdf", "raw/b/2.pdf"}
+    assert urls["raw/a/1.pdf"].endswith("X-Amz-Expires=60")
+
+
+def test_merge_join_finds_orphans_and_dangling():
+    objects = ["raw/0/a", "raw/0/b", "raw/0/d"]
+    refs = [("doc1", "raw/0/b"), ("doc2", "raw/0/b"), ("doc3", "raw/0/c"), ("doc4", "raw/0/e")]
+    result = list(merge_join(objects, refs))
+    assert result == [
+        ("orphan", None, "raw/0/a"),
+        ("dangling", "doc3", "raw/0/c"),
+        ("orphan", None, "raw/0/d"),
+        ("dangling", "doc4", "raw/0/e"),
+    ]
+
+
+def test_merge_join_empty_sides():
+    assert list(merge_join([], [])) == []
+    assert list(merge_join(["k"], [])) == [("orphan", None, "k")]
+    assert list(merge_join([], [("d", "k")])) == [("dangling", "d", "k")]
+
+
+def test_shard_prefixes_cover_the_whole_prefix():
+    shards = shard_prefixes("raw/")
+    assert len(shards) == 16
+    assert shards[0] == (None, "raw/1") and shards[9] == ("raw/9", "raw/a")
+    assert shards[-1] == ("raw/f", None)
+    assert successor("raw/") == "raw0" and successor("") is None
+
+
+@pytest.fixture
+def documents(tmp_path, monkeypatch):
+    """A documents table behind storage_reconcile.SessionLocal, with PostgreSQL's "C" collation"""
+    engine = create_engine(f"sqlite:///{tmp_path}/documents.db", connect_args={"check_same_thread": False})
+    event.listen(engine, "connect", lambda conn, _: conn.create_collation("C", lambda a, b: (a > b) - (a < b)))
+    Base.metadata.create_all(engine, tables=[OfficialDocument.__table__])
+    session_factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(storage_reconcile, "SessionLocal", session_factory)
+
+    def add(*names):
+        db = session_factory()
+        db.add_all([
+            OfficialDocument(id=uuid.uuid4(), title=name, doc_type="law", file_s3=f"s3://advisor-docs/{name}")
+            for name in names
+        ])
+        db.commit()
+        db.close()
+    return add
+
+
+def test_reconcile_storage_covers_keys_outside_the_hex_alphabet(documents):
+    objects = [
+        "raw/0a/doc.pdf", "raw/9f/doc.pdf", "raw/A1/upper.pdf", "raw/f0/doc.pdf",
+        "raw/zz/not-a-uuid.pdf", "raw/-/dash.pdf", "raw/قانون.pdf", "other/x.pdf",
+    ]
+    helper = make_helper(objects)
+    documents("raw/0a/doc.pdf", "raw/9f/doc.pdf", "raw/B2/missing.pdf", "raw/~/missing.pdf", "raw/f0/doc.pdf")
+
+    report = reconcile_storage(prefix="raw/", max_workers=4, helper=helper)
+    assert report.objects_scanned == 7 and report.references_scanned == 5
+    assert sorted(report.orphaned_sample) == sorted(["raw/A1/upper.pdf", "raw/zz/not-a-uuid.pdf", "raw/-/dash.pdf", "raw/قانون.pdf"])
+    assert sorted(name for _, name in report.dangling_sample) == ["raw/B2/missing.pdf", "raw/~/missing.pdf"]
+
+    # every key of the bucket under an empty prefix, each in one shard
+    report = reconcile_storage(prefix="", max_workers=4, helper=helper, delete_orphans=True)
+    assert report.objects_scanned == 8 and report.orphaned_count == 5 and report.dangling_count == 2
+    assert sorted(helper.client.names) == ["raw/0a/doc.pdf", "raw/9f/doc.pdf", "raw/f0/doc.pdf"]
@@ -0,0 +1,148 @@
+import uuid
+import pytest
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.db.base import Base
+from app.main import app
+from app.models.official import LegalUnit, OfficialDocument, UnitCitation
+from app.routers import suggest as suggest_router
+from app.services import suggest as suggest_service
+from app.services.suggest import PrefixIndex, SuggestIndex, document_labels, query_key
+from app.utils.text import normalize_key
+
+T0 = datetime(2024, 1, 1, 12, 0)
+
+
+def test_prefix_index_matches_word_starts():
+    index = PrefixIndex(["قانون کار", "قانون آیین دادرسی مدنی", "آیین نامه اجرایی قانون کار", "قانونی"], [0, 2, 1, 0])
+    # popularity plus a bonus for starting the text; ties in text order
+    assert [i for i, _ in index.top("قانون", 10)] == [1, 0, 2, 3]
+    assert [i for i, _ in index.top("آیین", 10)] == [1, 2]
+    assert [i for i, _ in index.top(query_key("قانون "), 10)] == [1, 0, 2]
+    assert index.top("دادرسی م", 10)[0][0] == 1 and index.top("مدنیات", 10) == []
+    # one completion per text, though "قانون" starts two of its words
+    assert len(index.top("قانون", 10)) == 4 and index.text(2) == "آیین نامه اجرایی قانون کار"
+    assert [i for i, _ in index.top("قانون", 1)] == [1]
+
+    labels = PrefixIndex(["ماده 1", "ماده 12", "تبصره 1"], [3, 1, 2], word_starts=False)
+    assert [i for i, _ in labels.top("ماده 1", 10)] == [0, 1]
+    assert labels.top("1", 10) == []
+
+
+def test_query_key_folds_like_the_index():
+    assert query_key("قانون  كار") == normalize_key("قانون کار")
+    assert query_key("ماده ۱۲") == "ماده 12"
+    assert query_key("قانون ") == "قانون " and query_key(" ") == ""
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[OfficialDocument.__table__, LegalUnit.__table__, UnitCitation.__table__])
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def add_document(db, title, labels=(), updated_at=T0):
+    doc = OfficialDocument(
+        id=uuid.uuid4(), title=title, title_normalized=normalize_key(title), doc_type="law",
+        status="published", updated_at=updated_at
+    )
+    db.add(doc)
+    db.add_all([
+        LegalUnit(
+            id=uuid.uuid4(), document_id=doc.id, unit_type="article", num_label=label,
+            num_label_normalized=normalize_key(label), order_index=i
+        )
+        for i, label in enumerate(labels)
+    ])
+    db.commit()
+    return doc
+
+
+def cite(db, source, target):
+    db.add(UnitCitation(
+        source_document_id=source.id, source_unit_id=uuid.uuid4(), target_document_id=target.id, citation="ماده 1"
+    ))
+    db.commit()
+
+
+def titles(index, prefix):
+    return [item["title"] for item in index.titles(prefix, 10)]
+
+
+def test_load_ranks_by_citing_documents_and_serves_labels(db):
+    labour = add_document(db, "قانون کار", ["ماده ۱", "ماده ۲", "ماده ۱۲"])
+    procedure = add_document(db, "قانون آیین دادرسی مدنی", ["ماده ۱", "ماده ۱۲"])
+    rules = add_document(db, "آیین نامه اجرایی قانون کار", ["ماده ۱"])
+    add_document(db, "قانون پیش نویس", []).status = "draft"
+    db.commit()
+    for source in (labour, rules):
+        cite(db, source, procedure)
+    cite(db, procedure, procedure)  # a document citing itself does not count
+
+    index = SuggestIndex()
+    assert index.refresh(db, overlap_seconds=0) == 4 and index.loaded
+    assert titles(index, "قانون") == ["قانون آیین دادرسی مدنی", "قانون کار", "آیین نامه اجرایی قانون کار"]
+    assert titles(index, "قانون ک") == ["قانون کار", "آیین نامه اجرایی قانون کار"]
+    # two citing documents outweigh starting the title
+    assert titles(index, "آيين") == ["قانون آیین دادرسی مدنی", "آیین نامه اجرایی قانون کار"]
+    assert {t["id"] for t in index.titles("کار", 10)} == {str(labour.id), str(rules.id)}
+
+    assert [(l["label"], l["units"]) for l in index.labels("ماده 1", 10)] == [("ماده ۱", 3), ("ماده ۱۲", 2)]
+    assert [u["label"] for u in document_labels(db, labour.id, "ماده ۱", 10)] == ["ماده ۱", "ماده ۱۲"]
+    assert document_labels(db, uuid.uuid4(), "ماده", 10) is None
+    assert index.stats()["titles"] == 3 and index.stats()["labels"] == 3
+
+
+def test_refresh_applies_changed_titles_incrementally(db, monkeypatch):
+    labour = add_document(db, "قانون کار")
+    tax = add_document(db, "قانون مالیات های مستقیم")
+    index = SuggestIndex()
+    index.load(db)
+    snapshot = index._snapshot
+
+    # an unchanged re-read from the overlap window leaves the snapshot alone
+    assert index.refresh(db, overlap_seconds=60) == 2
+    assert index._snapshot is snapshot
+
+    later = T0 + timedelta(minutes=5)
+    row = db.get(OfficialDocument, labour.id)
+    row.title, row.title_normalized, row.updated_at = "قانون کار و تامین اجتماعی", normalize_key("قانون کار و تامین اجتماعی"), later
+    db.get(OfficialDocument, tax.id).deleted_at = later
+    db.get(OfficialDocument, tax.id).updated_at = later
+    added = add_document(db, "قانون تجارت", updated_at=later)
+    index.refresh(db, overlap_seconds=0)
+    assert index.stats()["pending"] == 2
+    assert titles(index, "قانون") == ["قانون تجارت", "قانون کار و تامین اجتماعی"]
+    assert titles(index, "تامین") == ["قانون کار و تامین اجتماعی"] and titles(index, "مالیات") == []
+
+    # past the pending limit, the arrays are rebuilt with the same answers
+    monkeypatch.setattr(suggest_service, "PENDING_LIMIT", 0)
+    row.updated_at = later + timedelta(minutes=1)
+    row.title = row.title + " "
+    db.commit()
+    index.refresh(db, overlap_seconds=0)
+    assert index.stats()["pending"] == 0 and index.stats()["titles"] == 2
+    assert titles(index, "قانون") == ["قانون تجارت", "قانون کار و تامین اجتماعی "]
+    assert index.titles("تجارت", 10)[0]["id"] == str(added.id)
+
+
+def test_suggest_endpoint(db, monkeypatch):
+    add_document(db, "قانون کار", ["ماده ۱"])
+    index = SuggestIndex()
+    monkeypatch.setattr(suggest_router, "suggest_index", index)
+    client = TestClient(app)
+    assert client.get("/suggest", params={"q": "قانون"}).status_code == 503
+
+    index.load(db)
+    response = client.get("/suggest", params={"q": "قانو"})
+    assert response.status_code == 200
+    data = response.json()
+    assert [t["title"] for t in data["titles"]] == ["قانون کار"] and data["labels"] == []
+    assert client.get("/suggest", params={"q": "ماده", "kind": "label"}).json()["labels"][0]["label"] == "ماده ۱"
+    assert client.get("/suggest", params={"q": "قانون", "limit": 1000}).status_code == 400
+    assert client.get("/suggest/stats").json()["titles"] == 1
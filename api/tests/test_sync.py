@@ -3,7 +3,11 @@ from fastapi.testclient import TestClient
 from app.main import app
 from app.core.settings import settings
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.models.sync import SyncWatermark
+from app.routers.sync import advance_sync_position
 
 client = TestClient(app)
 
@@ -77,3 +81,19 @@ def test_sync_import_unauthorized():
     headers = {"X-Bridge-Token": "invalid_token"}
     response = client.post("/sync/import", json=payload, headers=headers)
     assert response.status_code == 401
+
+
+def test_sync_position_never_moves_backwards():
+    engine = create_engine("sqlite://")
+    SyncWatermark.__table__.create(engine)
+    db = sessionmaker(bind=engine)()
+    first = advance_sync_position(db)
+    db.commit()
+    assert advance_sync_position(db) >= first
+    db.commit()
+    # a position stored by an import that committed with a later clock is kept
+    ahead = datetime.now(timezone.utc) + timedelta(hours=1)
+    db.query(SyncWatermark).one().last_imported_at = ahead
+    db.commit()
+    assert advance_sync_position(db) == ahead
+    db.close()
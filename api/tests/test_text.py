@@ -0,0 +1,24 @@
+from app.services.match_keys import unit_match_keys
+from app.utils.text import normalize_batch, normalize_key
+
+
+def test_normalize_key_folds_variants():
+    assert normalize_key("ماده ۱۲") == normalize_key("ماده ١٢") == "ماده 12"
+    assert normalize_key("مي‌شود") == normalize_key("میشود") == "میشود"
+    assert normalize_key("كِتابـها  و  مسؤول") == "کتابها و مسوول"
+    assert normalize_key("  Article\n\tONE ") == "article one"
+    assert normalize_key("إعلام أولية") == "اعلام اولیه"
+    assert normalize_key(None) is None
+
+
+def test_normalize_batch_matches_single_calls():
+    texts = ["ماده ۱۲", None, "", " بند  الف ", "‌", "a\x00b", "تبصره ۳ \n"] * 700
+    assert normalize_batch(texts) == [normalize_key(t) if t else t for t in texts]
+    assert normalize_batch([]) == []
+
+
+def test_unit_match_keys_fills_shadow_columns():
+    rows = unit_match_keys([{"num_label": "ماده ۱", "heading": None, "text_plain": "متن  ماده"}])
+    assert rows[0]["num_label_normalized"] == "ماده 1"
+    assert rows[0]["heading_normalized"] is None
+    assert rows[0]["text_plain_normalized"] == "متن ماده"
@@ -0,0 +1,68 @@
+import json
+import uuid
+import pytest
+from datetime import date
+from types import SimpleNamespace
+from fastapi.exceptions import RequestValidationError
+from app.routers.sync import SyncImportRequest, sync_decoder
+from app.services.catalog import DocumentCatalog
+from app.services.tombstones import split_tombstones
+from app.utils.fast_decode import TombstoneStruct
+
+
+def body(tombstones):
+    return json.dumps({"tombstones": tombstones, "batch_ts": "2024-01-01T00:00:00Z"}).encode("utf-8")
+
+
+def test_tombstones_decode_on_both_paths():
+    doc_id, qa_id = str(uuid.uuid4()), str(uuid.uuid4())
+    raw = body([
+        {"kind": "document", "id": doc_id, "effective_date": "2024-03-01"},
+        {"kind": "qa_entry", "id": qa_id},
+    ])
+    fast = sync_decoder.decode(raw)
+    slow = SyncImportRequest.model_validate_json(raw)
+    assert isinstance(fast.tombstones[0], TombstoneStruct)
+    for a, b in zip(fast.tombstones, slow.tombstones):
+        assert (a.kind, a.id, a.effective_date) == (b.kind, b.id, b.effective_date)
+    assert fast.tombstones[0].effective_date == date(2024, 3, 1)
+    assert sync_decoder.decode(body([])).tombstones == []
+
+
+def test_unknown_tombstone_kind_is_rejected():
+    with pytest.raises(RequestValidationError):
+        sync_decoder.decode(body([{"kind": "legal_unit", "id": str(uuid.uuid4())}]))
+
+
+def test_split_tombstones():
+    a, b, q = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    tombstones = [
+        SimpleNamespace(kind="document", id=a, effective_date=None),
+        SimpleNamespace(kind="qa_entry", id=q, effective_date=None),
+        SimpleNamespace(kind="document", id=b, effective_date=date(2023, 1, 1)),
+        SimpleNamespace(kind="document", id=a, effective_date=date(2024, 6, 1)),
+        SimpleNamespace(kind="qa_entry", id=q, effective_date=None),
+    ]
+    documents, qa_ids = split_tombstones(tombstones, date(2024, 7, 1))
+    assert documents == {a: date(2024, 6, 1), b: date(2023, 1, 1)}
+    assert qa_ids == [q]
+    documents, _ = split_tombstones(tombstones[:1], date(2024, 7, 1))
+    assert documents == {a: date(2024, 7, 1)}
+
+
+def test_catalog_drops_deleted_rows_on_refresh():
+    cat = DocumentCatalog(initial_capacity=2)
+    ids = [uuid.uuid4() for _ in range(3)]
+
+    def row(doc_id, deleted_at=None):
+        return SimpleNamespace(
+            id=doc_id, doc_type="law", status="published", jurisdiction="Iran", authority=None,
+            effective_date=None, amended_date=None, updated_at=None, deleted_at=deleted_at
+        )
+
+    assert cat._apply_rows([row(i) for i in ids]) == 3
+    cat._apply_rows([row(ids[1], deleted_at="2024-01-01T00:00:00Z")])
+    assert cat.ids_for(cat.filter_mask(doc_type=["law"])) == [ids[0], ids[2]]
+    # a re-imported document comes back
+    cat._apply_rows([row(ids[1])])
+    assert ids[1] in cat.ids_for(cat.filter_mask(doc_type=["law"]))
@@ -0,0 +1,85 @@
+import uuid
+import pytest
+from datetime import date
+from types import SimpleNamespace
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.db.base import Base
+from app.models.official import DocumentVersion, LegalUnitVersion
+from app.services.versioning import (
+    content_hash, unit_keys, record_document_version, record_unit_versions,
+    document_as_of, units_as_of
+)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[DocumentVersion.__table__, LegalUnitVersion.__table__])
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def doc(doc_id, **overrides):
+    values = dict(
+        id=doc_id, title="قانون نمونه", doc_type="law", jurisdiction="Iran", authority="Majlis",
+        effective_date=date(2020, 1, 1), amended_date=None, source_url=None, file_s3=None
+    )
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+def unit(label, text, order, unit_type="article"):
+    return SimpleNamespace(unit_type=unit_type, num_label=label, heading=None, text_plain=text, order_index=order)
+
+
+def test_content_hash_treats_none_as_empty():
+    assert content_hash(["a", None, date(2020, 1, 2)]) == content_hash(["a", "", "2020-01-02"])
+    assert content_hash(["a", "b"]) != content_hash(["ab", ""])
+
+
+def test_unit_keys_disambiguate_repeated_labels():
+    units = [unit("بند الف", "x", 3, "clause"), unit("ماده ۱", "y", 1), unit("بند الف", "z", 2, "clause")]
+    assert unit_keys(units) == ["clause|بند الف|2", "article|ماده ۱|1", "clause|بند الف|1"]
+
+
+def test_point_in_time_reads(db):
+    doc_id = uuid.uuid4()
+    v1 = doc(doc_id)
+    record_document_version(db, v1, "published", date(2020, 1, 1))
+    record_unit_versions(db, doc_id, [unit("ماده ۱", "متن اول", 1), unit("ماده ۲", "ثابت", 2)], date(2020, 1, 1))
+    db.commit()
+
+    v2 = doc(doc_id, amended_date=date(2023, 6, 1), title="قانون نمونه (اصلاحی)")
+    assert record_document_version(db, v2, "published", date(2023, 6, 1))
+    counts = record_unit_versions(db, doc_id, [unit("ماده ۱", "متن دوم", 1), unit("ماده ۲", "ثابت", 2)], date(2023, 6, 1))
+    db.commit()
+    assert counts == {"added": 0, "changed": 1, "removed": 0, "unchanged": 1}
+
+    assert document_as_of(db, doc_id, date(2023, 5, 1)).title == "قانون نمونه"
+    assert document_as_of(db, doc_id, date(2023, 6, 1)).title == "قانون نمونه (اصلاحی)"
+    assert document_as_of(db, doc_id, date(2019, 12, 31)) is None
+
+    before = units_as_of(db, doc_id, date(2023, 5, 1))
+    after = units_as_of(db, doc_id, date(2024, 1, 1))
+    assert [u.text_plain for u in before] == ["متن اول", "ثابت"]
+    assert [u.text_plain for u in after] == ["متن دوم", "ثابت"]
+    # the unchanged article is stored once and shared by both versions
+    assert db.query(LegalUnitVersion).filter(LegalUnitVersion.num_label == "ماده ۲").count() == 1
+
+
+def test_resend_is_idempotent_and_removals_close(db):
+    doc_id = uuid.uuid4()
+    units = [unit("ماده ۱", "a", 1), unit("ماده ۲", "b", 2)]
+    record_document_version(db, doc(doc_id), "published", date(2020, 1, 1))
+    record_unit_versions(db, doc_id, units, date(2020, 1, 1))
+    assert not record_document_version(db, doc(doc_id), "published", date(2020, 1, 1))
+    assert record_unit_versions(db, doc_id, units, date(2020, 1, 1))["unchanged"] == 2
+
+    counts = record_unit_versions(db, doc_id, units[:1], date(2022, 1, 1))
+    db.commit()
+    assert counts["removed"] == 1
+    assert len(units_as_of(db, doc_id, date(2021, 1, 1))) == 2
+    assert len(units_as_of(db, doc_id, date(2022, 1, 1))) == 1
+    assert db.query(DocumentVersion).count() == 1